@@ -8,15 +8,36 @@ import os
 import sys
 import time
 import json
+import re
 import subprocess
 import argparse
+import zlib
+import fnmatch
+import glob
+import posixpath
+import struct
+import hashlib
+import hmac
+import calendar
+import uuid
+import threading
+import queue
+import shutil
+import socket
+import atexit
+import tempfile
+import gzip
+import contextlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, urlencode
 
 try:
     import requests
     import zipfile
-    import shutil
 except ImportError:
     print("❌ Cần cài đặt thư viện requests:")
     print("   pip install requests")
@@ -30,9 +51,147 @@ OUTPUT_DIR = "output"
 BRANCH = "main"
 XCODE_DIR = "XCODE"
 ASSETS_ZIP = "xcode-assets.zip"
+ZIP_LEVEL = 6                    # Mức nén deflate (giống mặc định của zipfile)
+AUTO_SAMPLE_SIZE = 64 * 1024     # Policy "auto": nén thử block đầu tiên của file
+AUTO_STORE_RATIO = 0.9           # Nén thử được > 90% kích thước gốc → STORE
+DEFAULT_COMPRESSION = "smart"
+DEDUP_LINKS = ".xcode-assets-links.json"  # Member cuối ZIP: file trùng nội dung → file nguồn
+DEDUP_MIN_SIZE = 4 * 1024        # File nhỏ hơn thì chép lại trên CI tốn hơn là nén thẳng
+ZIP_MANIFEST = ".xcode-assets-manifest.json"  # Member cuối ZIP: arcname → size/sha256 (CI kiểm tra sau khi giải nén)
 
-# GitHub API endpoints
-API_BASE = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}"
+# Policy nén: rule đầu tiên khớp (glob trên arcname, min_size tùy chọn) quyết định
+# method (store/deflate/lzma/auto) và level; không khớp rule nào thì dùng default.
+# LZMA cần giải nén bằng Python zipfile hoặc bsdtar (unzip 6.0 không đọc được).
+COMPRESSED_MEDIA = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.mp3', '*.mp4', '*.m4a', '*.ogg',
+                    '*.zip', '*.gz', '*.ipa', '*.car']
+UNITY_BINARIES = ['*.dll', '*.dylib', '*.a', '*.pdb', '*.assets', '*.resS', '*.resource',
+                  '*.bundle', '*.dat', '*/globalgamemanagers']
+COMPRESSION_PRESETS = {
+    # Như bản cũ: deflate mọi file
+    'deflate': {'rules': [], 'default': {'method': 'deflate', 'level': ZIP_LEVEL}},
+    # Media đã nén → store, binary Unity → nén thử, source/text → deflate
+    'smart': {
+        'rules': [
+            {'match': COMPRESSED_MEDIA, 'method': 'store'},
+            {'match': UNITY_BINARIES, 'method': 'auto', 'level': ZIP_LEVEL},
+        ],
+        'default': {'method': 'deflate', 'level': ZIP_LEVEL},
+    },
+    # Ưu tiên tốc độ: deflate level 1
+    'fast': {
+        'rules': [
+            {'match': COMPRESSED_MEDIA, 'method': 'store'},
+            {'match': UNITY_BINARIES, 'method': 'auto', 'level': 1},
+        ],
+        'default': {'method': 'deflate', 'level': 1},
+    },
+    # Ưu tiên kích thước: LZMA cho C++ IL2CPP lớn, deflate 9 cho phần còn lại
+    'max': {
+        'rules': [
+            {'match': COMPRESSED_MEDIA, 'method': 'store'},
+            {'match': ['*.cpp', '*.c'], 'min_size': 1024 * 1024, 'method': 'lzma'},
+            {'match': UNITY_BINARIES, 'method': 'auto', 'level': 9},
+        ],
+        'default': {'method': 'deflate', 'level': 9},
+    },
+    # Nén thử mọi file
+    'auto': {'rules': [], 'default': {'method': 'auto', 'level': ZIP_LEVEL}},
+}
+COMPRESSION_METHODS = {'store': zipfile.ZIP_STORED, 'deflate': zipfile.ZIP_DEFLATED,
+                       'lzma': zipfile.ZIP_LZMA}
+ZIP_READ_CHUNK = 1024 * 1024     # Đọc file theo block 1 MB khi nén
+ASSETS_MANIFEST = "xcode-assets.manifest.json"  # Manifest path/size/mtime/sha256 của XCODE
+MANIFEST_VERSION = 1
+HASH_CACHE = "xcode-assets.hash-cache.json"  # sha256 từng file XCODE theo size/mtime (quét lại nhanh)
+HASH_CACHE_VERSION = 1
+HASH_CACHE_RACY_NS = 2 * 10**9   # File sửa < 2s trước lúc quét chưa được cache (có thể sửa tiếp cùng mtime)
+SCAN_JOBS = 8                    # Số thư mục quét song song
+GIT_PATHSPEC_FROM_FILE = (2, 25)  # git add/commit --pathspec-from-file (không giới hạn số path)
+GIT_BUILTIN_FSMONITOR = (2, 37)  # core.fsmonitor=true dùng daemon có sẵn của git (macOS/Windows)
+GIT_ARGS_BATCH = 500             # git cũ: số path mỗi lệnh git add
+PACK_FORMAT = "zip-v1"           # Đổi khi định dạng gói thay đổi → digest đổi theo
+# File sinh ra khi chạy tool, không bao giờ được commit
+UPLOAD_STATE = "xcode-assets.upload-state.json"  # Part nào đã upload xong (để resume)
+DEFAULT_PART_SIZE_MB = 128       # Kích thước mỗi part khi upload (0 = 1 file duy nhất)
+MAX_PART_SIZE_MB = 2000          # GitHub giới hạn 2 GB cho mỗi asset
+DEFAULT_UPLOAD_JOBS = 4          # Số part upload song song
+STREAM_PART_SIZE_MB = 32         # Part mặc định khi --stream (RAM ≈ (2 x upload_jobs + 2) x part, xem PartSink)
+CHAIN_INDEX = "xcode-assets.chain.json"  # Baseline + danh sách delta đã publish
+CHAIN_VERSION = 1
+DEFAULT_BASELINE_EVERY = 10      # Sau N delta thì upload lại baseline đầy đủ
+DELTA_MAX_RATIO = 0.5            # Delta lớn hơn 50% baseline → upload baseline luôn
+CDC_RECIPE = "xcode-assets.recipe.json.gz"  # Chunk store (--chunked): file → chunk → vị trí trong pack
+CDC_RECIPE_VERSION = 1
+CDC_MIN_SIZE = 16 * 1024         # Chunk theo nội dung (FastCDC): nhỏ nhất / trung bình / lớn nhất
+CDC_AVG_SIZE = 64 * 1024
+CDC_MAX_SIZE = 256 * 1024        # File nhỏ hơn là 1 chunk nguyên file
+CDC_FORMAT = f"fastcdc-v1/{CDC_MIN_SIZE}/{CDC_AVG_SIZE}/{CDC_MAX_SIZE}"  # Đổi tham số → cắt lại hết
+CDC_PACK_PREFIX = "xcode-chunks-"  # Asset pack: các chunk đã nén ghi nối tiếp, tên theo sha256
+CDC_PACK_SIZE_MB = 128           # Kích thước tối đa mỗi pack
+CDC_REPACK_RATIO = 0.5           # Pack cũ còn < 50% dữ liệu được dùng → đóng gói lại toàn bộ
+CDC_PROCESS_MIN_BYTES = 16 * 1024 * 1024  # Cần cắt ít hơn thì không mở process pool
+CHUNK_CACHE = "xcode-assets.chunk-cache.json"  # Danh sách chunk theo sha256 file (khỏi cắt lại)
+CHUNK_CACHE_VERSION = 1
+ASSETS_LOCK = "xcode-assets.lock"  # Khóa file (fcntl/msvcrt): mỗi máy chỉ 1 process nén + publish
+CURRENT_ASSETS = "xcode-assets.current.json"  # Digest assets hiện tại + các digest trước đó trên Release
+CURRENT_ASSETS_VERSION = 1
+ASSETS_KEEP = 3                  # Giữ asset của 3 digest publish gần nhất
+ASSETS_GRACE = 6 * 3600          # Asset/digest mới thay thế < 6h chưa bị dọn (run đang tải, máy khác đang upload)
+PUBLISH_LEASE = "xcode-assets.lease.json"  # Lease theo digest trên Release: 1 máy publish, máy khác đợi
+LEASE_TTL = 3600                 # Lease cũ hơn 1h coi như process giữ nó đã chết
+LEASE_POLL_INTERVAL = 10         # Đợi lease: hỏi lại Release mỗi 10s
+WATCH_PORT = 8767                # --watch: status daemon tại http://127.0.0.1:8767/status
+WATCH_DEBOUNCE = 3.0             # Im lặng 3s (Unity export xong) mới nén + upload
+WATCH_MAX_DELAY = 60             # Thay đổi liên tục thì vẫn publish sau tối đa 60s
+WATCH_POLL_INTERVAL = 2.0        # Không có inotify: quét lại XCODE mỗi 2s
+WATCH_WAIT_TIMEOUT = 1800        # CLI đợi daemon publish xong tối đa 30 phút
+WATCH_RETRY_BASE = 5             # Publish lỗi: thử lại sau 5s, 10s, 20s... (có thay đổi thì thử ngay)
+WATCH_RETRY_MAX = 300            # Khoảng thử lại tối đa 5 phút
+UPLOAD_RETRIES = 3
+BUILD_HISTORY = "auto-build-history.json"  # Thời gian từng step của các lần build thành công
+BUILD_HISTORY_RUNS = 20          # Số lần build gần nhất giữ lại để ước lượng
+DEFAULT_POLL_INTERVAL = 10       # Chưa có lịch sử build: poll đều như trước
+MIN_POLL_INTERVAL = 3            # Sát lúc build dự kiến xong
+MAX_POLL_INTERVAL = 60           # Giữa pha xcodebuild dài (hoặc khi có webhook)
+RUN_LOOKUP_TIMEOUT = 90          # Thời gian tối đa chờ run xuất hiện sau khi trigger
+RUN_LOOKUP_MAX_INTERVAL = 3      # Poll tìm run: 0.5s, 1s, 2s, 3s, 3s...
+API_CACHE = "auto-build-api-cache.json"  # Response GET (ETag + payload) lưu giữa các lần chạy
+API_CACHE_MAX_AGE = 7 * 24 * 3600  # Entry cache cũ hơn thì bỏ khi đọc
+WORKFLOWS_CACHE_TTL = 24 * 3600  # Danh sách workflow gần như không đổi
+API_TIMEOUT = 60
+RATE_LIMIT_PACE_RATIO = 0.1      # Còn < 10% quota → giãn request đều tới lúc reset
+RATE_LIMIT_MAX_WAIT = 900        # Chờ reset rate limit tối đa 15 phút, lâu hơn thì báo lỗi
+DOWNLOAD_JOBS = 4                # Số kết nối Range song song cho mỗi artifact
+DOWNLOAD_SEGMENT_MB = 8          # Kích thước mỗi đoạn Range (đơn vị resume)
+DOWNLOAD_BUFFER = 1024 * 1024    # Bộ đệm đọc/ghi khi tải
+DOWNLOAD_RETRIES = 3
+ARTIFACT_JOBS = 3                # Số artifact tải cùng lúc
+BATCH_API_BUDGET = 120           # Request/phút dùng chung khi theo dõi build matrix
+BATCH_LOOKUP_JOBS = 4            # Số run tìm song song sau khi trigger matrix
+RELEASE_TAG = "v1.0-latest"      # Release cố định chứa assets XCODE
+STEP_THREAD_PREFIX = "step:"     # Tên luồng của các bước chạy song song trong main
+ZIP_TAIL_BYTES = 128 * 1024      # Đọc phần cuối artifact để lấy central directory (tải thẳng IPA)
+RUN_REPORT = "auto-build-report.jsonl"  # Span thời gian từng pha, mỗi lần chạy nối thêm
+BUILD_CACHE_DIR = ".ipa-cache"   # Cache IPA đã build theo commit + config + digest assets
+BUILD_CACHE_MAX_MB = 4096        # Vượt thì xóa IPA dùng lâu nhất (LRU)
+BUILD_CACHE_VERSION = "ipa-v1"
+BUILD_CACHE_TAG_LENGTH = 16      # Số ký tự đầu của key ghi vào correlation id (tên run)
+BUILD_CACHE_REMOTE_RUNS = 20     # Số run thành công gần nhất được dò khi tìm cache trên GitHub
+XCODE_PROJECT = "Unity-iPhone.xcodeproj"  # Project trong XCODE, dùng để tính file build cần (--prune)
+PRUNE_ALLOW = ['Data/*']         # Luôn đóng gói dù pbxproj không nhắc tới (Unity load lúc chạy)
+PRUNE_DROP = ['*.pdb', '*.mdb']  # Symbol debug của tool build, không cần để build IPA
+PBXPROJ_PATH_SETTINGS = ('INFOPLIST_FILE', 'GCC_PREFIX_HEADER', 'CODE_SIGN_ENTITLEMENTS',
+                         'SWIFT_OBJC_BRIDGING_HEADER', 'MODULEMAP_FILE')
+IL2CPP_ROOT_MARKER = "il2cpp_root"  # File đánh dấu thư mục gốc IL2CPP (tool il2cpp đọc cả cây)
+# File sinh ra khi chạy tool, không bao giờ được commit
+LOCAL_STATE_FILES = [ASSETS_ZIP, ASSETS_MANIFEST, UPLOAD_STATE, BUILD_HISTORY, API_CACHE, BUILD_CACHE_DIR,
+                     RUN_REPORT, HASH_CACHE, CHUNK_CACHE, ASSETS_LOCK]
+
+# GitHub API endpoints (override bằng biến môi trường để test với server giả lập)
+API_ROOT = os.environ.get('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+UPLOADS_ROOT = os.environ.get('GITHUB_UPLOADS_URL', 'https://uploads.github.com').rstrip('/')
+API_BASE = f"{API_ROOT}/repos/{REPO_OWNER}/{REPO_NAME}"
+UPLOADS_BASE = f"{UPLOADS_ROOT}/repos/{REPO_OWNER}/{REPO_NAME}"
 
 class Colors:
     """ANSI color codes"""
@@ -81,37 +240,1194 @@ def get_github_token():
     
     return token
 
-def run_command(cmd, check=True, capture_output=False):
-    """Chạy command và trả về kết quả"""
+# ============== ĐO THỜI GIAN ==============
+
+class RunReport:
+    """Span thời gian của từng pha trong 1 lần chạy tool
+
+    span() đo 1 pha chạy trên máy (lồng nhau được, từ thread nào cũng được); code trong
+    span gán record['bytes'] để có throughput. add_span() ghi span đã có sẵn mốc thời gian
+    (job/step CI lấy từ jobs API). Xuất JSON lines (mỗi span 1 dòng, nối thêm vào file)
+    và Chrome trace (mở bằng chrome://tracing hoặc https://ui.perfetto.dev).
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.meta = {}
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def span(self, name, category='local', **attrs):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        record = dict(attrs, name=name, cat=category, start=time.time(),
+                      thread=threading.current_thread().name,
+                      parent=stack[-1]['name'] if stack else None, depth=len(stack))
+        stack.append(record)
+        try:
+            yield record
+        except BaseException:
+            record['ok'] = False
+            raise
+        finally:
+            stack.pop()
+            self._finish(record, time.time())
+
+    def add_span(self, name, start, end, category='ci', **attrs):
+        """Ghi span có mốc thời gian sẵn (epoch giây)"""
+        record = dict(attrs, name=name, cat=category, start=start)
+        record.setdefault('thread', 'ci')
+        record.setdefault('parent', None)
+        record.setdefault('depth', 1 if record['parent'] else 0)
+        self._finish(record, end)
+
+    def _finish(self, record, end):
+        record['seconds'] = round(end - record['start'], 3)
+        if record.get('bytes') and record['seconds'] > 0:
+            record['mb_per_s'] = round(record['bytes'] / (1024 * 1024) / record['seconds'], 2)
+        with self._lock:
+            self.spans.append(record)
+
+    def write_jsonl(self, path):
+        """Nối các span vào file JSON lines (mỗi dòng có id lần chạy để gom theo build)"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda record: record['start'])
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in spans:
+                f.write(json.dumps(dict(record, report=self.id), ensure_ascii=False) + '\n')
+
+    def write_chrome_trace(self, path):
+        """Ghi Chrome trace: pha trên máy ở process 'local', job/step CI ở process 'GitHub Actions'"""
+        with self._lock:
+            spans = list(self.spans)
+        pids = {'local': 1, 'ci': 2}
+        threads = {}
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': label}}
+                  for pid, label in ((1, 'local'), (2, 'GitHub Actions'))]
+        for record in spans:
+            pid = pids.get(record['cat'], 1)
+            tid = threads.setdefault((pid, record['thread']), len(threads) + 1)
+            args = {key: value for key, value in record.items()
+                    if key not in ('name', 'cat', 'start', 'seconds', 'thread', 'depth')}
+            events.append({'name': record['name'], 'cat': record['cat'], 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': max(0, int((record['start'] - self.started) * 1e6)),
+                           'dur': int(record['seconds'] * 1e6), 'args': args})
+        for (pid, thread), tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread}})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def print_summary(self):
+        """Bảng thời gian các pha trên luồng chính và các luồng bước (2 cấp) và job CI"""
+        with self._lock:
+            spans = [record for record in self.spans
+                     if ((record['thread'] == 'MainThread' or record['thread'].startswith(STEP_THREAD_PREFIX))
+                         and record['depth'] <= 1)
+                     or (record['cat'] == 'ci' and record['depth'] == 0)]
+        roots = {(record['thread'], record['start']): record['start'] + record['seconds']
+                 for record in spans if record['depth'] == 0}
+
+        def group(record):
+            # Pha con đứng ngay dưới pha cha cùng luồng (các luồng bước chạy xen kẽ nhau)
+            if record['depth'] == 0:
+                return record['start']
+            return max((start for (thread, start), end in roots.items()
+                        if thread == record['thread'] and start <= record['start'] <= end),
+                       default=record['start'])
+
+        spans.sort(key=lambda record: (record['name'] == 'total', group(record), record['depth'], record['start']))
+        if not spans:
+            return
+        print(f"\n{Colors.BOLD}{'Pha':<36} {'Thời gian':>10} {'Dữ liệu':>12} {'Tốc độ':>12}{Colors.ENDC}")
+        for record in spans:
+            size = f"{record['bytes'] / (1024*1024):.2f} MB" if record.get('bytes') else ''
+            speed = f"{record['mb_per_s']:.2f} MB/s" if record.get('mb_per_s') else ''
+            label = '  ' * record['depth'] + record['name'] + (f" [{record['label']}]" if record.get('label') else '')
+            print(f"{label:<36} {record['seconds']:>9.1f}s {size:>12} {speed:>12}")
+
+_run_report = RunReport()
+
+def run_report():
+    """RunReport của lần chạy hiện tại"""
+    return _run_report
+
+def span(name, category='local', **attrs):
+    """Đo 1 pha: `with span('upload') as record: ...; record['bytes'] = n`"""
+    return _run_report.span(name, category, **attrs)
+
+def finish_run_report(report_path=RUN_REPORT, trace_path=None):
+    """Kết thúc lần chạy: thêm span 'total', in bảng thời gian, ghi JSON lines / Chrome trace"""
+    report = run_report()
+    report.add_span('total', report.started, time.time(), category='local', thread='MainThread',
+                    depth=0, **report.meta)
+    report.print_summary()
     try:
-        if capture_output:
-            result = subprocess.run(cmd, shell=True, check=check, 
-                                  capture_output=True, text=True, encoding='utf-8')
-            return result.stdout.strip()
-        else:
-            subprocess.run(cmd, shell=True, check=check)
+        if report_path:
+            report.write_jsonl(report_path)
+        if trace_path:
+            report.write_chrome_trace(trace_path)
+            print_info(f"Chrome trace: {trace_path}")
+    except OSError as e:
+        print_warning(f"Không ghi được báo cáo thời gian: {e}")
+
+def record_ci_spans(run_data, jobs, **attrs):
+    """Ghi thời gian chờ runner, từng job và từng step CI (mốc thời gian từ GitHub)"""
+    report = run_report()
+    created = parse_github_time(run_data.get('created_at'))
+    job_starts = [parse_github_time(job.get('started_at')) for job in jobs if job.get('started_at')]
+    if created is not None and job_starts:
+        report.add_span('ci.queue', created, min(job_starts), run_id=run_data['id'], **attrs)
+    for job in jobs:
+        started = parse_github_time(job.get('started_at'))
+        completed = parse_github_time(job.get('completed_at'))
+        if started is None or completed is None:
+            continue
+        report.add_span(f"ci.job {job['name']}", started, completed, thread=job['name'],
+                        run_id=run_data['id'], conclusion=job.get('conclusion'), **attrs)
+        for step in job.get('steps', []):
+            step_started = parse_github_time(step.get('started_at'))
+            step_completed = parse_github_time(step.get('completed_at'))
+            if step_started is None or step_completed is None:
+                continue
+            report.add_span(f"ci.step {step['name']}", step_started, step_completed, thread=job['name'],
+                            parent=f"ci.job {job['name']}", run_id=run_data['id'],
+                            conclusion=step.get('conclusion'), **attrs)
+
+# ============== GITHUB API CLIENT ==============
+
+class GitHubClient:
+    """Client GitHub API dùng chung cho toàn tool
+
+    - Mỗi thread giữ 1 requests.Session (keep-alive, không bắt tay TCP/TLS lại mỗi lần gọi)
+    - GET gửi kèm If-None-Match; 304 dùng lại payload đã cache và không tốn rate limit
+    - GET có `ttl` được lưu xuống API_CACHE và trả luôn từ cache trong ttl giây
+    - Đọc X-RateLimit-*: giãn request khi quota sắp hết, chờ reset khi bị chặn
+    - Thống kê số lần gọi, cache hit, 304, lỗi và thời gian theo từng endpoint
+    """
+
+    def __init__(self, token, cache_path=API_CACHE):
+        self.token = token
+        self.cache_path = cache_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Cache tách theo token để token khác (quyền khác) không đọc nhầm
+        self._token_key = hashlib.sha256(token.encode('utf-8')).hexdigest()[:12]
+        self._cache = self._load_cache()
+        self.rate_limit = None
+        self.rate_remaining = None
+        self.rate_reset = None
+        self.stats = {}
+
+    def session(self):
+        """Session keep-alive của thread hiện tại"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                "Authorization": f"token {self.token}",
+                "Accept": "application/vnd.github.v3+json"
+            })
+            self._local.session = session
+        return session
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict):
+            return {}
+        now = time.time()
+        return {key: dict(entry, persist=True) for key, entry in cache.items()
+                if isinstance(entry, dict) and now - entry.get('time', 0) < API_CACHE_MAX_AGE}
+
+    def _save_cache(self):
+        """Ghi các entry persist xuống đĩa (gọi khi đang giữ lock)"""
+        data = {key: {'etag': entry['etag'], 'payload': entry['payload'], 'time': entry['time']}
+                for key, entry in self._cache.items() if entry.get('persist')}
+        tmp_path = self.cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def endpoint(method, url):
+        """Tên endpoint để gom thống kê: 'GET /releases/{id}/assets'"""
+        path = urlparse(url).path
+        for base in (API_BASE, UPLOADS_BASE):
+            base_path = urlparse(base).path
+            if path.startswith(base_path + '/'):
+                path = path[len(base_path):]
+                break
+        return f"{method} {re.sub(r'/[0-9]+(?=/|$)', '/{id}', path)}"
+
+    def _record(self, endpoint, field, seconds=0.0):
+        with self._lock:
+            entry = self.stats.setdefault(endpoint, {'calls': 0, 'cache_hits': 0, 'not_modified': 0,
+                                                     'errors': 0, 'seconds': 0.0})
+            entry[field] += 1
+            entry['seconds'] += seconds
+
+    def _update_rate_limit(self, response):
+        headers = response.headers
+        if 'X-RateLimit-Remaining' not in headers:
+            return
+        try:
+            with self._lock:
+                self.rate_limit = int(headers.get('X-RateLimit-Limit', 0)) or self.rate_limit
+                self.rate_remaining = int(headers['X-RateLimit-Remaining'])
+                self.rate_reset = int(headers.get('X-RateLimit-Reset', 0)) or self.rate_reset
+        except ValueError:
+            pass
+
+    def _throttle(self):
+        """Quota sắp hết → giãn đều số request còn lại tới lúc reset"""
+        with self._lock:
+            limit, remaining, reset = self.rate_limit, self.rate_remaining, self.rate_reset
+        if not limit or remaining is None or not reset or remaining >= limit * RATE_LIMIT_PACE_RATIO:
+            return
+        window = reset - time.time()
+        if window > 0:
+            time.sleep(min(window / max(remaining, 1), MAX_POLL_INTERVAL))
+
+    def _blocked_wait(self, response):
+        """Số giây cần chờ nếu response là rate limit (403/429), None nếu không phải"""
+        if response.status_code not in (403, 429):
             return None
-    except subprocess.CalledProcessError as e:
-        if check:
-            print_error(f"Lỗi khi chạy command: {cmd}")
-            print_error(f"Error: {e}")
-            sys.exit(1)
+        if response.headers.get('Retry-After'):
+            try:
+                return int(response.headers['Retry-After'])
+            except ValueError:
+                return None
+        if response.headers.get('X-RateLimit-Remaining') == '0' and self.rate_reset:
+            return max(1, self.rate_reset - time.time() + 1)
         return None
 
-def is_file_locked(file_path):
-    """Kiểm tra xem file có đang bị lock không"""
-    if not file_path.exists():
+    def request(self, method, url, **kwargs):
+        """Gửi request qua Session của thread, tự chờ và thử lại 1 lần khi bị rate limit"""
+        kwargs.setdefault('timeout', API_TIMEOUT)
+        endpoint = self.endpoint(method, url)
+        # Body dạng stream (file) không gửi lại được
+        retriable = isinstance(kwargs.get('data'), (bytes, type(None)))
+        while True:
+            self._throttle()
+            start_time = time.time()
+            try:
+                response = self.session().request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                self._record(endpoint, 'errors', time.time() - start_time)
+                raise
+            self._record(endpoint, 'calls', time.time() - start_time)
+            self._update_rate_limit(response)
+            wait = self._blocked_wait(response)
+            if wait is None or not retriable or wait > RATE_LIMIT_MAX_WAIT:
+                return response
+            print_warning(f"Chạm rate limit GitHub ({endpoint}), đợi {wait:.0f}s...")
+            time.sleep(wait)
+            retriable = False
+
+    def get_json(self, url, params=None, ttl=None, with_source=False):
+        """GET JSON có cache: trả về (status, payload)
+
+        ttl=None: luôn hỏi lại GitHub (có If-None-Match). ttl=N: trong N giây dùng
+        luôn bản trên đĩa. with_source=True trả thêm nguồn: 'network', 'etag' hoặc 'cache'.
+        """
+        key = f"{self._token_key} {url}"
+        if params:
+            key += '?' + urlencode(sorted(params.items()))
+        endpoint = self.endpoint('GET', url)
+        with self._lock:
+            cached = self._cache.get(key)
+        if ttl and cached and cached.get('persist') and time.time() - cached['time'] < ttl:
+            self._record(endpoint, 'cache_hits')
+            result = (200, cached['payload'])
+            return result + ('cache',) if with_source else result
+        
+        headers = {}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        response = self.request('GET', url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            self._record(endpoint, 'not_modified')
+            with self._lock:
+                cached['time'] = time.time()
+                if ttl:
+                    cached['persist'] = True
+                    self._save_cache()
+            result = (200, cached['payload'])
+            return result + ('etag',) if with_source else result
+        
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        if response.status_code == 200:
+            entry = {'etag': response.headers.get('ETag'), 'payload': payload,
+                     'time': time.time(), 'persist': bool(ttl)}
+            with self._lock:
+                self._cache[key] = entry
+                if ttl:
+                    self._save_cache()
+        result = (response.status_code, payload)
+        return result + ('network',) if with_source else result
+
+    def print_stats(self):
+        """In bảng thống kê theo endpoint"""
+        with self._lock:
+            stats = sorted(self.stats.items())
+        if not stats:
+            return
+        print_info("Thống kê GitHub API:")
+        print(f"   {'Endpoint':<48} {'Gọi':>5} {'Cache':>6} {'304':>5} {'Lỗi':>5} {'TB (ms)':>9}")
+        for endpoint, entry in stats:
+            average = entry['seconds'] / entry['calls'] * 1000 if entry['calls'] else 0
+            print(f"   {endpoint[:48]:<48} {entry['calls']:>5} {entry['cache_hits']:>6} "
+                  f"{entry['not_modified']:>5} {entry['errors']:>5} {average:>9.0f}")
+        if self.rate_remaining is not None:
+            print_info(f"Rate limit còn {self.rate_remaining}/{self.rate_limit}")
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def github_client(token):
+    """GitHubClient dùng chung cho token này (tạo ở lần gọi đầu)"""
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is None:
+            client = GitHubClient(token)
+            _clients[token] = client
+        return client
+
+def run_git(args, check=True, capture=True, stdin=None, options=()):
+    """Chạy git không qua shell: `options` là option chung (-c ...), trả về CompletedProcess (bytes)
+
+    Mỗi lệnh được ghi thành span 'git <lệnh>'; lỗi khi check=True thì in stderr và thoát.
+    """
+    cmd = ['git', *options, *args]
+    pipe = subprocess.PIPE if capture else None
+    try:
+        with span(f"git {args[0]}"):
+            result = subprocess.run(cmd, input=stdin, stdout=pipe, stderr=pipe)
+    except OSError as e:
+        print_error(f"Không chạy được git: {e}")
+        sys.exit(1)
+    if check and result.returncode != 0:
+        print_error(f"Lỗi khi chạy command: {' '.join(cmd)}")
+        if result.stderr:
+            print_error(f"Error: {result.stderr.decode('utf-8', 'replace').strip()}")
+        sys.exit(1)
+    return result
+
+def _try_lock(f):
+    """Khóa độc quyền không chờ trên file đang mở (fcntl trên Unix, msvcrt trên Windows)"""
+    try:
+        if sys.platform == 'win32':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
         return False
+
+@contextlib.contextmanager
+def assets_lock(path=ASSETS_LOCK):
+    """Giữ khóa nén + publish assets của máy này; trả về True nếu đã phải đợi process khác
+
+    OS tự nhả khóa khi process chết nên không bao giờ kẹt khóa. File khóa không bị xóa
+    (xóa file đang được process khác chờ sẽ làm 2 process cùng giữ 2 khóa khác nhau).
+    """
+    f = open(path, 'a+')
+    waited = False
     try:
-        # Thử mở file để kiểm tra
-        with open(file_path, 'a'):
+        while not _try_lock(f):
+            if not waited:
+                try:
+                    f.seek(0)
+                    holder = f.read().strip() or "?"
+                except OSError:
+                    holder = "?"
+                print_info(f"Process khác ({holder}) đang nén/publish assets, đợi xong rồi dùng lại kết quả...")
+                waited = True
+            time.sleep(0.5)
+        f.seek(0)
+        f.truncate()
+        f.write(f"pid {os.getpid()}, từ {datetime.now().strftime('%H:%M:%S')}")
+        f.flush()
+        yield waited
+    finally:
+        f.close()  # Đóng file là nhả khóa
+
+# ============== NÉN SONG SONG ==============
+
+def default_jobs():
+    """Số worker mặc định cho nén song song (= số CPU)"""
+    return os.cpu_count() or 1
+
+def scan_tree(xcode_path, jobs=None):
+    """Quét cây bằng os.scandir, nhiều thư mục song song: [(arcname, path, size, mtime_ns)] sắp theo arcname
+
+    Archive name tương đối từ parent của thư mục (giống bản cũ). Như os.walk: không đi vào
+    symlink tới thư mục, bỏ qua thư mục không đọc được.
+    """
+    xcode_path = Path(xcode_path)
+    records = []
+
+    def scan_dir(path, arcdir):
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    arcname = f"{arcdir}/{entry.name}"
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append((entry.path, arcname))
+                    else:
+                        # stat() của DirEntry được cache (Windows: có sẵn từ lúc liệt kê)
+                        st = entry.stat()
+                        files.append((arcname, entry.path, st.st_size, st.st_mtime_ns))
+        except (FileNotFoundError, PermissionError, NotADirectoryError):
             pass
-        return False
-    except (PermissionError, IOError):
-        return True
+        return files, subdirs
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs or SCAN_JOBS)) as pool:
+        pending = {pool.submit(scan_dir, os.fspath(xcode_path), xcode_path.name)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                records.extend(files)
+                pending.update(pool.submit(scan_dir, path, arcname) for path, arcname in subdirs)
+    records.sort()
+    return records
+
+def scan_xcode_files(xcode_path):
+    """Liệt kê file trong XCODE theo thứ tự cố định: [(arcname, path), ...]"""
+    return [(arcname, Path(path)) for arcname, path, _, _ in scan_tree(xcode_path)]
+
+def load_compression_policy(name_or_path=None):
+    """Lấy policy nén theo tên preset hoặc từ file JSON {"rules": [...], "default": {...}}"""
+    name_or_path = name_or_path or DEFAULT_COMPRESSION
+    if name_or_path in COMPRESSION_PRESETS:
+        return COMPRESSION_PRESETS[name_or_path]
+    with open(name_or_path, 'r', encoding='utf-8') as f:
+        policy = json.load(f)
+    for rule in policy.get('rules', []) + [policy.setdefault('default', {'method': 'deflate'})]:
+        if rule.get('method', 'deflate') not in list(COMPRESSION_METHODS) + ['auto']:
+            raise ValueError(f"Method nén không hợp lệ: {rule.get('method')}")
+    return policy
+
+def pack_fingerprint(policy, dedup):
+    """Dấu của cách đóng gói (policy nén + dedup): ZIP cũ đóng gói khác thì không dùng lại được"""
+    payload = {'policy': policy or load_compression_policy(), 'dedup': bool(dedup)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def select_compression(policy, arcname, size):
+    """Chọn rule nén cho 1 file: trả về (method, level)"""
+    for rule in policy.get('rules', []):
+        patterns = rule['match']
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        if size < rule.get('min_size', 0):
+            continue
+        if any(fnmatch.fnmatchcase(arcname, pattern) for pattern in patterns):
+            return rule.get('method', 'deflate'), rule.get('level', ZIP_LEVEL)
+    default = policy.get('default', {})
+    return default.get('method', 'deflate'), default.get('level', ZIP_LEVEL)
+
+def compress_file(file_path, arcname=None, policy=None):
+    """Nén 1 file theo policy, trả về (data, crc, size, stat, method)
+
+    Chạy trong worker thread: zlib/lzma nhả GIL khi nén nên thread scale theo số core.
+    """
+    st = os.stat(file_path)
+    policy = policy or load_compression_policy()
+    method, level = select_compression(policy, arcname or Path(file_path).name, st.st_size)
+    crc = 0
+    size = 0
+    parts = []
+    with open(file_path, 'rb') as f:
+        block = f.read(ZIP_READ_CHUNK)
+        if method == 'auto':
+            # Nén thử block đầu: tỉ lệ kém (media/dữ liệu đã nén) thì STORE
+            sample = block[:AUTO_SAMPLE_SIZE]
+            ratio = len(zlib.compress(sample, 1)) / len(sample) if sample else 0
+            method = 'store' if ratio > AUTO_STORE_RATIO else 'deflate'
+        if method == 'deflate':
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        elif method == 'lzma':
+            compressor = zipfile.LZMACompressor()
+        else:
+            compressor = None
+        while block:
+            size += len(block)
+            crc = zlib.crc32(block, crc)
+            parts.append(compressor.compress(block) if compressor else block)
+            block = f.read(ZIP_READ_CHUNK)
+    if compressor:
+        parts.append(compressor.flush())
+    data = b''.join(parts)
+    if compressor and len(data) >= size:
+        # Nén không lợi gì → lưu nguyên (đọc lại file, hiếm khi xảy ra)
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        method = 'store'
+    return data, crc, size, st, COMPRESSION_METHODS[method]
+
+def print_compression_stats(stats):
+    """In số file và tỉ lệ nén theo từng method"""
+    for method, (count, bytes_in, bytes_out) in sorted(stats.get('methods', {}).items()):
+        ratio = bytes_out / bytes_in if bytes_in else 0
+        print_info(f"   {method:<8} {count:>6} file | {bytes_in / (1024*1024):>9.2f} MB → "
+                   f"{bytes_out / (1024*1024):>9.2f} MB ({ratio:.0%})")
+
+def read_raw_member(zip_path, zinfo, file_path):
+    """Đọc nguyên dữ liệu đã nén của 1 member trong ZIP cũ (không giải nén)
+
+    Trả về cùng dạng với compress_file để ghép thẳng vào ZIP mới.
+    """
+    st = os.stat(file_path)
+    with open(zip_path, 'rb') as f:
+        f.seek(zinfo.header_offset)
+        header = f.read(30)
+        if header[:4] != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f"Local header hỏng: {zinfo.filename}")
+        name_len, extra_len = struct.unpack('<HH', header[26:30])
+        f.seek(zinfo.header_offset + 30 + name_len + extra_len)
+        data = f.read(zinfo.compress_size)
+    return data, zinfo.CRC, zinfo.file_size, st, zinfo.compress_type
+
+def _dos_datetime(mtime):
+    """Đổi mtime sang (dos_time, dos_date) theo chuẩn ZIP"""
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1  # 1980-01-01 00:00, giống zipfile (strict_timestamps=False)
+    year = min(t.tm_year, 2107)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    return dos_time, dos_date
+
+class ZipStreamWriter:
+    """Ghi ZIP chuẩn (có ZIP64) từ dữ liệu đã nén sẵn, ghi tuần tự không cần seek"""
+
+    ZIP64_LIMIT = 0xFFFFFFFF   # Ngưỡng chuyển sang ZIP64
+    ZIP64_MARK = 0xFFFFFFFF    # Giá trị đánh dấu "xem extra field ZIP64"
+    MADE_BY = ((0 if os.name == 'nt' else 3) << 8) | 20
+
+    def __init__(self, fileobj):
+        self.fp = fileobj
+        self.offset = 0
+        self.entries = []
+
+    def _write(self, data):
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def add(self, arcname, data, crc, size, mtime, mode=0o100644,
+            method=zipfile.ZIP_DEFLATED):
+        """Thêm 1 member đã nén (data là stream raw theo method)"""
+        try:
+            name = arcname.encode('ascii')
+            flags = 0
+        except UnicodeEncodeError:
+            name = arcname.encode('utf-8')
+            flags = 0x800
+        if method == zipfile.ZIP_LZMA:
+            flags |= 0x02  # LZMA có end-of-stream marker (giống zipfile)
+        dos_time, dos_date = _dos_datetime(mtime)
+        compress_size = len(data)
+        header_offset = self.offset
+        zip64 = (size >= self.ZIP64_LIMIT or compress_size >= self.ZIP64_LIMIT)
+        if zip64:
+            extra = struct.pack('<HHQQ', 0x0001, 16, size, compress_size)
+            header_sizes = (self.ZIP64_MARK, self.ZIP64_MARK)
+        else:
+            extra = b''
+            header_sizes = (compress_size, size)
+        base_version = 63 if method == zipfile.ZIP_LZMA else 20
+        version = max(base_version, 45) if zip64 else base_version
+        self._write(struct.pack('<IHHHHHIIIHH', 0x04034b50, version, flags, method,
+                                dos_time, dos_date, crc, header_sizes[0], header_sizes[1],
+                                len(name), len(extra)))
+        self._write(name)
+        self._write(extra)
+        self._write(data)
+        self.entries.append((name, flags, method, dos_time, dos_date, crc,
+                             compress_size, size, header_offset, mode, base_version))
+
+    def close(self):
+        """Ghi central directory và end record"""
+        cd_offset = self.offset
+        for (name, flags, method, dos_time, dos_date, crc,
+             compress_size, size, header_offset, mode, base_version) in self.entries:
+            if (size >= self.ZIP64_LIMIT or compress_size >= self.ZIP64_LIMIT
+                    or header_offset >= self.ZIP64_LIMIT):
+                extra = struct.pack('<HHQQQ', 0x0001, 24, size, compress_size, header_offset)
+                fields = (self.ZIP64_MARK, self.ZIP64_MARK, self.ZIP64_MARK)
+                version = max(base_version, 45)
+            else:
+                extra = b''
+                fields = (compress_size, size, header_offset)
+                version = base_version
+            self._write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, self.MADE_BY, version,
+                                    flags, method, dos_time, dos_date, crc, fields[0], fields[1],
+                                    len(name), len(extra), 0, 0, 0,
+                                    (mode & 0xFFFF) << 16, fields[2]))
+            self._write(name)
+            self._write(extra)
+        cd_size = self.offset - cd_offset
+        count = len(self.entries)
+        if (count >= 0xFFFF or cd_size >= self.ZIP64_LIMIT
+                or cd_offset >= self.ZIP64_LIMIT):
+            zip64_end_offset = self.offset
+            self._write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, self.MADE_BY, 45,
+                                    0, 0, count, count, cd_size, cd_offset))
+            self._write(struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1))
+            count = min(count, 0xFFFF)
+            cd_size = self.ZIP64_MARK
+            cd_offset = self.ZIP64_MARK
+        self._write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count,
+                                cd_size, cd_offset, 0))
+        self.fp.flush()
+
+def _add_json_member(writer, arcname, payload):
+    """Ghi dict thành member JSON (mtime cố định để ZIP vẫn deterministic: stream resume so sánh part)"""
+    data = json.dumps(payload, indent=1, sort_keys=True).encode('utf-8')
+    compressor = zlib.compressobj(ZIP_LEVEL, zlib.DEFLATED, -15)
+    writer.add(arcname, compressor.compress(data) + compressor.flush(), zlib.crc32(data), len(data), 0)
+
+def write_zip_stream(fileobj, entries, jobs=None, policy=None, progress=True,
+                     reuse_zip=None, reuse=(), links=None, files=None, pack=None):
+    """Nén danh sách [(arcname, path)] thành ZIP ghi tuần tự vào `fileobj`
+
+    fileobj chỉ cần write()/flush() (file, pipe, bộ đệm upload...).
+    Member có tên trong `reuse` được chép nguyên dữ liệu nén từ `reuse_zip`
+    thay vì nén lại. `links` ({arcname: arcname nguồn}, xem dedup_entries) được
+    ghi thành member DEDUP_LINKS ở cuối ZIP, `files` (index của cả cây) thành
+    member ZIP_MANIFEST (kèm `pack`, xem compute_assets_digest) để CI kiểm tra từng file. Trả về dict thống kê: files, reused,
+    bytes_in, bytes_out, seconds, methods ({method: [số file, bytes vào, bytes ra]}).
+    """
+    jobs = max(1, jobs or default_jobs())
+    policy = policy or load_compression_policy()
+    method_names = {number: name for name, number in COMPRESSION_METHODS.items()}
+    methods = {}
+    total = len(entries)
+    bytes_in = 0
+    reused = 0
+    start_time = time.time()
+
+    reuse_infos = {}
+    if reuse_zip and reuse:
+        with zipfile.ZipFile(reuse_zip) as old_zip:
+            reuse_infos = {info.filename: info for info in old_zip.infolist()
+                           if info.filename in reuse}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        writer = ZipStreamWriter(fileobj)
+        # Giới hạn số file đang nén dở để RAM không phụ thuộc kích thước cây
+        pending = deque()
+        todo = iter(entries)
+        window = jobs * 4
+
+        def submit_next():
+            for arcname, file_path in todo:
+                zinfo = reuse_infos.get(arcname)
+                if zinfo is not None:
+                    future = pool.submit(read_raw_member, reuse_zip, zinfo, file_path)
+                else:
+                    future = pool.submit(compress_file, file_path, arcname, policy)
+                pending.append((arcname, future, zinfo is not None))
+                return
+
+        for _ in range(window):
+            submit_next()
+
+        done = 0
+        while pending:
+            arcname, future, is_reused = pending.popleft()
+            data, crc, size, st, method = future.result()
+            submit_next()
+            writer.add(arcname, data, crc, size, st.st_mtime, st.st_mode, method)
+            counters = methods.setdefault(method_names.get(method, str(method)), [0, 0, 0])
+            counters[0] += 1
+            counters[1] += size
+            counters[2] += len(data)
+            bytes_in += size
+            reused += is_reused
+            done += 1
+            if progress:
+                print(f"\r   Đã nén: {done}/{total} {arcname}", end='')
+        if links:
+            _add_json_member(writer, DEDUP_LINKS, {'version': 1, 'links': links})
+        if files:
+            _add_json_member(writer, ZIP_MANIFEST, {
+                'version': MANIFEST_VERSION,
+                'digest': compute_assets_digest(files, pack),
+                'pack': pack,
+                'files': {arcname: {'size': record['size'], 'sha256': record['sha256']}
+                          for arcname, record in files.items()},
+            })
+        writer.close()
+
+    if progress:
+        print()  # New line
+    return {
+        'files': total,
+        'reused': reused,
+        'bytes_in': bytes_in,
+        'bytes_out': writer.offset,
+        'seconds': time.time() - start_time,
+        'jobs': jobs,
+        'methods': methods,
+    }
+
+def pack_directory(xcode_path, zip_path, jobs=None, policy=None, progress=True,
+                   reuse_zip=None, reuse=(), entries=None, links=None, files=None, pack=None):
+    """Nén thư mục thành file ZIP (ghi file tạm rồi thay thế nguyên tử)
+
+    `entries` ([(arcname, path)]) giới hạn tập file cần nén; xem write_zip_stream.
+    """
+    zip_path = Path(zip_path)
+    if entries is None:
+        entries = scan_xcode_files(xcode_path)
+    tmp_path = zip_path.with_name(zip_path.name + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            stats = write_zip_stream(f, entries, jobs=jobs, policy=policy, progress=progress,
+                                     reuse_zip=reuse_zip, reuse=reuse, links=links, files=files, pack=pack)
+        os.replace(tmp_path, zip_path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    return stats
+
+# ============== PRUNE THEO PBXPROJ ==============
+
+PBXPROJ_TOKEN = re.compile(r'\s+|//[^\n]*|/\*.*?\*/|"((?:[^"\\]|\\.)*)"|([\w$+/:.\-]+)|([{}()=;,])', re.S)
+PBXPROJ_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', '\\': '\\'}
+# $(SRCROOT)/x, ${PROJECT_DIR}/x, $PROJECT_DIR/x... trong build setting và shell script
+PROJECT_VAR_PATH = re.compile(r'\$[({]?(?:SRCROOT|PROJECT_DIR|SOURCE_ROOT)[)}]?/([^"\'\s;:]*)')
+SCRIPT_VAR = re.compile(r'\$[({]?\w+[)}]?')
+
+def _pbxproj_unescape(text):
+    """Bỏ escape trong chuỗi có ngoặc kép của pbxproj (\\n, \\", \\Uxxxx...)"""
+    def replace(match):
+        code = match.group(1)
+        if code[0] == 'U':
+            return chr(int(code[1:], 16))
+        return PBXPROJ_ESCAPES.get(code, code)
+    return re.sub(r'\\(U[0-9a-fA-F]{4}|.)', replace, text, flags=re.S)
+
+def parse_pbxproj(text):
+    """Parse project.pbxproj (plist dạng OpenStep) thành dict/list/str"""
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = PBXPROJ_TOKEN.match(text, position)
+        if not match:
+            raise ValueError(f"pbxproj lỗi cú pháp ở ký tự {position}")
+        position = match.end()
+        quoted, bare, punct = match.groups()
+        if quoted is not None:
+            tokens.append(('str', _pbxproj_unescape(quoted)))
+        elif bare is not None:
+            tokens.append(('str', bare))
+        elif punct is not None:
+            tokens.append((punct, punct))
+    tokens.append(('end', None))
+    index = 0
+
+    def expect(kind):
+        nonlocal index
+        if tokens[index][0] != kind:
+            raise ValueError(f"pbxproj: cần '{kind}', gặp '{tokens[index][1]}'")
+        index += 1
+
+    def value():
+        nonlocal index
+        kind, token = tokens[index]
+        index += 1
+        if kind == '{':
+            result = {}
+            while tokens[index][0] != '}':
+                key = value()
+                expect('=')
+                result[key] = value()
+                expect(';')
+            index += 1
+            return result
+        if kind == '(':
+            result = []
+            while tokens[index][0] != ')':
+                result.append(value())
+                if tokens[index][0] == ',':
+                    index += 1
+            index += 1
+            return result
+        if kind != 'str':
+            raise ValueError(f"pbxproj: không chờ '{token}'")
+        return token
+
+    return value()
+
+def _project_path(project_dir, value):
+    """Đường dẫn trong build setting/script → path tương đối từ project dir (None nếu nằm ngoài)"""
+    value = value.strip().strip('"\'')
+    match = PROJECT_VAR_PATH.match(value)
+    if match:
+        value = match.group(1)
+    elif value.startswith(('$', '/', '@', '-')):
+        return None
+    value = value.rstrip('/')
+    if value.endswith('/**'):
+        value = value[:-3]
+    value = posixpath.normpath(value) if value else '.'
+    if value == '..' or value.startswith('../'):
+        return None
+    return value
+
+def _expand_script_path(project_dir, rel):
+    """Path trong shell script có thể chứa $VAR (deploy_$HOST_ARCH) → các path có thật khớp"""
+    if not SCRIPT_VAR.search(rel):
+        return [rel] if (project_dir / rel).exists() else []
+    pattern = SCRIPT_VAR.sub('*', rel)
+    return sorted(Path(path).relative_to(project_dir).as_posix()
+                  for path in glob.glob(os.fspath(project_dir / pattern)))
+
+def _il2cpp_root(project_dir, rel):
+    """Thư mục gốc IL2CPP (có file il2cpp_root) chứa `rel`: tool il2cpp đọc cả cây này"""
+    parts = rel.split('/')
+    for depth in range(len(parts), 0, -1):
+        candidate = '/'.join(parts[:depth])
+        if (project_dir / candidate / IL2CPP_ROOT_MARKER).is_file():
+            return candidate
+    return None
+
+def pbxproj_required_paths(xcode_path, project=XCODE_PROJECT):
+    """Tập path build thực sự cần theo project.pbxproj: (files, dirs giữ nguyên cả cây)
+
+    Gồm file reference (resolve qua cây group), folder reference, file trong build setting
+    (Info.plist, prefix header, entitlements), thư mục search path và path mà shell script
+    build phase dùng tới. Path tương đối từ thư mục XCODE, dạng posix.
+    """
+    project_dir = Path(xcode_path)
+    pbxproj = project_dir / project / 'project.pbxproj'
+    plist = parse_pbxproj(pbxproj.read_text(encoding='utf-8'))
+    objects = plist['objects']
+    root = objects[plist['rootObject']]
+    files = set()
+    dirs = {project}
+
+    def keep(rel, whole=False):
+        if rel is None or rel == '.':
+            return
+        if whole or (project_dir / rel).is_dir():
+            dirs.add(rel)
+        else:
+            files.add(rel)
+
+    # File reference: path tính theo group cha, SOURCE_ROOT hoặc ngoài project (bỏ qua)
+    parents = {}
+    for object_id, obj in objects.items():
+        if obj.get('isa') in ('PBXGroup', 'PBXVariantGroup', 'XCVersionGroup'):
+            for child in obj.get('children', []):
+                parents[child] = object_id
+    resolved = {}
+
+    def resolve(object_id):
+        if object_id not in resolved:
+            obj = objects.get(object_id, {})
+            tree = obj.get('sourceTree', '<group>')
+            if tree == '<group>':
+                parent = parents.get(object_id)
+                base = resolve(parent) if parent else root.get('projectDirPath', '')
+            elif tree == 'SOURCE_ROOT':
+                base = root.get('projectDirPath', '')
+            else:
+                base = None  # <absolute>, SDKROOT, BUILT_PRODUCTS_DIR...
+            path = obj.get('path', '')
+            resolved[object_id] = None if base is None else (
+                posixpath.normpath(posixpath.join(base, path)) if base or path else '')
+        return resolved[object_id]
+
+    for object_id, obj in objects.items():
+        isa = obj.get('isa')
+        if isa == 'PBXFileReference':
+            rel = resolve(object_id)
+            if rel and rel != '..' and not rel.startswith('../'):
+                file_type = obj.get('lastKnownFileType') or obj.get('explicitFileType') or ''
+                keep(rel, whole=file_type.startswith(('folder', 'wrapper')))
+        elif isa == 'XCBuildConfiguration':
+            for key, setting in obj.get('buildSettings', {}).items():
+                values = setting if isinstance(setting, list) else [setting]
+                if key.endswith('_SEARCH_PATHS') and key != 'LD_RUNPATH_SEARCH_PATHS':
+                    for item in values:
+                        for path in item.split():
+                            keep(_project_path(project_dir, path), whole=True)
+                elif key in PBXPROJ_PATH_SETTINGS:
+                    for item in values:
+                        keep(_project_path(project_dir, item))
+        elif isa == 'PBXShellScriptBuildPhase':
+            script = obj.get('shellScript', '')
+            candidates = [match.group(1) for match in PROJECT_VAR_PATH.finditer(script)]
+            # Path tương đối trong ngoặc kép: --generatedcppdir="Il2CppOutputProject/Source/..."
+            candidates += re.findall(r'"([^"$\s/][^"]*)"', script)
+            for key in ('inputPaths', 'outputPaths'):
+                candidates += [match.group(1) for item in obj.get(key, [])
+                               for match in PROJECT_VAR_PATH.finditer(item)]
+            for candidate in candidates:
+                rel = _project_path(project_dir, candidate)
+                if not rel or rel == '.':
+                    continue
+                for path in _expand_script_path(project_dir, rel):
+                    il2cpp_root = _il2cpp_root(project_dir, path)
+                    keep(il2cpp_root or path, whole=il2cpp_root is not None)
+    return files, dirs
+
+def prune_file_index(xcode_path, files, allow=PRUNE_ALLOW, drop=PRUNE_DROP, project=XCODE_PROJECT):
+    """Chỉ giữ file build cần theo pbxproj + allow-list: (files giữ lại, {arcname: size} đã bỏ)
+
+    `allow`/`drop` là pattern fnmatch tính từ thư mục XCODE; `drop` (symbol debug...) bỏ cả file
+    nằm trong thư mục được giữ, `allow` thắng tất cả. XML doc cạnh DLL cùng tên cũng bị bỏ.
+    """
+    needed_files, needed_dirs = pbxproj_required_paths(xcode_path, project=project)
+    prefix = Path(xcode_path).name + '/'
+    kept = {}
+    pruned = {}
+    for arcname, record in files.items():
+        rel = arcname[len(prefix):] if arcname.startswith(prefix) else arcname
+        if any(fnmatch.fnmatchcase(rel, pattern) for pattern in allow):
+            needed = True
+        elif any(fnmatch.fnmatchcase(rel, pattern) for pattern in drop):
+            needed = False
+        elif rel.endswith('.xml') and f"{arcname[:-4]}.dll" in files:
+            needed = False
+        else:
+            parts = rel.split('/')
+            needed = rel in needed_files or any('/'.join(parts[:depth]) in needed_dirs
+                                                for depth in range(1, len(parts) + 1))
+        if needed:
+            kept[arcname] = record
+        else:
+            pruned[arcname] = record['size']
+    return kept, pruned
+
+def print_prune_stats(pruned, kept):
+    """In số file/byte đã bỏ nhờ prune theo pbxproj, nhóm theo thư mục"""
+    total = sum(pruned.values()) + sum(record['size'] for record in kept.values())
+    saved = sum(pruned.values())
+    ratio = saved / total if total else 0
+    print_info(f"Prune theo pbxproj: bỏ {len(pruned)} file build không dùng "
+               f"({saved / (1024*1024):.2f} MB, {ratio:.1%} dữ liệu), giữ {len(kept)} file")
+    by_dir = {}
+    for arcname, size in pruned.items():
+        directory = posixpath.dirname(arcname)
+        count, total_size = by_dir.get(directory, (0, 0))
+        by_dir[directory] = (count + 1, total_size + size)
+    for directory, (count, size) in sorted(by_dir.items(), key=lambda item: -item[1][1])[:5]:
+        print_info(f"   {directory}: {count} file ({size / (1024*1024):.2f} MB)")
+
+def select_packed_files(xcode_path, files, prune):
+    """Áp prune (allow-list hoặc None = tắt) lên file index trước khi tính digest và nén"""
+    if prune is None:
+        return files
+    try:
+        with span('prune') as record:
+            kept, pruned = prune_file_index(xcode_path, files, allow=prune)
+            record.update(files=len(pruned), bytes=sum(pruned.values()))
+    except (OSError, ValueError, KeyError) as e:
+        print_warning(f"Không đọc được {XCODE_PROJECT}/project.pbxproj ({e}), đóng gói toàn bộ XCODE")
+        return files
+    print_prune_stats(pruned, kept)
+    return kept
+
+# ============== MANIFEST & NÉN INCREMENTAL ==============
+
+def hash_file(file_path):
+    """SHA-256 nội dung file"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(ZIP_READ_CHUNK)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_assets_manifest(manifest_path=ASSETS_MANIFEST):
+    """Đọc manifest lần nén trước, trả về None nếu không có hoặc không hợp lệ"""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def save_assets_manifest(manifest, manifest_path=ASSETS_MANIFEST):
+    """Ghi manifest (ghi file tạm rồi đổi tên để không bao giờ bị ghi dở)"""
+    manifest_path = Path(manifest_path)
+    tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+class HashCache:
+    """Cache sha256 từng file theo (size, mtime_ns), lưu giữa các lần chạy: {arcname: [size, mtime_ns, sha256]}"""
+
+    def __init__(self, path=HASH_CACHE, load=True):
+        self.path = Path(path)
+        self.files = {}
+        self.dirty = False
+        if not load:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get('version') == HASH_CACHE_VERSION:
+            self.files = data.get('files', {})
+
+    def get(self, arcname, size, mtime_ns):
+        """sha256 đã biết của file, None nếu chưa có hoặc size/mtime đã đổi"""
+        record = self.files.get(arcname)
+        if record and record[0] == size and record[1] == mtime_ns:
+            return record[2]
+        return None
+
+    def update(self, index, racy_after):
+        """Thay cache bằng index mới (file đã xóa tự rơi khỏi cache), bỏ file có mtime >= racy_after"""
+        files = {arcname: [size, mtime_ns, sha256] for arcname, _, size, mtime_ns, sha256 in index
+                 if mtime_ns < racy_after}
+        if files != self.files:
+            self.files = files
+            self.dirty = True
+
+    def save(self):
+        """Ghi cache nếu có thay đổi (ghi file tạm rồi đổi tên)"""
+        if not self.dirty:
+            return
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': HASH_CACHE_VERSION, 'files': self.files}, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+def index_tree(xcode_path, jobs=None, cache=None, previous_files=None):
+    """Index gọn của cây: [(arcname, path, size, mtime_ns, sha256)] sắp theo arcname
+
+    Hash lấy từ `cache` (HashCache) hoặc `previous_files` (manifest) khi size/mtime khớp,
+    chỉ hash file mới/đã đổi bằng thread pool (hashlib nhả GIL). Trả về (index, số file phải hash).
+    """
+    previous_files = previous_files or {}
+    scan_start = time.time_ns()
+    with span('walk') as walk:
+        records = scan_tree(xcode_path)
+        walk['files'] = len(records)
+
+    digests = {}
+    to_hash = []
+    for arcname, path, size, mtime_ns in records:
+        sha256 = cache.get(arcname, size, mtime_ns) if cache is not None else None
+        if sha256 is None:
+            old = previous_files.get(arcname)
+            if old and old.get('size') == size and old.get('mtime_ns') == mtime_ns:
+                sha256 = old['sha256']
+        if sha256 is None:
+            to_hash.append((arcname, path, size))
+        else:
+            digests[arcname] = sha256
 
-def compress_xcode_assets():
-    """Nén các file lớn trong XCODE thành ZIP"""
+    if to_hash:
+        with span('hash', files=len(to_hash), bytes=sum(size for _, _, size in to_hash)), \
+                ThreadPoolExecutor(max_workers=max(1, jobs or default_jobs())) as pool:
+            for (arcname, _, _), digest in zip(to_hash, pool.map(hash_file, [path for _, path, _ in to_hash])):
+                digests[arcname] = digest
+
+    index = [(arcname, path, size, mtime_ns, digests[arcname]) for arcname, path, size, mtime_ns in records]
+    if cache is not None:
+        cache.update(index, racy_after=scan_start - HASH_CACHE_RACY_NS)
+        cache.save()
+    return index, len(to_hash)
+
+def build_file_index(xcode_path, previous_files=None, jobs=None, cache_path=HASH_CACHE, rehash=False):
+    """Stat + hash toàn bộ file trong XCODE: {arcname: {size, mtime_ns, sha256}}
+
+    File có size/mtime giống cache hash (hoặc manifest cũ) dùng lại hash cũ, chỉ hash file
+    đã đổi; `rehash` bỏ qua cache và hash lại tất cả. Trả về (files, số file phải hash lại).
+    """
+    cache = HashCache(cache_path, load=not rehash) if cache_path else None
+    index, hashed = index_tree(xcode_path, jobs=jobs, cache=cache, previous_files=previous_files)
+    return {arcname: {'size': size, 'mtime_ns': mtime_ns, 'sha256': sha256}
+            for arcname, _, size, mtime_ns, sha256 in index}, hashed
+
+def _archive_stamp(zip_path):
+    """Dấu size/mtime của file ZIP để phát hiện ZIP bị sửa ngoài tool"""
+    st = Path(zip_path).stat()
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def compute_assets_digest(files, pack=None):
+    """Digest ổn định của toàn bộ input đã đóng gói (không phụ thuộc mtime)
+
+    `pack` (pack_fingerprint) đưa cách đóng gói vào digest: asset theo digest là bất biến nên
+    đổi policy nén/dedup phải ra digest mới thì Release mới nhận bản đóng gói mới.
+    """
+    header = PACK_FORMAT if pack is None else f"{PACK_FORMAT} {pack}"
+    digest = hashlib.sha256(header.encode('utf-8') + b'\n')
+    for arcname in sorted(files):
+        record = files[arcname]
+        digest.update(f"{arcname}\0{record['size']}\0{record['sha256']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def dedup_entries(entries, files):
+    """Bỏ các file trùng nội dung khỏi danh sách nén
+
+    Mỗi sha256 chỉ giữ 1 bản (arcname nhỏ nhất trong toàn bộ `files`), các bản
+    còn lại được workflow chép lại từ bản đó sau khi giải nén.
+    Trả về (entries giữ lại, links {arcname: arcname nguồn}, số byte bỏ qua).
+    """
+    canonical = {}
+    for arcname in sorted(files):
+        canonical.setdefault(files[arcname]['sha256'], arcname)
+    kept = []
+    links = {}
+    skipped = 0
+    for arcname, file_path in entries:
+        record = files.get(arcname)
+        source = canonical.get(record['sha256']) if record else None
+        if source and source != arcname and record['size'] >= DEDUP_MIN_SIZE:
+            links[arcname] = source
+            skipped += record['size']
+        else:
+            kept.append((arcname, file_path))
+    return kept, links, skipped
+
+def print_dedup_stats(links, skipped, files):
+    """In tỉ lệ trùng lặp của lần nén"""
+    total = sum(record['size'] for record in files.values())
+    ratio = skipped / total if total else 0
+    print_info(f"Dedup: {len(links)} file trùng nội dung ({skipped / (1024*1024):.2f} MB, "
+               f"{ratio:.1%} dữ liệu) chỉ lưu 1 bản")
+
+def compress_xcode_assets(jobs=None, full=False, policy=None, dedup=True, prune=None):
+    """Nén các file lớn trong XCODE thành ZIP (song song nhiều core)
+
+    `prune` là allow-list (xem PRUNE_ALLOW) thì chỉ nén file build cần theo pbxproj.
+    """
     print_step(0, "Nén file lớn từ XCODE...")
     
     xcode_path = Path(XCODE_DIR)
@@ -119,44 +1435,75 @@ def compress_xcode_assets():
         print_error(f"Thư mục {XCODE_DIR} không tồn tại!")
         return None
     
-    # Kiểm tra file ZIP có đang được sử dụng không
+    # Terminal khác / daemon --watch trên máy này đợi ở assets_lock (setup_releases) nên không ghi đè ZIP
     zip_path = Path(ASSETS_ZIP)
-    if is_file_locked(zip_path):
-        print_warning(f"File {ASSETS_ZIP} đang được sử dụng bởi process khác!")
-        print_info("Có thể bạn đang chạy tool ở terminal khác. Đợi process đó hoàn thành hoặc dừng nó.")
-        
-        # Kiểm tra xem file có hợp lệ không
-        if zip_path.exists() and zip_path.stat().st_size > 100 * 1024 * 1024:  # > 100MB
-            print_success(f"File ZIP đã tồn tại và có vẻ hợp lệ ({zip_path.stat().st_size / (1024*1024):.2f} MB)")
-            return str(zip_path)
-        else:
-            print_error("Không thể tạo file ZIP mới vì file đang bị lock và không hợp lệ")
-            return None
     
-    # Nén toàn bộ thư mục XCODE (không chỉ 3 thư mục con)
-    print_info(f"Nén toàn bộ thư mục {XCODE_DIR}...")
-    
-    # Xóa file ZIP cũ nếu có
-    if zip_path.exists():
-        print_info(f"Xóa file ZIP cũ: {ASSETS_ZIP}")
-        zip_path.unlink()
-    
-    print_info(f"Đang nén toàn bộ thư mục {XCODE_DIR} thành {ASSETS_ZIP}...")
+    jobs = max(1, jobs or default_jobs())
+    policy = policy or load_compression_policy()
+    pack = pack_fingerprint(policy, dedup)
     
     try:
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Nén toàn bộ thư mục XCODE
-            for root, dirs, files in os.walk(xcode_path):
-                for file in files:
-                    file_path = Path(root) / file
-                    # Tạo archive name tương đối từ parent của XCODE
-                    arcname = file_path.relative_to(xcode_path.parent)
-                    zipf.write(file_path, arcname)
-                    print(f"\r   Đã nén: {arcname}", end='')
+        # So sánh với manifest lần nén trước
+        manifest = None if full else load_assets_manifest()
+        previous_files = manifest.get('files', {}) if manifest else {}
+        files, hashed = build_file_index(xcode_path, previous_files, jobs=jobs, rehash=full)
+        print_info(f"Đã quét {len(files)} file ({hashed} file cần hash lại)")
+        files = select_packed_files(xcode_path, files, prune)
         
-        print()  # New line
-        file_size_mb = zip_path.stat().st_size / (1024 * 1024)
+        # ZIP cũ nén theo policy khác / bật tắt dedup khác thì nén lại toàn bộ
+        archive_ok = (manifest is not None and zip_path.exists()
+                      and manifest.get('archive') == _archive_stamp(zip_path)
+                      and manifest.get('pack') == pack)
+        unchanged = set()
+        if archive_ok:
+            unchanged = {name for name, record in files.items()
+                         if name in previous_files
+                         and previous_files[name].get('sha256') == record['sha256']}
+        
+        if archive_ok and len(unchanged) == len(files) == len(previous_files):
+            manifest['files'] = files  # Cập nhật mtime để lần sau khỏi hash lại
+            manifest['digest'] = compute_assets_digest(files, pack)
+            save_assets_manifest(manifest)
+            print_success(f"XCODE không thay đổi, dùng lại {ASSETS_ZIP} "
+                          f"({zip_path.stat().st_size / (1024*1024):.2f} MB)")
+            return str(zip_path)
+        
+        if unchanged:
+            changed = len(files) - len(unchanged)
+            removed = len(set(previous_files) - set(files))
+            print_info(f"Nén incremental: {changed} file mới/đã đổi, {removed} file đã xóa, "
+                       f"chép lại {len(unchanged)} file từ ZIP cũ ({jobs} luồng)...")
+        else:
+            # Nén toàn bộ thư mục XCODE (không chỉ 3 thư mục con)
+            print_info(f"Đang nén toàn bộ thư mục {XCODE_DIR} thành {ASSETS_ZIP} ({jobs} luồng)...")
+        
+        entries = [entry for entry in scan_xcode_files(xcode_path) if entry[0] in files]
+        links = {}
+        if dedup:
+            entries, links, skipped = dedup_entries(entries, files)
+            print_dedup_stats(links, skipped, files)
+        
+        # File ZIP cũ được thay thế nguyên tử khi nén xong
+        with span('compress', jobs=jobs) as compress:
+            stats = pack_directory(xcode_path, zip_path, jobs=jobs, policy=policy,
+                                   reuse_zip=zip_path if unchanged else None, reuse=unchanged,
+                                   entries=entries, links=links, files=files, pack=pack)
+            compress.update(bytes=stats['bytes_in'], bytes_out=stats['bytes_out'], files=stats['files'],
+                            reused=stats['reused'])
+        save_assets_manifest({
+            'version': MANIFEST_VERSION,
+            'archive': _archive_stamp(zip_path),
+            'pack': pack,
+            'digest': compute_assets_digest(files, pack),
+            'files': files,
+        })
+        
+        file_size_mb = stats['bytes_out'] / (1024 * 1024)
+        speed = stats['bytes_in'] / (1024 * 1024) / stats['seconds'] if stats['seconds'] > 0 else 0
         print_success(f"Đã tạo file ZIP: {ASSETS_ZIP} ({file_size_mb:.2f} MB)")
+        print_info(f"Thời gian nén: {stats['seconds']:.1f}s | {stats['files']} file "
+                   f"({stats['reused']} chép lại) | {speed:.2f} MB/s")
+        print_compression_stats(stats)
         return str(zip_path)
     except Exception as e:
         print_error(f"Lỗi khi nén file: {e}")
@@ -164,17 +1511,13 @@ def compress_xcode_assets():
 
 def get_or_create_release(token, tag_name):
     """Lấy hoặc tạo Release mới"""
-    url = f"{API_BASE}/releases/tags/{tag_name}"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    api = github_client(token)
     
-    # Kiểm tra Release có tồn tại không
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
+    # Kiểm tra Release có tồn tại không (ETag: không đổi thì GitHub trả 304)
+    status, release = api.get_json(f"{API_BASE}/releases/tags/{tag_name}")
+    if status == 200:
         print_success(f"Tìm thấy Release: {tag_name}")
-        return response.json()
+        return release
     
     # Tạo Release mới
     print_info(f"Tạo Release mới: {tag_name}")
@@ -187,7 +1530,7 @@ def get_or_create_release(token, tag_name):
         "prerelease": False
     }
     
-    response = requests.post(url, headers=headers, json=payload)
+    response = api.request('POST', url, json=payload)
     if response.status_code == 201:
         print_success(f"Đã tạo Release: {tag_name}")
         return response.json()
@@ -198,29 +1541,47 @@ def get_or_create_release(token, tag_name):
 
 def delete_release_asset(token, asset_id):
     """Xóa asset khỏi Release"""
-    url = f"{API_BASE}/releases/assets/{asset_id}"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    response = requests.delete(url, headers=headers)
+    response = github_client(token).request('DELETE', f"{API_BASE}/releases/assets/{asset_id}")
     return response.status_code == 204
 
-def upload_to_release(token, release_id, file_path):
-    """Upload file lên GitHub Release"""
-    file_name = Path(file_path).name
+def asset_label(file_name, digest):
+    """Label gắn lên asset để ghi lại digest input đã đóng gói"""
+    return f"{file_name} sha256:{digest}"
+
+def asset_digest(asset):
+    """Đọc digest từ label của asset, None nếu asset không có"""
+    match = re.search(r'sha256:([0-9a-f]{64})', asset.get('label') or '')
+    return match.group(1) if match else None
+
+def part_label(file_name, digest, sha256):
+    """Label của 1 part: digest input + sha256 nội dung part (ZIP cùng digest vẫn có thể khác byte)"""
+    return f"{asset_label(file_name, digest)} part:{sha256}"
+
+def asset_part_sha(asset):
+    """Đọc sha256 nội dung part từ label, None nếu label không có"""
+    match = re.search(r'part:([0-9a-f]{64})', asset.get('label') or '')
+    return match.group(1) if match else None
+
+def find_matching_asset(release, file_name, digest):
+    """Tìm asset đã upload xong có cùng tên và cùng digest trong Release"""
+    if not digest:
+        return None
+    for asset in release.get('assets', []):
+        if (asset['name'] == file_name and asset.get('state') == 'uploaded'
+                and asset_digest(asset) == digest):
+            return asset
+    return None
+
+def upload_to_release(token, release_id, file_path, digest=None, name=None):
+    """Upload file lên GitHub Release (gắn digest vào label nếu có), `name` là tên asset nếu khác tên file"""
+    file_name = name or Path(file_path).name
     file_size = Path(file_path).stat().st_size
     file_size_mb = file_size / (1024*1024)
     
     # Xóa asset cũ nếu có
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    release_url = f"{API_BASE}/releases/{release_id}"
-    response = requests.get(release_url, headers=headers)
-    if response.status_code == 200:
-        release_data = response.json()
+    api = github_client(token)
+    status, release_data = api.get_json(f"{API_BASE}/releases/{release_id}")
+    if status == 200:
         for asset in release_data.get('assets', []):
             if asset['name'] == file_name:
                 print_info(f"Xóa asset cũ: {file_name}")
@@ -231,11 +1592,11 @@ def upload_to_release(token, release_id, file_path):
     print_info("⏳ Upload có thể mất 5-15 phút tùy tốc độ mạng...")
     print_info("💡 Đang upload, vui lòng đợi... (không có progress bar cho upload lớn)")
     
-    url = f"https://uploads.github.com/repos/{REPO_OWNER}/{REPO_NAME}/releases/{release_id}/assets"
+    url = f"{UPLOADS_BASE}/releases/{release_id}/assets"
     params = {"name": file_name}
+    if digest:
+        params["label"] = asset_label(file_name, digest)
     headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json",
         "Content-Type": "application/zip"
     }
     
@@ -244,7 +1605,8 @@ def upload_to_release(token, release_id, file_path):
     try:
         # Upload file với timeout 30 phút
         with open(file_path, 'rb') as f:
-            response = requests.post(
+            response = api.request(
+                'POST',
                 url, 
                 headers=headers, 
                 params=params, 
@@ -282,151 +1644,1565 @@ def upload_to_release(token, release_id, file_path):
         traceback.print_exc()
         return None
 
-def update_workflow_file(release_tag, asset_name):
-    """Cập nhật workflow file với RELEASE_TAG và ASSET_NAME"""
-    workflow_path = Path(f".github/workflows/{WORKFLOW_FILE}")
-    
-    if not workflow_path.exists():
-        print_warning(f"Workflow file không tồn tại: {workflow_path}")
-        return False
-    
-    # Đọc file
-    with open(workflow_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Cập nhật RELEASE_TAG và ASSET_NAME
-    import re
-    content = re.sub(
-        r'RELEASE_TAG="[^"]*"',
-        f'RELEASE_TAG="{release_tag}"',
-        content
-    )
-    content = re.sub(
-        r'ASSET_NAME="[^"]*"',
-        f'ASSET_NAME="{asset_name}"',
-        content
-    )
-    
-    # Ghi lại file
-    with open(workflow_path, 'w', encoding='utf-8') as f:
-        f.write(content)
-    
-    print_success(f"Đã cập nhật workflow: RELEASE_TAG={release_tag}, ASSET_NAME={asset_name}")
-    return True
+# ============== UPLOAD CHIA PART ==============
 
-def setup_releases(token):
-    """Tự động setup GitHub Releases: Nén file, tạo Release, upload"""
-    print_step(0, "Tự động setup GitHub Releases...")
+def parts_index_name(file_name):
+    """Tên asset index liệt kê các part của 1 file"""
+    return f"{file_name}.parts.json"
+
+def part_name(file_name, index):
+    """Tên asset của part thứ `index` (bắt đầu từ 1)"""
+    return f"{file_name}.{index:03d}"
+
+def plan_parts(file_path, part_size, name=None):
+    """Chia file thành các đoạn [offset, size) cố định (tên part theo `name` hoặc tên file)"""
+    file_name = name or Path(file_path).name
+    total = Path(file_path).stat().st_size
+    parts = []
+    offset = 0
+    while offset < total or not parts:
+        size = min(part_size, total - offset)
+        parts.append({'name': part_name(file_name, len(parts) + 1), 'offset': offset, 'size': size})
+        offset += size
+    return parts
+
+class FileSlice:
+    """File-like đọc đoạn [offset, offset+size) của file, tính sha256 trong lúc đọc
+
+    Có __len__ để requests gửi Content-Length và stream body thay vì đọc hết vào RAM.
+    """
+
+    def __init__(self, file_path, offset, size):
+        self._file = open(file_path, 'rb')
+        self._file.seek(offset)
+        self._remaining = size
+        self.size = size
+        self.sha256 = hashlib.sha256()
+
+    def __len__(self):
+        return self.size
+
+    def read(self, n=-1):
+        if n is None or n < 0 or n > self._remaining:
+            n = self._remaining
+        data = self._file.read(n)
+        self._remaining -= len(data)
+        self.sha256.update(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+def hash_file_slice(file_path, offset, size):
+    """SHA-256 của 1 đoạn file"""
+    piece = FileSlice(file_path, offset, size)
+    try:
+        while piece.read(ZIP_READ_CHUNK):
+            pass
+    finally:
+        piece.close()
+    return piece.sha256.hexdigest()
+
+def load_upload_state(digest, release_id, part_size):
+    """Đọc state upload dở lần trước, bỏ qua nếu khác digest/release/part size"""
+    try:
+        with open(UPLOAD_STATE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = None
+    if (not isinstance(state, dict) or state.get('digest') != digest
+            or state.get('release_id') != release_id or state.get('part_size') != part_size):
+        state = {'digest': digest, 'release_id': release_id, 'part_size': part_size, 'parts': {}}
+    return state
+
+def save_upload_state(state):
+    """Ghi state upload (ghi file tạm rồi đổi tên)"""
+    tmp_path = UPLOAD_STATE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, UPLOAD_STATE)
+
+def upload_asset_bytes(token, release_id, name, body, content_type, label=None, timeout=1800):
+    """POST 1 asset lên uploads endpoint, trả về (response, lỗi)"""
+    url = f"{UPLOADS_BASE}/releases/{release_id}/assets"
+    params = {"name": name}
+    if label:
+        params["label"] = label
+    headers = {
+        "Content-Type": content_type
+    }
+    try:
+        return github_client(token).request('POST', url, headers=headers, params=params,
+                                            data=body, timeout=timeout), None
+    except requests.exceptions.RequestException as e:
+        return None, e
+
+def upload_part(token, release_id, part, make_body, digest, sha256=None):
+    """Upload 1 part (có retry), make_body() tạo body mới cho mỗi lần thử
+
+    `sha256` (nội dung part) được ghi vào label để lần resume kiểm tra part trước khi dùng lại.
+    Trả về (asset, body của lần thành công) hoặc raise RuntimeError.
+    """
+    if digest and sha256:
+        label = part_label(part['name'], digest, sha256)
+    else:
+        label = asset_label(part['name'], digest) if digest else None
+    last_error = None
+    for attempt in range(1, UPLOAD_RETRIES + 1):
+        body = make_body()
+        try:
+            response, error = upload_asset_bytes(token, release_id, part['name'], body,
+                                                 "application/octet-stream", label)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        if response is not None and response.status_code == 201:
+            return response.json(), body
+        last_error = error or f"HTTP {response.status_code}: {response.text[:200]}"
+        if response is not None and response.status_code == 422:
+            # Asset trùng tên còn sót (upload dở) → xóa rồi thử lại
+            for asset in list_release_assets(token, release_id):
+                if asset['name'] == part['name']:
+                    delete_release_asset(token, asset['id'])
+        time.sleep(2 ** attempt)
+    raise RuntimeError(f"{part['name']}: {last_error}")
+
+def list_release_assets(token, release_id):
+    """Danh sách asset hiện có của Release"""
+    api = github_client(token)
+    assets = []
+    page = 1
+    while True:
+        status, batch = api.get_json(f"{API_BASE}/releases/{release_id}/assets",
+                                     params={"per_page": 100, "page": page})
+        if status != 200:
+            break
+        assets.extend(batch)
+        if len(batch) < 100:
+            break
+        page += 1
+    return assets
+
+def upload_parts_to_release(token, release_id, zip_path, digest=None,
+                            part_size_mb=DEFAULT_PART_SIZE_MB, jobs=DEFAULT_UPLOAD_JOBS, name=None):
+    """Chia ZIP thành part cố định, upload song song, resume được khi bị ngắt
+
+    Index (*.parts.json) được upload sau cùng nên workflow chỉ thấy bộ part đầy đủ.
+    `name` là tên asset (part/index đặt theo tên này) nếu khác tên file.
+    Trả về asset của index hoặc None nếu lỗi.
+    """
+    file_name = name or Path(zip_path).name
+    index_name = parts_index_name(file_name)
+    part_size = min(part_size_mb, MAX_PART_SIZE_MB) * 1024 * 1024
+    parts = plan_parts(zip_path, part_size, file_name)
+    total_mb = Path(zip_path).stat().st_size / (1024 * 1024)
+    state = load_upload_state(digest, release_id, part_size)
     
-    # Bước 1: Nén file
-    zip_path = compress_xcode_assets()
-    if not zip_path:
-        print_error("Không thể nén file!")
-        return False
+    # Xóa index cũ trước để workflow không đọc index trỏ vào part đang bị thay
+    remote = {asset['name']: asset for asset in list_release_assets(token, release_id)}
+    if index_name in remote:
+        delete_release_asset(token, remote.pop(index_name)['id'])
     
-    # Bước 2: Tạo tag và Release (dùng tag cố định)
-    release_tag = "v1.0-latest"
+    landed = {}
+    for part in parts:
+        asset = remote.get(part['name'])
+        if asset is None:
+            continue
+        if (digest and asset.get('state') == 'uploaded' and asset_digest(asset) == digest
+                and asset.get('size') == part['size']):
+            # Cùng digest chưa chắc cùng byte (mtime, policy nén, dedup...) → so sha256 nội dung
+            sha = hash_file_slice(zip_path, part['offset'], part['size'])
+            uploaded = asset_part_sha(asset) or state['parts'].get(part['name'], {}).get('sha256')
+            if uploaded == sha:
+                landed[part['name']] = {'id': asset['id'], 'sha256': sha}
+                continue
+        # Part cũ của lần build khác, upload dở hoặc khác nội dung ZIP hiện tại → xóa để upload lại
+        delete_release_asset(token, asset['id'])
+    state['parts'] = landed
+    save_upload_state(state)
     
-    release = get_or_create_release(token, release_tag)
-    if not release:
-        return False
+    missing = [part for part in parts if part['name'] not in landed]
+    print_info(f"Upload {file_name} ({total_mb:.2f} MB) thành {len(parts)} part x "
+               f"{part_size // (1024 * 1024)} MB | đã có {len(landed)} | cần upload {len(missing)} "
+               f"({jobs} luồng)")
     
-    release_id = release['id']
+    start_time = time.time()
+    state_lock = threading.Lock()
+    failed = []
     
-    # Bước 3: Upload file (có thể mất 5-15 phút)
-    print_info("💡 Tip: Upload file lớn có thể mất 5-15 phút, vui lòng đợi...")
-    asset = upload_to_release(token, release_id, zip_path)
-    if not asset:
-        print_error("Upload thất bại! Kiểm tra:")
-        print_info("   1. Kết nối mạng có ổn định không?")
-        print_info("   2. File có quá lớn không? (GitHub giới hạn 2 GB)")
-        print_info("   3. GitHub Token có quyền 'repo' không?")
-        return False
+    def run(part):
+        sha = hash_file_slice(zip_path, part['offset'], part['size'])
+        asset, body = upload_part(token, release_id, part,
+                                  lambda: FileSlice(zip_path, part['offset'], part['size']), digest, sha)
+        if body.sha256.hexdigest() != sha:
+            raise RuntimeError(f"{part['name']}: ZIP bị thay đổi trong lúc upload")
+        result = {'id': asset['id'], 'sha256': sha}
+        with state_lock:
+            state['parts'][part['name']] = result
+            save_upload_state(state)
+            done = len(state['parts'])
+        print_info(f"   Part {part['name']} xong ({done}/{len(parts)})")
+        return result
+    
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [(part, pool.submit(run, part)) for part in missing]
+        for part, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failed.append(part['name'])
+                print_error(f"Upload part thất bại: {e}")
     
-    asset_name = asset['name']
+    if failed:
+        print_warning(f"Còn {len(failed)} part chưa upload, chạy lại tool để resume từ {failed[0]}")
+        return None
     
-    # Bước 4: Đợi một chút để đảm bảo file đã có trên Releases
-    print_info("Đợi 5 giây để đảm bảo file đã có trên Releases...")
-    time.sleep(5)
+    elapsed = time.time() - start_time
+    uploaded_mb = sum(part['size'] for part in missing) / (1024 * 1024)
+    if missing:
+        speed = uploaded_mb / elapsed if elapsed > 0 else 0
+        print_info(f"Thời gian: {elapsed:.1f}s | Đã upload {uploaded_mb:.2f} MB | Tốc độ: {speed:.2f} MB/s")
     
-    # Bước 5: Kiểm tra file có thực sự trên Releases không
-    print_info("Kiểm tra file trên Releases...")
-    release_check_url = f"{API_BASE}/releases/tags/{release_tag}"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
+    index = {
+        'name': file_name,
+        'size': Path(zip_path).stat().st_size,
+        'sha256': hash_file(zip_path),
+        'digest': digest,
+        'part_size': part_size,
+        'parts': [{'name': part['name'], 'offset': part['offset'], 'size': part['size'],
+                   'sha256': state['parts'][part['name']]['sha256']} for part in parts],
     }
-    check_response = requests.get(release_check_url, headers=headers)
-    if check_response.status_code == 200:
-        release_data = check_response.json()
-        assets = release_data.get('assets', [])
-        asset_found = any(a['name'] == asset_name for a in assets)
-        if asset_found:
-            print_success(f"Đã xác nhận file {asset_name} có trên Releases!")
-        else:
-            print_warning(f"File {asset_name} chưa thấy trên Releases, đợi thêm 10 giây...")
-            time.sleep(10)
+    body = json.dumps(index, indent=1).encode('utf-8')
+    response, error = upload_asset_bytes(token, release_id, index_name, body, "application/json",
+                                         asset_label(index_name, digest) if digest else None)
+    if response is None or response.status_code != 201:
+        print_error(f"Lỗi khi upload index {index_name}: "
+                    f"{error or response.status_code}")
+        return None
+    
+    Path(UPLOAD_STATE).unlink()
+    print_success(f"Đã upload {len(parts)} part + {index_name} lên Release!")
+    return response.json()
+
+# ============== STREAM NÉN + UPLOAD ==============
+
+class UploadAborted(Exception):
+    """Part upload lỗi nên dừng nén phần còn lại (PartSink)"""
+
+class PartSink:
+    """File-like nhận output ZIP, cắt thành part cố định và đẩy vào hàng đợi upload
+
+    Hàng đợi có giới hạn (upload_jobs) nên khi upload chậm thì việc nén tự đợi (backpressure).
+    RAM giữ cùng lúc tới 2 x upload_jobs + 2 part: upload_jobs part đang upload, upload_jobs part
+    chờ trong hàng đợi, 1 part đang đợi vào hàng đợi và bộ đệm đang gom part kế tiếp; chỉ phụ
+    thuộc part_size và số luồng upload, không phụ thuộc kích thước cây. `aborted` được set khi
+    1 part upload lỗi: lần ghi sau raise UploadAborted để không nén tiếp vô ích.
+    """
+
+    def __init__(self, file_name, part_size, parts_queue, aborted=None):
+        self.file_name = file_name
+        self.part_size = part_size
+        self.queue = parts_queue
+        self.aborted = aborted or threading.Event()
+        self.buffer = bytearray()
+        self.offset = 0
+        self.count = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        if self.aborted.is_set():
+            raise UploadAborted(self.file_name)
+        self.sha256.update(data)
+        self.buffer += data
+        while len(self.buffer) >= self.part_size:
+            self._seal(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+
+    def flush(self):
+        pass
+
+    def _seal(self, data):
+        self.count += 1
+        part = {'name': part_name(self.file_name, self.count), 'offset': self.offset, 'size': len(data)}
+        self.offset += len(data)
+        self.queue.put((part, data))
+
+    def close(self):
+        """Đẩy phần còn lại thành part cuối"""
+        if self.aborted.is_set():
+            raise UploadAborted(self.file_name)
+        if self.buffer or self.count == 0:
+            self._seal(bytes(self.buffer))
+            self.buffer = bytearray()
+
+def stream_pack_and_upload(token, release_id, entries, file_name=ASSETS_ZIP, digest=None,
+                           part_size_mb=STREAM_PART_SIZE_MB, jobs=None,
+                           upload_jobs=DEFAULT_UPLOAD_JOBS, progress=True, policy=None, links=None,
+                           files=None, pack=None):
+    """Nén và upload cùng lúc: output ZIP đi thẳng từ RAM lên Release theo part
+
+    Không ghi ZIP xuống đĩa. Uploads endpoint cần Content-Length nên mỗi part được
+    gom đủ trong bộ đệm rồi mới POST; part k upload trong khi part k+1 đang được nén.
+    Part đã có trên Release (cùng digest, cùng sha256 nội dung trong label) được bỏ qua.
+    Trả về asset của index (*.parts.json) hoặc None nếu lỗi.
+    """
+    index_name = parts_index_name(file_name)
+    part_size = min(part_size_mb, MAX_PART_SIZE_MB) * 1024 * 1024
+    upload_jobs = max(1, upload_jobs)
+    
+    # Xóa index cũ trước; part cũ không cùng digest thì xóa, cùng digest thì giữ lại để so nội dung
+    landed = {}
+    part_pattern = re.compile(re.escape(file_name) + r'\.\d{3}')
+    for asset in list_release_assets(token, release_id):
+        if asset['name'] == index_name:
+            delete_release_asset(token, asset['id'])
+        elif part_pattern.fullmatch(asset['name']):
+            if digest and asset.get('state') == 'uploaded' and asset_digest(asset) == digest:
+                landed[asset['name']] = asset
+            else:
+                delete_release_asset(token, asset['id'])
+    
+    parts_queue = queue.Queue(maxsize=upload_jobs)
+    aborted = threading.Event()
+    results = {}
+    failed = []
+    lock = threading.Lock()
+    uploaded_bytes = [0]
+    
+    def consume():
+        while True:
+            item = parts_queue.get()
+            if item is None:
+                return
+            if aborted.is_set():
+                continue  # Đã có part lỗi: chỉ lấy nốt khỏi hàng đợi, không upload
+            part, data = item
+            sha = hashlib.sha256(data).hexdigest()
+            existing = landed.get(part['name'])
+            if (existing is not None and existing.get('size') == part['size']
+                    and asset_part_sha(existing) == sha):
+                asset_id = existing['id']
+            else:
+                try:
+                    if existing is not None:
+                        # Cùng digest nhưng khác byte (mtime, policy nén, dedup...) → upload lại
+                        delete_release_asset(token, existing['id'])
+                    asset, _ = upload_part(token, release_id, part, lambda: data, digest, sha)
+                except Exception as e:
+                    # Dừng nén (PartSink raise ở lần ghi sau), vẫn lấy part khỏi hàng đợi để bên nén không bị treo
+                    with lock:
+                        failed.append(part['name'])
+                    aborted.set()
+                    print_error(f"Upload part thất bại: {e}")
+                    continue
+                asset_id = asset['id']
+                with lock:
+                    uploaded_bytes[0] += part['size']
+            with lock:
+                results[part['name']] = dict(part, id=asset_id, sha256=sha)
+            if progress:
+                print_info(f"   Part {part['name']} xong ({part['size'] / (1024*1024):.2f} MB)")
+    
+    threads = [threading.Thread(target=consume, daemon=True) for _ in range(upload_jobs)]
+    for thread in threads:
+        thread.start()
+    
+    start_time = time.time()
+    sink = PartSink(file_name, part_size, parts_queue, aborted)
+    try:
+        stats = write_zip_stream(sink, entries, jobs=jobs, policy=policy, progress=False,
+                                 links=links, files=files, pack=pack)
+        sink.close()
+    except UploadAborted:
+        pass  # Part lỗi đã nằm trong failed, báo bên dưới
+    finally:
+        for _ in threads:
+            parts_queue.put(None)
+        for thread in threads:
+            thread.join()
+    elapsed = time.time() - start_time
+    
+    if failed:
+        print_warning(f"Upload {failed[0]} lỗi nên đã dừng nén, chạy lại tool để upload tiếp "
+                      f"(part đã lên Release được giữ lại)")
+        return None
+    
+    for name, asset in landed.items():
+        if name not in results:
+            # ZIP lần này ít part hơn → part thừa của lần trước không còn thuộc index nào
+            delete_release_asset(token, asset['id'])
+    
+    uploaded_mb = uploaded_bytes[0] / (1024 * 1024)
+    print_info(f"Nén + upload: {elapsed:.1f}s | {stats['files']} file | ZIP {sink.offset / (1024*1024):.2f} MB "
+               f"thành {sink.count} part | đã upload {uploaded_mb:.2f} MB")
+    
+    index = {
+        'name': file_name,
+        'size': sink.offset,
+        'sha256': sink.sha256.hexdigest(),
+        'digest': digest,
+        'part_size': part_size,
+        'parts': [{'name': part['name'], 'offset': part['offset'], 'size': part['size'],
+                   'sha256': part['sha256']}
+                  for part in sorted(results.values(), key=lambda part: part['offset'])],
+    }
+    body = json.dumps(index, indent=1).encode('utf-8')
+    response, error = upload_asset_bytes(token, release_id, index_name, body, "application/json",
+                                         asset_label(index_name, digest) if digest else None)
+    if response is None or response.status_code != 201:
+        print_error(f"Lỗi khi upload index {index_name}: {error or response.status_code}")
+        return None
+    print_success(f"Đã stream {sink.count} part + {index_name} lên Release!")
+    return response.json()
+
+def stream_release_assets(token, release, jobs=None, full_pack=False,
+                          part_size_mb=STREAM_PART_SIZE_MB, upload_jobs=DEFAULT_UPLOAD_JOBS,
+                          policy=None, dedup=True, prune=None):
+    """Chế độ --stream của setup_releases: hash XCODE, bỏ qua nếu Release đã khớp, rồi stream"""
+    xcode_path = Path(XCODE_DIR)
+    if not xcode_path.exists():
+        print_error(f"Thư mục {XCODE_DIR} không tồn tại!")
+        return False
+    
+    manifest = None if full_pack else load_assets_manifest()
+    previous_files = manifest.get('files', {}) if manifest else {}
+    files, hashed = build_file_index(xcode_path, previous_files, jobs=jobs, rehash=full_pack)
+    files = select_packed_files(xcode_path, files, prune)
+    pack = pack_fingerprint(policy, dedup)
+    digest = compute_assets_digest(files, pack)
+    # Không có ZIP trên đĩa → archive None để lần chạy thường sau nén lại đầy đủ
+    save_assets_manifest({
+        'version': MANIFEST_VERSION,
+        'archive': None,
+        'pack': pack,
+        'digest': digest,
+        'files': files,
+    })
+    print_info(f"Đã quét {len(files)} file ({hashed} file cần hash lại) | digest {digest[:12]}")
+    
+    root = published_asset_name('stream', digest, part_size_mb)
+    if report_published(release, root, digest):
+        return True
+    with publish_lease(token, release, digest) as release:
+        if report_published(release, root, digest):
+            return True
+        return stream_xcode_assets(token, release, xcode_path, files, digest, jobs=jobs,
+                                   part_size_mb=part_size_mb, upload_jobs=upload_jobs,
+                                   policy=policy, dedup=dedup)
+
+def stream_xcode_assets(token, release, xcode_path, files, digest, jobs=None,
+                        part_size_mb=STREAM_PART_SIZE_MB, upload_jobs=DEFAULT_UPLOAD_JOBS,
+                        policy=None, dedup=True):
+    """Stream nén + upload các file đã index thành part của ZIP theo digest"""
+    pack = pack_fingerprint(policy, dedup)
+    entries = [entry for entry in scan_xcode_files(xcode_path) if entry[0] in files]
+    links = {}
+    if dedup:
+        entries, links, skipped = dedup_entries(entries, files)
+        print_dedup_stats(links, skipped, files)
+    
+    print_info(f"Stream nén + upload {XCODE_DIR} (part {part_size_mb} MB, {upload_jobs} luồng upload)...")
+    with span('compress+upload', mode='stream') as record:
+        record['bytes'] = sum(files[arcname]['size'] for arcname, _ in entries)
+        asset = stream_pack_and_upload(token, release['id'], entries,
+                                       digest_asset_name(ASSETS_ZIP, digest), digest=digest,
+                                       part_size_mb=part_size_mb,
+                                       jobs=jobs, upload_jobs=upload_jobs, policy=policy, links=links,
+                                       files=files, pack=pack)
+    return asset is not None
+
+# ============== ASSET BẤT BIẾN THEO DIGEST ==============
+
+def digest_asset_name(name, digest):
+    """Tên asset riêng của digest: xcode-assets.zip → xcode-assets.<12 ký tự digest>.zip
+
+    Asset đã upload không bao giờ bị xóa-rồi-upload-lại dưới cùng tên, nên workflow đang
+    tải digest cũ không bao giờ thấy asset biến mất giữa chừng.
+    """
+    stem, _, suffix = name.partition('.')
+    return f"{stem}.{digest[:12]}.{suffix}"
+
+def _asset_suffix(name):
+    """Đuôi chung của các asset cùng loại: xcode-assets.chain.json → .chain.json"""
+    return '.' + name.partition('.')[2]
+
+def published_asset_name(mode, digest, part_size_mb):
+    """Asset gốc của digest ở chế độ publish này (workflow đọc asset này trước tiên)"""
+    if mode == 'chunked':
+        return digest_asset_name(CDC_RECIPE, digest)
+    if mode == 'delta':
+        return digest_asset_name(CHAIN_INDEX, digest)
+    zip_name = digest_asset_name(ASSETS_ZIP, digest)
+    return parts_index_name(zip_name) if mode == 'stream' or part_size_mb > 0 else zip_name
+
+def report_published(release, root, digest):
+    """True (và in thông báo) nếu Release đã có asset gốc của digest"""
+    existing = find_matching_asset(release, root, digest)
+    if existing:
+        print_success(f"Asset {root} trên Release đã khớp digest {digest[:12]}, bỏ qua upload!")
+    return existing is not None
+
+def refresh_release(token, release):
+    """Đọc lại Release (danh sách asset) sau khi đợi process/máy khác"""
+    status, data = github_client(token).get_json(f"{API_BASE}/releases/{release['id']}")
+    return data if status == 200 else release
+
+# Lease đang giữ {asset id: token}: luồng publish là daemon thread (StepScheduler) nên main thoát
+# giữa chừng (push lỗi, Ctrl+C) thì finally của publish_lease không chạy → nhả ở atexit
+_held_leases = {}
+_held_leases_lock = threading.Lock()
+
+def release_held_leases():
+    """Xóa các lease process này còn giữ (gọi khi thoát) để máy khác không phải đợi tới LEASE_TTL"""
+    with _held_leases_lock:
+        leases = list(_held_leases.items())
+        _held_leases.clear()
+    for lease_id, token in leases:
+        delete_release_asset(token, lease_id)
+
+atexit.register(release_held_leases)
+
+@contextlib.contextmanager
+def publish_lease(token, release, digest):
+    """Single-flight theo digest giữa các máy: giữ lease asset trên Release trong lúc publish
+
+    GitHub từ chối (422) upload asset trùng tên nên chỉ 1 máy tạo được lease của digest;
+    máy khác đợi lease biến mất rồi nhận Release đọc lại (đã có asset nếu máy kia publish
+    xong). Lease quá LEASE_TTL coi như của process đã chết. Yield Release.
+    """
+    name = digest_asset_name(PUBLISH_LEASE, digest)
+    owner = f"{socket.gethostname()} pid {os.getpid()}"
+    body = json.dumps({'digest': digest, 'owner': owner}).encode('utf-8')
+    lease = None
+    waited = False
+    misses = 0
+    while True:
+        response, error = upload_asset_bytes(token, release['id'], name, body, "application/json", owner)
+        if response is not None and response.status_code == 201:
+            lease = response.json()
+            with _held_leases_lock:
+                _held_leases[lease['id']] = token
+            break
+        holder = None
+        if response is not None and response.status_code == 422:
+            holder = next((asset for asset in list_release_assets(token, release['id'])
+                           if asset['name'] == name), None)
+            misses = 0 if holder else misses + 1
+        if holder is None and (response is None or response.status_code != 422 or misses > 3):
+            # Lease chỉ để khỏi làm trùng; asset theo digest vẫn đúng khi publish không có lease
+            print_warning(f"Không tạo được lease {name} ({error or response.status_code}), "
+                          f"publish không đợi máy khác")
+            break
+        if holder is None:
+            continue  # Vừa được nhả
+        age = time.time() - (parse_github_time(holder.get('created_at')) or time.time())
+        if age > LEASE_TTL:
+            print_warning(f"Lease {name} ({holder.get('label') or '?'}) đã {age / 60:.0f} phút, bỏ qua")
+            delete_release_asset(token, holder['id'])
+            continue
+        if not waited:
+            print_info(f"{holder.get('label') or 'Máy khác'} đang publish digest {digest[:12]}, "
+                       f"đợi xong rồi dùng lại kết quả...")
+            waited = True
+        time.sleep(LEASE_POLL_INTERVAL)
+    try:
+        yield refresh_release(token, release) if waited else release
+    finally:
+        if lease is not None:
+            with _held_leases_lock:
+                held = _held_leases.pop(lease['id'], None)
+            if held is not None:
+                delete_release_asset(token, lease['id'])
+
+def load_current_assets(token, release):
+    """Đọc con trỏ CURRENT_ASSETS trên Release, None nếu chưa có
+
+    Giữa lúc con trỏ đang được thay (hoặc lần thay bị lỗi giữa chừng) tên chính có thể vắng:
+    khi đó dùng bản mới nhất trong các bản tạm/dự phòng (replace_json_asset).
+    """
+    candidates = sorted((asset for asset in release.get('assets', [])
+                         if asset.get('state') == 'uploaded'
+                         and (asset['name'] == CURRENT_ASSETS or is_replacement_copy(asset['name'], CURRENT_ASSETS))),
+                        key=lambda asset: asset['name'] != CURRENT_ASSETS)
+    pointers = []
+    for asset in candidates:
+        pointer = download_asset_json(token, asset['id'])
+        if not isinstance(pointer, dict) or pointer.get('version') != CURRENT_ASSETS_VERSION:
+            continue
+        if asset['name'] == CURRENT_ASSETS:
+            return pointer
+        pointers.append(pointer)
+    return max(pointers, key=pointer_published_at, default=None)
+
+def pointer_published_at(pointer):
+    """Thời điểm publish digest mà con trỏ đang trỏ tới (entry đầu của history)"""
+    history = pointer.get('history') or [{}]
+    return history[0].get('published_at') or 0
+
+def find_published_root(token, release, legacy_name):
+    """Asset gốc mới nhất cùng loại với `legacy_name` (chain/recipe) còn trên Release
+
+    Duyệt history của con trỏ; Release publish bằng bản cũ (chưa có con trỏ) thì dùng
+    asset tên cố định `legacy_name`.
+    """
+    assets = {asset['name']: asset for asset in release.get('assets', []) if asset.get('state') == 'uploaded'}
+    pointer = load_current_assets(token, release)
+    names = [entry['asset'] for entry in pointer.get('history', [])] if pointer else [legacy_name]
+    suffix = _asset_suffix(legacy_name)
+    for name in names:
+        if name.endswith(suffix) and name in assets:
+            return assets[name]
+    return None
+
+def referenced_assets(token, assets, root):
+    """Tên các asset mà asset gốc cần (chain → baseline + delta, recipe → pack); None nếu không đọc được"""
+    names = {root}
+    if root.endswith(parts_index_name('')):
+        names.add(root[:-len(parts_index_name(''))])
+    asset = assets.get(root)
+    if asset is None:
+        return names
+    if root.endswith(_asset_suffix(CHAIN_INDEX)):
+        chain = download_asset_json(token, asset['id'])
+        if not isinstance(chain, dict) or 'baseline' not in chain:
+            return None
+        names.add(chain['baseline']['name'])
+        names.update(delta['name'] for delta in chain.get('deltas', []))
+    elif root.endswith(_asset_suffix(CDC_RECIPE)):
+        recipe = download_recipe(token, asset)
+        if recipe is None:
+            return None
+        names.update(recipe[0])
+    return names
+
+def gc_release_assets(token, release_id, history):
+    """Xóa asset của tool không còn được digest nào trong history tham chiếu
+
+    Asset tạo chưa được ASSETS_GRACE giây luôn được giữ: có thể là lần publish đang chạy ở máy khác.
+    """
+    assets = {asset['name']: asset for asset in list_release_assets(token, release_id)}
+    keep = {CURRENT_ASSETS}
+    for entry in history:
+        names = referenced_assets(token, assets, entry['asset'])
+        if names is None:
+            print_warning(f"Không đọc được {entry['asset']}, lần này không dọn asset cũ trên Release")
+            return
+        keep |= names
+    now = time.time()
+    stale = [asset for name, asset in assets.items()
+             if name.startswith(('xcode-assets', CDC_PACK_PREFIX))
+             and not any(name == ref or name.startswith(ref + '.') for ref in keep)
+             and now - (parse_github_time(asset.get('created_at')) or now) > ASSETS_GRACE]
+    if stale:
+        print_info(f"Dọn {len(stale)} asset cũ không còn digest nào dùng "
+                   f"({sum(asset.get('size', 0) for asset in stale) / (1024*1024):.2f} MB)")
+    for asset in stale:
+        delete_release_asset(token, asset['id'])
+
+def record_published_assets(token, release, digest, mode, root):
+    """Trỏ CURRENT_ASSETS vào digest vừa publish rồi dọn asset không còn được tham chiếu
+
+    History giữ ASSETS_KEEP digest gần nhất, cùng mọi digest mới bị thay chưa quá ASSETS_GRACE
+    giây (run đã trigger với digest đó có thể vẫn đang tải).
+    """
+    release = refresh_release(token, release)
+    pointer = load_current_assets(token, release) or {}
+    if pointer.get('digest') == digest and pointer.get('asset') == root:
+        return True
+    now = time.time()
+    history = [{'digest': digest, 'mode': mode, 'asset': root, 'published_at': now}]
+    for entry in pointer.get('history', []):
+        if entry.get('asset') == root:
+            continue
+        # Entry bị thay lúc entry mới hơn nó (cuối history hiện tại) được publish
+        if len(history) >= ASSETS_KEEP and now - history[-1]['published_at'] > ASSETS_GRACE:
+            break
+        history.append(entry)
+    payload = {
+        'version': CURRENT_ASSETS_VERSION,
+        'digest': digest,
+        'mode': mode,
+        'asset': root,
+        'history': history,
+    }
+    if not replace_json_asset(token, release['id'], CURRENT_ASSETS, payload, digest):
+        return False
+    print_info(f"{CURRENT_ASSETS} → {root}")
+    gc_release_assets(token, release['id'], history)
+    return True
+
+# ============== CHUNK STORE (CDC) ==============
+
+# Bảng gear cố định (sinh từ sha256) để cùng nội dung luôn cắt ra cùng chunk ở mọi máy
+CDC_GEAR = [int.from_bytes(hashlib.sha256(b'fastcdc-gear-%d' % i).digest()[:8], 'big') for i in range(256)]
+CDC_HASH_MASK = (1 << 64) - 1
+# Normalized chunking: trước CDC_AVG_SIZE khó cắt hơn (nhiều bit), sau đó dễ cắt hơn
+CDC_MASK_S = ((1 << 18) - 1) << 46
+CDC_MASK_L = ((1 << 14) - 1) << 50
+
+def cdc_cut(data, start, end):
+    """Vị trí cắt chunk đầu tiên từ `start` (FastCDC, gear hash); `end` = hết dữ liệu đang có"""
+    if end - start <= CDC_MIN_SIZE:
+        return end
+    limit = min(end, start + CDC_MAX_SIZE)
+    normal = min(limit, start + CDC_AVG_SIZE)
+    gear = CDC_GEAR
+    mask = CDC_HASH_MASK
+    h = 0
+    # CDC_MIN_SIZE byte đầu không bao giờ là điểm cắt: bỏ qua, không cần hash
+    position = start + CDC_MIN_SIZE
+    for byte in data[position:normal]:
+        h = ((h << 1) + gear[byte]) & mask
+        position += 1
+        if not h & CDC_MASK_S:
+            return position
+    for byte in data[normal:limit]:
+        h = ((h << 1) + gear[byte]) & mask
+        position += 1
+        if not h & CDC_MASK_L:
+            return position
+    return limit
+
+def cdc_chunks(file_path):
+    """Đọc file theo block, yield từng chunk (bytes) theo ranh giới nội dung"""
+    pending = b''
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(ZIP_READ_CHUNK * 4)
+            data = pending + block if pending else block
+            position = 0
+            # Còn đọc tiếp được thì chỉ cắt khi đủ CDC_MAX_SIZE byte phía trước
+            while len(data) - position >= (CDC_MAX_SIZE if block else 1):
+                cut = cdc_cut(data, position, len(data))
+                yield data[position:cut]
+                position = cut
+            pending = data[position:]
+            if not block:
+                return
+
+def chunk_file(file_path):
+    """Danh sách chunk của 1 file: [[sha256, size], ...] (chạy được trong process pool)"""
+    return [[hashlib.sha256(chunk).hexdigest(), len(chunk)] for chunk in cdc_chunks(file_path)]
+
+class ChunkCache:
+    """Danh sách chunk theo sha256 của file: file không đổi nội dung thì khỏi cắt lại"""
+
+    def __init__(self, path=CHUNK_CACHE):
+        self.path = Path(path)
+        self.files = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CHUNK_CACHE_VERSION and data.get('format') == CDC_FORMAT:
+                self.files = data.get('files', {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def save(self, keep):
+        """Ghi cache, chỉ giữ file có sha256 trong `keep` (nội dung còn trong XCODE)"""
+        data = {'version': CHUNK_CACHE_VERSION, 'format': CDC_FORMAT,
+                'files': {sha256: chunks for sha256, chunks in self.files.items() if sha256 in keep}}
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+def build_recipe(xcode_path, files, jobs=None, cache_path=CHUNK_CACHE):
+    """Cắt các file trong `files` thành chunk: (recipe files, nguồn của từng chunk)
+
+    recipe files: {arcname: {size, sha256, chunks: [sha256...], exec?}}; nguồn chunk:
+    {sha256: (path, offset, size, arcname, size file)} theo lần xuất hiện đầu tiên (arcname sắp xếp).
+    File nhỏ hơn CDC_MAX_SIZE là 1 chunk (id = sha256 của file, không cần cắt).
+    """
+    jobs = max(1, jobs or default_jobs())
+    cache = ChunkCache(cache_path) if cache_path else None
+    records = [(arcname, path) for arcname, path, _, _ in scan_tree(xcode_path) if arcname in files]
+    chunk_lists = {}
+    to_chunk = {}
+    for arcname, path in records:
+        record = files[arcname]
+        if record['size'] < CDC_MAX_SIZE:
+            chunk_lists[arcname] = [[record['sha256'], record['size']]]
+        elif cache and record['sha256'] in cache.files:
+            chunk_lists[arcname] = cache.files[record['sha256']]
+        else:
+            to_chunk.setdefault(record['sha256'], (arcname, path))
+    with span('chunk', files=len(to_chunk)) as record:
+        todo = sorted(to_chunk.items(), key=lambda item: -files[item[1][0]]['size'])
+        total = sum(files[arcname]['size'] for _, (arcname, _) in todo)
+        record['bytes'] = total
+        if jobs > 1 and total >= CDC_PROCESS_MIN_BYTES:
+            # Gear hash chạy bằng Python (giữ GIL) → chia file cho nhiều process
+            with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+                results = list(pool.map(chunk_file, [path for _, (_, path) in todo]))
+        else:
+            results = [chunk_file(path) for _, (_, path) in todo]
+    by_sha = {sha256: chunks for (sha256, _), chunks in zip(todo, results)}
+    if cache:
+        cache.files.update(by_sha)
+        cache.save({record['sha256'] for record in files.values()})
+    recipe_files = {}
+    sources = {}
+    for arcname, path in records:
+        record = files[arcname]
+        chunks = chunk_lists.get(arcname) or by_sha[record['sha256']]
+        offset = 0
+        for chunk_id, size in chunks:
+            sources.setdefault(chunk_id, (path, offset, size, arcname, record['size']))
+            offset += size
+        entry = {'size': record['size'], 'sha256': record['sha256'],
+                 'chunks': [chunk_id for chunk_id, _ in chunks]}
+        if os.stat(path).st_mode & 0o111:
+            entry['exec'] = True
+        recipe_files[arcname] = entry
+    return recipe_files, sources
+
+def compress_chunk(source, policy):
+    """Đọc 1 chunk từ file và nén theo policy của file chứa nó: (data, payload, method)"""
+    path, offset, size, arcname, file_size = source
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(size)
+    method, level = select_compression(policy, arcname, file_size)
+    if method == 'auto':
+        sample = data[:AUTO_SAMPLE_SIZE]
+        ratio = len(zlib.compress(sample, 1)) / len(sample) if sample else 0
+        method = 'store' if ratio > AUTO_STORE_RATIO else 'deflate'
+    if method == 'deflate':
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        payload = compressor.compress(data) + compressor.flush()
+    elif method == 'lzma':
+        import lzma
+        payload = lzma.compress(data, format=lzma.FORMAT_XZ)
+    else:
+        payload = data
+    if method != 'store' and len(payload) >= len(data):
+        method, payload = 'store', data
+    return data, payload, method
+
+def write_chunk_packs(new_chunks, sources, pack_dir, jobs=None, policy=None):
+    """Nén các chunk mới (song song) và ghi nối tiếp vào pack ≤ CDC_PACK_SIZE_MB
+
+    Trả về (packs {tên: {size, sha256, path}}, vị trí chunk {id: [pack, offset, length, size, method]}).
+    Tên pack = sha256 nội dung nên upload lại pack đã có trên Release là thừa.
+    """
+    jobs = max(1, jobs or default_jobs())
+    policy = policy or load_compression_policy()
+    pack_limit = CDC_PACK_SIZE_MB * 1024 * 1024
+    packs = {}
+    locations = {}
+    current = {'file': None}
+
+    def close_pack():
+        if current['file'] is None:
+            return
+        current['file'].close()
+        digest = current['hash'].hexdigest()
+        name = f"{CDC_PACK_PREFIX}{digest[:16]}.pack"
+        path = Path(pack_dir) / name
+        os.replace(current['path'], path)
+        packs[name] = {'size': current['size'], 'sha256': digest, 'path': str(path)}
+        for chunk_id in current['chunks']:
+            locations[chunk_id][0] = name
+        current['file'] = None
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        todo = iter(new_chunks)
+
+        def submit_next():
+            for chunk_id in todo:
+                pending.append((chunk_id, pool.submit(compress_chunk, sources[chunk_id], policy)))
+                return
+
+        for _ in range(jobs * 4):
+            submit_next()
+        while pending:
+            chunk_id, future = pending.popleft()
+            data, payload, method = future.result()
+            submit_next()
+            if hashlib.sha256(data).hexdigest() != chunk_id:
+                raise RuntimeError(f"{sources[chunk_id][3]} đã bị sửa trong lúc publish, chạy lại tool")
+            if current['file'] is not None and current['size'] + len(payload) > pack_limit:
+                close_pack()
+            if current['file'] is None:
+                path = Path(pack_dir) / f"pack-{len(packs)}.tmp"
+                current.update(file=open(path, 'wb'), path=path, size=0,
+                               hash=hashlib.sha256(), chunks=[])
+            locations[chunk_id] = [None, current['size'], len(payload), len(data), method]
+            current['file'].write(payload)
+            current['hash'].update(payload)
+            current['size'] += len(payload)
+            current['chunks'].append(chunk_id)
+        close_pack()
+    return packs, locations
+
+def encode_recipe(digest, recipe_files, order, locations, packs, pack=None):
+    """Recipe gọn để upload mỗi lần publish: id chunk chỉ ghi 1 lần, file tham chiếu theo chỉ số
+
+    {pack (xem compute_assets_digest), packs: [[tên, size, sha256]], chunks: [[sha256, pack, offset, length, size, method]],
+     files: {arcname: {size, sha256, chunks: [chỉ số], exec?}}}, JSON gọn nén gzip.
+    """
+    pack_names = sorted({locations[chunk_id][0] for chunk_id in order})
+    pack_index = {name: index for index, name in enumerate(pack_names)}
+    chunk_index = {chunk_id: index for index, chunk_id in enumerate(order)}
+    recipe = {
+        'version': CDC_RECIPE_VERSION,
+        'format': CDC_FORMAT,
+        'digest': digest,
+        'pack': pack,
+        'packs': [[name, packs[name]['size'], packs[name]['sha256']] for name in pack_names],
+        'chunks': [[chunk_id, pack_index[locations[chunk_id][0]]] + locations[chunk_id][1:]
+                   for chunk_id in order],
+        'files': {arcname: dict(record, chunks=[chunk_index[chunk_id] for chunk_id in record['chunks']])
+                  for arcname, record in recipe_files.items()},
+    }
+    body = json.dumps(recipe, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return gzip.compress(body, mtime=0), pack_names
+
+def download_recipe(token, asset):
+    """Tải 1 recipe: ({tên pack: {size, sha256}}, {chunk: [pack, offset, length, size, method]})
+
+    Trả về None nếu không tải được hoặc recipe khác version/format.
+    """
+    response = github_client(token).request('GET', f"{API_BASE}/releases/assets/{asset['id']}",
+                                            headers={"Accept": "application/octet-stream"},
+                                            timeout=120)
+    if response.status_code != 200:
+        return None
+    try:
+        recipe = json.loads(gzip.decompress(response.content))
+    except (OSError, ValueError):
+        return None
+    if recipe.get('version') != CDC_RECIPE_VERSION or recipe.get('format') != CDC_FORMAT:
+        return None
+    packs = [(name, {'size': size, 'sha256': sha256}) for name, size, sha256 in recipe['packs']]
+    chunks = {chunk[0]: [packs[chunk[1]][0]] + chunk[2:] for chunk in recipe['chunks']}
+    return dict(packs), chunks
+
+def load_published_recipe(token, release):
+    """Recipe publish gần nhất còn trên Release (theo CURRENT_ASSETS), None nếu chưa có"""
+    asset = find_published_root(token, release, CDC_RECIPE)
+    return download_recipe(token, asset) if asset else None
+
+def publish_chunk_store(token, release, xcode_path, files, digest, jobs=None,
+                        upload_jobs=DEFAULT_UPLOAD_JOBS, policy=None):
+    """Publish XCODE dạng chunk store: chỉ upload chunk mới trong pack mới rồi upload recipe của digest
+
+    Chunk đã có trong pack trên Release (theo recipe gần nhất) được tham chiếu lại. Khi dữ liệu
+    còn dùng trong các pack cũ < CDC_REPACK_RATIO thì đóng gói lại toàn bộ; pack không còn
+    recipe nào tham chiếu được gc_release_assets dọn sau.
+    """
+    release_id = release['id']
+    recipe_name = digest_asset_name(CDC_RECIPE, digest)
+    recipe_files, sources = build_recipe(xcode_path, files, jobs=jobs)
+    order = list(dict.fromkeys(chunk_id for record in recipe_files.values() for chunk_id in record['chunks']))
+    total_bytes = sum(sources[chunk_id][2] for chunk_id in order)
+    
+    published = load_published_recipe(token, release)
+    live_packs = {asset['name'] for asset in release.get('assets', [])
+                  if asset['name'].startswith(CDC_PACK_PREFIX) and asset.get('state') == 'uploaded'}
+    known = {}
+    old_packs = {}
+    if published:
+        old_packs = {name: meta for name, meta in published[0].items() if name in live_packs}
+        known = {chunk_id: location for chunk_id, location in published[1].items()
+                 if location[0] in old_packs}
+    reused = {chunk_id: known[chunk_id] for chunk_id in order if chunk_id in known}
+    used_packs = {location[0] for location in reused.values()}
+    pack_bytes = sum(old_packs[name]['size'] for name in used_packs)
+    live_bytes = sum(location[2] for location in reused.values())
+    if pack_bytes and live_bytes < pack_bytes * CDC_REPACK_RATIO:
+        print_info(f"Pack cũ chỉ còn {live_bytes / pack_bytes:.0%} dữ liệu được dùng, đóng gói lại toàn bộ")
+        reused = {}
+    new_chunks = [chunk_id for chunk_id in order if chunk_id not in reused]
+    new_bytes = sum(sources[chunk_id][2] for chunk_id in new_chunks)
+    reuse_ratio = 1 - new_bytes / total_bytes if total_bytes else 0
+    print_info(f"CDC: {len(order)} chunk khác nhau ({total_bytes / (1024*1024):.2f} MB, TB "
+               f"{total_bytes / max(1, len(order)) / 1024:.0f} KB) | {len(new_chunks)} chunk mới "
+               f"({new_bytes / (1024*1024):.2f} MB) | dùng lại {reuse_ratio:.1%} dữ liệu")
+    
+    pack_dir = Path(tempfile.mkdtemp(prefix='xcode-chunks-'))
+    try:
+        with span('pack_chunks', chunks=len(new_chunks), bytes=new_bytes):
+            packs, locations = write_chunk_packs(new_chunks, sources, pack_dir, jobs=jobs, policy=policy)
+        upload_packs = [name for name in packs if name not in live_packs]
+        upload_bytes = sum(packs[name]['size'] for name in upload_packs)
+        if upload_packs:
+            print_info(f"Upload {len(upload_packs)} pack ({upload_bytes / (1024*1024):.2f} MB, "
+                       f"{upload_jobs} luồng)...")
+        with span('upload', mode='chunked', bytes=upload_bytes, files=len(upload_packs)):
+            with ThreadPoolExecutor(max_workers=max(1, upload_jobs)) as pool:
+                futures = [pool.submit(upload_part, token, release_id, {'name': name},
+                                       lambda path=packs[name]['path']: open(path, 'rb'), digest)
+                           for name in upload_packs]
+                for future in futures:
+                    future.result()
+    except (OSError, RuntimeError) as e:
+        print_error(f"Lỗi khi publish chunk store: {e}")
+        return False
+    finally:
+        shutil.rmtree(pack_dir, ignore_errors=True)
+    
+    locations.update(reused)
+    body, pack_names = encode_recipe(digest, recipe_files, order, locations, dict(old_packs, **packs),
+                                     pack=pack_fingerprint(policy, False))
+    print_info(f"Upload {recipe_name} ({len(body) / 1024:.0f} KB)...")
+    try:
+        upload_part(token, release_id, {'name': recipe_name}, lambda: body, digest)
+    except RuntimeError as e:
+        print_error(f"Lỗi khi upload recipe: {e}")
+        return False
+    print_success(f"Đã publish chunk store: {recipe_name} + {len(pack_names)} pack "
+                  f"({len(upload_packs)} pack mới)")
+    return True
+
+def chunk_release_assets(token, release, jobs=None, full_pack=False,
+                         upload_jobs=DEFAULT_UPLOAD_JOBS, policy=None, prune=None):
+    """Chế độ --chunked của setup_releases: hash XCODE, bỏ qua nếu recipe đã khớp, rồi publish"""
+    xcode_path = Path(XCODE_DIR)
+    if not xcode_path.exists():
+        print_error(f"Thư mục {XCODE_DIR} không tồn tại!")
+        return False
+    
+    manifest = None if full_pack else load_assets_manifest()
+    previous_files = manifest.get('files', {}) if manifest else {}
+    files, hashed = build_file_index(xcode_path, previous_files, jobs=jobs, rehash=full_pack)
+    files = select_packed_files(xcode_path, files, prune)
+    # Chunk store không dùng dedup theo link (chunk trùng đã chỉ lưu 1 lần)
+    pack = pack_fingerprint(policy, False)
+    digest = compute_assets_digest(files, pack)
+    save_assets_manifest({
+        'version': MANIFEST_VERSION,
+        'archive': None,
+        'pack': pack,
+        'digest': digest,
+        'files': files,
+    })
+    print_info(f"Đã quét {len(files)} file ({hashed} file cần hash lại) | digest {digest[:12]}")
+    
+    root = published_asset_name('chunked', digest, 0)
+    if report_published(release, root, digest):
+        return True
+    with publish_lease(token, release, digest) as release:
+        if report_published(release, root, digest):
+            return True
+        return publish_chunk_store(token, release, xcode_path, files, digest, jobs=jobs,
+                                   upload_jobs=upload_jobs, policy=policy)
+
+# ============== DELTA BUNDLE ==============
+
+def delta_asset_name(digest, sha256=None):
+    """Tên asset delta cho trạng thái XCODE có digest này (kèm sha256 nội dung khi upload)
+
+    Cùng digest nhưng khác chain (baseline khác) cho ra delta khác byte → tên theo nội dung để
+    asset đã upload không bao giờ bị thay dưới cùng tên.
+    """
+    if sha256:
+        return f"xcode-assets.delta-{digest[:12]}.{sha256[:12]}.zip"
+    return f"xcode-assets.delta-{digest[:12]}.zip"
+
+def upload_delta(token, release, delta_path, digest):
+    """Upload delta dưới tên theo nội dung (bất biến như các asset theo digest khác)
+
+    Delta cùng tên đã upload xong (lần trước lỗi ở bước upload chain) thì dùng lại.
+    Trả về (tên asset, sha256) hoặc None nếu lỗi.
+    """
+    sha = hash_file(delta_path)
+    name = delta_asset_name(digest, sha)
+    for asset in list_release_assets(token, release['id']):
+        if asset['name'] == name and asset.get('state') == 'uploaded' and asset_part_sha(asset) == sha:
+            print_info(f"{name} đã có trên Release, dùng lại")
+            return name, sha
+    print_info(f"Đang upload {name} ({Path(delta_path).stat().st_size / (1024*1024):.2f} MB)...")
+    try:
+        upload_part(token, release['id'], {'name': name}, lambda: open(delta_path, 'rb'), digest, sha)
+    except RuntimeError as e:
+        print_error(f"Lỗi khi upload delta: {e}")
+        return None
+    return name, sha
+
+def download_asset_json(token, asset_id):
+    """Tải nội dung 1 asset JSON nhỏ trên Release"""
+    headers = {
+        "Accept": "application/octet-stream"
+    }
+    response = github_client(token).request('GET', f"{API_BASE}/releases/assets/{asset_id}",
+                                            headers=headers, timeout=120)
+    if response.status_code != 200:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+def rename_release_asset(token, asset_id, name, label=None):
+    """Đổi tên (và label) asset trên Release"""
+    payload = {"name": name}
+    if label:
+        payload["label"] = label
+    response = github_client(token).request('PATCH', f"{API_BASE}/releases/assets/{asset_id}",
+                                            json=payload)
+    return response.json() if response.status_code == 200 else None
+
+def is_replacement_copy(asset_name, name):
+    """Asset là bản tạm/dự phòng của `name` do replace_json_asset tạo (name.<digest>[.old].tmp)"""
+    return asset_name.startswith(name + '.') and asset_name.endswith('.tmp')
+
+def replace_json_asset(token, release_id, name, payload, digest):
+    """Thay asset JSON: upload dưới tên tạm rồi đổi tên thế chỗ bản cũ
+
+    Bản cũ chỉ bị đổi sang tên dự phòng ngay trước khi bản mới nhận tên, và được trả về chỗ cũ
+    nếu đổi tên lỗi; bản cũ chỉ bị xóa sau khi bản mới đã đứng đúng tên. Lúc nào Release cũng
+    có ít nhất 1 bản đầy đủ (tên chính hoặc bản tạm) cho người đọc (load_current_assets).
+    """
+    body = json.dumps(payload, indent=1, sort_keys=True).encode('utf-8')
+    tmp_name = f"{name}.{digest[:12]}.tmp"
+    backup_name = f"{name}.{digest[:12]}.old.tmp"
+    assets = list_release_assets(token, release_id)
+    now = time.time()
+    for asset in assets:
+        # Bản tạm của lần thay trước bị bỏ dở (quá LEASE_TTL thì không còn process nào dùng)
+        age = now - (parse_github_time(asset.get('created_at')) or now)
+        if asset['name'] in (tmp_name, backup_name) or (is_replacement_copy(asset['name'], name)
+                                                        and age > LEASE_TTL):
+            delete_release_asset(token, asset['id'])
+    response, error = upload_asset_bytes(token, release_id, tmp_name, body, "application/json",
+                                         asset_label(name, digest))
+    if response is None or response.status_code != 201:
+        print_error(f"Lỗi khi upload {name}: {error or response.status_code}")
+        return None
+    new_id = response.json()['id']
+    old = next((asset for asset in assets if asset['name'] == name), None)
+    if old is not None and rename_release_asset(token, old['id'], backup_name, old.get('label')) is None:
+        print_error(f"Lỗi khi thay {name}: không đổi được tên bản cũ")
+        delete_release_asset(token, new_id)
+        return None
+    renamed = rename_release_asset(token, new_id, name, asset_label(name, digest))
+    if renamed is None:
+        print_error(f"Lỗi khi thay {name}: không đổi được tên bản mới")
+        if old is not None:
+            rename_release_asset(token, old['id'], name, old.get('label'))
+        return None
+    if old is not None:
+        delete_release_asset(token, old['id'])
+    return renamed
+
+def load_published_chain(token, release):
+    """Đọc chain (baseline + delta) publish gần nhất còn trên Release, None nếu chưa có"""
+    asset = find_published_root(token, release, CHAIN_INDEX)
+    if asset is None:
+        return None
+    chain = download_asset_json(token, asset['id'])
+    if isinstance(chain, dict) and chain.get('version') == CHAIN_VERSION:
+        return chain
+    return None
+
+def upload_chain(token, release_id, chain, digest):
+    """Upload chain của digest (asset mới, chain cũ giữ nguyên cho run đang tải)"""
+    body = json.dumps(chain, indent=1, sort_keys=True).encode('utf-8')
+    try:
+        upload_part(token, release_id, {'name': digest_asset_name(CHAIN_INDEX, digest)}, lambda: body, digest)
+    except RuntimeError as e:
+        print_error(f"Lỗi khi upload chain: {e}")
+        return False
+    return True
+
+def diff_file_index(old_files, new_files):
+    """So sánh 2 bản index: trả về (arcname mới/đã đổi, arcname đã xóa)"""
+    changed = sorted(name for name, record in new_files.items()
+                     if old_files.get(name, {}).get('sha256') != record['sha256'])
+    deleted = sorted(set(old_files) - set(new_files))
+    return changed, deleted
+
+def publish_delta_release(token, release, zip_path, manifest, jobs=None,
+                          part_size_mb=DEFAULT_PART_SIZE_MB, upload_jobs=DEFAULT_UPLOAD_JOBS,
+                          baseline_every=DEFAULT_BASELINE_EVERY, policy=None, dedup=True):
+    """Publish delta so với chain gần nhất trên Release, hoặc baseline đầy đủ khi cần
+
+    Workflow áp baseline rồi lần lượt từng delta (file mới/đã đổi + danh sách xóa). Mỗi digest
+    có chain riêng; baseline đặt tên theo digest nên đổi baseline không làm hỏng chain cũ.
+    """
+    release_id = release['id']
+    digest = manifest['digest']
+    published_files = {name: {'size': record['size'], 'sha256': record['sha256']}
+                       for name, record in manifest['files'].items()}
+    
+    chain = load_published_chain(token, release)
+    if chain and len(chain.get('deltas', [])) < baseline_every:
+        changed, deleted = diff_file_index(chain.get('files', {}), published_files)
+        # Thư mục tạm ngoài repo (như pack CDC): scheduler có thể đang git add song song
+        delta_dir = Path(tempfile.mkdtemp(prefix='xcode-delta-'))
+        delta_path = delta_dir / delta_asset_name(digest)
+        entries = [(name, Path(XCODE_DIR).parent / name) for name in changed]
+        links = {}
+        if dedup:
+            # Nguồn có thể là file không đổi: trên CI nó đã có sẵn từ baseline/delta trước
+            entries, links, _ = dedup_entries(entries, published_files)
+        try:
+            stats = pack_directory(XCODE_DIR, delta_path, jobs=jobs, policy=policy, entries=entries,
+                                   links=links, progress=False)
+            baseline_size = Path(zip_path).stat().st_size
+            if stats['bytes_out'] <= baseline_size * DELTA_MAX_RATIO:
+                print_info(f"Delta: {len(changed)} file mới/đã đổi, {len(deleted)} file đã xóa "
+                           f"({stats['bytes_out'] / (1024*1024):.2f} MB so với baseline "
+                           f"{baseline_size / (1024*1024):.2f} MB)")
+                uploaded = upload_delta(token, release, delta_path, digest)
+                if not uploaded:
+                    return False
+                chain['deltas'].append({
+                    'name': uploaded[0],
+                    'digest': digest,
+                    'size': stats['bytes_out'],
+                    'sha256': uploaded[1],
+                    'changed': len(changed),
+                    'deleted': deleted,
+                })
+                chain['digest'] = digest
+                chain['pack'] = manifest.get('pack')
+                chain['files'] = published_files
+                if not upload_chain(token, release_id, chain, digest):
+                    return False
+                print_success(f"Đã publish delta {len(chain['deltas'])}/{baseline_every} "
+                              f"trên baseline {chain['baseline']['digest'][:12]}")
+                return True
+            print_info("Delta quá lớn so với baseline, upload baseline mới...")
+        finally:
+            shutil.rmtree(delta_dir, ignore_errors=True)
+    
+    # Baseline đầy đủ: chain mới (baseline + delta cũ được dọn khi không còn chain nào dùng)
+    print_info("Upload baseline đầy đủ...")
+    baseline_name = digest_asset_name(ASSETS_ZIP, digest)
+    if part_size_mb > 0:
+        asset = upload_parts_to_release(token, release_id, zip_path, digest=digest,
+                                        part_size_mb=part_size_mb, jobs=upload_jobs, name=baseline_name)
+    else:
+        asset = upload_to_release(token, release_id, zip_path, digest=digest, name=baseline_name)
+    if not asset:
+        return False
+    chain = {
+        'version': CHAIN_VERSION,
+        'digest': digest,
+        'pack': manifest.get('pack'),
+        'baseline': {'name': baseline_name, 'digest': digest, 'parts': part_size_mb > 0},
+        'deltas': [],
+        'files': published_files,
+    }
+    if not upload_chain(token, release_id, chain, digest):
+        return False
+    print_success(f"Đã publish baseline mới {digest[:12]}")
+    return True
+
+def update_workflow_file(release_tag, asset_name):
+    """Cập nhật workflow file với RELEASE_TAG và ASSET_NAME"""
+    workflow_path = Path(f".github/workflows/{WORKFLOW_FILE}")
+    
+    if not workflow_path.exists():
+        print_warning(f"Workflow file không tồn tại: {workflow_path}")
+        return False
+    
+    # Đọc file
+    with open(workflow_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    # Cập nhật RELEASE_TAG và ASSET_NAME
+    import re
+    content = re.sub(
+        r'RELEASE_TAG="[^"]*"',
+        f'RELEASE_TAG="{release_tag}"',
+        content
+    )
+    content = re.sub(
+        r'ASSET_NAME="[^"]*"',
+        f'ASSET_NAME="{asset_name}"',
+        content
+    )
+    
+    # Ghi lại file
+    with open(workflow_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    
+    print_success(f"Đã cập nhật workflow: RELEASE_TAG={release_tag}, ASSET_NAME={asset_name}")
+    return True
+
+def publish_zip_release(token, release, zip_path, jobs=None, part_size_mb=DEFAULT_PART_SIZE_MB,
+                        upload_jobs=DEFAULT_UPLOAD_JOBS, delta=False,
+                        baseline_every=DEFAULT_BASELINE_EVERY, policy=None, dedup=True):
+    """Upload ZIP vừa nén (1 file, chia part hoặc delta trên chain) dưới tên theo digest
+
+    Giữ lease của digest trong lúc upload: máy khác cùng digest đợi rồi dùng lại asset.
+    """
+    manifest = load_assets_manifest()
+    digest = manifest.get('digest') if manifest else None
+    if not digest:
+        print_error(f"Không đọc được digest từ {ASSETS_MANIFEST}!")
+        return False
+    root = published_asset_name('delta' if delta else 'zip', digest, part_size_mb)
+    if report_published(release, root, digest):
+        return True
+    
+    with publish_lease(token, release, digest) as release:
+        if report_published(release, root, digest):
+            return True
+        release_id = release['id']
+        if delta:
+            with span('publish_delta'):
+                return publish_delta_release(token, release, zip_path, manifest, jobs=jobs,
+                                             part_size_mb=part_size_mb, upload_jobs=upload_jobs,
+                                             baseline_every=baseline_every, policy=policy, dedup=dedup)
+        
+        # Upload file (có thể mất 5-15 phút)
+        print_info("💡 Tip: Upload file lớn có thể mất 5-15 phút, vui lòng đợi...")
+        asset_name = digest_asset_name(ASSETS_ZIP, digest)
+        with span('upload', mode='parts' if part_size_mb > 0 else 'single',
+                  bytes=os.path.getsize(zip_path)):
+            if part_size_mb > 0:
+                asset = upload_parts_to_release(token, release_id, zip_path, digest=digest,
+                                                part_size_mb=part_size_mb, jobs=upload_jobs, name=asset_name)
+            else:
+                asset = upload_to_release(token, release_id, zip_path, digest=digest, name=asset_name)
+        if not asset:
+            print_error("Upload thất bại! Kiểm tra:")
+            print_info("   1. Kết nối mạng có ổn định không?")
+            print_info("   2. File có quá lớn không? (GitHub giới hạn 2 GB, dùng --part-size để chia nhỏ)")
+            print_info("   3. GitHub Token có quyền 'repo' không?")
+            return False
+        
+        asset_name = asset['name']
+        
+        # Đợi một chút để đảm bảo file đã có trên Releases
+        print_info("Đợi 5 giây để đảm bảo file đã có trên Releases...")
+        time.sleep(5)
+        
+        # Kiểm tra file có thực sự trên Releases không
+        print_info("Kiểm tra file trên Releases...")
+        status, release_data = github_client(token).get_json(f"{API_BASE}/releases/{release_id}")
+        if status == 200:
+            assets = release_data.get('assets', [])
+            asset_found = any(a['name'] == asset_name for a in assets)
+            if asset_found:
+                print_success(f"Đã xác nhận file {asset_name} có trên Releases!")
+            else:
+                print_warning(f"File {asset_name} chưa thấy trên Releases, đợi thêm 10 giây...")
+                time.sleep(10)
+        return True
+
+def setup_releases(token, jobs=None, full_pack=False,
+                   part_size_mb=DEFAULT_PART_SIZE_MB, upload_jobs=DEFAULT_UPLOAD_JOBS,
+                   delta=False, baseline_every=DEFAULT_BASELINE_EVERY, stream=False,
+                   compression=DEFAULT_COMPRESSION, dedup=True, release_lookup=None, prune=None,
+                   chunked=False):
+    """Tự động setup GitHub Releases: Nén file, tạo Release, upload
+
+    `release_lookup` (hàm không tham số) trả về Release đã được tìm/tạo song song lúc đang nén.
+    `prune` (allow-list hoặc None) chỉ đóng gói file build cần theo project.pbxproj.
+    `chunked` publish dạng chunk store (chỉ upload chunk mới).
+    Mỗi máy chỉ 1 process nén + publish (assets_lock), mỗi digest chỉ 1 máy upload
+    (publish_lease); process đến sau đợi rồi dùng lại kết quả. Asset đặt tên theo digest,
+    CURRENT_ASSETS trỏ tới digest mới nhất.
+    """
+    print_step(0, "Tự động setup GitHub Releases...")
+    release_tag = RELEASE_TAG
+    release_lookup = release_lookup or (lambda: get_or_create_release(token, release_tag))
+    
+    try:
+        policy = load_compression_policy(compression)
+    except (OSError, ValueError, KeyError) as e:
+        print_error(f"Không đọc được policy nén {compression}: {e}")
+        return False
+    
+    mode = 'chunked' if chunked else 'stream' if stream else 'delta' if delta else 'zip'
+    with assets_lock() as waited:
+        if waited:
+            # Process trước có thể vừa publish xong: Release tìm song song từ trước đã cũ
+            release_lookup = lambda: get_or_create_release(token, release_tag)
+        
+        if chunked or stream:
+            with span('release_lookup'):
+                release = release_lookup()
+            if not release:
+                return False
+            if chunked:
+                ok = chunk_release_assets(token, release, jobs=jobs, full_pack=full_pack,
+                                          upload_jobs=upload_jobs, policy=policy, prune=prune)
+            else:
+                # Nén và upload đồng thời, không ghi ZIP xuống đĩa
+                ok = stream_release_assets(token, release, jobs=jobs, full_pack=full_pack,
+                                           part_size_mb=part_size_mb or STREAM_PART_SIZE_MB,
+                                           upload_jobs=upload_jobs, policy=policy, dedup=dedup, prune=prune)
+        else:
+            # Bước 1: Nén file
+            zip_path = compress_xcode_assets(jobs=jobs, full=full_pack, policy=policy, dedup=dedup, prune=prune)
+            if not zip_path:
+                print_error("Không thể nén file!")
+                return False
+            
+            # Bước 2: Tạo tag và Release (dùng tag cố định)
+            with span('release_lookup'):
+                release = release_lookup()
+            if not release:
+                return False
+            
+            # Bước 3: Upload (bỏ qua nếu Release đã có asset của digest này)
+            ok = publish_zip_release(token, release, zip_path, jobs=jobs, part_size_mb=part_size_mb,
+                                     upload_jobs=upload_jobs, delta=delta, baseline_every=baseline_every,
+                                     policy=policy, dedup=dedup)
+        if not ok:
+            return False
+        
+        digest = current_assets_digest()
+        root = published_asset_name(mode, digest, part_size_mb)
+        if not record_published_assets(token, release, digest, mode, root):
+            return False
     
     print_success("Đã setup GitHub Releases thành công!")
     return True
 
+_git_version = None
+
+def git_version():
+    """Phiên bản git dạng tuple, ví dụ (2, 39, 5); (0,) nếu không đọc được"""
+    global _git_version
+    if _git_version is None:
+        match = re.search(rb'(\d+)\.(\d+)(?:\.(\d+))?', run_git(['version'], check=False).stdout or b'')
+        _git_version = tuple(int(part) for part in match.groups() if part) if match else (0,)
+    return _git_version
+
+def git_status_options():
+    """Option -c cho git status: bật untracked cache, và fsmonitor có sẵn của git (macOS/Windows)
+
+    Repo đã tự cấu hình core.untrackedCache / core.fsmonitor thì giữ nguyên cấu hình đó.
+    """
+    result = run_git(['config', '--get-regexp', r'^core\.(untrackedcache|fsmonitor)$'], check=False)
+    configured = {line.split(b' ', 1)[0].lower() for line in (result.stdout or b'').splitlines()}
+    options = []
+    if b'core.untrackedcache' not in configured:
+        options += ['-c', 'core.untrackedCache=true']
+    if (b'core.fsmonitor' not in configured and sys.platform in ('darwin', 'win32')
+            and git_version() >= GIT_BUILTIN_FSMONITOR):
+        options += ['-c', 'core.fsmonitor=true']
+    return options
+
+def git_exclude_pathspecs(state_files=LOCAL_STATE_FILES):
+    """Pathspec :(exclude) cho file trạng thái của tool (kể cả file .tmp và nội dung thư mục)"""
+    pathspecs = []
+    for name in state_files:
+        pathspecs += [f':(exclude,glob){name}*', f':(exclude,glob){name}/**']
+    return pathspecs
+
+def git_changed_paths(state_files=LOCAL_STATE_FILES):
+    """Path đã đổi (staged, chưa staged, untracked) theo 1 lần `git status --porcelain=v2 -z`
+
+    File trạng thái của tool bị loại ngay trong pathspec nên git không quét tới.
+    """
+    result = run_git(['status', '--porcelain=v2', '-z', '--untracked-files=all', '--no-renames',
+                      '--', *git_exclude_pathspecs(state_files)], options=git_status_options())
+    paths = []
+    records = iter(result.stdout.split(b'\0'))
+    for record in records:
+        kind = record[:1]
+        if kind == b'1':
+            paths.append(record.split(b' ', 8)[8])
+        elif kind == b'2':
+            # Rename: path mới, rồi path cũ ở record kế tiếp
+            paths.append(record.split(b' ', 9)[9])
+            paths.append(next(records))
+        elif kind == b'u':
+            paths.append(record.split(b' ', 10)[10])
+        elif kind == b'?':
+            paths.append(record[2:])
+    return [os.fsdecode(path) for path in paths]
+
+def ensure_state_files_ignored(state_files=LOCAL_STATE_FILES):
+    """Thêm file trạng thái của tool chưa bị ignore vào .gitignore (1 lệnh check-ignore cho tất cả)"""
+    existing = [name for name in state_files if Path(name).exists()]
+    if not existing:
+        return
+    result = run_git(['check-ignore', '--no-index', '-z', '--stdin'], check=False,
+                     stdin=b''.join(os.fsencode(name) + b'\0' for name in existing))
+    if result.returncode > 1:
+        return
+    ignored = {os.fsdecode(path) for path in result.stdout.split(b'\0') if path}
+    missing = [name for name in existing if name not in ignored]
+    if not missing:
+        return
+    gitignore = Path('.gitignore')
+    content = gitignore.read_bytes() if gitignore.exists() else b''
+    with open(gitignore, 'ab') as f:
+        if content and not content.endswith(b'\n'):
+            f.write(b'\n')
+        f.write(''.join(f"{name}\n" for name in missing).encode('utf-8'))
+
+def git_commit_paths(paths, message, state_files=LOCAL_STATE_FILES):
+    """Stage đúng các path đã đổi rồi commit, trả về CompletedProcess của git commit
+
+    git >= 2.25: commit chỉ các path đó (file trạng thái lỡ bị staged không bị commit theo).
+    Path đã xóa dùng `git rm --cached`: path cũ của rename đã staged không còn trong index
+    nên `git add` sẽ báo pathspec không khớp.
+    """
+    literal = ['--literal-pathspecs']
+    removed = [path for path in paths if not os.path.lexists(path)]
+    for start in range(0, len(removed), GIT_ARGS_BATCH):
+        run_git(['rm', '-q', '-r', '--cached', '--ignore-unmatch', '--', *removed[start:start + GIT_ARGS_BATCH]],
+                options=literal)
+    present = [path for path in paths if os.path.lexists(path)]
+    if git_version() >= GIT_PATHSPEC_FROM_FILE:
+        from_file = ['--pathspec-from-file=-', '--pathspec-file-nul']
+        if present:
+            run_git(['add', '-A', *from_file], stdin=b'\0'.join(os.fsencode(path) for path in present),
+                    options=literal)
+        pathspec = b'\0'.join(os.fsencode(path) for path in paths)
+        return run_git(['commit', '-q', '-m', message, *from_file], check=False, stdin=pathspec, options=literal)
+    for start in range(0, len(present), GIT_ARGS_BATCH):
+        run_git(['add', '-A', '--', *present[start:start + GIT_ARGS_BATCH]], options=literal)
+    existing = [name for name in state_files if Path(name).exists()]
+    if existing:
+        run_git(['reset', '-q', 'HEAD', '--', *existing], check=False)
+    return run_git(['commit', '-q', '-m', message], check=False)
+
 def git_push(branch=BRANCH, force=False):
-    """Push code lên GitHub"""
+    """Push code lên GitHub (chỉ stage các path đã đổi, mỗi bước in thời gian)"""
     print_step(1, "Đẩy code lên GitHub...")
+    timings = []
     
-    # Đảm bảo file ZIP không bị add vào git
-    zip_path = Path(ASSETS_ZIP)
-    if zip_path.exists():
-        # Reset file ZIP nếu đã được staged
-        run_command(f'git reset HEAD {ASSETS_ZIP}', check=False)
-        # Đảm bảo file ZIP trong .gitignore
-        run_command(f'git check-ignore -q {ASSETS_ZIP} || echo "{ASSETS_ZIP}" >> .gitignore', check=False)
-    
-    # Kiểm tra có thay đổi không (loại trừ file ZIP)
-    status = run_command("git status --porcelain", capture_output=True)
-    
-    # Lọc bỏ file ZIP khỏi status
-    if status:
-        lines = status.split('\n')
-        filtered_lines = [line for line in lines if ASSETS_ZIP not in line]
-        status = '\n'.join(filtered_lines) if filtered_lines else None
-    
-    if not status:
-        print_info("Không có thay đổi để commit")
+    # Đảm bảo file ZIP (và các file trạng thái khác) không bị add vào git
+    start_time = time.time()
+    ensure_state_files_ignored()
+    paths = git_changed_paths()
+    timings.append(('status', time.time() - start_time))
+    
+    if not paths:
+        print_info(f"Không có thay đổi để commit (git status {timings[0][1]:.2f}s)")
         return False
-    else:
-        # Add và commit (không add file ZIP)
-        print_info("Đang commit thay đổi...")
-        run_command("git add -A")
-        # Reset file ZIP nếu vẫn bị add
-        run_command(f'git reset HEAD {ASSETS_ZIP}', check=False)
-        
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        commit_msg = f"Auto build IPA - {timestamp}"
-        run_command(f'git commit -m "{commit_msg}"', check=False)
+    
+    print_info(f"Đang commit {len(paths)} thay đổi...")
+    start_time = time.time()
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    result = git_commit_paths(paths, f"Auto build IPA - {timestamp}")
+    timings.append(('add + commit', time.time() - start_time))
+    if result.returncode != 0:
+        print_warning(f"git commit: {(result.stderr or result.stdout).decode('utf-8', 'replace').strip()}")
     
     # Push
     print_info(f"Đang push lên branch {branch}...")
-    push_cmd = f"git push origin {branch}"
-    if force:
-        push_cmd += " --force"
-    
-    run_command(push_cmd)
+    start_time = time.time()
+    run_git(['push', 'origin', branch] + (['--force'] if force else []), capture=False)
+    timings.append(('push', time.time() - start_time))
+    print_info("Git: " + " | ".join(f"{name} {seconds:.2f}s" for name, seconds in timings))
     print_success(f"Đã push code lên {branch}!")
     return True
 
 def get_workflow_id(token, workflow_file):
-    """Lấy workflow ID từ tên file"""
+    """Lấy workflow ID từ tên file (danh sách workflow được cache WORKFLOWS_CACHE_TTL giây)"""
     url = f"{API_BASE}/actions/workflows"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    api = github_client(token)
     
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        workflows = response.json().get('workflows', [])
+    # Lần 1 dùng cache; không thấy thì hỏi lại GitHub (workflow mới thêm)
+    for ttl in (WORKFLOWS_CACHE_TTL, None):
+        status, data = api.get_json(url, params={"per_page": 100}, ttl=ttl)
+        if status != 200:
+            continue
+        workflows = data.get('workflows', [])
         # Tìm workflow theo tên file
         for workflow in workflows:
             if workflow['path'].endswith(workflow_file) or workflow['name'] == workflow_file:
@@ -440,40 +3216,83 @@ def get_workflow_id(token, workflow_file):
     
     return None
 
-def trigger_workflow(token, build_config="Release"):
-    """Trigger GitHub Actions workflow"""
+def new_correlation_id(cache_key=None):
+    """ID ngẫu nhiên gắn vào lần trigger, workflow ghi nó vào tên run
+
+    Có cache_key thì ID bắt đầu bằng key để lần sau tìm lại được run đã build đúng nội dung này.
+    """
+    random_id = uuid.uuid4().hex[:16]
+    return f"{cache_key[:BUILD_CACHE_TAG_LENGTH]}-{random_id[:8]}" if cache_key else random_id
+
+def trigger_workflow(token, build_config="Release", correlation_id=None,
+                     workflow_file=WORKFLOW_FILE, branch=BRANCH, assets_digest=None):
+    """Trigger GitHub Actions workflow
+
+    Trả về dict {workflow, branch, correlation_id, dispatched_at, known_runs} để
+    find_workflow_run tìm đúng run vừa tạo, hoặc None nếu lỗi. correlation_id là
+    None khi workflow trên GitHub chưa khai báo input correlation_id (bản cũ);
+    khi đó known_runs là các run đã có trước lúc trigger. `assets_digest` ghim run vào
+    đúng bộ asset XCODE vừa publish (asset theo digest trên Release).
+    """
     print_step(2, f"Kích hoạt workflow build IPA (config: {build_config})...")
     
     # Lấy workflow ID
-    workflow_id = get_workflow_id(token, WORKFLOW_FILE)
+    workflow_id = get_workflow_id(token, workflow_file)
     
     if not workflow_id:
-        print_warning(f"Không tìm thấy workflow '{WORKFLOW_FILE}', thử dùng đường dẫn đầy đủ...")
+        print_warning(f"Không tìm thấy workflow '{workflow_file}', thử dùng đường dẫn đầy đủ...")
         # Thử dùng đường dẫn đầy đủ
-        workflow_path = f".github/workflows/{WORKFLOW_FILE}"
-        url = f"{API_BASE}/actions/workflows/{workflow_path}/dispatches"
+        workflow_ref = f".github/workflows/{workflow_file}"
     else:
         print_info(f"Tìm thấy workflow ID: {workflow_id}")
-        url = f"{API_BASE}/actions/workflows/{workflow_id}/dispatches"
+        workflow_ref = workflow_id
+    url = f"{API_BASE}/actions/workflows/{workflow_ref}/dispatches"
+    api = github_client(token)
     
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
+    inputs = {
+        "build_configuration": build_config
     }
+    if correlation_id:
+        inputs["correlation_id"] = correlation_id
+    if assets_digest:
+        inputs["assets_digest"] = assets_digest
     payload = {
-        "ref": BRANCH,
-        "inputs": {
-            "build_configuration": build_config
-        }
+        "ref": branch,
+        "inputs": inputs
     }
     
-    response = requests.post(url, headers=headers, json=payload)
+    dispatched_at = time.time()
+    known_runs = []
+    response = api.request('POST', url, json=payload)
+    
+    if response.status_code == 422 and assets_digest and 'assets_digest' in response.text:
+        # Workflow bản cũ: tự đọc digest hiện tại từ CURRENT_ASSETS trên Release
+        print_warning(f"Workflow chưa có input assets_digest, run dùng assets theo {CURRENT_ASSETS}")
+        del inputs["assets_digest"]
+        response = api.request('POST', url, json=payload)
+    
+    if response.status_code == 422 and correlation_id and 'correlation_id' in response.text:
+        # Workflow trên branch chưa có input correlation_id → trigger như cũ,
+        # nhớ các run đang có để không nhận nhầm run của người khác
+        print_warning("Workflow chưa có input correlation_id, tìm run theo thời gian trigger")
+        correlation_id = None
+        del inputs["correlation_id"]
+        status, data = api.get_json(f"{API_BASE}/actions/workflows/{workflow_ref}/runs",
+                                    params={"branch": branch, "per_page": 20})
+        if status == 200:
+            known_runs = [run['id'] for run in data.get('workflow_runs', [])]
+        dispatched_at = time.time()
+        response = api.request('POST', url, json=payload)
     
     if response.status_code == 204:
-        print_success("Đã kích hoạt workflow!")
-        # Đợi 3 giây để workflow được tạo
-        time.sleep(3)
-        return True
+        print_success("Đã kích hoạt workflow!" + (f" (ID: {correlation_id})" if correlation_id else ""))
+        return {
+            "workflow": workflow_ref,
+            "branch": branch,
+            "correlation_id": correlation_id,
+            "dispatched_at": dispatched_at,
+            "known_runs": known_runs,
+        }
     else:
         print_error(f"Lỗi khi trigger workflow: {response.status_code}")
         print_error(response.text)
@@ -482,177 +3301,1600 @@ def trigger_workflow(token, build_config="Release"):
         if response.status_code == 404:
             print_info("Đang liệt kê workflows có sẵn...")
             list_url = f"{API_BASE}/actions/workflows"
-            list_response = requests.get(list_url, headers=headers)
-            if list_response.status_code == 200:
-                workflows = list_response.json().get('workflows', [])
+            status, data = api.get_json(list_url)
+            if status == 200:
+                workflows = data.get('workflows', [])
                 print_info(f"Tìm thấy {len(workflows)} workflow(s):")
                 for wf in workflows:
                     print(f"   - {wf['name']} ({wf['path']})")
         
-        return False
+        return None
 
-def get_latest_workflow_run(token):
-    """Lấy workflow run mới nhất"""
-    # Lấy workflow ID
-    workflow_id = get_workflow_id(token, WORKFLOW_FILE)
-    
-    if workflow_id:
-        url = f"{API_BASE}/actions/workflows/{workflow_id}/runs"
-    else:
-        # Fallback: dùng đường dẫn đầy đủ
-        workflow_path = f".github/workflows/{WORKFLOW_FILE}"
-        url = f"{API_BASE}/actions/workflows/{workflow_path}/runs"
-    
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+def find_workflow_run(token, dispatch, timeout=RUN_LOOKUP_TIMEOUT):
+    """Tìm run của lần trigger `dispatch` (kết quả của trigger_workflow)
+
+    Poll nhanh (0.5s, 1s, 2s rồi 3s) cho tới khi run xuất hiện, tối đa `timeout` giây.
+    Có correlation_id thì khớp theo tên run nên không nhầm với run chạy song song;
+    không có thì lấy run workflow_dispatch mới đầu tiên tạo sau lúc trigger.
+    """
+    url = f"{API_BASE}/actions/workflows/{dispatch['workflow']}/runs"
+    api = github_client(token)
+    correlation_id = dispatch.get('correlation_id')
+    # Chừa lệch đồng hồ giữa máy local và GitHub
+    not_before = dispatch['dispatched_at'] - 60
     params = {
-        "branch": BRANCH,
-        "per_page": 1
+        "branch": dispatch.get('branch', BRANCH),
+        "event": "workflow_dispatch",
+        "created": ">=" + time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(not_before)),
+        "per_page": 20
     }
     
-    response = requests.get(url, headers=headers, params=params)
+    start_time = time.time()
+    interval = 0.5
+    while True:
+        status, data = api.get_json(url, params=params)
+        if status == 200:
+            runs = data.get('workflow_runs', [])
+            if correlation_id:
+                for run in runs:
+                    if correlation_id in (run.get('display_title') or run.get('name') or ''):
+                        return run
+            else:
+                known = set(dispatch.get('known_runs') or ())
+                fallback = [run for run in runs if run['id'] not in known
+                            and (parse_github_time(run.get('created_at')) or 0) >= dispatch['dispatched_at'] - 5]
+                if fallback:
+                    # Cũ nhất trong số run tạo sau lúc trigger
+                    return min(fallback, key=lambda run: run['created_at'])
+        if time.time() - start_time + interval > timeout:
+            return None
+        time.sleep(interval)
+        interval = min(interval * 2, RUN_LOOKUP_MAX_INTERVAL)
+
+# ============== THEO DÕI WORKFLOW RUN ==============
+
+def parse_github_time(value):
+    """Đổi timestamp ISO 8601 của GitHub ('2024-01-01T00:00:00Z') sang epoch giây"""
+    if not value:
+        return None
+    return calendar.timegm(time.strptime(value, "%Y-%m-%dT%H:%M:%SZ"))
+
+def load_build_history():
+    """Đọc lịch sử thời gian build, {} nếu chưa có"""
+    try:
+        with open(BUILD_HISTORY, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return history if isinstance(history, dict) else {}
+
+def record_build_history(run_data, jobs):
+    """Lưu thời gian từng step của 1 lần build thành công"""
+    steps = {}
+    for job in jobs:
+        for step in job.get('steps', []):
+            started = parse_github_time(step.get('started_at'))
+            completed = parse_github_time(step.get('completed_at'))
+            if started is not None and completed is not None:
+                steps[f"{job['name']}/{step['name']}"] = completed - started
+    started = parse_github_time(run_data.get('run_started_at'))
+    completed = parse_github_time(run_data.get('updated_at'))
+    history = load_build_history()
+    runs = history.get('runs', [])
+    runs.append({
+        'run_id': run_data['id'],
+        'duration': completed - started if started is not None and completed is not None else None,
+        'steps': steps,
+    })
+    history['runs'] = runs[-BUILD_HISTORY_RUNS:]
+    with open(BUILD_HISTORY, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=1)
+
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+def expected_step_durations(history):
+    """Thời gian trung vị của từng step ("job/step") và của cả run theo lịch sử"""
+    samples = {}
+    durations = []
+    for run in history.get('runs', []):
+        if run.get('duration'):
+            durations.append(run['duration'])
+        for key, seconds in run.get('steps', {}).items():
+            samples.setdefault(key, []).append(seconds)
+    return {key: _median(values) for key, values in samples.items()}, _median(durations)
+
+def next_poll_interval(remaining):
+    """Khoảng chờ tới lần poll sau theo thời gian ước lượng còn lại
+
+    Còn xa → poll thưa (tối đa MAX_POLL_INTERVAL), gần lúc dự kiến xong → poll dày.
+    Đã quá giờ dự kiến thì giãn dần ra để build bị chậm không tốn request.
+    """
+    if remaining is None:
+        return DEFAULT_POLL_INTERVAL
+    interval = remaining / 3 if remaining >= 0 else -remaining / 4
+    return min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, interval))
+
+class WebhookReceiver:
+    """Server HTTP local nhận webhook workflow_run/workflow_job của GitHub
+
+    Dùng với `gh webhook forward` hoặc tunnel bất kỳ trỏ về cổng này; mỗi event
+    của run đang theo dõi đánh thức vòng poll ngay thay vì đợi hết khoảng chờ.
+    `run_id` là 1 id hoặc tập id (build matrix); id của các run có event được gom
+    vào `woken`. Nếu đặt GITHUB_WEBHOOK_SECRET thì chữ ký X-Hub-Signature-256 được kiểm tra.
+    """
+
+    def __init__(self, port, run_id, wake, secret=None):
+        receiver = self
+        self.run_ids = set(run_id) if isinstance(run_id, (set, frozenset, list, tuple)) else {run_id}
+        self.wake = wake
+        self.secret = secret
+        self.events = 0
+        self.woken = set()
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if receiver.secret:
+                    expected = 'sha256=' + hmac.new(receiver.secret.encode('utf-8'), body,
+                                                    hashlib.sha256).hexdigest()
+                    if not hmac.compare_digest(expected, self.headers.get('X-Hub-Signature-256', '')):
+                        self.send_response(401)
+                        self.end_headers()
+                        return
+                try:
+                    payload = json.loads(body.decode('utf-8'))
+                except ValueError:
+                    payload = {}
+                run_id = (payload.get('workflow_run') or {}).get('id') or \
+                         (payload.get('workflow_job') or {}).get('run_id')
+                if run_id in receiver.run_ids:
+                    receiver.events += 1
+                    receiver.woken.add(run_id)
+                    receiver.wake.set()
+                self.send_response(204)
+                self.end_headers()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class RunTracker:
+    """Theo dõi 1 workflow run bằng request có điều kiện (ETag) và poll thích ứng
+
+    Request đi qua GitHubClient: response 304 Not Modified không tốn rate limit,
+    payload lần trước được dùng lại. Số request/304 được đếm để in thống kê khi xong.
+    """
+
+    def __init__(self, token, run_id, history=None):
+        self.run_id = run_id
+        self.api = github_client(token)
+        self.requests = 0
+        self.not_modified = 0
+        self.run_data = None
+        self.jobs = []
+        self.step_history, self.run_history = expected_step_durations(history or {})
+
+    def get(self, url, params=None):
+        """GET có If-None-Match; trả về JSON (mới hoặc bản cache khi 304)"""
+        status, payload, source = self.api.get_json(url, params=params, with_source=True)
+        self.requests += 1
+        self.not_modified += source == 'etag'
+        if status != 200:
+            raise RuntimeError(f"{status} {url}")
+        return payload
+
+    def fetch_run(self):
+        return self.get(f"{API_BASE}/actions/runs/{self.run_id}")
+
+    def fetch_jobs(self):
+        return self.get(f"{API_BASE}/actions/runs/{self.run_id}/jobs",
+                        params={"per_page": 100}).get('jobs', [])
+    
+    def poll(self):
+        """1 lượt kiểm tra, trả về status của run (run_data/jobs mới nhất lưu trong tracker)"""
+        # Khi job đang chạy chỉ cần endpoint jobs; run được đọc lại lúc
+        # còn queued hoặc mọi job đã xong (để lấy conclusion)
+        jobs = self.fetch_jobs() if self.run_data is not None else []
+        if self.run_data is None or not jobs or all(job.get('status') == 'completed' for job in jobs):
+            self.run_data = self.fetch_run()
+            status = self.run_data['status']
+        else:
+            status = 'in_progress'
+        self.jobs = jobs
+        return status
+
+    def estimate_remaining(self, run_data, jobs, now=None):
+        """Số giây ước lượng còn lại (âm nếu đã quá giờ), None nếu chưa có lịch sử"""
+        now = now or time.time()
+        if not self.step_history:
+            if not self.run_history or not run_data.get('run_started_at'):
+                return None
+            return self.run_history - (now - parse_github_time(run_data['run_started_at']))
+        remaining = 0
+        known = False
+        for job in jobs:
+            if job.get('status') == 'completed':
+                continue
+            for step in job.get('steps', []):
+                expected = self.step_history.get(f"{job['name']}/{step['name']}")
+                if expected is None or step.get('status') == 'completed':
+                    continue
+                known = True
+                started = parse_github_time(step.get('started_at'))
+                if step.get('status') == 'in_progress' and started is not None:
+                    remaining += expected - (now - started)
+                else:
+                    remaining += expected
+        if not known:
+            # Job còn queued (chưa có danh sách step) → dùng thời gian cả run
+            if self.run_history and run_data.get('run_started_at'):
+                return self.run_history - (now - parse_github_time(run_data['run_started_at']))
+            return None
+        return remaining
+
+def current_step(jobs):
+    """(job, step, số thứ tự, tổng số step) của step đang chạy, None nếu không có"""
+    for job in jobs:
+        steps = job.get('steps', [])
+        for index, step in enumerate(steps, 1):
+            if step.get('status') == 'in_progress':
+                return job, step, index, len(steps)
+    return None
+
+def wait_for_workflow_completion(token, run_id, timeout=3600, webhook_port=None):
+    """Đợi workflow hoàn thành
+
+    Khoảng poll co giãn theo thời gian các step ở những lần build trước; request
+    dùng ETag nên lần poll không có gì mới chỉ nhận 304. Với webhook_port, event
+    từ GitHub đánh thức vòng poll ngay lập tức.
+    """
+    print_step(3, "Đang đợi workflow build xong...")
+    
+    tracker = RunTracker(token, run_id, load_build_history())
+    wake = threading.Event()
+    receiver = None
+    if webhook_port is not None:
+        receiver = WebhookReceiver(webhook_port, run_id, wake,
+                                   secret=os.environ.get('GITHUB_WEBHOOK_SECRET'))
+        print_info(f"Đang nhận webhook tại http://127.0.0.1:{receiver.port}/ "
+                   f"(ví dụ: gh webhook forward --events=workflow_run,workflow_job "
+                   f"--url=http://127.0.0.1:{receiver.port}/)")
+    
+    start_time = time.time()
+    last_status = None
+    last_step = None
+    
+    try:
+        while True:
+            if time.time() - start_time > timeout:
+                print_error(f"Timeout sau {timeout}s!")
+                return False
+            
+            try:
+                status = tracker.poll()
+            except (RuntimeError, requests.exceptions.RequestException) as e:
+                print_error(f"Lỗi khi check status: {e}")
+                return False
+            run_data, jobs = tracker.run_data, tracker.jobs
+            conclusion = run_data.get('conclusion')
+            
+            # In progress nếu status thay đổi
+            if status != last_status:
+                elapsed = int(time.time() - start_time)
+                print_info(f"Status: {status} | Đã chạy: {elapsed}s | URL: {run_data['html_url']}")
+                last_status = status
+            
+            running = current_step(jobs)
+            if running:
+                job, step, index, total = running
+                key = f"{job['name']}/{step['name']}"
+                if key != last_step:
+                    expected = tracker.step_history.get(key)
+                    hint = f" (lần trước ~{int(expected)}s)" if expected else ""
+                    print_info(f"   ▶ {job['name']}: bước {index}/{total} '{step['name']}'{hint}")
+                    last_step = key
+            
+            if status == 'completed':
+                print_info(f"Theo dõi: {tracker.requests} request ({tracker.not_modified} trả 304)"
+                           + (f", {receiver.events} webhook" if receiver else ""))
+                try:
+                    jobs = tracker.fetch_jobs()
+                except (RuntimeError, requests.exceptions.RequestException):
+                    pass
+                record_ci_spans(run_data, jobs)
+                if conclusion == 'success':
+                    print_success(f"Build thành công! (Thời gian: {int(time.time() - start_time)}s)")
+                    try:
+                        record_build_history(run_data, jobs)
+                    except OSError:
+                        pass
+                    return True
+                else:
+                    print_error(f"Build thất bại! Conclusion: {conclusion}")
+                    print_error(f"Chi tiết: {run_data['html_url']}")
+                    return False
+            
+            interval = next_poll_interval(tracker.estimate_remaining(run_data, jobs))
+            if receiver:
+                # Webhook báo thay đổi → poll chỉ là lưới an toàn
+                interval = MAX_POLL_INTERVAL
+            wake.wait(interval)
+            wake.clear()
+    finally:
+        if receiver:
+            receiver.close()
+
+def list_artifacts(token, run_id):
+    """Liệt kê artifacts của workflow run"""
+    url = f"{API_BASE}/actions/runs/{run_id}/artifacts"
+    
+    status, data = github_client(token).get_json(url)
+    
+    if status == 200:
+        return data['artifacts']
+    
+    return []
+
+# ============== DOWNLOAD ARTIFACT ==============
+
+_blob_sessions = threading.local()
+
+def _blob_session():
+    """Session keep-alive không kèm token GitHub (URL blob đã được ký sẵn)"""
+    session = getattr(_blob_sessions, 'session', None)
+    if session is None:
+        session = requests.Session()
+        _blob_sessions.session = session
+    return session
+
+def resolve_artifact_url(token, artifact_id):
+    """URL blob của artifact (GitHub redirect, hết hạn sau ~1 phút)
+
+    Trả về (url, cần gửi token): server không redirect thì tải thẳng từ API.
+    """
+    url = f"{API_BASE}/actions/artifacts/{artifact_id}/zip"
+    response = github_client(token).request('GET', url, allow_redirects=False, stream=True)
+    response.close()
+    if response.status_code in (301, 302, 303, 307, 308):
+        return response.headers['Location'], False
+    if response.status_code == 200:
+        return url, True
+    raise RuntimeError(f"HTTP {response.status_code} khi lấy URL artifact {artifact_id}")
+
+def _blob_get(source, headers):
+    """GET (stream) tới URL blob hiện tại của `source`"""
+    if source['auth']:
+        return github_client(source['token']).request('GET', source['url'], headers=headers,
+                                                      stream=True)
+    return _blob_session().get(source['url'], headers=headers, stream=True, timeout=API_TIMEOUT)
+
+def _refresh_source(source, stale_url):
+    """Lấy URL blob mới khi URL cũ hết hạn (chỉ 1 thread làm)"""
+    with source['lock']:
+        if source['url'] == stale_url:
+            source['url'], source['auth'] = resolve_artifact_url(source['token'], source['artifact_id'])
+
+def open_artifact_source(token, artifact_id):
+    """Lấy URL blob và thử Range 1 byte: trả về (source, dung lượng ZIP, server hỗ trợ Range)"""
+    source = {'token': token, 'artifact_id': artifact_id, 'lock': threading.Lock()}
+    source['url'], source['auth'] = resolve_artifact_url(token, artifact_id)
+    for attempt in range(DOWNLOAD_RETRIES):
+        response = _blob_get(source, {'Range': 'bytes=0-0'})
+        response.close()
+        if response.status_code not in (401, 403):
+            break
+        _refresh_source(source, source['url'])
+    if response.status_code == 206:
+        return source, int(response.headers['Content-Range'].rsplit('/', 1)[1]), True
+    if response.status_code == 200:
+        return source, int(response.headers.get('Content-Length') or 0), False
+    raise RuntimeError(f"HTTP {response.status_code} khi tải artifact {artifact_id}")
+
+def read_blob_range(source, start, end):
+    """Đọc [start, end] của blob vào bộ nhớ (dùng cho header/central directory nhỏ)"""
+    last_error = None
+    for attempt in range(DOWNLOAD_RETRIES):
+        url = source['url']
+        response = _blob_get(source, {'Range': f'bytes={start}-{end}'})
+        try:
+            if response.status_code == 206:
+                data = response.content
+                if len(data) == end - start + 1:
+                    return data
+                last_error = f"thiếu dữ liệu ({len(data)}/{end - start + 1} bytes)"
+            elif response.status_code in (401, 403):
+                _refresh_source(source, url)
+                last_error = f"URL hết hạn (HTTP {response.status_code})"
+            else:
+                last_error = f"HTTP {response.status_code}"
+        finally:
+            response.close()
+    raise RuntimeError(f"Không đọc được byte {start}-{end} của artifact {source['artifact_id']}: {last_error}")
+
+def fetch_blob_window(source, part_path, state_path, base, length, ranged=True,
+                      jobs=DOWNLOAD_JOBS, progress=True):
+    """Tải [base, base + length) của blob vào part_path bằng nhiều đoạn Range song song
+
+    Đoạn đã xong ghi vào state_path nên lần chạy sau chỉ tải tiếp phần còn thiếu.
+    Server không hỗ trợ Range thì tải 1 luồng. Trả về (số byte đã tải, số đoạn).
+    """
+    segment_size = DOWNLOAD_SEGMENT_MB * 1024 * 1024
+    lock = threading.Lock()
+    artifact_id = source['artifact_id']
+    
+    done = set()
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if (state.get('artifact_id') == artifact_id and state.get('offset', 0) == base
+                and state.get('size') == length and state.get('segment_size') == segment_size
+                and ranged and part_path.exists() and part_path.stat().st_size == length):
+            done = set(state.get('done', []))
+    except (OSError, ValueError):
+        pass
+    if not done:
+        with open(part_path, 'wb') as f:
+            f.truncate(length)
+    
+    state = {'artifact_id': artifact_id, 'offset': base, 'size': length,
+             'segment_size': segment_size, 'done': sorted(done)}
+    segments = [(index, offset, min(offset + segment_size, length) - 1)
+                for index, offset in enumerate(range(0, length, segment_size))]
+    todo = [segment for segment in segments if segment[0] not in done]
+    downloaded = [0]
+    completed = [length - sum(end - offset + 1 for _, offset, end in todo)]
+    if done and progress:
+        print_info(f"   Resume: đã có {completed[0] / (1024*1024):.2f}/{length / (1024*1024):.2f} MB")
+    
+    def fetch(offset, end):
+        """Tải [offset, end] (tính từ base) vào file .part, trả về số byte đã ghi"""
+        url = source['url']
+        headers = {'Range': f'bytes={base + offset}-{base + end}'} if ranged else {}
+        response = _blob_get(source, headers)
+        try:
+            if response.status_code in (401, 403):
+                _refresh_source(source, url)
+                raise RuntimeError(f"URL hết hạn (HTTP {response.status_code})")
+            if response.status_code != (206 if ranged else 200):
+                raise RuntimeError(f"HTTP {response.status_code}")
+            written = 0
+            with open(part_path, 'r+b') as f:
+                f.seek(offset)
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_BUFFER):
+                    f.write(chunk)
+                    written += len(chunk)
+                    with lock:
+                        downloaded[0] += len(chunk)
+            return written
+        finally:
+            response.close()
+    
+    def fetch_segment(segment):
+        index, offset, end = segment
+        last_error = None
+        for attempt in range(1, DOWNLOAD_RETRIES + 1):
+            try:
+                written = fetch(offset, end)
+                if length and written != end - offset + 1:
+                    raise RuntimeError(f"thiếu dữ liệu ({written}/{end - offset + 1} bytes)")
+                break
+            except (RuntimeError, requests.exceptions.RequestException) as e:
+                last_error = e
+                if attempt < DOWNLOAD_RETRIES:
+                    time.sleep(2 ** attempt)
+        else:
+            raise RuntimeError(f"Đoạn {index} của artifact {artifact_id}: {last_error}")
+        with lock:
+            done.add(index)
+            state['done'] = sorted(done)
+            completed[0] += end - offset + 1
+            with open(state_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            if progress and length:
+                print(f"\r   Đang tải: {completed[0] / length * 100:.1f}% "
+                      f"({completed[0]}/{length} bytes)", end='')
+    
+    if not ranged:
+        fetch_segment((0, 0, length - 1))
+    elif todo:
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(todo)))) as pool:
+            for future in [pool.submit(fetch_segment, segment) for segment in todo]:
+                future.result()
+    if progress:
+        print()  # New line
+    return downloaded[0], len(segments)
+
+def _discard_download(part_path, state_path):
+    """Xóa file .part và state khi dữ liệu tải về bị sai"""
+    for path in (part_path, state_path):
+        if path.exists():
+            path.unlink()
+
+def fetch_artifact_zip(token, artifact_id, dest_path, digest=None, jobs=DOWNLOAD_JOBS, progress=True):
+    """Tải ZIP của artifact về dest_path bằng nhiều đoạn Range song song
+
+    Dữ liệu ghi vào `<dest>.part`, đoạn đã xong ghi vào `<dest>.part.json` nên lần
+    chạy sau chỉ tải tiếp phần còn thiếu. Server không hỗ trợ Range thì tải 1 luồng.
+    Kiểm tra digest ("sha256:...") nếu có, không thì kiểm tra CRC của ZIP.
+    Trả về dict thống kê: bytes, downloaded, seconds, segments; raise RuntimeError nếu lỗi.
+    """
+    dest_path = Path(dest_path)
+    part_path = dest_path.with_name(dest_path.name + '.part')
+    state_path = dest_path.with_name(dest_path.name + '.part.json')
+    start_time = time.time()
     
-    if response.status_code == 200:
-        data = response.json()
-        if data['workflow_runs']:
-            return data['workflow_runs'][0]
+    source, total, ranged = open_artifact_source(token, artifact_id)
+    with span('download', artifact=artifact_id, mode='zip') as record:
+        downloaded, segments = fetch_blob_window(source, part_path, state_path, 0, total, ranged,
+                                                 jobs=jobs, progress=progress)
+        record.update(bytes=downloaded, segments=segments)
     
-    return None
+    # Kiểm tra toàn vẹn trước khi đổi tên file .part
+    with span('verify', artifact=artifact_id, bytes=total):
+        if digest and digest.startswith('sha256:'):
+            actual = hash_file(part_path)
+            if actual != digest.split(':', 1)[1]:
+                _discard_download(part_path, state_path)
+                raise RuntimeError(f"Sai digest artifact {artifact_id}: {actual[:12]}")
+        else:
+            with zipfile.ZipFile(part_path) as zip_ref:
+                bad = zip_ref.testzip()
+            if bad:
+                _discard_download(part_path, state_path)
+                raise RuntimeError(f"Artifact {artifact_id} bị hỏng (CRC sai ở {bad})")
+    os.replace(part_path, dest_path)
+    if state_path.exists():
+        state_path.unlink()
+    return {
+        'bytes': total,
+        'downloaded': downloaded,
+        'seconds': time.time() - start_time,
+        'segments': segments,
+    }
 
-def wait_for_workflow_completion(token, run_id, timeout=3600):
-    """Đợi workflow hoàn thành"""
-    print_step(3, "Đang đợi workflow build xong...")
+class _TailFile:
+    """File-like chỉ có phần cuối của ZIP trên server, đủ để zipfile đọc central directory"""
     
-    url = f"{API_BASE}/actions/runs/{run_id}"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    def __init__(self, tail, total):
+        self.tail = tail
+        self.start = total - len(tail)
+        self.total = total
+        self.pos = 0
     
-    start_time = time.time()
-    last_status = None
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.total
+        self.pos = offset
+        return self.pos
     
-    while True:
-        if time.time() - start_time > timeout:
-            print_error(f"Timeout sau {timeout}s!")
-            return False
-        
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code != 200:
-            print_error(f"Lỗi khi check status: {response.status_code}")
-            return False
-        
-        run_data = response.json()
-        status = run_data['status']
-        conclusion = run_data.get('conclusion')
-        
-        # In progress nếu status thay đổi
-        if status != last_status:
-            elapsed = int(time.time() - start_time)
-            print_info(f"Status: {status} | Đã chạy: {elapsed}s | URL: {run_data['html_url']}")
-            last_status = status
-        
-        if status == 'completed':
-            if conclusion == 'success':
-                print_success(f"Build thành công! (Thời gian: {int(time.time() - start_time)}s)")
-                return True
-            else:
-                print_error(f"Build thất bại! Conclusion: {conclusion}")
-                print_error(f"Chi tiết: {run_data['html_url']}")
-                return False
-        
-        # Đợi 10s trước khi check lại
-        time.sleep(10)
+    def tell(self):
+        return self.pos
+    
+    def read(self, size=-1):
+        if self.pos < self.start:
+            raise OSError("central directory nằm ngoài phần cuối đã tải")
+        begin = self.pos - self.start
+        data = self.tail[begin:] if size < 0 else self.tail[begin:begin + size]
+        self.pos += len(data)
+        return data
 
-def list_artifacts(token, run_id):
-    """Liệt kê artifacts của workflow run"""
-    url = f"{API_BASE}/actions/runs/{run_id}/artifacts"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+def locate_stored_member(source, total):
+    """Tìm member duy nhất được lưu nguyên (STORE) trong ZIP trên server
+
+    Đọc central directory bằng Range ở cuối blob và local header của member, không tải
+    dữ liệu. Trả về (zinfo, vị trí byte đầu của dữ liệu) hoặc None nếu ZIP không phải
+    đúng 1 file STORE.
+    """
+    tail_start = max(0, total - ZIP_TAIL_BYTES)
+    tail = read_blob_range(source, tail_start, total - 1)
+    try:
+        with zipfile.ZipFile(_TailFile(tail, total)) as zip_ref:
+            members = [info for info in zip_ref.infolist() if not info.is_dir()]
+    except (OSError, zipfile.BadZipFile):
+        return None
+    if len(members) != 1 or members[0].compress_type != zipfile.ZIP_STORED:
+        return None
+    info = members[0]
+    header = read_blob_range(source, info.header_offset, info.header_offset + 29)
+    signature, name_length, extra_length = struct.unpack('<4s22xHH', header)
+    if signature != b'PK\x03\x04':
+        return None
+    return info, info.header_offset + 30 + name_length + extra_length
+
+def fetch_artifact_member(token, artifact_id, dest_path, digest=None, jobs=DOWNLOAD_JOBS, progress=True):
+    """Tải thẳng file bên trong artifact (ZIP 1 file STORE) về dest_path, không lưu ZIP
+
+    Chỉ tải các byte dữ liệu của member bằng Range song song vào `<dest>.part` (resume
+    được như fetch_artifact_zip), rồi kiểm tra CRC32 của member và digest của cả ZIP
+    (ghép header + dữ liệu + central directory) trong 1 lượt đọc.
+    Trả về dict thống kê như fetch_artifact_zip, hoặc None nếu artifact không hợp
+    (server không hỗ trợ Range, member bị nén, nhiều file) để gọi fetch_artifact_zip.
+    """
+    dest_path = Path(dest_path)
+    part_path = dest_path.with_name(dest_path.name + '.part')
+    state_path = dest_path.with_name(dest_path.name + '.part.json')
+    start_time = time.time()
     
-    response = requests.get(url, headers=headers)
+    source, total, ranged = open_artifact_source(token, artifact_id)
+    if not ranged:
+        return None
+    located = locate_stored_member(source, total)
+    if not located:
+        return None
+    info, data_start = located
+    data_end = data_start + info.compress_size
+    head = read_blob_range(source, 0, data_start - 1)
+    tail = read_blob_range(source, data_end, total - 1) if data_end < total else b''
     
-    if response.status_code == 200:
-        return response.json()['artifacts']
+    with span('download', artifact=artifact_id, mode='member') as record:
+        downloaded, segments = fetch_blob_window(source, part_path, state_path, data_start, info.file_size,
+                                                 jobs=jobs, progress=progress)
+        record.update(bytes=downloaded, segments=segments)
     
-    return []
+    # CRC32 của member và sha256 của cả ZIP trong cùng 1 lượt đọc
+    with span('verify', artifact=artifact_id, bytes=info.file_size):
+        crc = 0
+        sha = hashlib.sha256(head)
+        with open(part_path, 'rb') as f:
+            while True:
+                block = f.read(DOWNLOAD_BUFFER)
+                if not block:
+                    break
+                crc = zlib.crc32(block, crc)
+                sha.update(block)
+        sha.update(tail)
+    if crc != info.CRC:
+        _discard_download(part_path, state_path)
+        raise RuntimeError(f"Artifact {artifact_id} bị hỏng (CRC sai ở {info.filename})")
+    if digest and digest.startswith('sha256:') and sha.hexdigest() != digest.split(':', 1)[1]:
+        _discard_download(part_path, state_path)
+        raise RuntimeError(f"Sai digest artifact {artifact_id}: {sha.hexdigest()[:12]}")
+    os.replace(part_path, dest_path)
+    if state_path.exists():
+        state_path.unlink()
+    return {
+        'bytes': info.file_size,
+        'downloaded': downloaded + len(head) + len(tail),
+        'seconds': time.time() - start_time,
+        'segments': segments,
+    }
 
-def download_artifact(token, artifact_id, artifact_name, output_dir):
-    """Download artifact từ GitHub"""
+def download_artifact(token, artifact_id, artifact_name, output_dir, digest=None,
+                      jobs=DOWNLOAD_JOBS, progress=True):
+    """Download artifact từ GitHub (Range song song, resume được)
+
+    Artifact `.ipa` (ZIP 1 file STORE do workflow upload với compression-level 0) được tải
+    thẳng ra file IPA; artifact khác, hoặc khi không tải thẳng được, thì tải ZIP rồi giải nén.
+    """
     print_step(4, f"Đang tải file {artifact_name}...")
     
     # Tạo thư mục output
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
-    # Download artifact (ZIP format)
-    url = f"{API_BASE}/actions/artifacts/{artifact_id}/zip"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    try:
+        if artifact_name.endswith('.ipa'):
+            final_ipa = output_path / artifact_name
+            stats = fetch_artifact_member(token, artifact_id, final_ipa, digest=digest, jobs=jobs,
+                                          progress=progress)
+            if stats:
+                speed = stats['downloaded'] / (1024 * 1024) / stats['seconds'] if stats['seconds'] > 0 else 0
+                print_info(f"{artifact_name}: {stats['bytes'] / (1024*1024):.2f} MB | {stats['segments']} đoạn | "
+                           f"{stats['seconds']:.1f}s | {speed:.2f} MB/s (tải thẳng, không lưu ZIP)")
+                print_success(f"File IPA: {final_ipa}")
+                return str(final_ipa)
+            print_info("Artifact không phải ZIP 1 file STORE, tải ZIP rồi giải nén")
+        
+        # Download artifact (ZIP format)
+        zip_file = output_path / f"{artifact_name}.zip"
+        stats = fetch_artifact_zip(token, artifact_id, zip_file, digest=digest, jobs=jobs,
+                                   progress=progress)
+    except (RuntimeError, OSError, zipfile.BadZipFile, requests.exceptions.RequestException) as e:
+        print_error(f"Lỗi khi tải artifact: {e}")
+        print_info("💡 Chạy lại để tải tiếp phần còn thiếu")
+        return None
     
-    response = requests.get(url, headers=headers, stream=True, allow_redirects=True)
+    speed = stats['downloaded'] / (1024 * 1024) / stats['seconds'] if stats['seconds'] > 0 else 0
+    print_info(f"{artifact_name}: {stats['bytes'] / (1024*1024):.2f} MB | {stats['segments']} đoạn | "
+               f"{stats['seconds']:.1f}s | {speed:.2f} MB/s")
+    print_success(f"Đã tải về: {zip_file}")
     
-    if response.status_code == 200:
-        # Lưu file
-        zip_file = output_path / f"{artifact_name}.zip"
-        
-        with open(zip_file, 'wb') as f:
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
+    # Giải nén nếu cần
+    if artifact_name.endswith('.ipa'):
+        # Artifact là .ipa nhưng GitHub wrap trong ZIP
+        # Giải nén để lấy file IPA
+        try:
+            with span('extract', artifact=artifact_id) as record, zipfile.ZipFile(zip_file, 'r') as zip_ref:
+                # Lấy tên file đầu tiên trong zip
+                file_list = zip_ref.namelist()
+                record['bytes'] = sum(info.file_size for info in zip_ref.infolist())
+                if file_list:
+                    ipa_file = file_list[0]
+                    zip_ref.extract(ipa_file, output_path)
                     
-                    if total_size > 0:
-                        percent = (downloaded / total_size) * 100
-                        print(f"\r   Đang tải: {percent:.1f}% ({downloaded}/{total_size} bytes)", end='')
-        
-        print()  # New line
-        print_success(f"Đã tải về: {zip_file}")
-        
-        # Giải nén nếu cần
-        if artifact_name.endswith('.ipa'):
-            # Artifact là .ipa nhưng GitHub wrap trong ZIP
-            # Giải nén để lấy file IPA
+                    # Đổi tên nếu cần
+                    extracted_path = output_path / ipa_file
+                    final_ipa = output_path / artifact_name
+                    
+                    if extracted_path != final_ipa:
+                        extracted_path.rename(final_ipa)
+                    
+                    print_success(f"File IPA: {final_ipa}")
+                    
+                    # Xóa file ZIP
+                    zip_file.unlink()
+                    
+                    return str(final_ipa)
+        except Exception as e:
+            print_warning(f"Không thể giải nén: {e}")
+            print_info(f"File ZIP vẫn có tại: {zip_file}")
+    
+    return str(zip_file)
+
+def download_artifacts(token, artifacts, output_dir, jobs=DOWNLOAD_JOBS, progress=None):
+    """Tải nhiều artifact cùng lúc, trả về list đường dẫn theo đúng thứ tự artifacts"""
+    if not artifacts:
+        return []
+    # Nhiều artifact thì tắt progress từng file để output không bị chồng lên nhau
+    if progress is None:
+        progress = len(artifacts) == 1
+    with ThreadPoolExecutor(max_workers=min(ARTIFACT_JOBS, len(artifacts))) as pool:
+        futures = [pool.submit(download_artifact, token, artifact['id'], artifact['name'], output_dir,
+                               artifact.get('digest'), jobs, progress)
+                   for artifact in artifacts]
+        return [future.result() for future in futures]
+
+# ============== CACHE IPA ==============
+
+def build_cache_key(commit, config, assets_digest, workflow_file=WORKFLOW_FILE):
+    """Key cache của 1 bản build: sha256(commit, config, digest assets XCODE, file workflow)"""
+    raw = "\0".join([BUILD_CACHE_VERSION, commit, config, assets_digest, workflow_file])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def resolve_branch_commit(token, branch=BRANCH):
+    """SHA commit đầu branch trên GitHub (đúng commit mà workflow_dispatch sẽ build)"""
+    status, data = github_client(token).get_json(f"{API_BASE}/branches/{branch}")
+    if status == 200:
+        return data['commit']['sha']
+    return None
+
+def current_assets_digest():
+    """Digest nội dung XCODE của lần publish gần nhất (theo manifest), None nếu chưa có"""
+    manifest = load_assets_manifest()
+    return manifest.get('digest') if manifest else None
+
+def release_assets_digest(token, tag_name):
+    """Digest assets hiện tại trên Release (theo CURRENT_ASSETS), None nếu chưa có
+
+    Dùng khi --skip-releases: máy khác có thể đã publish, manifest trên máy này không còn đúng.
+    """
+    status, release = github_client(token).get_json(f"{API_BASE}/releases/tags/{tag_name}")
+    if status != 200:
+        return None
+    pointer = load_current_assets(token, release)
+    return pointer.get('digest') if pointer else None
+
+def _link_or_copy(src, dst):
+    """Hard link src → dst (cùng ổ đĩa thì không tốn dung lượng), không được thì copy"""
+    dst = Path(dst)
+    tmp = dst.with_name(dst.name + '.tmp')
+    if tmp.exists():
+        tmp.unlink()
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+class BuildCache:
+    """Cache IPA đã build trên máy, lưu theo nội dung
+
+    objects/<sha256>.ipa chứa file IPA (nhiều key cùng nội dung chỉ lưu 1 bản),
+    index.json map key → {object, size, last_used, commit, config, run_id}. Tổng
+    dung lượng vượt `max_bytes` thì xóa bớt object dùng lâu nhất (LRU).
+    """
+
+    def __init__(self, root=BUILD_CACHE_DIR, max_bytes=BUILD_CACHE_MAX_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.objects = self.root / 'objects'
+        self.index_path = self.root / 'index.json'
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def _save(self, index):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_name(self.index_path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, self.index_path)
+
+    def get(self, key):
+        """(đường dẫn object IPA, entry) của key và cập nhật last_used; (None, None) nếu không có"""
+        with self.lock:
+            index = self._load()
+            entry = index.get(key)
+            if not entry:
+                return None, None
+            path = self.objects / entry['object']
+            if not path.exists() or path.stat().st_size != entry['size']:
+                del index[key]
+                self._save(index)
+                return None, None
+            entry['last_used'] = time.time()
+            self._save(index)
+            return path, entry
+
+    def put(self, key, ipa_path, **meta):
+        """Lưu IPA vào cache dưới key, trả về đường dẫn object"""
+        sha = hash_file(ipa_path)
+        size = os.path.getsize(ipa_path)
+        with self.lock:
+            self.objects.mkdir(parents=True, exist_ok=True)
+            path = self.objects / f"{sha}.ipa"
+            if not path.exists():
+                _link_or_copy(ipa_path, path)
+            index = self._load()
+            entry = dict(meta, object=path.name, name=Path(ipa_path).name, size=size,
+                         last_used=time.time())
+            entry.setdefault('created', entry['last_used'])
+            index[key] = entry
+            self._evict(index)
+            self._save(index)
+        return path
+
+    def _evict(self, index):
+        """Xóa object dùng lâu nhất tới khi tổng dung lượng <= max_bytes"""
+        objects = {}
+        for key, entry in index.items():
+            last = objects.get(entry['object'])
+            objects[entry['object']] = (max(entry['last_used'], last[0]) if last else entry['last_used'],
+                                        entry['size'])
+        total = sum(size for _, size in objects.values())
+        for name, (last_used, size) in sorted(objects.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            for key in [key for key, entry in index.items() if entry['object'] == name]:
+                del index[key]
+            path = self.objects / name
+            if path.exists():
+                path.unlink()
+            total -= size
+            print_info(f"Cache IPA: xóa {name[:12]} ({size / (1024*1024):.2f} MB, LRU)")
+
+def find_cached_run(token, cache_key, commit, workflow_file=WORKFLOW_FILE, branch=BRANCH):
+    """Tìm run thành công gần đây đã build đúng cache_key và còn artifact IPA
+
+    Key nằm trong correlation id (tên run) nên chỉ cần 1 request list run theo
+    head_sha. Trả về (run, artifacts) hoặc (None, []).
+    """
+    workflow_ref = get_workflow_id(token, workflow_file) or f".github/workflows/{workflow_file}"
+    status, data = github_client(token).get_json(
+        f"{API_BASE}/actions/workflows/{workflow_ref}/runs",
+        params={"branch": branch, "status": "success", "head_sha": commit,
+                "per_page": BUILD_CACHE_REMOTE_RUNS})
+    if status != 200:
+        return None, []
+    tag = cache_key[:BUILD_CACHE_TAG_LENGTH]
+    for run in data.get('workflow_runs', []):
+        if tag not in (run.get('display_title') or run.get('name') or ''):
+            continue
+        artifacts = [artifact for artifact in list_artifacts(token, run['id'])
+                     if 'ipa' in artifact['name'].lower() and not artifact.get('expired')]
+        if artifacts:
+            return run, artifacts
+    return None, []
+
+def restore_cached_build(token, cache, cache_key, commit, output_dir, config,
+                         workflow_file=WORKFLOW_FILE, branch=BRANCH, jobs=DOWNLOAD_JOBS, progress=None):
+    """Lấy IPA đã build cho cache_key: cache local trước, rồi artifact của run cũ trên GitHub
+
+    Trả về list file IPA trong output_dir, [] nếu không có (cần build mới).
+    """
+    output_path = Path(output_dir)
+    cached, entry = cache.get(cache_key)
+    if cached:
+        output_path.mkdir(parents=True, exist_ok=True)
+        ipa_path = output_path / entry['name']
+        _link_or_copy(cached, ipa_path)
+        print_success(f"Cache IPA (local): {commit[:7]} [{config}] → {ipa_path}")
+        return [str(ipa_path)]
+    
+    run, artifacts = find_cached_run(token, cache_key, commit, workflow_file=workflow_file, branch=branch)
+    if not run:
+        return []
+    print_success(f"Cache IPA (GitHub): run {run['id']} đã build {commit[:7]} [{config}], tải lại artifact")
+    files = [file_path for file_path in
+             download_artifacts(token, artifacts, output_dir, jobs=jobs, progress=progress) if file_path]
+    for file_path in files:
+        if file_path.endswith('.ipa'):
+            cache.put(cache_key, file_path, commit=commit, config=config, run_id=run['id'])
+    return files
+
+# ============== BUILD MATRIX ==============
+
+class RequestBudget:
+    """Token bucket chia chung `per_minute` request/phút cho mọi run trong build matrix
+
+    Vòng theo dõi hỏi `wait_time()` trước mỗi lượt poll và `take(n)` sau khi gọi n request;
+    quota thiếu thì lượt poll kế tiếp bị lùi lại thay vì vượt ngân sách.
+    """
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, per_minute // 6)
+        self.tokens = float(self.capacity)
+        self.updated = time.time()
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Số giây cần đợi tới khi có quota cho 1 request"""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, count=1):
+        self._refill()
+        self.tokens -= count
+
+def build_matrix(configs, branches, workflows):
+    """Tích configs × branches × workflows → list build {config, branch, workflow, label, output}
+
+    label/output chỉ gồm các chiều có nhiều hơn 1 giá trị (matrix 1 chiều → tên config).
+    """
+    builds = []
+    for workflow_file in workflows:
+        for branch in branches:
+            for config in configs:
+                parts = []
+                if len(workflows) > 1:
+                    parts.append(Path(workflow_file).stem)
+                if len(branches) > 1:
+                    parts.append(branch)
+                if len(configs) > 1 or not parts:
+                    parts.append(config)
+                builds.append({
+                    'config': config,
+                    'branch': branch,
+                    'workflow': workflow_file,
+                    'label': '/'.join(parts),
+                    'output': '-'.join(part.replace('/', '_') for part in parts),
+                })
+    return builds
+
+def lookup_cached_builds(token, builds, cache, output_dir, assets_digest, jobs=DOWNLOAD_JOBS):
+    """Gắn 'cache_key' cho mỗi build; build đã có IPA trong cache được gắn 'files' và 'cached'
+
+    `assets_digest` là digest mà các run được ghim vào (không có thì không dùng cache).
+    """
+    if not assets_digest:
+        print_info("Bỏ qua cache IPA (chưa có digest assets XCODE)")
+        return builds
+    commits = {}
+    for build in builds:
+        if build['branch'] not in commits:
+            commits[build['branch']] = resolve_branch_commit(token, build['branch'])
+        commit = commits[build['branch']]
+        if not commit:
+            continue
+        build['commit'] = commit
+        build['cache_key'] = build_cache_key(commit, build['config'], assets_digest, build['workflow'])
+        files = restore_cached_build(token, cache, build['cache_key'], commit,
+                                     Path(output_dir) / build['output'], build['config'],
+                                     workflow_file=build['workflow'], branch=build['branch'],
+                                     jobs=jobs, progress=False)
+        if files:
+            build['files'] = files
+            build['cached'] = True
+    return builds
+
+def dispatch_builds(token, builds, assets_digest=None):
+    """Trigger toàn bộ matrix (trừ build đã có trong cache) rồi tìm run song song
+
+    Gắn 'dispatch' và 'run' vào mỗi build; build lỗi có 'error'.
+    """
+    for build in builds:
+        if build.get('cached'):
+            continue
+        print_info(f"[{build['label']}] workflow {build['workflow']} @ {build['branch']}")
+        build['dispatch'] = trigger_workflow(token, build['config'],
+                                             correlation_id=new_correlation_id(build.get('cache_key')),
+                                             workflow_file=build['workflow'], branch=build['branch'],
+                                             assets_digest=assets_digest)
+        if not build['dispatch']:
+            build['error'] = "Trigger thất bại"
+    
+    print_info("Đang tìm workflow run...")
+    pending = [build for build in builds if build.get('dispatch')]
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(BATCH_LOOKUP_JOBS, len(pending))) as pool:
+            runs = list(pool.map(lambda build: find_workflow_run(token, build['dispatch']), pending))
+        for build, run in zip(pending, runs):
+            if run:
+                build['run'] = run
+                print_success(f"[{build['label']}] Run ID: {run['id']} | {run['html_url']}")
+            else:
+                build['error'] = f"Không tìm thấy run sau {RUN_LOOKUP_TIMEOUT}s"
+                print_error(f"[{build['label']}] {build['error']}")
+    return builds
+
+def collect_build_artifacts(token, build, output_dir, jobs=DOWNLOAD_JOBS, cache=None):
+    """Tải IPA của 1 build trong matrix vào output_dir/<build output> (và lưu vào cache)"""
+    artifacts = [artifact for artifact in list_artifacts(token, build['run']['id'])
+                 if 'ipa' in artifact['name'].lower()]
+    if not artifacts:
+        print_warning(f"[{build['label']}] Không tìm thấy artifacts!")
+        return []
+    files = download_artifacts(token, artifacts, Path(output_dir) / build['output'], jobs=jobs,
+                               progress=False)
+    files = [file_path for file_path in files if file_path]
+    if cache and build.get('cache_key'):
+        for file_path in files:
+            if file_path.endswith('.ipa'):
+                cache.put(build['cache_key'], file_path, commit=build['commit'], config=build['config'],
+                          run_id=build['run']['id'])
+    return files
+
+def track_builds(token, builds, output_dir, timeout=3600, webhook_port=None,
+                 download_jobs=DOWNLOAD_JOBS, api_budget=BATCH_API_BUDGET, cache=None):
+    """Theo dõi đồng thời mọi run của matrix, tải IPA ngay khi từng run xong
+
+    1 vòng lặp duy nhất poll run nào tới lượt (khoảng poll thích ứng như
+    wait_for_workflow_completion) trong ngân sách `api_budget` request/phút dùng chung;
+    tải artifact chạy trên pool riêng nên không chặn việc theo dõi các run còn lại.
+    """
+    print_step(3, "Đang đợi các workflow build xong...")
+    history = load_build_history()
+    active = []
+    for build in builds:
+        if build.get('run'):
+            build['tracker'] = RunTracker(token, build['run']['id'], history)
+            build['next_poll'] = 0
+            build['status'] = None
+            build['step'] = None
+            active.append(build)
+    if not active:
+        return builds
+    
+    budget = RequestBudget(api_budget)
+    wake = threading.Event()
+    receiver = None
+    if webhook_port is not None:
+        receiver = WebhookReceiver(webhook_port, [build['run']['id'] for build in active], wake,
+                                   secret=os.environ.get('GITHUB_WEBHOOK_SECRET'))
+        print_info(f"Đang nhận webhook tại http://127.0.0.1:{receiver.port}/")
+    
+    start_time = time.time()
+    downloads = ThreadPoolExecutor(max_workers=ARTIFACT_JOBS)
+    try:
+        while active:
+            now = time.time()
+            if now - start_time > timeout:
+                for build in active:
+                    build['error'] = f"Timeout sau {timeout}s"
+                    print_error(f"[{build['label']}] {build['error']}")
+                break
+            
+            woken = receiver.woken if receiver else set()
+            due = [build for build in active
+                   if build['next_poll'] <= now or build['run']['id'] in woken]
+            if not due:
+                wake.wait(min(build['next_poll'] for build in active) - now)
+                wake.clear()
+                continue
+            delay = budget.wait_time()
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            
+            build = min(due, key=lambda item: item['next_poll'])
+            woken.discard(build['run']['id'])
+            tracker = build['tracker']
+            before = tracker.requests
             try:
-                with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                    # Lấy tên file đầu tiên trong zip
-                    file_list = zip_ref.namelist()
-                    if file_list:
-                        ipa_file = file_list[0]
-                        zip_ref.extract(ipa_file, output_path)
-                        
-                        # Đổi tên nếu cần
-                        extracted_path = output_path / ipa_file
-                        final_ipa = output_path / artifact_name
-                        
-                        if extracted_path != final_ipa:
-                            extracted_path.rename(final_ipa)
-                        
-                        print_success(f"File IPA: {final_ipa}")
-                        
-                        # Xóa file ZIP
-                        zip_file.unlink()
-                        
-                        return str(final_ipa)
-            except Exception as e:
-                print_warning(f"Không thể giải nén: {e}")
-                print_info(f"File ZIP vẫn có tại: {zip_file}")
+                status = tracker.poll()
+            except (RuntimeError, requests.exceptions.RequestException) as e:
+                build['error'] = f"Lỗi khi check status: {e}"
+                print_error(f"[{build['label']}] {build['error']}")
+                active.remove(build)
+                continue
+            finally:
+                budget.take(tracker.requests - before)
+            
+            if status != build['status']:
+                print_info(f"[{build['label']}] Status: {status} | Đã chạy: {int(time.time() - start_time)}s")
+                build['status'] = status
+            running = current_step(tracker.jobs)
+            if running:
+                job, step, index, total = running
+                key = f"{job['name']}/{step['name']}"
+                if key != build['step']:
+                    print_info(f"[{build['label']}]    ▶ bước {index}/{total} '{step['name']}'")
+                    build['step'] = key
+            
+            if status == 'completed':
+                active.remove(build)
+                build['conclusion'] = tracker.run_data.get('conclusion')
+                build['seconds'] = time.time() - build['dispatch']['dispatched_at']
+                jobs = tracker.jobs
+                try:
+                    jobs = tracker.fetch_jobs()
+                except (RuntimeError, requests.exceptions.RequestException):
+                    pass
+                record_ci_spans(tracker.run_data, jobs, label=build['label'])
+                if build['conclusion'] == 'success':
+                    print_success(f"[{build['label']}] Build thành công! ({int(build['seconds'])}s)")
+                    try:
+                        record_build_history(tracker.run_data, jobs)
+                    except OSError:
+                        pass
+                    build['download'] = downloads.submit(collect_build_artifacts, token, build,
+                                                         output_dir, download_jobs, cache)
+                else:
+                    build['error'] = f"Build thất bại! Conclusion: {build['conclusion']}"
+                    print_error(f"[{build['label']}] {build['error']} | {tracker.run_data['html_url']}")
+                continue
+            
+            interval = next_poll_interval(tracker.estimate_remaining(tracker.run_data, tracker.jobs))
+            if receiver:
+                # Webhook báo thay đổi → poll chỉ là lưới an toàn
+                interval = MAX_POLL_INTERVAL
+            build['next_poll'] = time.time() + interval
         
-        return str(zip_file)
-    else:
-        print_error(f"Lỗi khi tải artifact: {response.status_code}")
+        for build in builds:
+            if build.get('download'):
+                try:
+                    build['files'] = build['download'].result()
+                except Exception as e:
+                    build['error'] = f"Lỗi khi tải artifact: {e}"
+                    build['files'] = []
+                if not build['files'] and not build.get('error'):
+                    build['error'] = "Không tải được IPA"
+    finally:
+        downloads.shutdown(wait=True)
+        if receiver:
+            receiver.close()
+    
+    requests_used = sum(build['tracker'].requests for build in builds if build.get('tracker'))
+    not_modified = sum(build['tracker'].not_modified for build in builds if build.get('tracker'))
+    print_info(f"Theo dõi: {requests_used} request ({not_modified} trả 304) cho {len(builds)} build")
+    return builds
+
+def print_batch_summary(builds, wall_seconds):
+    """Bảng tổng kết build matrix; trả về True nếu mọi build đều có IPA"""
+    print(f"\n{Colors.BOLD}{'Build':<32} {'Run':>12} {'Kết quả':<10} {'Thời gian':>10}  IPA{Colors.ENDC}")
+    for build in builds:
+        run_id = build['run']['id'] if build.get('run') else '-'
+        result = 'cache' if build.get('cached') else 'OK' if build.get('files') else (build.get('conclusion') or 'lỗi')
+        seconds = f"{int(build['seconds'])}s" if build.get('seconds') else '-'
+        files = ', '.join(f"{file_path} ({os.path.getsize(file_path) / (1024*1024):.2f} MB)"
+                          for file_path in build.get('files') or [])
+        color = Colors.GREEN if build.get('files') else Colors.RED
+        print(f"{color}{build['label']:<32} {run_id:>12} {result:<10} {seconds:>10}  "
+              f"{files or build.get('error', '')}{Colors.ENDC}")
+    total_build = sum(build.get('seconds') or 0 for build in builds)
+    cached = sum(1 for build in builds if build.get('cached'))
+    if cached:
+        print_info(f"{cached}/{len(builds)} build lấy từ cache IPA, không build lại")
+    speedup = f" (nhanh hơn chạy lần lượt ~{total_build / wall_seconds:.1f}x)" if wall_seconds > 0 else ""
+    print_info(f"Thời gian thực: {int(wall_seconds)}s | Cộng dồn các build: {int(total_build)}s{speedup}")
+    return all(build.get('files') for build in builds)
+
+def run_batch(token, builds, output_dir, no_wait=False, timeout=3600, webhook_port=None,
+              download_jobs=DOWNLOAD_JOBS, cache=None, assets_digest=None):
+    """Build cả matrix: trigger cùng lúc, theo dõi song song, tải IPA khi từng run xong
+
+    Có `cache` (BuildCache) thì build đã có IPA cho đúng commit/config/assets không bị trigger lại.
+    `assets_digest` (digest vừa publish, hoặc của CURRENT_ASSETS khi --skip-releases) được truyền
+    cho mọi run và là một phần key cache.
+    """
+    start_time = time.time()
+    print_info(f"Build matrix: {len(builds)} build ({', '.join(build['label'] for build in builds)})")
+    if cache:
+        with span('cache_lookup'):
+            lookup_cached_builds(token, builds, cache, output_dir, assets_digest, jobs=download_jobs)
+    with span('dispatch', builds=len(builds)):
+        dispatch_builds(token, builds, assets_digest=assets_digest)
+    if no_wait:
+        print_info("Không đợi build xong (--no-wait)")
+        return all(build.get('run') or build.get('cached') for build in builds)
+    with span('wait', builds=len(builds)):
+        track_builds(token, builds, output_dir, timeout=timeout, webhook_port=webhook_port,
+                     download_jobs=download_jobs, cache=cache)
+    
+    print(f"\n{Colors.BOLD}{Colors.GREEN}{'='*60}{Colors.ENDC}")
+    print(f"{Colors.BOLD}{Colors.GREEN}🎉 HOÀN TẤT BUILD MATRIX 🎉{Colors.ENDC}")
+    print(f"{Colors.BOLD}{Colors.GREEN}{'='*60}{Colors.ENDC}")
+    return print_batch_summary(builds, time.time() - start_time)
+
+# ============== WATCH DAEMON ==============
+
+class InotifyWatcher:
+    """Theo dõi thay đổi trong cây thư mục bằng inotify (Linux, gọi libc qua ctypes)"""
+
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                  | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+    def __init__(self, root):
+        import ctypes
+        import ctypes.util
+        self.root = Path(root)
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.get_errno = ctypes.get_errno
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(self.get_errno(), "inotify_init1 lỗi")
+        self.paths = {}
+        self.add_tree(self.root)
+
+    def add_tree(self, directory):
+        """Watch thư mục và mọi thư mục con (không đi theo symlink)"""
+        for path, dirnames, _ in os.walk(directory):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.EVENT_MASK)
+            if wd < 0:
+                error = self.get_errno()
+                if error == 28:  # ENOSPC: hết fs.inotify.max_user_watches
+                    raise OSError(error, "hết inotify watch (tăng fs.inotify.max_user_watches)")
+                continue  # Thư mục vừa bị xóa/không đọc được
+            self.paths[wd] = path
+
+    def wait(self, timeout):
+        """Đợi tối đa `timeout` giây, trả về tập path (tương đối từ root) đã đổi"""
+        import select
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        while readable:
+            try:
+                data = os.read(self.fd, 256 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & self.IN_Q_OVERFLOW:
+                    changed.add('*')  # Mất event: coi như đổi hết
+                    continue
+                if mask & self.IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    continue
+                directory = self.paths.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, name) if name else directory
+                if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self.add_tree(path)
+                changed.add(os.path.relpath(path, self.root))
+            readable, _, _ = select.select([self.fd], [], [], 0)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Dự phòng khi không có inotify: quét lại cây theo chu kỳ, so size/mtime"""
+
+    def __init__(self, root, interval=WATCH_POLL_INTERVAL):
+        self.root = Path(root)
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        return {arcname: (size, mtime_ns) for arcname, _, size, mtime_ns in scan_tree(self.root)}
+
+    def wait(self, timeout):
+        time.sleep(max(0, min(self.interval, timeout if timeout is not None else self.interval)))
+        snapshot = self.scan()
+        changed = {arcname for arcname in set(snapshot) | set(self.snapshot)
+                   if snapshot.get(arcname) != self.snapshot.get(arcname)}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+def make_watcher(root):
+    """inotify trên Linux, không được thì quét định kỳ"""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print_warning(f"Không dùng được inotify ({e}), chuyển sang quét lại mỗi {WATCH_POLL_INTERVAL}s")
+    return PollingWatcher(root)
+
+class WatchDaemon:
+    """--watch: theo dõi XCODE, gom thay đổi rồi nén + upload nền; trạng thái ở GET /status
+
+    `publish` (hàm không tham số → True/False) là setup_releases với đúng option của CLI;
+    `options` được trả kèm status để CLI chỉ tin daemon khi cùng cách đóng gói.
+    """
+
+    def __init__(self, publish, options, port=WATCH_PORT, debounce=WATCH_DEBOUNCE,
+                 max_delay=WATCH_MAX_DELAY):
+        daemon = self
+        self.publish = publish
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.status = {'state': 'starting', 'dirty': True, 'options': options, 'pid': os.getpid(),
+                       'digest': None, 'published_at': None, 'error': None, 'changes': 0,
+                       'publishes': 0, 'retry_at': None}
+        self.failures = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if urlparse(self.path).path != '/status':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = json.dumps(daemon.snapshot()).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.status)
+
+    def update(self, **fields):
+        with self.lock:
+            self.status.update(fields)
+
+    def mark_dirty(self, changes):
+        with self.lock:
+            self.status['dirty'] = True
+            self.status['changes'] += len(changes)
+            if self.status['state'] in ('idle', 'error'):
+                self.status['state'] = 'pending'
+
+    def publish_now(self):
+        """Nén + upload 1 lần; thay đổi đến trong lúc đó làm daemon dirty lại"""
+        self.update(state='publishing', dirty=False, changes=0)
+        start_time = time.time()
+        try:
+            ok = self.publish()
+            error = None if ok else "setup_releases thất bại (xem log phía trên)"
+        except Exception as e:  # Daemon không được chết vì 1 lần publish lỗi
+            ok, error = False, str(e)
+        manifest = load_assets_manifest()
+        # Lỗi liên tiếp thì giãn khoảng thử lại (không nén + gọi API mỗi vài giây mãi)
+        self.failures = 0 if ok else self.failures + 1
+        retry_delay = min(WATCH_RETRY_MAX, WATCH_RETRY_BASE * 2 ** (self.failures - 1)) if not ok else None
+        with self.lock:
+            self.status['publishes'] += 1
+            self.status['error'] = error
+            if ok:
+                self.status['digest'] = manifest.get('digest') if manifest else None
+                self.status['published_at'] = time.time()
+                self.status['retry_at'] = None
+            else:
+                self.status['dirty'] = True
+                self.status['retry_at'] = time.time() + retry_delay
+            self.status['state'] = 'pending' if self.status['dirty'] and ok else ('idle' if ok else 'error')
+        if ok:
+            print_success(f"Watch: assets đã publish ({time.time() - start_time:.1f}s), đợi thay đổi tiếp...")
+        else:
+            print_error(f"Watch: publish lỗi: {error}; thử lại sau {retry_delay:.0f}s hoặc khi XCODE thay đổi")
+        return ok
+
+    def next_wait(self):
+        """Timeout cho watcher.wait: đã dirty thì không đợi, lỗi thì đợi tới lần thử lại, còn lại đợi event"""
+        status = self.snapshot()
+        if status['state'] == 'error':
+            return max(0, status['retry_at'] - time.time())
+        if status['dirty']:
+            # Thay đổi đến trong lúc publish: publish tiếp ngay, không chặn chờ event mới
+            return 0
+        return None
+
+    def run(self, xcode_path):
+        """Vòng chính (chạy tới khi Ctrl+C)"""
+        watcher = make_watcher(xcode_path)
+        print_info(f"Watch: theo dõi {xcode_path} ({type(watcher).__name__}), "
+                   f"status tại http://127.0.0.1:{self.port}/status")
+        try:
+            # Cây có thể đã đổi từ lần publish trước: đồng bộ 1 lần khi khởi động
+            self.publish_now()
+            while True:
+                changes = watcher.wait(self.next_wait())
+                if changes:
+                    self.mark_dirty(changes)
+                status = self.snapshot()
+                if not status['dirty']:
+                    continue
+                if status['state'] == 'error' and time.time() < status['retry_at']:
+                    continue  # PollingWatcher trả về sau mỗi lần quét dù chưa tới lúc thử lại
+                # Debounce: đợi tới khi im lặng `debounce` giây (tối đa `max_delay`)
+                first = time.time()
+                quiet_until = first + self.debounce
+                while time.time() < quiet_until and time.time() - first < self.max_delay:
+                    more = watcher.wait(max(0, min(quiet_until, first + self.max_delay) - time.time()))
+                    if more:
+                        self.mark_dirty(more)
+                        quiet_until = time.time() + self.debounce
+                print_info(f"Watch: {self.snapshot()['changes']} thay đổi, nén + upload...")
+                self.publish_now()
+                # Event đến trong lúc publish đang nằm trong hàng đợi: đọc ngay để status không báo nhầm
+                pending = watcher.wait(0)
+                if pending:
+                    self.mark_dirty(pending)
+        finally:
+            watcher.close()
+            self.server.shutdown()
+            self.server.server_close()
+
+def query_watch_status(port=WATCH_PORT, timeout=1):
+    """Status của daemon --watch đang chạy trên máy, None nếu không có"""
+    try:
+        response = requests.get(f"http://127.0.0.1:{port}/status", timeout=timeout)
+        return response.json() if response.status_code == 200 else None
+    except (requests.exceptions.RequestException, ValueError):
         return None
 
+def assets_current_via_watch(options, port=WATCH_PORT, timeout=WATCH_WAIT_TIMEOUT):
+    """True nếu daemon --watch (cùng option) đã publish assets khớp cây hiện tại
+
+    Daemon đang nén/upload thì đợi nó xong thay vì nén lần thứ 2 song song.
+    """
+    status = query_watch_status(port)
+    if status is None:
+        return False
+    if status.get('options') != options:
+        print_warning(f"Daemon --watch (pid {status.get('pid')}) đóng gói khác option hiện tại, tự setup Releases")
+        return False
+    deadline = time.time() + timeout
+    announced = False
+    while status and status.get('state') in ('starting', 'pending', 'publishing') and time.time() < deadline:
+        if not announced:
+            print_info(f"Daemon --watch đang {status['state']}, đợi assets publish xong...")
+            announced = True
+        time.sleep(1)
+        status = query_watch_status(port)
+    if status and status.get('state') == 'idle' and not status.get('dirty'):
+        digest = status.get('digest') or ''
+        print_success(f"Assets đã được daemon --watch publish (digest {digest[:12]}), bỏ qua nén + upload")
+        return True
+    print_warning("Daemon --watch chưa publish được assets hiện tại, tự setup Releases")
+    return False
+
+# ============== CHẠY SONG SONG CÁC BƯỚC ==============
+
+class StepScheduler:
+    """Chạy các bước của main theo phụ thuộc: bước độc lập chạy song song ngay khi add()
+
+    Mỗi bước chạy trong 1 luồng daemon riêng (Ctrl+C / thoát không phải đợi upload dở) và
+    là 1 span trong report. Bước có `after` đợi các bước đó xong; lỗi của bước phụ thuộc
+    được truyền sang. gate() chặn main tới khi các bước cần thiết xong, finish() in mức
+    chồng lấn đạt được.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.steps = {}
+
+    def add(self, name, fn, after=(), **attrs):
+        step = {'done': threading.Event(), 'result': None, 'error': None, 'start': None, 'end': None}
+        depends = [self.steps[dep] for dep in after if dep in self.steps]
+
+        def run():
+            try:
+                for dep in depends:
+                    dep['done'].wait()
+                    if dep['error'] is not None:
+                        raise dep['error']
+                step['start'] = time.time()
+                with span(name, **attrs):
+                    step['result'] = fn()
+            except BaseException as e:  # Cả SystemExit (sys.exit trong bước) để main raise lại
+                step['error'] = e
+            finally:
+                step['end'] = time.time()
+                step['done'].set()
+
+        self.steps[name] = step
+        threading.Thread(target=run, name=STEP_THREAD_PREFIX + name, daemon=True).start()
+
+    def gate(self, *names):
+        """Đợi các bước `names` (bỏ qua bước không có) xong; bước nào lỗi thì raise ngay, không đợi bước khác"""
+        pending = [self.steps[name] for name in names if name in self.steps]
+        while pending:
+            for step in pending:
+                if step['error'] is not None:
+                    raise step['error']
+            pending = [step for step in pending if not step['done'].is_set()]
+            if pending:
+                pending[0]['done'].wait(0.2)  # Timeout để Ctrl+C vẫn ngắt được (Windows)
+
+    def result(self, name, default=None):
+        """Kết quả của bước (đợi nếu chưa xong), `default` nếu bước không được add"""
+        if name not in self.steps:
+            return default
+        self.gate(name)
+        return self.steps[name]['result']
+
+    def finish(self):
+        """Đợi mọi bước xong, in thời gian từng bước và thời gian tiết kiệm nhờ chạy song song"""
+        for step in self.steps.values():
+            while not step['done'].wait(0.2):
+                pass
+        timed = sorted(((name, step) for name, step in self.steps.items() if step['start']),
+                       key=lambda item: item[1]['start'])
+        if not timed:
+            return
+        serial = sum(step['end'] - step['start'] for _, step in timed)
+        wall = max(step['end'] for _, step in timed) - self.started
+        print_info(f"Các bước trước khi trigger: {serial:.1f}s công việc trong {wall:.1f}s "
+                   f"(song song tiết kiệm {max(0, serial - wall):.1f}s)")
+        for name, step in timed:
+            print_info(f"   {name:<32} {step['start'] - self.started:>7.1f}s → {step['end'] - self.started:>7.1f}s "
+                       f"({step['end'] - step['start']:.1f}s){'' if step['error'] is None else ' lỗi'}")
+        run_report().add_span('steps', self.started, self.started + wall, category='local', thread='MainThread',
+                              serial_seconds=round(serial, 3), overlap_seconds=round(max(0, serial - wall), 3))
+
+def print_result(downloaded_files):
+    """In kết quả cuối cùng: danh sách IPA đã có trong output"""
+    print(f"\n{Colors.BOLD}{Colors.GREEN}{'='*60}{Colors.ENDC}")
+    print(f"{Colors.BOLD}{Colors.GREEN}🎉 HOÀN TẤT! 🎉{Colors.ENDC}")
+    print(f"{Colors.BOLD}{Colors.GREEN}{'='*60}{Colors.ENDC}\n")
+    
+    if downloaded_files:
+        print_success(f"Đã tải về {len(downloaded_files)} file:")
+        for file_path in downloaded_files:
+            print(f"   📦 {file_path}")
+            print_info(f"      Kích thước: {os.path.getsize(file_path) / (1024*1024):.2f} MB")
+    else:
+        print_warning("Không có file nào được tải về!")
+
 def main():
     """Main function"""
     parser = argparse.ArgumentParser(
@@ -665,9 +4907,30 @@ Ví dụ sử dụng:
   python auto_build_ipa.py --skip-releases    # Bỏ qua setup Releases (dùng Release có sẵn)
   python auto_build_ipa.py --no-push          # Chỉ trigger workflow, không push code
   python auto_build_ipa.py --output myipa     # Lưu IPA vào thư mục myipa/
+  python auto_build_ipa.py --jobs 8           # Nén XCODE bằng 8 luồng song song
+  python auto_build_ipa.py --full-pack        # Nén lại toàn bộ (bỏ qua nén incremental)
+  python auto_build_ipa.py --part-size 64     # Upload ZIP thành part 64 MB song song (resume được)
+  python auto_build_ipa.py --delta            # Chỉ upload file thay đổi từ lần publish trước
+  python auto_build_ipa.py --stream           # Nén và upload đồng thời, không ghi ZIP ra đĩa
+  python auto_build_ipa.py --chunked          # Chunk store: file lớn sửa vài byte chỉ upload vài chunk
+  python auto_build_ipa.py --compression fast # Policy nén: smart (mặc định), fast, max, auto, deflate
+  python auto_build_ipa.py --compression policy.json  # Policy nén tự định nghĩa (rules theo glob)
+  python auto_build_ipa.py --no-dedup         # Nén cả các file trùng nội dung (mặc định chỉ lưu 1 bản)
+  python auto_build_ipa.py --prune            # Chỉ đóng gói file build cần theo project.pbxproj (+ Data/)
+  python auto_build_ipa.py --prune --prune-allow 'Libraries/Plugins/*'  # Giữ thêm file load lúc chạy
+  python auto_build_ipa.py --watch --chunked  # Daemon: XCODE đổi là nén + upload nền, lần build sau chỉ trigger
+  python auto_build_ipa.py --webhook-port 8765  # Nhận webhook (gh webhook forward) thay vì chỉ poll
+  python auto_build_ipa.py --api-stats        # In số lần gọi/cache hit/độ trễ theo endpoint GitHub API
+  python auto_build_ipa.py --download-jobs 8  # Tải IPA bằng 8 đoạn Range song song (resume được)
+  python auto_build_ipa.py --configs Release,Debug --branches main,dev  # Build matrix song song
+  python auto_build_ipa.py --no-cache         # Luôn build mới, không dùng IPA đã build cho cùng commit/config
+  python auto_build_ipa.py --trace trace.json # Ghi Chrome trace thời gian từng pha (local + step CI)
   
 Biến môi trường:
-  GITHUB_TOKEN    GitHub Personal Access Token (cần quyền: repo, workflow)
+  GITHUB_TOKEN        GitHub Personal Access Token (cần quyền: repo, workflow)
+  GITHUB_API_URL      API endpoint (mặc định: https://api.github.com)
+  GITHUB_UPLOADS_URL  Uploads endpoint (mặc định: https://uploads.github.com)
+  GITHUB_WEBHOOK_SECRET  Secret để kiểm tra chữ ký webhook (--webhook-port)
   
 Tính năng tự động:
   ✅ Tự động nén file lớn từ XCODE/ thành ZIP
@@ -704,8 +4967,139 @@ Tính năng tự động:
                        action='store_true',
                        help='Bỏ qua setup GitHub Releases (dùng Release có sẵn)')
     
+    parser.add_argument('--jobs', '-j',
+                       type=int,
+                       default=None,
+                       help=f'Số luồng nén song song (mặc định: số CPU = {default_jobs()})')
+    
+    parser.add_argument('--full-pack',
+                       action='store_true',
+                       help=f'Nén lại toàn bộ XCODE, bỏ qua manifest {ASSETS_MANIFEST} và cache hash')
+    
+    parser.add_argument('--part-size',
+                       type=int,
+                       default=None,
+                       help=f'Chia ZIP thành part N MB khi upload (mặc định: {DEFAULT_PART_SIZE_MB}, '
+                            f'--stream: {STREAM_PART_SIZE_MB}, 0 = 1 file)')
+    
+    parser.add_argument('--upload-jobs',
+                       type=int,
+                       default=DEFAULT_UPLOAD_JOBS,
+                       help=f'Số part upload song song (mặc định: {DEFAULT_UPLOAD_JOBS})')
+    
+    parser.add_argument('--delta',
+                       action='store_true',
+                       help='Chỉ upload file thay đổi so với lần publish trước (delta + baseline định kỳ)')
+    
+    parser.add_argument('--baseline-every',
+                       type=int,
+                       default=DEFAULT_BASELINE_EVERY,
+                       help=f'Upload lại baseline đầy đủ sau N delta (mặc định: {DEFAULT_BASELINE_EVERY})')
+    
+    parser.add_argument('--stream',
+                       action='store_true',
+                       help='Nén và upload đồng thời, không ghi ZIP xuống đĩa')
+    
+    parser.add_argument('--chunked',
+                       action='store_true',
+                       help='Publish dạng chunk store (cắt file theo nội dung, chỉ upload chunk mới + '
+                            f'recipe {CDC_RECIPE}); workflow ghép lại file từ recipe')
+    
+    parser.add_argument('--compression',
+                       default=DEFAULT_COMPRESSION,
+                       help=f'Policy nén: {", ".join(COMPRESSION_PRESETS)} hoặc đường dẫn file JSON '
+                            f'(mặc định: {DEFAULT_COMPRESSION})')
+    
+    parser.add_argument('--watch',
+                       action='store_true',
+                       help='Chạy nền: theo dõi XCODE, gom thay đổi rồi nén + upload Release trước; '
+                            'lệnh build sau (cùng option) chỉ việc trigger')
+    
+    parser.add_argument('--watch-port',
+                       type=int,
+                       default=WATCH_PORT,
+                       help=f'Cổng local status của daemon --watch (mặc định: {WATCH_PORT})')
+    
+    parser.add_argument('--webhook-port',
+                       type=int,
+                       default=None,
+                       help='Nhận webhook workflow_run/workflow_job tại cổng local này '
+                            '(phát hiện build xong ngay, poll chỉ để dự phòng)')
+    
+    parser.add_argument('--api-stats',
+                       action='store_true',
+                       help='In thống kê GitHub API (số lần gọi, cache hit, 304, thời gian) khi kết thúc')
+    
+    parser.add_argument('--no-dedup',
+                       action='store_true',
+                       help='Không gộp file trùng nội dung (mỗi bản đều được nén và upload)')
+    
+    parser.add_argument('--prune',
+                       action='store_true',
+                       help=f'Chỉ đóng gói file build cần theo {XCODE_PROJECT}/project.pbxproj '
+                            f'(file reference, build setting, search path, shell script) và allow-list')
+    
+    parser.add_argument('--prune-allow',
+                       type=str,
+                       default='',
+                       help=f'Pattern (phân cách bởi dấu phẩy, tính từ {XCODE_DIR}/) luôn được đóng gói khi '
+                            f'--prune, thêm vào mặc định: {",".join(PRUNE_ALLOW)}')
+    
+    parser.add_argument('--download-jobs',
+                       type=int,
+                       default=DOWNLOAD_JOBS,
+                       help=f'Số đoạn Range tải song song cho mỗi artifact (mặc định: {DOWNLOAD_JOBS})')
+    
+    parser.add_argument('--no-cache',
+                       action='store_true',
+                       help='Không dùng cache IPA (local và run cũ trên GitHub), luôn build mới')
+    
+    parser.add_argument('--cache-size',
+                       type=int,
+                       default=BUILD_CACHE_MAX_MB,
+                       help=f'Dung lượng tối đa cache IPA local, MB (mặc định: {BUILD_CACHE_MAX_MB})')
+    
+    parser.add_argument('--report',
+                       default=RUN_REPORT,
+                       help=f'Nối span thời gian từng pha vào file JSON lines này '
+                            f'(mặc định: {RUN_REPORT}, "" = tắt)')
+    
+    parser.add_argument('--trace',
+                       default=None,
+                       help='Ghi thêm Chrome trace (mở bằng chrome://tracing hoặc ui.perfetto.dev)')
+    
+    parser.add_argument('--configs',
+                       default=None,
+                       help='Build matrix: danh sách config, ví dụ Release,Debug')
+    
+    parser.add_argument('--branches',
+                       default=None,
+                       help=f'Build matrix: danh sách branch đã có trên GitHub (mặc định: {BRANCH})')
+    
+    parser.add_argument('--workflows',
+                       default=None,
+                       help=f'Build matrix: danh sách file workflow (mặc định: {WORKFLOW_FILE})')
+    
     args = parser.parse_args()
     
+    if args.stream and args.delta:
+        parser.error("--stream không dùng chung được với --delta")
+    if args.chunked and (args.stream or args.delta):
+        parser.error("--chunked không dùng chung được với --stream/--delta")
+    if args.watch and args.skip_releases:
+        parser.error("--watch không dùng chung được với --skip-releases")
+    if args.part_size is None:
+        args.part_size = STREAM_PART_SIZE_MB if args.stream else DEFAULT_PART_SIZE_MB
+    prune = None
+    if args.prune:
+        prune = PRUNE_ALLOW + [item.strip() for item in args.prune_allow.split(',') if item.strip()]
+    builds = None
+    if args.configs or args.branches or args.workflows:
+        def split(value, default):
+            return [item.strip() for item in (value or default).split(',') if item.strip()]
+        builds = build_matrix(split(args.configs, args.config), split(args.branches, BRANCH),
+                              split(args.workflows, WORKFLOW_FILE))
+    
     # Banner
     print(f"\n{Colors.BOLD}{Colors.HEADER}{'='*60}{Colors.ENDC}")
     print(f"{Colors.BOLD}{Colors.HEADER}🚀 AUTO BUILD IPA TOOL 🚀{Colors.ENDC}")
@@ -713,38 +5107,125 @@ Tính năng tự động:
     
     print_info(f"Repository: {REPO_OWNER}/{REPO_NAME}")
     print_info(f"Branch: {BRANCH}")
-    print_info(f"Build Config: {args.config}")
+    if builds:
+        print_info(f"Build matrix: {len(builds)} build")
+    else:
+        print_info(f"Build Config: {args.config}")
     print_info(f"Output: {args.output}/")
     
     # Lấy GitHub token
     token = get_github_token()
+    if args.api_stats:
+        atexit.register(github_client(token).print_stats)
     
-    # Bước 0: Setup GitHub Releases (tự động)
-    if not args.skip_releases:
-        if not setup_releases(token):
-            print_error("Không thể setup GitHub Releases!")
+    mode = 'chunked' if args.chunked else 'stream' if args.stream else 'delta' if args.delta else 'zip'
+    publish_options = {'mode': mode, 'compression': args.compression, 'dedup': not args.no_dedup,
+                       'prune': prune, 'part_size': args.part_size}
+    def publish_assets(full_pack=args.full_pack, release_lookup=None):
+        return setup_releases(
+            token, jobs=args.jobs, full_pack=full_pack, part_size_mb=args.part_size,
+            upload_jobs=args.upload_jobs, delta=args.delta, baseline_every=args.baseline_every,
+            stream=args.stream, compression=args.compression, dedup=not args.no_dedup,
+            release_lookup=release_lookup, prune=prune, chunked=args.chunked)
+    
+    if args.watch:
+        # Chỉ --full-pack lần publish đầu, các lần sau incremental
+        first = [args.full_pack]
+        def publish():
+            full_pack, first[0] = first[0], False
+            return publish_assets(full_pack=full_pack)
+        try:
+            daemon = WatchDaemon(publish, publish_options, port=args.watch_port)
+        except OSError as e:
+            print_error(f"Không mở được cổng {args.watch_port} cho --watch (đã có daemon chạy?): {e}")
             sys.exit(1)
+        daemon.run(XCODE_DIR)
+        return
+    
+    run_report().meta = {'config': args.config, 'branch': BRANCH, 'matrix': len(builds) if builds else None}
+    atexit.register(finish_run_report, args.report, args.trace)
+    
+    # Bước 0 + 1: nén/upload assets, push code và các lookup API chạy song song;
+    # chỉ trigger khi assets đã lên Release và code đã push xong
+    scheduler = StepScheduler()
+    if not args.skip_releases:
+        def publish_step():
+            # Daemon --watch đã publish đúng bộ assets này thì không đóng gói lại
+            if not args.full_pack and assets_current_via_watch(publish_options, args.watch_port):
+                return True
+            return publish_assets(release_lookup=lambda: scheduler.result('release'))
+        scheduler.add('release', lambda: get_or_create_release(token, RELEASE_TAG))
+        scheduler.add('setup_releases', publish_step, mode=mode)
     else:
         print_info("Bỏ qua setup GitHub Releases (--skip-releases)")
     
-    # Bước 1: Push code (nếu cần)
     if not args.no_push:
-        has_changes = git_push(branch=BRANCH, force=args.force_push)
-        if not has_changes and not args.skip_releases:
-            print_info("Không có thay đổi code, nhưng đã cập nhật Release")
+        scheduler.add('push', lambda: git_push(branch=BRANCH, force=args.force_push))
     else:
         print_info("Bỏ qua push code (--no-push)")
     
+    # Workflow id được cache trong GitHubClient: trigger sau đó không phải hỏi lại
+    for workflow_file in sorted({build['workflow'] for build in builds} if builds else {WORKFLOW_FILE}):
+        scheduler.add(f'workflow_id {workflow_file}', lambda workflow_file=workflow_file: get_workflow_id(token, workflow_file))
+    
+    cache = None if args.no_cache else BuildCache(max_bytes=args.cache_size * 1024 * 1024)
+    if cache and not builds:
+        # Commit đầu branch (key cache IPA) chỉ đúng sau khi push xong
+        scheduler.add('branch_commit', lambda: resolve_branch_commit(token, BRANCH), after=('push',))
+    
+    scheduler.gate('setup_releases', 'push')
+    if not scheduler.result('setup_releases', True):
+        print_error("Không thể setup GitHub Releases!")
+        sys.exit(1)
+    if not args.no_push and not scheduler.result('push') and not args.skip_releases:
+        print_info("Không có thay đổi code, nhưng đã cập nhật Release")
+    scheduler.finish()
+    
+    # Run được ghim vào digest vừa publish; --skip-releases thì ghim vào digest CURRENT_ASSETS
+    # trên Release (máy khác có thể đã publish) để key cache IPA đúng với assets được build
+    if args.skip_releases:
+        published_digest = release_assets_digest(token, RELEASE_TAG)
+    else:
+        published_digest = current_assets_digest()
+    
+    # Build matrix: trigger, theo dõi và tải song song
+    if builds:
+        ok = run_batch(token, builds, args.output, no_wait=args.no_wait, timeout=3600,
+                       webhook_port=args.webhook_port, download_jobs=args.download_jobs, cache=cache,
+                       assets_digest=published_digest)
+        sys.exit(0 if ok else 1)
+    
+    # Cache IPA: cùng commit + config + assets đã build thì lấy lại, không build mới
+    cache_key = None
+    commit = None
+    if cache:
+        commit = scheduler.result('branch_commit')
+        if commit and published_digest:
+            cache_key = build_cache_key(commit, args.config, published_digest)
+            with span('cache_lookup') as record:
+                cached_files = restore_cached_build(token, cache, cache_key, commit, args.output, args.config,
+                                                    jobs=args.download_jobs)
+                record['hit'] = bool(cached_files)
+            if cached_files:
+                print_result(cached_files)
+                return
+        else:
+            print_info("Bỏ qua cache IPA (chưa có digest assets XCODE hoặc không đọc được commit)")
+    
     # Bước 2: Trigger workflow
-    if not trigger_workflow(token, args.config):
+    with span('dispatch'):
+        dispatch = trigger_workflow(token, args.config, correlation_id=new_correlation_id(cache_key),
+                                    assets_digest=published_digest)
+    if not dispatch:
         sys.exit(1)
     
-    # Lấy workflow run mới nhất
+    # Tìm đúng run vừa trigger (theo correlation id trong tên run)
     print_info("Đang tìm workflow run...")
-    run = get_latest_workflow_run(token)
+    with span('run_lookup'):
+        run = find_workflow_run(token, dispatch)
     
     if not run:
-        print_error("Không tìm thấy workflow run!")
+        print_error(f"Không tìm thấy workflow run sau {RUN_LOOKUP_TIMEOUT}s!")
         sys.exit(1)
     
     run_id = run['id']
@@ -757,7 +5238,9 @@ Tính năng tự động:
         print_info(f"Theo dõi tại: {run['html_url']}")
         sys.exit(0)
     
-    if not wait_for_workflow_completion(token, run_id, timeout=3600):
+    with span('wait', run_id=run_id):
+        ok = wait_for_workflow_completion(token, run_id, timeout=3600, webhook_port=args.webhook_port)
+    if not ok:
         sys.exit(1)
     
     # Bước 4: Download artifacts
@@ -770,29 +5253,19 @@ Tính năng tự động:
     
     print_success(f"Tìm thấy {len(artifacts)} artifact(s)")
     
-    downloaded_files = []
-    for artifact in artifacts:
-        artifact_name = artifact['name']
-        artifact_id = artifact['id']
-        
-        # Chỉ download IPA artifacts
-        if 'ipa' in artifact_name.lower():
-            file_path = download_artifact(token, artifact_id, artifact_name, args.output)
-            if file_path:
-                downloaded_files.append(file_path)
-    
-    # Kết quả
-    print(f"\n{Colors.BOLD}{Colors.GREEN}{'='*60}{Colors.ENDC}")
-    print(f"{Colors.BOLD}{Colors.GREEN}🎉 HOÀN TẤT! 🎉{Colors.ENDC}")
-    print(f"{Colors.BOLD}{Colors.GREEN}{'='*60}{Colors.ENDC}\n")
-    
-    if downloaded_files:
-        print_success(f"Đã tải về {len(downloaded_files)} file:")
+    # Chỉ download IPA artifacts
+    ipa_artifacts = [artifact for artifact in artifacts if 'ipa' in artifact['name'].lower()]
+    with span('artifacts') as record:
+        downloaded_files = [file_path for file_path in
+                            download_artifacts(token, ipa_artifacts, args.output, jobs=args.download_jobs)
+                            if file_path]
+        record['bytes'] = sum(os.path.getsize(file_path) for file_path in downloaded_files)
+    if cache_key:
         for file_path in downloaded_files:
-            print(f"   📦 {file_path}")
-            print_info(f"      Kích thước: {os.path.getsize(file_path) / (1024*1024):.2f} MB")
-    else:
-        print_warning("Không có file nào được tải về!")
+            if file_path.endswith('.ipa'):
+                cache.put(cache_key, file_path, commit=commit, config=args.config, run_id=run_id)
+    
+    print_result(downloaded_files)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,1427 @@
+#!/usr/bin/env python3
+"""
+Benchmark cho Auto Build IPA Tool
+- compress: so sánh nén XCODE bằng zipfile 1 luồng cũ với bộ nén song song mới
+- pipeline: so sánh nén → ghi ZIP → upload (2 pha) với stream nén + upload đồng thời,
+  upload lên 1 server HTTP giả lập GitHub chạy local (có thể giới hạn băng thông)
+- policy: so sánh tốc độ và kích thước ZIP giữa các policy nén (smart, fast, max, ...)
+- tracking: so sánh poll 10s cũ với RunTracker (ETag + poll thích ứng, webhook) trên
+  1 Actions API giả lập: số request, số 304, độ trễ phát hiện build xong
+- download: so sánh vòng tải artifact tuần tự 8 KB cũ (ghi ZIP rồi giải nén) với
+  download_artifacts (nhiều artifact song song, Range nhiều đoạn, tải thẳng IPA) trên server
+  giả lập giới hạn băng thông mỗi kết nối: thời gian và dung lượng đĩa tối đa
+- batch: build matrix giả lập, chạy lần lượt từng build vs run_batch (trigger, theo dõi và
+  tải song song): tổng thời gian so với build dài nhất
+- suite: sinh cây XCODE giả lập (hàng nghìn .h nhỏ, .cpp vài MB, .dll/.dylib/.resS, file trùng)
+  rồi đo quét, hash, compress_xcode_assets (đầy đủ + incremental), upload_to_release,
+  upload_parts_to_release và download_artifacts với server giả lập chạy ở process riêng:
+  MB/s, file/s, RSS đỉnh, CPU. Kết quả nối vào benchmark-results.jsonl kèm commit để so sánh
+- cdc: tốc độ cắt chunk theo nội dung (--chunked) theo số process, rồi giả lập vài lần IL2CPP sinh
+  lại file lớn: byte phải upload theo file (nén incremental/delta) so với chỉ chunk mới
+- restore: bước tải assets của workflow trên cây giả lập, Release giả lập ở process riêng (giới hạn
+  băng thông mỗi kết nối): 1 curl + unzip cũ vs restore_xcode_assets.py (Range song song, giải nén
+  song song) vs cache runner ấm (phải không có request nào)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zipfile
+import io
+import socket
+import hashlib
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import auto_build_ipa as tool
+import restore_xcode_assets as restore
+
+
+def compress_with_zipfile(xcode_path, zip_path):
+    """Đường nén cũ: 1 zipfile.ZipFile(ZIP_DEFLATED), 1 luồng"""
+    xcode_path = Path(xcode_path)
+    start_time = time.time()
+    bytes_in = 0
+    files = 0
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for root, dirs, names in os.walk(xcode_path):
+            for name in names:
+                file_path = Path(root) / name
+                zipf.write(file_path, file_path.relative_to(xcode_path.parent))
+                bytes_in += file_path.stat().st_size
+                files += 1
+    return {
+        'files': files,
+        'bytes_in': bytes_in,
+        'bytes_out': Path(zip_path).stat().st_size,
+        'seconds': time.time() - start_time,
+        'jobs': 1,
+    }
+
+
+def verify_zip(zip_path):
+    """Kiểm tra CRC toàn bộ member bằng zipfile chuẩn"""
+    with zipfile.ZipFile(zip_path) as zipf:
+        return zipf.testzip() is None
+
+
+def print_row(label, stats, baseline_seconds):
+    mb_in = stats['bytes_in'] / (1024 * 1024)
+    speed = mb_in / stats['seconds'] if stats['seconds'] > 0 else 0
+    speedup = baseline_seconds / stats['seconds'] if stats['seconds'] > 0 else 0
+    print(f"{label:<22} {stats['seconds']:>9.2f}s {speed:>10.2f} MB/s "
+          f"{stats['bytes_out'] / (1024 * 1024):>10.2f} MB {speedup:>8.2f}x")
+
+
+class ReleaseStandIn(BaseHTTPRequestHandler):
+    """Giả lập các endpoint Release của GitHub (list/upload/delete asset)
+
+    Body upload được đọc với tốc độ giới hạn `bandwidth` (bytes/s, 0 = không giới hạn).
+    """
+
+    protocol_version = 'HTTP/1.1'
+    assets = {}
+    next_id = [1]
+    lock = threading.Lock()
+    bandwidth = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if re.search(r'/releases/\d+/assets$', urlparse(self.path).path):
+            with self.lock:
+                return self._send(200, list(self.assets.values()))
+        self._send(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        query = parse_qs(urlparse(self.path).query)
+        remaining = int(self.headers['Content-Length'])
+        size = remaining
+        start_time = time.time()
+        while remaining:
+            block = self.rfile.read(min(remaining, 64 * 1024))
+            remaining -= len(block)
+            if self.bandwidth:
+                delay = (size - remaining) / self.bandwidth - (time.time() - start_time)
+                if delay > 0:
+                    time.sleep(delay)
+        with self.lock:
+            asset_id = self.next_id[0]
+            self.next_id[0] += 1
+            asset = {'id': asset_id, 'name': query['name'][0], 'label': query.get('label', [None])[0],
+                     'size': size, 'state': 'uploaded'}
+            self.assets[asset_id] = asset
+        self._send(201, asset)
+
+    def do_DELETE(self):
+        match = re.search(r'/releases/assets/(\d+)$', self.path)
+        with self.lock:
+            self.assets.pop(int(match.group(1)), None)
+        self._send(204)
+
+
+def start_stand_in(bandwidth_mb):
+    """Chạy server giả lập và trỏ API/uploads của tool vào đó"""
+    ReleaseStandIn.bandwidth = int(bandwidth_mb * 1024 * 1024)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ReleaseStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = f"http://127.0.0.1:{server.server_address[1]}"
+    tool.API_BASE = f"{root}/repos/{tool.REPO_OWNER}/{tool.REPO_NAME}"
+    tool.UPLOADS_BASE = tool.API_BASE
+    return server
+
+
+# Các step của run giả lập (tên, tỉ lệ thời gian) — xcodebuild chiếm phần lớn như thật
+SIMULATED_STEPS = [('Checkout repository (without LFS)', 0.05),
+                   ('Download large files from GitHub Releases', 0.15),
+                   ('Build Xcode project', 0.65),
+                   ('Export IPA', 0.10),
+                   ('Upload IPA artifact', 0.05)]
+
+
+def iso_time(epoch):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch))
+
+
+class ActionsStandIn(BaseHTTPRequestHandler):
+    """Giả lập /actions/runs/{id} và /actions/runs/{id}/jobs theo đồng hồ thật
+
+    Mỗi run là {start, steps: [(tên, giây)], webhook: url|None}; response có ETag và
+    trả 304 khi If-None-Match khớp. Đếm request/304 theo run id.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    runs = {}
+    counters = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    @classmethod
+    def snapshot(cls, run_id, now):
+        run = cls.runs[run_id]
+        t = run['start']
+        steps = []
+        for number, (name, seconds) in enumerate(run['steps'], 1):
+            step = {'name': name, 'number': number, 'status': 'queued', 'conclusion': None,
+                    'started_at': None, 'completed_at': None}
+            if now >= t:
+                step['status'] = 'in_progress'
+                step['started_at'] = iso_time(t)
+            if now >= t + seconds:
+                step.update(status='completed', conclusion='success', completed_at=iso_time(t + seconds))
+            steps.append(step)
+            t += seconds
+        done = now >= t
+        status = 'completed' if done else 'in_progress'
+        run_data = {'id': run_id, 'status': status, 'conclusion': 'success' if done else None,
+                    'html_url': f'http://stand-in/runs/{run_id}', 'run_started_at': iso_time(run['start']),
+                    'created_at': iso_time(run.get('created', run['start'])), 'updated_at': iso_time(min(now, t))}
+        jobs = {'total_count': 1, 'jobs': [{'id': run_id, 'run_id': run_id, 'name': 'build-ipa',
+                                            'status': status, 'conclusion': run_data['conclusion'],
+                                            'started_at': iso_time(run['start']) if now >= run['start'] else None,
+                                            'completed_at': iso_time(t) if done else None,
+                                            'steps': steps}]}
+        return run_data, jobs, t
+
+    def do_GET(self):
+        match = re.search(r'/actions/runs/(\d+)(/jobs)?$', urlparse(self.path).path)
+        if not match or int(match.group(1)) not in self.runs:
+            body = b'{}'
+            self.send_response(404)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        run_id = int(match.group(1))
+        run_data, jobs, _ = self.snapshot(run_id, time.time())
+        body = json.dumps(jobs if match.group(2) else run_data).encode('utf-8')
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        with self.lock:
+            counter = self.counters.setdefault(run_id, [0, 0])
+            counter[0] += 1
+            if self.headers.get('If-None-Match') == etag:
+                counter[1] += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def send_webhook_on_completion(run_id):
+    """Gửi event workflow_run completed tới receiver của run khi run giả lập xong"""
+    run = ActionsStandIn.runs[run_id]
+    _, _, end = ActionsStandIn.snapshot(run_id, time.time())
+    time.sleep(max(0, end - time.time()))
+    payload = {'action': 'completed', 'workflow_run': {'id': run_id, 'status': 'completed'}}
+    try:
+        tool.requests.post(run['webhook'], json=payload, timeout=5)
+    except tool.requests.exceptions.RequestException:
+        pass
+
+
+def poll_fixed(run_id, interval=10):
+    """Vòng poll cũ: GET /actions/runs/{id} mỗi `interval` giây, không ETag"""
+    while True:
+        response = tool.requests.get(f"{tool.API_BASE}/actions/runs/{run_id}", timeout=60)
+        if response.json()['status'] == 'completed':
+            return
+        time.sleep(interval)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_tracking(args):
+    """Chạy song song 3 cách theo dõi trên 3 run giả lập giống nhau, so sánh kết quả"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ActionsStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tool.API_BASE = f"http://127.0.0.1:{server.server_address[1]}/repos/{tool.REPO_OWNER}/{tool.REPO_NAME}"
+    # Lần build này chậm hơn lịch sử 10% để poll thích ứng phải xử lý quá giờ
+    history_steps = [(name, args.run_seconds * share) for name, share in SIMULATED_STEPS]
+    steps = [(name, seconds * 1.1) for name, seconds in history_steps]
+    webhook_port = free_port()
+    start = time.time()
+    ActionsStandIn.runs = {
+        1: {'start': start, 'steps': steps, 'webhook': None},
+        2: {'start': start, 'steps': steps, 'webhook': None},
+        3: {'start': start, 'steps': steps, 'webhook': f'http://127.0.0.1:{webhook_port}/'},
+    }
+    _, _, end = ActionsStandIn.snapshot(1, start)
+    print(f"Run giả lập: {end - start:.0f}s, {len(steps)} step | lịch sử: {args.run_seconds:.0f}s")
+
+    detected = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            with open(tool.BUILD_HISTORY, 'w', encoding='utf-8') as f:
+                json.dump({'runs': [{'run_id': 0, 'duration': args.run_seconds,
+                                     'steps': {f'build-ipa/{name}': seconds
+                                               for name, seconds in history_steps}}]}, f)
+
+            def track(label, run):
+                run()
+                detected[label] = time.time()
+
+            threads = [
+                threading.Thread(target=track, args=('poll 10s (cũ)', lambda: poll_fixed(1))),
+                threading.Thread(target=track, args=('RunTracker', lambda: tool.wait_for_workflow_completion(
+                    'token', 2, timeout=args.run_seconds * 3))),
+                threading.Thread(target=track, args=('RunTracker + webhook', lambda: tool.wait_for_workflow_completion(
+                    'token', 3, timeout=args.run_seconds * 3, webhook_port=webhook_port))),
+                threading.Thread(target=send_webhook_on_completion, args=(3,), daemon=True),
+            ]
+            with contextlib.redirect_stdout(io.StringIO()):
+                for thread in threads:
+                    thread.start()
+                for thread in threads[:3]:
+                    thread.join()
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+
+    print(f"{'Cách theo dõi':<22} {'Request':>8} {'304':>6} {'Độ trễ phát hiện':>18}")
+    for run_id, label in ((1, 'poll 10s (cũ)'), (2, 'RunTracker'), (3, 'RunTracker + webhook')):
+        total, not_modified = ActionsStandIn.counters.get(run_id, [0, 0])
+        print(f"{label:<22} {total:>8} {not_modified:>6} {detected[label] - end:>17.2f}s")
+
+
+class ArtifactStandIn(BaseHTTPRequestHandler):
+    """Giả lập tải artifact: /actions/artifacts/{id}/zip redirect 302 sang /blob/{id}
+
+    /blob/{id} hỗ trợ Range; mỗi kết nối bị giới hạn `bandwidth` bytes/s như CDN thật.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    blobs = {}
+    bandwidth = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        match = re.search(r'/actions/artifacts/(\d+)/zip$', path)
+        if match:
+            self.send_response(302)
+            self.send_header('Location', f"http://127.0.0.1:{self.server.server_address[1]}/blob/{match.group(1)}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        match = re.search(r'/blob/(\d+)$', path)
+        data = self.blobs.get(int(match.group(1))) if match else None
+        if data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        start, end = 0, len(data) - 1
+        byte_range = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if byte_range:
+            start = int(byte_range.group(1))
+            end = min(int(byte_range.group(2) or end), end)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        sent = 0
+        start_time = time.time()
+        view = memoryview(data)[start:end + 1]
+        while sent < len(view):
+            block = view[sent:sent + 64 * 1024]
+            self.wfile.write(block)
+            sent += len(block)
+            if self.bandwidth:
+                delay = sent / self.bandwidth - (time.time() - start_time)
+                if delay > 0:
+                    time.sleep(delay)
+
+
+def make_artifact(size):
+    """ZIP giống artifact IPA: 1 file dữ liệu ngẫu nhiên (không nén được) dung lượng ~size bytes"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+        zf.writestr('NROFLY.ipa', os.urandom(size))
+    return buffer.getvalue()
+
+
+def download_sequential(token, artifacts, output_dir):
+    """Vòng tải cũ: từng artifact một, 1 kết nối, iter_content 8 KB, ghi ZIP rồi giải nén IPA"""
+    for artifact in artifacts:
+        url = f"{tool.API_BASE}/actions/artifacts/{artifact['id']}/zip"
+        response = tool.requests.get(url, headers={'Authorization': f'token {token}'}, stream=True)
+        zip_file = Path(output_dir) / f"{artifact['name']}.zip"
+        with open(zip_file, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                if chunk:
+                    f.write(chunk)
+        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+            ipa_file = zip_ref.namelist()[0]
+            zip_ref.extract(ipa_file, output_dir)
+        (Path(output_dir) / ipa_file).rename(Path(output_dir) / artifact['name'])
+        zip_file.unlink()
+
+
+class DiskSampler:
+    """Đo dung lượng tối đa của 1 thư mục trong lúc chạy (lấy mẫu mỗi 10 ms)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.peak = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stop.wait(0.01):
+            total = 0
+            for entry in os.scandir(self.path):
+                try:
+                    total += entry.stat().st_blocks * 512
+                except OSError:
+                    pass
+            self.peak = max(self.peak, total)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+
+def run_download(args):
+    """Tải cùng bộ artifact giả lập bằng vòng cũ và download_artifacts, so sánh MB/s và đĩa"""
+    ArtifactStandIn.bandwidth = int(args.bandwidth * 1024 * 1024)
+    size = int(args.artifact_mb * 1024 * 1024)
+    ArtifactStandIn.blobs = {index: make_artifact(size) for index in range(1, args.artifacts + 1)}
+    artifacts = []
+    for index, data in ArtifactStandIn.blobs.items():
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            ipa_sha = hashlib.sha256(zf.read('NROFLY.ipa')).hexdigest()
+        artifacts.append({'id': index, 'name': f'NROFLY-{index}.ipa', 'ipa_sha': ipa_sha,
+                          'digest': 'sha256:' + hashlib.sha256(data).hexdigest()})
+    total_mb = sum(len(data) for data in ArtifactStandIn.blobs.values()) / (1024 * 1024)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ArtifactStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tool.API_BASE = f"http://127.0.0.1:{server.server_address[1]}/repos/{tool.REPO_OWNER}/{tool.REPO_NAME}"
+    print(f"{args.artifacts} artifact x {args.artifact_mb:.0f} MB | băng thông mỗi kết nối: "
+          f"{args.bandwidth:.0f} MB/s | đoạn: {tool.DOWNLOAD_SEGMENT_MB} MB")
+    print(f"{'Cách tải':<28} {'Thời gian':>10} {'Tốc độ':>15} {'Đĩa tối đa':>13} {'Speedup':>9}")
+    job_counts = [int(j) for j in args.jobs.split(',')] if args.jobs else [1, tool.DOWNLOAD_JOBS]
+
+    try:
+        baseline = None
+        runs = [('iter_content 8 KB (cũ)', lambda out: download_sequential('token', artifacts, out))]
+        runs += [(f'download_artifacts x{jobs}',
+                  lambda out, jobs=jobs: tool.download_artifacts('token', artifacts, out, jobs=jobs))
+                 for jobs in job_counts]
+        for label, run in runs:
+            best = None
+            peak = 0
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory() as tmp:
+                    start_time = time.time()
+                    with contextlib.redirect_stdout(io.StringIO()), DiskSampler(tmp) as sampler:
+                        run(tmp)
+                    seconds = time.time() - start_time
+                    peak = max(peak, sampler.peak)
+                    for artifact in artifacts:
+                        ipa_path = Path(tmp) / artifact['name']
+                        if not ipa_path.exists() or tool.hash_file(ipa_path) != artifact['ipa_sha']:
+                            print(f"❌ {label}: {artifact['name']} tải về bị lỗi!")
+                            sys.exit(1)
+                best = seconds if best is None else min(best, seconds)
+            baseline = baseline or best
+            print(f"{label:<28} {best:>9.2f}s {total_mb / best:>10.2f} MB/s "
+                  f"{peak / (1024 * 1024):>10.2f} MB {baseline / best:>8.2f}x")
+    finally:
+        server.shutdown()
+
+
+class MatrixStandIn(ActionsStandIn, ArtifactStandIn):
+    """Giả lập đủ vòng build matrix: list workflow, dispatch, tìm run, theo dõi, artifact
+
+    Mỗi lần dispatch tạo 1 run giả lập chạy `durations[config]` giây và có 1 artifact
+    NROFLY.ipa; run/jobs và tải artifact dùng lại ActionsStandIn và ArtifactStandIn.
+    Commit đầu mỗi branch là sha1 của tên branch (để thử cache IPA theo head_sha).
+    """
+
+    durations = {}
+    artifact_size = 0
+    dispatched = []
+
+    def _json(self, payload, code=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def branch_sha(branch):
+        return hashlib.sha1(branch.encode('utf-8')).hexdigest()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        query = parse_qs(urlparse(self.path).query)
+        match = re.search(r'/branches/(.+)$', path)
+        if match:
+            return self._json({'name': match.group(1), 'commit': {'sha': self.branch_sha(match.group(1))}})
+        if path.endswith('/actions/workflows'):
+            return self._json({'workflows': [{'id': 1, 'name': 'Build iOS IPA',
+                                              'path': f'.github/workflows/{tool.WORKFLOW_FILE}'}]})
+        if re.search(r'/actions/workflows/[^/]+/runs$', path):
+            now = time.time()
+            runs = []
+            with self.lock:
+                for run_id, run in self.runs.items():
+                    run_data = self.snapshot(run_id, now)[0]
+                    if query.get('status') == ['success'] and run_data['conclusion'] != 'success':
+                        continue
+                    if query.get('head_sha', [run['sha']]) != [run['sha']]:
+                        continue
+                    runs.append({'id': run_id, 'display_title': run['title'], 'head_sha': run['sha'],
+                                 'created_at': iso_time(run['created']), 'html_url': run_data['html_url']})
+            return self._json({'workflow_runs': runs[::-1]})
+        match = re.search(r'/actions/runs/(\d+)/artifacts$', path)
+        if match:
+            run_id = int(match.group(1))
+            return self._json({'artifacts': [{'id': run_id, 'name': 'NROFLY.ipa'}]})
+        if '/actions/artifacts/' in path or '/blob/' in path:
+            return ArtifactStandIn.do_GET(self)
+        return ActionsStandIn.do_GET(self)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        inputs = body.get('inputs', {})
+        seconds = self.durations[inputs['build_configuration']]
+        now = time.time()
+        with self.lock:
+            run_id = len(self.runs) + 1
+            self.runs[run_id] = {'start': now + 1, 'created': now, 'webhook': None,
+                                 'sha': self.branch_sha(body['ref']),
+                                 'title': f"Build [{inputs['build_configuration']}] {inputs.get('correlation_id', '')}",
+                                 'steps': [(name, seconds * share) for name, share in SIMULATED_STEPS]}
+            self.blobs[run_id] = make_artifact(self.artifact_size)
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def build_sequential(token, builds, output_dir):
+    """Cách cũ: mỗi build chạy hết trigger → đợi → tải rồi mới tới build sau"""
+    for build in builds:
+        dispatch = tool.trigger_workflow(token, build['config'], correlation_id=tool.new_correlation_id(),
+                                         workflow_file=build['workflow'], branch=build['branch'])
+        run = tool.find_workflow_run(token, dispatch)
+        if tool.wait_for_workflow_completion(token, run['id']):
+            artifacts = tool.list_artifacts(token, run['id'])
+            tool.download_artifacts(token, artifacts, Path(output_dir) / build['output'])
+
+
+def run_batch_bench(args):
+    """Build matrix giả lập: lần lượt từng build vs run_batch (trigger/theo dõi/tải song song)
+    vs chạy lại run_batch khi mọi build đã có trong cache IPA"""
+    configs = [f'Config{index}' for index in range(1, args.builds + 1)]
+    # Build dài nhất = run-seconds, các build khác ngắn dần
+    MatrixStandIn.durations = {config: args.run_seconds * (1 - 0.15 * index) for index, config in enumerate(configs)}
+    MatrixStandIn.artifact_size = int(args.artifact_mb * 1024 * 1024)
+    MatrixStandIn.bandwidth = int(args.bandwidth * 1024 * 1024)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MatrixStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tool.API_BASE = f"http://127.0.0.1:{server.server_address[1]}/repos/{tool.REPO_OWNER}/{tool.REPO_NAME}"
+    longest = max(MatrixStandIn.durations.values())
+    total = sum(MatrixStandIn.durations.values())
+    print(f"{len(configs)} build | build dài nhất {longest:.0f}s | cộng dồn {total:.0f}s | "
+          f"artifact {args.artifact_mb:.0f} MB")
+    print(f"{'Cách chạy':<22} {'Thời gian':>10} {'Request':>8} {'so với build dài nhất':>22}")
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            with open(tool.BUILD_HISTORY, 'w', encoding='utf-8') as f:
+                json.dump({'runs': [{'run_id': 0, 'duration': args.run_seconds,
+                                     'steps': {f'build-ipa/{name}': args.run_seconds * share
+                                               for name, share in SIMULATED_STEPS}}]}, f)
+            tool.save_assets_manifest({'version': tool.MANIFEST_VERSION, 'files': {},
+                                       'digest': hashlib.sha256(b'assets').hexdigest()})
+            cache = tool.BuildCache()
+            for label, run, use_cache in (('lần lượt (cũ)', build_sequential, None),
+                                          ('run_batch', None, cache),
+                                          ('run_batch (cache hit)', None, cache)):
+                if use_cache is None:
+                    ActionsStandIn.runs.clear()
+                    ActionsStandIn.counters.clear()
+                api = tool.github_client('token')
+                calls_before = sum(stat['calls'] for stat in api.stats.values())
+                builds = tool.build_matrix(configs, [tool.BRANCH], [tool.WORKFLOW_FILE])
+                start_time = time.time()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if run:
+                        run('token', builds, Path(tmp) / 'seq')
+                        ok = all((Path(tmp) / 'seq' / build['output'] / 'NROFLY.ipa').exists() for build in builds)
+                    else:
+                        ok = tool.run_batch('token', builds, Path(tmp) / label, cache=use_cache)
+                seconds = time.time() - start_time
+                calls = sum(stat['calls'] for stat in api.stats.values()) - calls_before
+                if not ok:
+                    print(f"❌ {label}: có build không tải được IPA!")
+                    sys.exit(1)
+                print(f"{label:<22} {seconds:>9.2f}s {calls:>8} {seconds / longest:>21.2f}x")
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+
+
+def run_pipeline(args, xcode_path):
+    """So sánh 2 pha (nén ra đĩa rồi upload) với stream nén + upload"""
+    server = start_stand_in(args.bandwidth)
+    xcode_path = xcode_path.resolve()
+    entries = tool.scan_xcode_files(xcode_path)
+    jobs = int(args.jobs.split(',')[-1]) if args.jobs else tool.default_jobs()
+    cwd = os.getcwd()
+    print(f"Thư mục: {xcode_path} | nén {jobs} luồng | upload {args.upload_jobs} luồng | "
+          f"part {args.part_size} MB | băng thông {args.bandwidth or 'không giới hạn'} MB/s")
+    print(f"{'Cấu hình':<22} {'Thời gian':>10} {'ZIP':>13}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            ReleaseStandIn.assets.clear()
+            start_time = time.time()
+            stats = tool.pack_directory(xcode_path, tool.ASSETS_ZIP, jobs=jobs, progress=False,
+                                        entries=entries)
+            tool.upload_parts_to_release('token', 1, tool.ASSETS_ZIP, part_size_mb=args.part_size,
+                                         jobs=args.upload_jobs)
+            two_phase = time.time() - start_time
+            print(f"{'2 pha (ZIP trên đĩa)':<22} {two_phase:>9.2f}s "
+                  f"{stats['bytes_out'] / (1024 * 1024):>10.2f} MB")
+
+            ReleaseStandIn.assets.clear()
+            start_time = time.time()
+            tool.stream_pack_and_upload('token', 1, entries, part_size_mb=args.part_size,
+                                        jobs=jobs, upload_jobs=args.upload_jobs, progress=False)
+            streamed = time.time() - start_time
+            print(f"{'stream (không ghi đĩa)':<22} {streamed:>9.2f}s "
+                  f"{stats['bytes_out'] / (1024 * 1024):>10.2f} MB   "
+                  f"({two_phase / streamed if streamed > 0 else 0:.2f}x)")
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+
+
+def run_policies(args, xcode_path):
+    """Nén cùng thư mục với từng policy, in thời gian, MB/s, kích thước và tỉ lệ theo method"""
+    jobs = int(args.jobs.split(',')[-1]) if args.jobs else tool.default_jobs()
+    policies = args.policies.split(',') if args.policies else list(tool.COMPRESSION_PRESETS)
+    entries = tool.scan_xcode_files(xcode_path)
+    print(f"Thư mục: {xcode_path} | {len(entries)} file | nén {jobs} luồng | repeat: {args.repeat}")
+    print(f"{'Policy':<22} {'Thời gian':>10} {'Tốc độ':>15} {'Kích thước':>13} {'Tỉ lệ':>7}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in policies:
+            policy = tool.load_compression_policy(name)
+            zip_path = Path(tmp) / 'policy.zip'
+            best = None
+            for _ in range(args.repeat):
+                stats = tool.pack_directory(xcode_path, zip_path, jobs=jobs, policy=policy,
+                                            progress=False, entries=entries)
+                if best is None or stats['seconds'] < best['seconds']:
+                    best = stats
+            if not verify_zip(zip_path):
+                print(f"❌ ZIP policy {name} bị lỗi CRC!")
+                sys.exit(1)
+            mb_in = best['bytes_in'] / (1024 * 1024)
+            speed = mb_in / best['seconds'] if best['seconds'] > 0 else 0
+            ratio = best['bytes_out'] / best['bytes_in'] if best['bytes_in'] else 0
+            print(f"{name:<22} {best['seconds']:>9.2f}s {speed:>10.2f} MB/s "
+                  f"{best['bytes_out'] / (1024 * 1024):>10.2f} MB {ratio:>7.1%}")
+            for method, (count, bytes_in, bytes_out) in sorted(best['methods'].items()):
+                print(f"  {method:<20} {count:>6} file {bytes_in / (1024 * 1024):>12.2f} MB "
+                      f"→ {bytes_out / (1024 * 1024):.2f} MB")
+            zip_path.unlink()
+
+
+# ============== SUITE: cây XCODE giả lập + đo MB/s, file/s, RSS, CPU ==============
+
+SYNTHETIC_VERSION = 1            # Đổi khi cách sinh cây thay đổi → kết quả cũ không còn so được
+SYNTHETIC_MTIME = 1700000000     # mtime cố định cho mọi file giả lập
+# (đường dẫn mẫu, số file khi scale=1, kích thước mỗi file, kiểu nội dung) — tỉ lệ giống XCODE thật
+SYNTHETIC_MIX = [
+    ('XCODE/Classes/Native/Il2CppHeader{:05d}.h', 4000, 2 * 1024, 'source'),
+    ('XCODE/Classes/Native/Bulk_Generics_{}.cpp', 6, 4 * 1024 * 1024, 'source'),
+    ('XCODE/Data/Managed/Assembly-{}.dll', 40, 256 * 1024, 'binary'),
+    ('XCODE/Frameworks/UnityFramework{}.dylib', 4, 4 * 1024 * 1024, 'binary'),
+    ('XCODE/Data/sharedassets{}.resS', 12, 2 * 1024 * 1024, 'random'),
+]
+SYNTHETIC_DUPLICATE_EVERY = 4    # Cứ 4 file .dll/.resS thì 1 file có bản sao y hệt trong Data/Raw
+SYNTHETIC_CHANGED_RATIO = 0.01   # Pha incremental: sửa 1% file .h + 1 file .cpp
+SUITE_RESULTS = "benchmark-results.jsonl"
+
+
+def synthetic_source_lines(rng, count=4096):
+    """Các dòng C++ kiểu il2cpp để ghép thành .h/.cpp (nén deflate ~5-8x như code sinh thật)"""
+    words = ['Il2CppObject', 'RuntimeMethod', 'String_t', 'Int32_t', 'List_1_t', 'Dictionary_2_t',
+             'IL2CPP_EXTERN_C', 'il2cpp_codegen_initialize', 'NullCheck', 'Vector3_t', 'Component_t']
+    lines = []
+    for index in range(count):
+        name = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(12))
+        a, b, c = rng.sample(words, 3)
+        lines.append(f"{a} {b}_{name}_m{index:04X} ({c}* __this, const RuntimeMethod* method);\n")
+    return lines
+
+
+def synthetic_content(kind, size, rng, lines):
+    """Nội dung file giả lập: source (text lặp nhiều), binary (nén ~2x), random (không nén được)"""
+    if kind == 'random':
+        return rng.getrandbits(size * 8).to_bytes(size, 'little')
+    if kind == 'binary':
+        out = bytearray()
+        while len(out) < size:
+            block = rng.getrandbits(4096 * 8).to_bytes(4096, 'little')
+            out += block + block  # Block lặp lại trong cửa sổ 32 KB của deflate
+        return bytes(out[:size])
+    text = ''.join(rng.choices(lines, k=size // 60 + 1)).encode('ascii')
+    return text[:size]
+
+
+def make_synthetic_tree(root, scale=1.0, seed=1):
+    """Sinh cây XCODE giả lập deterministic (cùng scale/seed → cùng nội dung trên mọi máy)
+
+    Trả về list đường dẫn tương đối theo kiểu: {kind: [rel_path, ...]}.
+    """
+    rng = random.Random(seed)
+    lines = synthetic_source_lines(rng)
+    paths = {}
+    copies = 0
+    for pattern, count, size, kind in SYNTHETIC_MIX:
+        for index in range(max(1, int(count * scale))):
+            rel_path = pattern.format(index)
+            data = synthetic_content(kind, size, rng, lines)
+            targets = [rel_path]
+            if kind != 'source' and index % SYNTHETIC_DUPLICATE_EVERY == 0:
+                targets.append(f"XCODE/Data/Raw/copy{copies}-{Path(rel_path).name}")
+                copies += 1
+            for target in targets:
+                file_path = Path(root) / target
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                file_path.write_bytes(data)
+                os.utime(file_path, (SYNTHETIC_MTIME, SYNTHETIC_MTIME))
+            paths.setdefault(pattern.rsplit('.', 1)[-1], []).append(rel_path)
+    return paths
+
+
+def modify_synthetic_tree(root, paths, rng):
+    """Sửa 1% file .h và 1 file .cpp (giống 1 lần export lại từ Unity)"""
+    lines = synthetic_source_lines(rng, 256)
+    headers = paths['h'][:max(1, int(len(paths['h']) * SYNTHETIC_CHANGED_RATIO))]
+    for rel_path in headers + paths['cpp'][:1]:
+        file_path = Path(root) / rel_path
+        size = file_path.stat().st_size
+        file_path.write_bytes(synthetic_content('source', size, rng, lines))
+    return len(headers) + 1
+
+
+def tree_fingerprint(files):
+    """Digest nội dung cây (path, size, sha256) — kết quả chỉ so sánh khi cùng fingerprint"""
+    digest = hashlib.sha256(f"synthetic-v{SYNTHETIC_VERSION}\n".encode('utf-8'))
+    for arcname in sorted(files):
+        digest.update(f"{arcname}\0{files[arcname]['size']}\0{files[arcname]['sha256']}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def current_rss():
+    """RSS hiện tại của process (bytes), None nếu không đo được"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ResourceSampler:
+    """Đo RSS tối đa (lấy mẫu mỗi 10 ms) và CPU time (mọi luồng) của process trong 1 pha
+
+    Không có /proc (macOS) thì dùng ru_maxrss — giá trị tối đa từ đầu process.
+    """
+
+    def __init__(self):
+        self.peak = None
+        self.cpu = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None:
+            self.peak = max(self.peak or 0, rss)
+
+    def _run(self):
+        while not self.stop.wait(0.01):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        times = os.times()
+        self.cpu_start = times.user + times.system
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+        times = os.times()
+        self.cpu = times.user + times.system - self.cpu_start
+        self._sample()
+        if self.peak is None and resource is not None:
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak = maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+class SuiteStandIn(ReleaseStandIn, ArtifactStandIn):
+    """Upload Release + tải artifact trên cùng 1 server (chạy ở process riêng)"""
+
+    def do_GET(self):
+        if re.search(r'/(actions/artifacts/\d+/zip|blob/\d+)$', urlparse(self.path).path):
+            return ArtifactStandIn.do_GET(self)
+        return ReleaseStandIn.do_GET(self)
+
+
+def serve_suite_stand_in(port_queue, blobs, bandwidth):
+    """Chạy SuiteStandIn ở process con: CPU/RSS của server không bị tính vào tool"""
+    SuiteStandIn.blobs = blobs
+    SuiteStandIn.bandwidth = bandwidth
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SuiteStandIn)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def measure_phase(run, repeat):
+    """Chạy 1 pha `repeat` lần, lấy lần nhanh nhất: seconds, cpu, peak_rss + bytes/files do run trả về"""
+    best = None
+    for attempt in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()), ResourceSampler() as sampler:
+            start_time = time.time()
+            size, files = run(attempt)
+            seconds = time.time() - start_time
+        if best is None or seconds < best['seconds']:
+            best = {'seconds': seconds, 'cpu_seconds': sampler.cpu, 'peak_rss': sampler.peak,
+                    'bytes': size, 'files': files}
+    return best
+
+
+def git_revision():
+    """Commit hiện tại của repo chứa benchmark (thêm '-dirty' nếu có file đang sửa)"""
+    cwd = Path(__file__).resolve().parent
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=cwd,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def load_suite_baseline(results_path, record, baseline=None):
+    """Lần chạy trước cùng fingerprint cây và số CPU (hoặc commit `baseline`) trong file kết quả"""
+    match = None
+    try:
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    previous = json.loads(line)
+                except ValueError:
+                    continue
+                if (previous.get('tree', {}).get('fingerprint') == record['tree']['fingerprint']
+                        and previous.get('cpus') == record['cpus']
+                        and (previous.get('commit', '').startswith(baseline) if baseline else True)):
+                    match = previous
+    except OSError:
+        return None
+    return match
+
+
+def print_suite(record, previous):
+    """Bảng kết quả từng pha, kèm speedup so với lần chạy `previous` nếu có"""
+    header = f"{'Pha':<32} {'Thời gian':>10} {'Tốc độ':>12} {'File/s':>9} {'RSS đỉnh':>10} {'CPU':>6}"
+    if previous:
+        header += f" {'vs ' + previous['commit']:>14}"
+    print(header)
+    for name, phase in record['phases'].items():
+        seconds = phase['seconds']
+        speed = f"{phase['bytes'] / (1024 * 1024) / seconds:.1f} MB/s" if phase['bytes'] and seconds > 0 else ''
+        rate = f"{phase['files'] / seconds:.0f}" if phase['files'] and seconds > 0 else ''
+        rss = f"{phase['peak_rss'] / (1024 * 1024):.0f} MB" if phase['peak_rss'] else '-'
+        cpu = f"{phase['cpu_seconds'] / seconds:.0%}" if seconds > 0 else ''
+        line = f"{name:<32} {seconds:>9.2f}s {speed:>12} {rate:>9} {rss:>10} {cpu:>6}"
+        old = previous['phases'].get(name) if previous else None
+        if old and seconds > 0:
+            line += f" {old['seconds'] / seconds:>13.2f}x"
+        print(line)
+
+
+def run_suite(args):
+    """Đo các đường nóng của tool trên cây XCODE giả lập + server giả lập GitHub (process riêng)"""
+    jobs = int(args.jobs.split(',')[-1]) if args.jobs else tool.default_jobs()
+    cwd = os.getcwd()
+    results_path = Path(args.results).resolve() if args.results else None
+    record = {'version': SYNTHETIC_VERSION, 'commit': git_revision(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'platform': sys.platform, 'cpus': os.cpu_count(),
+              'jobs': jobs, 'repeat': args.repeat, 'bandwidth': args.bandwidth or 0, 'phases': {}}
+    server = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            start_time = time.time()
+            paths = make_synthetic_tree(tmp, scale=args.scale, seed=args.seed)
+            xcode_path = Path(tmp) / tool.XCODE_DIR
+            files, _ = tool.build_file_index(xcode_path, jobs=jobs)
+            total = sum(entry['size'] for entry in files.values())
+            record['tree'] = {'scale': args.scale, 'seed': args.seed, 'files': len(files), 'bytes': total,
+                              'fingerprint': tree_fingerprint(files)}
+            print(f"Cây giả lập: {len(files)} file, {total / (1024 * 1024):.1f} MB "
+                  f"(sinh trong {time.time() - start_time:.1f}s) | fingerprint {record['tree']['fingerprint']} | "
+                  f"CPU: {os.cpu_count()} | {jobs} luồng | repeat: {args.repeat} | commit {record['commit']}")
+            phases = record['phases']
+
+            phases['scan_xcode_files'] = measure_phase(
+                lambda _: (None, len(tool.scan_xcode_files(xcode_path))), args.repeat)
+            phases['build_file_index'] = measure_phase(
+                lambda _: (total, len(tool.build_file_index(xcode_path, jobs=jobs, cache_path=None)[0])), args.repeat)
+            phases['build_file_index (cache ấm)'] = measure_phase(
+                lambda _: (None, len(tool.build_file_index(xcode_path, jobs=jobs)[0])), args.repeat)
+
+            def pack(_):
+                if not tool.compress_xcode_assets(jobs=jobs, full=True):
+                    raise RuntimeError('compress_xcode_assets lỗi')
+                return total, len(files)
+            phases['compress_xcode_assets'] = measure_phase(pack, args.repeat)
+
+            changed = {}
+
+            def repack(attempt):
+                changed['files'] = modify_synthetic_tree(tmp, paths, random.Random(args.seed + 1 + attempt))
+                if not tool.compress_xcode_assets(jobs=jobs):
+                    raise RuntimeError('compress_xcode_assets (incremental) lỗi')
+                return total, len(files)
+            phases['compress_xcode_assets (1% đổi)'] = measure_phase(repack, args.repeat)
+            zip_path = Path(tmp) / tool.ASSETS_ZIP
+            if not verify_zip(zip_path):
+                print("❌ ZIP bị lỗi CRC!")
+                sys.exit(1)
+            zip_size = zip_path.stat().st_size
+            print(f"ZIP: {zip_size / (1024 * 1024):.1f} MB ({zip_size / total:.1%}) | "
+                  f"incremental: {changed['files']} file đổi")
+
+            # Server giả lập ở process riêng; artifact = ZIP STORE chứa NROFLY.ipa (nội dung = ZIP assets)
+            artifact = io.BytesIO()
+            with zipfile.ZipFile(artifact, 'w', zipfile.ZIP_STORED) as zf:
+                zf.write(zip_path, 'NROFLY.ipa')
+            artifact = artifact.getvalue()
+            port_queue = multiprocessing.Queue()
+            server = multiprocessing.Process(target=serve_suite_stand_in, daemon=True,
+                                             args=(port_queue, {1: artifact}, int((args.bandwidth or 0) * 1024 * 1024)))
+            server.start()
+            root = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+            tool.API_BASE = f"{root}/repos/{tool.REPO_OWNER}/{tool.REPO_NAME}"
+            tool.UPLOADS_BASE = tool.API_BASE
+
+            def upload(_):
+                if not tool.upload_to_release('token', 1, zip_path):
+                    raise RuntimeError('upload_to_release lỗi')
+                return zip_size, None
+            phases['upload_to_release'] = measure_phase(upload, args.repeat)
+
+            def upload_parts(_):
+                if not tool.upload_parts_to_release('token', 1, zip_path, part_size_mb=args.part_size,
+                                                    jobs=args.upload_jobs):
+                    raise RuntimeError('upload_parts_to_release lỗi')
+                return zip_size, None
+            phases['upload_parts_to_release'] = measure_phase(upload_parts, args.repeat)
+
+            expected = tool.hash_file(zip_path)
+            entry = {'id': 1, 'name': 'NROFLY.ipa', 'digest': 'sha256:' + hashlib.sha256(artifact).hexdigest()}
+
+            def download(attempt):
+                out = Path(tmp) / f'download-{attempt}'
+                path = tool.download_artifacts('token', [entry], out)[0]
+                if not path or tool.hash_file(path) != expected:
+                    raise RuntimeError('download_artifacts: IPA tải về bị lỗi')
+                shutil.rmtree(out)
+                return len(artifact), None
+            phases['download_artifacts'] = measure_phase(download, args.repeat)
+        finally:
+            os.chdir(cwd)
+            if server is not None:
+                server.terminate()
+
+    previous = load_suite_baseline(results_path, record, args.baseline) if results_path else None
+    if args.baseline and not previous:
+        print(f"⚠️  Không có kết quả của commit {args.baseline} với cùng cây giả lập trong {results_path}")
+    print_suite(record, previous)
+    if results_path:
+        with open(results_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"Đã ghi kết quả vào {results_path}")
+
+
+# ============== CDC: chunk theo nội dung qua các lần sinh lại IL2CPP ==============
+
+CDC_CORPUS_MB = 64               # Dung lượng file lớn lấy từ XCODE khi scale=1
+CDC_UNCHANGED_RATIO = 0.6        # Mỗi lần sinh lại: 60% file lớn giữ nguyên (sửa C# nhỏ)
+
+
+def cdc_corpus(xcode_path, budget, rng):
+    """File lớn (≥ CDC_MAX_SIZE) của XCODE, lớn trước, tới `budget` byte: {tên: bytes}
+
+    Không có XCODE thì sinh .cpp giả lập kiểu il2cpp.
+    """
+    corpus = {}
+    total = 0
+    if xcode_path.is_dir():
+        records = sorted(tool.scan_tree(xcode_path), key=lambda record: -record[2])
+        for arcname, path, size, _ in records:
+            if size < tool.CDC_MAX_SIZE or total >= budget:
+                continue
+            corpus[arcname] = Path(path).read_bytes()
+            total += size
+    if not corpus:
+        lines = synthetic_source_lines(rng)
+        index = 0
+        while total < budget:
+            corpus[f"XCODE/Il2CppOutputProject/Source/il2cppOutput/Generated{index}.cpp"] = \
+                synthetic_content('source', 4 * 1024 * 1024, rng, lines)
+            total += 4 * 1024 * 1024
+            index += 1
+    return corpus
+
+
+def regenerate_il2cpp(data, rng):
+    """Giả lập 1 lần IL2CPP sinh lại file: chèn vài hàm mới, đổi số thứ tự trong vài dòng
+
+    File text: chèn khối 20-80 dòng (copy + đổi tên) và đổi chữ số trong 1-2 đoạn 50 dòng liền nhau
+    (bảng index/metadata được đánh số lại quanh chỗ thêm).
+    File binary: ghi đè vài vùng nhỏ và chèn 1 khối.
+    """
+    if b'\0' in data[:4096]:
+        out = bytearray(data)
+        for _ in range(rng.randint(1, 3)):
+            offset = rng.randrange(len(out))
+            out[offset:offset + 128] = rng.getrandbits(128 * 8).to_bytes(128, 'little')
+        offset = rng.randrange(len(out))
+        return bytes(out[:offset]) + rng.getrandbits(4096 * 8).to_bytes(4096, 'little') + bytes(out[offset:])
+    lines = data.split(b'\n')
+    for _ in range(rng.randint(1, 3)):
+        start = rng.randrange(len(lines))
+        suffix = b'_gen%d' % rng.randrange(10**6)
+        block = [line.replace(b'(', suffix + b'(', 1) for line in lines[start:start + rng.randint(20, 80)]]
+        position = rng.randrange(len(lines))
+        lines[position:position] = block
+    for _ in range(rng.randint(1, 2)):
+        start = rng.randrange(len(lines))
+        for index in range(start, min(len(lines), start + 50)):
+            lines[index] = re.sub(rb'\d', lambda match: str(rng.randrange(10)).encode('ascii'), lines[index], count=2)
+    return b'\n'.join(lines)
+
+
+def chunk_corpus(root, corpus, jobs):
+    """Ghi corpus ra `root` rồi cắt chunk: ({tên: [[sha256, size], ...]}, giây)"""
+    paths = {}
+    for name, data in corpus.items():
+        path = Path(root) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        paths[name] = str(path)
+    names = sorted(paths)
+    start_time = time.time()
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(tool.chunk_file, [paths[name] for name in names]))
+    else:
+        results = [tool.chunk_file(paths[name]) for name in names]
+    return dict(zip(names, results)), time.time() - start_time
+
+
+def run_cdc(args):
+    """Tốc độ cắt chunk (MB/s theo số process) và tỉ lệ dùng lại chunk qua các lần sinh lại IL2CPP"""
+    rng = random.Random(args.seed)
+    xcode_path = Path(args.xcode_dir)
+    corpus = cdc_corpus(xcode_path, int(CDC_CORPUS_MB * args.scale * 1024 * 1024), rng)
+    total = sum(len(data) for data in corpus.values())
+    job_counts = ([int(j) for j in args.jobs.split(',') if j.strip()] if args.jobs
+                  else sorted({1, tool.default_jobs()}))
+    print(f"Corpus: {len(corpus)} file lớn, {total / (1024 * 1024):.1f} MB | CPU: {tool.default_jobs()} | "
+          f"chunk {tool.CDC_FORMAT}")
+    print(f"{'Cắt chunk':<22} {'Thời gian':>10} {'Tốc độ':>15} {'Chunk':>8} {'TB':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for jobs in job_counts:
+            best = None
+            for _ in range(args.repeat):
+                chunks, seconds = chunk_corpus(Path(tmp) / 'gen0', corpus, jobs)
+                best = seconds if best is None else min(best, seconds)
+            count = sum(len(chunk_list) for chunk_list in chunks.values())
+            print(f"{f'{jobs} process':<22} {best:>9.2f}s {total / (1024 * 1024) / best:>10.2f} MB/s "
+                  f"{count:>8} {total / count / 1024:>6.0f} KB")
+
+        print()
+        print(f"{'Lần sinh lại':<14} {'File đổi':>9} {'Theo file':>12} {'Theo chunk':>12} {'Dùng lại':>9} {'Giảm':>7}")
+        store = {chunk_id for chunk_list in chunks.values() for chunk_id, _ in chunk_list}
+        previous = corpus
+        jobs = job_counts[-1]
+        for generation in range(1, args.regenerations + 1):
+            current = {name: (data if rng.random() < CDC_UNCHANGED_RATIO else regenerate_il2cpp(data, rng))
+                       for name, data in previous.items()}
+            changed = [name for name in current if current[name] != previous[name]]
+            chunks, _ = chunk_corpus(Path(tmp) / f'gen{generation}', current, jobs)
+            file_bytes = sum(len(current[name]) for name in changed)
+            new = {}
+            for chunk_list in chunks.values():
+                for chunk_id, size in chunk_list:
+                    if chunk_id not in store:
+                        new[chunk_id] = size
+            new_bytes = sum(new.values())
+            current_total = sum(len(data) for data in current.values())
+            print(f"{generation:<14} {len(changed):>9} {file_bytes / (1024 * 1024):>9.2f} MB "
+                  f"{new_bytes / (1024 * 1024):>9.2f} MB {1 - new_bytes / current_total:>9.1%} "
+                  f"{file_bytes / new_bytes if new_bytes else 0:>6.1f}x")
+            store.update(new)
+            shutil.rmtree(Path(tmp) / f'gen{generation - 1}', ignore_errors=True)
+            previous = current
+
+
+# ============== RESTORE: bước tải assets của workflow ==============
+
+class RestoreStandIn(ArtifactStandIn):
+    """Release giả lập cho restore_xcode_assets.py: tag → danh sách asset, asset redirect 302 sang /blob/{id}
+
+    /blob/{id} (Range, giới hạn băng thông mỗi kết nối) dùng lại ArtifactStandIn. `requests` đếm
+    số request (dùng chung giữa các process).
+    """
+
+    assets = []
+    requests = None
+
+    def _json(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.requests.get_lock():
+            self.requests.value += 1
+        path = urlparse(self.path).path
+        if re.search(r'/releases/tags/[^/]+$', path):
+            return self._json({'id': 1, 'assets': self.assets})
+        if re.search(r'/releases/1/assets$', path):
+            page = int(parse_qs(urlparse(self.path).query).get('page', ['1'])[0])
+            return self._json(self.assets if page == 1 else [])
+        match = re.search(r'/releases/assets/(\d+)$', path)
+        if match:
+            self.send_response(302)
+            self.send_header('Location', f"http://127.0.0.1:{self.server.server_address[1]}/blob/{match.group(1)}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        return ArtifactStandIn.do_GET(self)
+
+
+def serve_restore_stand_in(port_queue, blobs, assets, bandwidth, requests):
+    """Chạy RestoreStandIn ở process con (server không tranh GIL với bên tải)"""
+    RestoreStandIn.blobs = blobs
+    RestoreStandIn.assets = assets
+    RestoreStandIn.bandwidth = bandwidth
+    RestoreStandIn.requests = requests
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RestoreStandIn)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def restore_sequential(url, dest):
+    """Bước tải cũ của workflow: 1 curl tải cả ZIP, unzip 1 luồng rồi chép lại file trùng nội dung"""
+    zip_path = Path(dest) / 'xcode-assets.zip'
+    response = tool.requests.get(url, headers={'Accept': 'application/octet-stream'}, stream=True)
+    with open(zip_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=tool.DOWNLOAD_BUFFER):
+            f.write(chunk)
+    with zipfile.ZipFile(zip_path) as zf:
+        zf.extractall(dest)
+    links_path = Path(dest) / tool.DEDUP_LINKS
+    if links_path.exists():
+        for arcname, source in json.loads(links_path.read_text(encoding='utf-8'))['links'].items():
+            (Path(dest) / arcname).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(Path(dest) / source, Path(dest) / arcname)
+        links_path.unlink()
+    (Path(dest) / tool.ZIP_MANIFEST).unlink(missing_ok=True)
+    zip_path.unlink()
+
+
+def run_restore(args):
+    """Restore cùng bộ assets (part theo digest + ZIP tên cũ) bằng bước tải cũ, restore_xcode_assets và cache ấm"""
+    jobs = int(args.jobs.split(',')[-1]) if args.jobs else restore.DOWNLOAD_JOBS
+    cwd = os.getcwd()
+    server = None
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            make_synthetic_tree(tmp, scale=args.scale, seed=args.seed)
+            with contextlib.redirect_stdout(io.StringIO()):
+                zip_path = tool.compress_xcode_assets(jobs=jobs, full=True)
+            if not zip_path:
+                raise RuntimeError('compress_xcode_assets lỗi')
+            manifest = tool.load_assets_manifest()
+            digest = manifest['digest']
+            expected = {arcname: record['sha256'] for arcname, record in manifest['files'].items()}
+            data = Path(zip_path).read_bytes()
+
+            # Release: part + index theo digest (restore_xcode_assets) và ZIP tên cố định (bước cũ)
+            name = tool.digest_asset_name(tool.ASSETS_ZIP, digest)
+            part_size = args.part_size * 1024 * 1024
+            blobs = {1: data}
+            assets = [{'id': 1, 'name': tool.ASSETS_ZIP, 'size': len(data), 'state': 'uploaded'}]
+            parts = []
+            for offset in range(0, len(data), part_size):
+                chunk = data[offset:offset + part_size]
+                asset_id = len(blobs) + 1
+                blobs[asset_id] = chunk
+                part = {'name': tool.part_name(name, len(parts) + 1), 'offset': offset, 'size': len(chunk),
+                        'sha256': hashlib.sha256(chunk).hexdigest()}
+                parts.append(part)
+                assets.append({'id': asset_id, 'name': part['name'], 'size': len(chunk), 'state': 'uploaded'})
+            index = json.dumps({'name': name, 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest(),
+                                'digest': digest, 'part_size': part_size, 'parts': parts}).encode('utf-8')
+            blobs[len(blobs) + 1] = index
+            assets.append({'id': len(blobs), 'name': tool.parts_index_name(name), 'size': len(index),
+                           'state': 'uploaded'})
+
+            requests = multiprocessing.Value('i', 0)
+            port_queue = multiprocessing.Queue()
+            server = multiprocessing.Process(target=serve_restore_stand_in, daemon=True,
+                                             args=(port_queue, blobs, assets, int(args.bandwidth * 1024 * 1024),
+                                                   requests))
+            server.start()
+            root = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+            client_args = ('owner/repo', 'v1.0-latest', 'token')
+            total = sum(record['size'] for record in manifest['files'].values())
+            print(f"Cây giả lập: {len(expected)} file, {total / (1024 * 1024):.1f} MB | ZIP "
+                  f"{len(data) / (1024 * 1024):.1f} MB, {len(parts)} part | băng thông mỗi kết nối: "
+                  f"{args.bandwidth:.0f} MB/s | CPU: {os.cpu_count()} | {jobs} kết nối")
+            print(f"{'Cách restore':<28} {'Thời gian':>10} {'Tốc độ':>15} {'Request':>8} {'Speedup':>9}")
+
+            cache_dir = Path(tmp) / 'runner-cache'
+            runs = [('curl + unzip (cũ)',
+                     lambda dest: restore_sequential(f"{root}/repos/owner/repo/releases/assets/1", dest)),
+                    (f'restore_xcode_assets x{jobs}',
+                     lambda dest: restore.restore_assets(restore.ReleaseClient(*client_args, api_root=root),
+                                                         digest, dest, jobs=jobs)),
+                    ('restore (cache ấm)',
+                     lambda dest: restore.restore_assets(restore.ReleaseClient(*client_args, api_root=root),
+                                                         digest, dest, str(cache_dir), jobs=jobs))]
+            with contextlib.redirect_stdout(io.StringIO()):
+                runs[2][1](Path(tmp) / 'warm-up')  # Lần đầu điền cache (như run trước đó trên runner)
+            shutil.rmtree(Path(tmp) / 'warm-up')
+
+            baseline = None
+            for label, run in runs:
+                best = None
+                for attempt in range(args.repeat):
+                    dest = Path(tmp) / f'restore-{attempt}'
+                    dest.mkdir()
+                    before = requests.value
+                    start_time = time.time()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        run(dest)
+                    seconds = time.time() - start_time
+                    count = requests.value - before
+                    files, _ = tool.build_file_index(dest / tool.XCODE_DIR, cache_path=None)
+                    if {arcname: record['sha256'] for arcname, record in files.items()} != expected:
+                        print(f"❌ {label}: cây restore khác cây gốc!")
+                        sys.exit(1)
+                    shutil.rmtree(dest)
+                    if best is None or seconds < best[0]:
+                        best = (seconds, count)
+                baseline = baseline or best[0]
+                print(f"{label:<28} {best[0]:>9.2f}s {len(data) / (1024 * 1024) / best[0]:>10.2f} MB/s "
+                      f"{best[1]:>8} {baseline / best[0]:>8.2f}x")
+        finally:
+            os.chdir(cwd)
+            if server is not None:
+                server.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark nén/upload XCODE của auto_build_ipa.py')
+    parser.add_argument('mode', nargs='?', default='compress', choices=['compress', 'pipeline', 'policy', 'tracking', 'download', 'batch', 'suite', 'cdc',
+                                                                   'restore'],
+                        help='compress: zipfile 1 luồng vs song song | pipeline: 2 pha vs stream | '
+                             'policy: so sánh các policy nén | tracking: poll 10s vs RunTracker | '
+                             'download: tải artifact tuần tự vs song song | batch: build matrix lần lượt vs song song | '
+                             'suite: đo các đường nóng trên cây giả lập, so sánh giữa các commit | '
+                             'cdc: tốc độ cắt chunk và tỉ lệ dùng lại qua các lần sinh lại IL2CPP | '
+                             'restore: bước tải assets của workflow cũ vs restore_xcode_assets.py')
+    parser.add_argument('--xcode-dir', default=tool.XCODE_DIR,
+                        help=f'Thư mục cần nén (mặc định: {tool.XCODE_DIR})')
+    parser.add_argument('--jobs', default=None,
+                        help='Danh sách số luồng, ví dụ: 1,2,4,8 (mặc định: 1,2,4,...,số CPU)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Số lần chạy mỗi cấu hình, lấy thời gian tốt nhất')
+    parser.add_argument('--part-size', type=int, default=tool.STREAM_PART_SIZE_MB,
+                        help=f'pipeline/restore: kích thước part MB (mặc định: {tool.STREAM_PART_SIZE_MB})')
+    parser.add_argument('--upload-jobs', type=int, default=tool.DEFAULT_UPLOAD_JOBS,
+                        help=f'pipeline: số luồng upload (mặc định: {tool.DEFAULT_UPLOAD_JOBS})')
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help='pipeline/download/batch/suite: băng thông giả lập MB/s (download: mỗi kết nối; '
+                             '0 = không giới hạn, mặc định: 20, suite: 0)')
+    parser.add_argument('--policies', default=None,
+                        help='policy: danh sách preset hoặc file JSON, ví dụ: deflate,smart,max '
+                             '(mặc định: tất cả preset)')
+    parser.add_argument('--run-seconds', type=float, default=120,
+                        help='tracking: thời gian build trong lịch sử (run giả lập chậm hơn 10%%); '
+                             'batch: thời gian build dài nhất (mặc định: 120)')
+    parser.add_argument('--builds', type=int, default=3,
+                        help='batch: số build trong matrix (mặc định: 3)')
+    parser.add_argument('--artifacts', type=int, default=2,
+                        help='download: số artifact giả lập (mặc định: 2)')
+    parser.add_argument('--artifact-mb', type=float, default=64,
+                        help='download: dung lượng mỗi artifact MB (mặc định: 64)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='suite: hệ số số file của cây giả lập (mặc định: 1.0 ≈ 4200 file, 90 MB); '
+                             f'cdc: hệ số dung lượng file lớn lấy từ XCODE (1.0 = {CDC_CORPUS_MB} MB)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='suite/cdc: seed sinh cây giả lập và các lần sinh lại (mặc định: 1)')
+    parser.add_argument('--regenerations', type=int, default=3,
+                        help='cdc: số lần giả lập IL2CPP sinh lại code (mặc định: 3)')
+    parser.add_argument('--results', default=SUITE_RESULTS,
+                        help=f'suite: file JSONL lưu kết quả các lần chạy (mặc định: {SUITE_RESULTS}, "" = không lưu)')
+    parser.add_argument('--baseline', default=None,
+                        help='suite: commit để so sánh (mặc định: lần chạy trước cùng cây giả lập)')
+    args = parser.parse_args()
+
+    if args.mode == 'suite':
+        run_suite(args)
+        return
+    if args.mode == 'cdc':
+        run_cdc(args)
+        return
+    if args.bandwidth is None:
+        args.bandwidth = 20
+
+    if args.mode == 'tracking':
+        run_tracking(args)
+        return
+    if args.mode == 'download':
+        run_download(args)
+        return
+    if args.mode == 'batch':
+        run_batch_bench(args)
+        return
+    if args.mode == 'restore':
+        run_restore(args)
+        return
+
+    xcode_path = Path(args.xcode_dir)
+    if not xcode_path.is_dir():
+        print(f"❌ Thư mục {xcode_path} không tồn tại!")
+        sys.exit(1)
+
+    if args.mode == 'pipeline':
+        run_pipeline(args, xcode_path)
+        return
+    if args.mode == 'policy':
+        run_policies(args, xcode_path)
+        return
+
+    if args.jobs:
+        job_counts = [int(j) for j in args.jobs.split(',') if j.strip()]
+    else:
+        job_counts = []
+        j = 1
+        while j < tool.default_jobs():
+            job_counts.append(j)
+            j *= 2
+        job_counts.append(tool.default_jobs())
+
+    def best_of(run):
+        best = None
+        for _ in range(args.repeat):
+            stats = run()
+            if best is None or stats['seconds'] < best['seconds']:
+                best = stats
+        return best
+
+    print(f"Thư mục: {xcode_path} | CPU: {tool.default_jobs()} | repeat: {args.repeat}")
+    print(f"{'Cấu hình':<22} {'Thời gian':>10} {'Tốc độ':>15} {'Kích thước':>13} {'Speedup':>9}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_zip = Path(tmp) / 'baseline.zip'
+        baseline = best_of(lambda: compress_with_zipfile(xcode_path, baseline_zip))
+        if not verify_zip(baseline_zip):
+            print("❌ ZIP baseline bị lỗi CRC!")
+            sys.exit(1)
+        print_row('zipfile (1 luồng)', baseline, baseline['seconds'])
+
+        for jobs in job_counts:
+            parallel_zip = Path(tmp) / f'parallel-{jobs}.zip'
+            stats = best_of(lambda: tool.pack_directory(xcode_path, parallel_zip,
+                                                        jobs=jobs, progress=False))
+            if not verify_zip(parallel_zip):
+                print(f"❌ ZIP song song ({jobs} luồng) bị lỗi CRC!")
+                sys.exit(1)
+            print_row(f'song song ({jobs} luồng)', stats, baseline['seconds'])
+            parallel_zip.unlink()
+
+
+if __name__ == "__main__":
+    main()
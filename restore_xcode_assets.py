@@ -0,0 +1,899 @@
+#!/usr/bin/env python3
+"""
+Restore XCODE từ GitHub Releases (bước tải assets của build-ipa-releases.yml)
+Tìm bộ asset theo digest → tải song song theo Range → giải nén song song ngay khi member
+đã đủ byte → kiểm tra từng file theo manifest (sha256) và digest của cả cây.
+Asset đã có trong cache của runner (actions/cache, key theo digest) thì dùng lại, không cần mạng.
+Chỉ dùng thư viện chuẩn: runner không cần pip install.
+
+    python3 restore_xcode_assets.py resolve --tag v1.0-latest            # digest=... vào $GITHUB_OUTPUT
+    python3 restore_xcode_assets.py restore --tag v1.0-latest --digest <digest> --cache-dir <dir>
+"""
+
+import os
+import sys
+import time
+import json
+import gzip
+import lzma
+import zlib
+import queue
+import bisect
+import shutil
+import ctypes
+import ctypes.util
+import hashlib
+import zipfile
+import argparse
+import tempfile
+import threading
+import http.client
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# ============== CẤU HÌNH ==============
+# Tên asset/member và cách tính digest phải khớp auto_build_ipa.py
+XCODE_DIR = "XCODE"
+ASSETS_ZIP = "xcode-assets.zip"
+CURRENT_ASSETS = "xcode-assets.current.json"
+CHAIN_INDEX = "xcode-assets.chain.json"
+CHAIN_VERSION = 1
+CDC_RECIPE = "xcode-assets.recipe.json.gz"
+CDC_RECIPE_VERSION = 1
+DEDUP_LINKS = ".xcode-assets-links.json"
+ZIP_MANIFEST = ".xcode-assets-manifest.json"
+MANIFEST_VERSION = 1
+PACK_FORMAT = "zip-v1"
+API_ROOT = os.environ.get('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+DEFAULT_REPO = os.environ.get('GITHUB_REPOSITORY', 'cuong1206/IPA_UNITY_FULL')
+DOWNLOAD_JOBS = 8                # Số kết nối Range song song
+RANGE_SIZE_MB = 16               # Kích thước mỗi đoạn Range
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 600
+API_TIMEOUT = 60
+READ_BLOCK = 1024 * 1024         # Bộ đệm đọc/ghi khi tải và giải nén
+EXTRACT_BATCH_BYTES = 8 * 1024 * 1024  # Gom các member nhỏ liền nhau thành 1 job giải nén
+EXTRACT_BATCH_FILES = 256
+TMP_SUFFIX = '.restore-tmp'      # File đang ghi dở, đổi tên khi xong
+
+class RestoreError(Exception):
+    """Lỗi không restore tiếp được (asset thiếu, tải lỗi, sai sha256...)"""
+
+def print_success(message):
+    """In thông báo thành công"""
+    print(f"✅ {message}", flush=True)
+
+def print_error(message):
+    """In thông báo lỗi"""
+    print(f"❌ {message}", flush=True)
+
+def print_info(message):
+    """In thông tin"""
+    print(f"ℹ️  {message}", flush=True)
+
+def print_warning(message):
+    """In cảnh báo"""
+    print(f"⚠️  {message}", flush=True)
+
+def digest_asset_name(name, digest):
+    """Tên asset của 1 digest: xcode-assets.zip → xcode-assets.<12 ký tự digest>.zip"""
+    stem, _, suffix = name.partition('.')
+    return f"{stem}.{digest[:12]}.{suffix}"
+
+def compute_assets_digest(files, pack=None):
+    """Digest của cả cây {arcname: {size, sha256}} + cách đóng gói `pack` (giống auto_build_ipa.py)"""
+    header = PACK_FORMAT if pack is None else f"{PACK_FORMAT} {pack}"
+    digest = hashlib.sha256(header.encode('utf-8') + b'\n')
+    for arcname in sorted(files):
+        record = files[arcname]
+        digest.update(f"{arcname}\0{record['size']}\0{record['sha256']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def hash_slice(path, offset=0, size=None):
+    """SHA-256 của đoạn [offset, offset+size) trong file (size None = tới hết file)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        remaining = size
+        while remaining is None or remaining > 0:
+            block = f.read(READ_BLOCK if remaining is None else min(READ_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+def check_slice(path, offset, size, sha256, label):
+    """Kiểm tra sha256 của 1 đoạn đã tải (part, pack)"""
+    if hash_slice(path, offset, size) != sha256:
+        raise RestoreError(f"{label} bị hỏng (sai sha256)")
+
+_clonefile = None
+if sys.platform == 'darwin':
+    try:
+        _clonefile = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True).clonefile
+        _clonefile.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+    except (OSError, AttributeError):
+        _clonefile = None
+
+def clone_file(src, dst):
+    """Chép file: clone APFS trên macOS (không tốn thêm dung lượng), hệ khác chép thường"""
+    tmp_path = dst + TMP_SUFFIX
+    if os.path.lexists(tmp_path):
+        os.unlink(tmp_path)
+    if _clonefile is None or _clonefile(os.fsencode(src), os.fsencode(tmp_path), 0) != 0:
+        shutil.copyfile(src, tmp_path)
+    shutil.copymode(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+# ============== GITHUB RELEASE ==============
+
+class ReleaseClient:
+    """Đọc asset của 1 Release qua GitHub API bằng urllib
+
+    Danh sách asset chỉ được lấy khi cần lần đầu: restore hoàn toàn từ cache không gọi mạng.
+    """
+
+    def __init__(self, repo, tag, token=None, api_root=API_ROOT):
+        self.base = f"{api_root}/repos/{repo}"
+        self.tag = tag
+        self.token = token
+        self.lock = threading.Lock()
+        self._assets = None
+
+    def _open(self, url, headers, timeout):
+        request = urllib.request.Request(url, headers=headers)
+        if self.token:
+            # Token không đi theo redirect sang storage (storage chỉ nhận 1 kiểu xác thực)
+            request.add_unredirected_header('Authorization', f'token {self.token}')
+        return urllib.request.urlopen(request, timeout=timeout)
+
+    def get_json(self, path):
+        """GET 1 endpoint của repo, thử lại khi lỗi mạng/5xx; 404 trả về None"""
+        error = None
+        for attempt in range(DOWNLOAD_RETRIES):
+            try:
+                with self._open(self.base + path, {'Accept': 'application/vnd.github+json'},
+                                API_TIMEOUT) as response:
+                    return json.loads(response.read().decode('utf-8'))
+            except urllib.error.HTTPError as e:
+                if e.code == 404:
+                    return None
+                error = e
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                error = e
+            time.sleep(attempt + 1)
+        raise RestoreError(f"GitHub API {path}: {error}")
+
+    def assets(self):
+        """{tên: asset} các asset đã upload xong của Release"""
+        with self.lock:
+            if self._assets is None:
+                release = self.get_json(f"/releases/tags/{self.tag}")
+                if release is None:
+                    raise RestoreError(f"Không tìm thấy Release với tag '{self.tag}' "
+                                       f"(tag có đúng không? Release đã publish chưa, không phải draft?)")
+                assets = {}
+                page = 1
+                while True:
+                    batch = self.get_json(f"/releases/{release['id']}/assets?per_page=100&page={page}") or []
+                    for asset in batch:
+                        if asset.get('state') == 'uploaded':
+                            assets[asset['name']] = asset
+                    if len(batch) < 100:
+                        break
+                    page += 1
+                self._assets = assets
+            return self._assets
+
+    def asset(self, name):
+        """Asset theo tên, lỗi nếu Release không có"""
+        asset = self.assets().get(name)
+        if asset is None:
+            raise RestoreError(f"Release {self.tag} không có asset {name}")
+        return asset
+
+    def open_asset(self, asset, start=None, end=None):
+        """Mở stream nội dung asset (đoạn [start, end] nếu có)"""
+        headers = {'Accept': 'application/octet-stream'}
+        if start is not None:
+            headers['Range'] = f'bytes={start}-{end}'
+        return self._open(f"{self.base}/releases/assets/{asset['id']}", headers, DOWNLOAD_TIMEOUT)
+
+    def read(self, name):
+        """Nội dung 1 asset nhỏ (JSON) vào RAM"""
+        asset = self.asset(name)
+        error = None
+        for attempt in range(DOWNLOAD_RETRIES):
+            try:
+                with self.open_asset(asset) as response:
+                    return response.read()
+            except (OSError, http.client.HTTPException) as e:
+                error = e
+            time.sleep(attempt + 1)
+        raise RestoreError(f"Không thể download {name}: {error}")
+
+def current_digest(client):
+    """Digest bộ assets hiện tại theo CURRENT_ASSETS, None nếu Release publish bằng bản tool cũ
+
+    Con trỏ đang được thay (tên chính vắng trong chốc lát) thì đọc bản mới nhất trong các bản
+    tạm/dự phòng (CURRENT_ASSETS.<digest>[.old].tmp) thay vì coi là Release của bản tool cũ.
+    """
+    names = sorted((name for name in client.assets()
+                    if name == CURRENT_ASSETS or (name.startswith(CURRENT_ASSETS + '.') and name.endswith('.tmp'))),
+                   key=lambda name: name != CURRENT_ASSETS)
+    if not names:
+        return None
+    pointers = []
+    for name in names:
+        try:
+            pointer = json.loads(client.read(name).decode('utf-8'))
+            digest = pointer['digest']
+        except (ValueError, KeyError, TypeError, RestoreError) as e:
+            if name == CURRENT_ASSETS:
+                raise RestoreError(f"{name} không hợp lệ: {e}")
+            continue  # Bản tạm vừa bị xóa/đổi tên khi lần thay xong
+        if name == CURRENT_ASSETS:
+            return digest
+        history = pointer.get('history') or [{}]
+        pointers.append((history[0].get('published_at') or 0, digest))
+    if not pointers:
+        raise RestoreError(f"{CURRENT_ASSETS} đang được thay, chạy lại sau vài giây")
+    print_warning(f"{CURRENT_ASSETS} đang được thay, dùng bản tạm mới nhất")
+    return max(pointers)[1]
+
+# ============== CACHE ASSET ==============
+
+class AssetStore:
+    """Thư mục chứa asset đã tải, theo tên asset
+
+    Asset theo digest/sha256 không bao giờ đổi nội dung nên thư mục cache của runner
+    (actions/cache) dùng lại được qua các run; không có cache thì là thư mục tạm.
+    """
+
+    def __init__(self, root=None):
+        self.persistent = root is not None
+        self.root = root or tempfile.mkdtemp(prefix='xcode-assets-')
+        os.makedirs(self.root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.used = set()
+        self.hits = 0
+        self.hit_bytes = 0
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def partial(self, name):
+        return self.path(name) + '.part'
+
+    def has(self, name):
+        return os.path.isfile(self.path(name))
+
+    def get(self, name, size=None):
+        """Đường dẫn asset nếu đã có (và đúng size nếu biết trước), None nếu chưa"""
+        path = self.path(name)
+        try:
+            actual = os.path.getsize(path)
+        except OSError:
+            return None
+        if size is not None and actual != size:
+            return None
+        with self.lock:
+            if name not in self.used:
+                self.used.add(name)
+                self.hits += 1
+                self.hit_bytes += actual
+        return path
+
+    def commit(self, name):
+        """Asset tải xong (file .part) → dùng được"""
+        path = self.path(name)
+        os.replace(self.partial(name), path)
+        with self.lock:
+            self.used.add(name)
+        return path
+
+    def clear(self):
+        """Xóa hết (cache hỏng)"""
+        for entry in os.scandir(self.root):
+            os.unlink(entry.path)
+        self.used.clear()
+        self.hits = 0
+        self.hit_bytes = 0
+
+    def close(self, success):
+        """Cache chỉ giữ asset của lần restore thành công này (actions/cache lưu lại), thư mục tạm thì xóa"""
+        if not self.persistent:
+            shutil.rmtree(self.root, ignore_errors=True)
+            return
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.part') or (success and entry.name not in self.used):
+                os.unlink(entry.path)
+
+# ============== CHẠY JOB THEO PHỤ THUỘC ==============
+
+class TaskGraph:
+    """Chạy job trên thread pool ngay khi các key nó cần đã xong (đoạn đã tải, pack đã kiểm tra...)
+
+    `on_done(kết quả)` chạy ở luồng gọi run() nên được thêm job mới mà không cần khóa;
+    job xong thì key `provides` của nó cũng xong.
+    """
+
+    def __init__(self):
+        self.done = set()
+        self.waiting = {}
+        self.running = {}
+        self.finished = queue.Queue()
+
+    def add(self, pool, fn, *args, needs=(), provides=None, on_done=None):
+        job = [set(needs) - self.done, pool, fn, args, provides, on_done]
+        if not job[0]:
+            self._submit(job)
+        for key in job[0]:
+            self.waiting.setdefault(key, []).append(job)
+
+    def _submit(self, job):
+        _, pool, fn, args, provides, on_done = job
+        future = pool.submit(fn, *args)
+        self.running[future] = (provides, on_done)
+        future.add_done_callback(self.finished.put)
+
+    def complete(self, key):
+        self.done.add(key)
+        for job in self.waiting.pop(key, ()):
+            job[0].discard(key)
+            if not job[0]:
+                self._submit(job)
+
+    def run(self):
+        """Đợi tới khi mọi job xong; job lỗi thì hủy các job chưa chạy và ném lỗi đó"""
+        try:
+            while self.running:
+                future = self.finished.get()
+                provides, on_done = self.running.pop(future)
+                result = future.result()
+                if on_done is not None:
+                    on_done(result)
+                if provides is not None:
+                    self.complete(provides)
+        except BaseException:
+            for future in self.running:
+                future.cancel()
+            raise
+        if self.waiting:
+            raise RestoreError(f"Còn {len(self.waiting)} key không bao giờ xong")
+
+# ============== RESTORE ==============
+
+class XcodeRestore:
+    """Restore cây XCODE của 1 bộ assets vào `dest` (thư mục gốc repo)"""
+
+    def __init__(self, client, store, dest='.', jobs=DOWNLOAD_JOBS, range_size_mb=RANGE_SIZE_MB):
+        self.client = client
+        self.store = store
+        self.dest = dest
+        self.jobs = max(1, jobs)
+        self.range_size = range_size_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.written = {}      # arcname → (size, sha256) của file đã ghi ở lần restore này
+        self.downloaded = 0
+        self._zips = {}
+
+    def __enter__(self):
+        self.download_pool = ThreadPoolExecutor(self.jobs)
+        self.work_pool = ThreadPoolExecutor(os.cpu_count() or 4)
+        return self
+
+    def __exit__(self, *exc):
+        self.download_pool.shutdown()
+        self.work_pool.shutdown()
+        self._close_zips()
+
+    # ---------- Tải ----------
+
+    def fetch_range(self, asset, offset, length, path, file_offset):
+        """Tải byte [offset, offset+length) của asset vào `path` tại `file_offset`"""
+        error = None
+        for attempt in range(DOWNLOAD_RETRIES):
+            try:
+                with self.client.open_asset(asset, offset, offset + length - 1) as response, \
+                        open(path, 'r+b') as f:
+                    skip = offset if response.status != 206 else 0
+                    while skip:
+                        # Server bỏ qua Range: đọc bỏ phần trước đoạn cần
+                        block = response.read(min(skip, READ_BLOCK))
+                        if not block:
+                            break
+                        skip -= len(block)
+                    f.seek(file_offset)
+                    remaining = length
+                    while remaining:
+                        block = response.read(min(remaining, READ_BLOCK))
+                        if not block:
+                            raise ConnectionError("kết nối đóng trước khi tải đủ")
+                        f.write(block)
+                        remaining -= len(block)
+                with self.lock:
+                    self.downloaded += length
+                return length
+            except (OSError, http.client.HTTPException) as e:
+                error = e
+            time.sleep(attempt + 1)
+        raise RestoreError(f"Không thể download {asset['name']} (byte {offset}+{length}): {error}")
+
+    def queue_download(self, graph, name, segments, total, tail_first=False):
+        """Thêm các đoạn Range ghép thành asset `name` (file .part cấp phát trước) vào graph
+
+        `segments` là [(asset, offset trong asset, số byte, offset trong file)]. Trả về
+        [(start, end, key)] sắp theo start, key xong khi đoạn đã tải.
+        """
+        path = self.store.partial(name)
+        with open(path, 'wb') as f:
+            f.truncate(total)
+        ranges = []
+        for asset, asset_offset, length, file_offset in segments:
+            for start in range(0, length, self.range_size):
+                size = min(self.range_size, length - start)
+                ranges.append((file_offset + start, size, asset, asset_offset + start))
+        ranges.sort(key=lambda item: item[0])
+        order = ranges[-1:] + ranges[:-1] if tail_first else ranges
+        for file_offset, size, asset, asset_offset in order:
+            graph.add(self.download_pool, self.fetch_range, asset, asset_offset, size, path, file_offset,
+                      provides=(name, file_offset))
+        return [(file_offset, file_offset + size, (name, file_offset)) for file_offset, size, _, _ in ranges]
+
+    def fetch_blob(self, name, size=None, sha256=None):
+        """Asset nguyên vẹn trong store (tải song song theo Range nếu chưa có), trả về đường dẫn"""
+        path = self.store.get(name, size)
+        if path:
+            return path
+        asset = self.client.asset(name)
+        graph = TaskGraph()
+        self.queue_download(graph, name, [(asset, 0, asset['size'], 0)], asset['size'])
+        graph.run()
+        if sha256:
+            check_slice(self.store.partial(name), 0, None, sha256, name)
+        return self.store.commit(name)
+
+    def read_blob(self, name):
+        with open(self.fetch_blob(name), 'rb') as f:
+            return f.read()
+
+    # ---------- Giải nén ----------
+
+    def target_path(self, arcname):
+        """Đường dẫn ghi file của member (không cho thoát ra ngoài dest)"""
+        parts = arcname.split('/')
+        if not arcname or arcname.startswith('/') or '..' in parts or '\\' in arcname:
+            raise RestoreError(f"Member không hợp lệ: {arcname}")
+        return os.path.join(self.dest, *parts)
+
+    def _zip(self, path):
+        """ZipFile riêng cho từng luồng (không dùng chung con trỏ file)"""
+        key = (threading.get_ident(), path)
+        zf = self._zips.get(key)
+        if zf is None:
+            zf = zipfile.ZipFile(path)
+            with self.lock:
+                self._zips[key] = zf
+        return zf
+
+    def _close_zips(self, path=None):
+        with self.lock:
+            for key in [key for key in self._zips if path is None or key[1] == path]:
+                self._zips.pop(key).close()
+
+    def read_directory(self, path, strict):
+        """Central directory của ZIP: (members theo offset, offset central directory)
+
+        Gọi khi mới có đoạn cuối file: central directory dài hơn đoạn đó thì trả về None
+        (đọc lại khi tải xong cả file).
+        """
+        try:
+            with zipfile.ZipFile(path) as zf:
+                infos = sorted(zf.infolist(), key=lambda info: info.header_offset)
+                return infos, getattr(zf, 'start_dir', os.path.getsize(path))
+        except (zipfile.BadZipFile, ValueError, EOFError):
+            if strict:
+                raise RestoreError(f"{os.path.basename(path)} không phải ZIP hợp lệ")
+            return None
+
+    def extract_members(self, path, infos):
+        """Giải nén 1 nhóm member: [(arcname, (size, sha256))] hoặc (arcname, dict) với member JSON của tool"""
+        zf = self._zip(path)
+        results = []
+        for info in infos:
+            if info.filename in (DEDUP_LINKS, ZIP_MANIFEST):
+                results.append((info.filename, json.loads(zf.read(info).decode('utf-8'))))
+                continue
+            target = self.target_path(info.filename)
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = target + TMP_SUFFIX
+            digest = hashlib.sha256()
+            try:
+                # Đọc hết member thì zipfile kiểm tra CRC
+                with zf.open(info) as src, open(tmp_path, 'wb') as out:
+                    for block in iter(lambda: src.read(READ_BLOCK), b''):
+                        digest.update(block)
+                        out.write(block)
+                mode = (info.external_attr >> 16) & 0o7777
+                if mode:
+                    os.chmod(tmp_path, mode)
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                os.utime(tmp_path, (mtime, mtime))
+                # Đổi tên thay vì ghi đè tại chỗ: file clone/hardlink khác không bị sửa theo
+                os.replace(tmp_path, target)
+            except zipfile.BadZipFile as e:
+                raise RestoreError(f"{info.filename}: {e}")
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+            results.append((info.filename, (info.file_size, digest.hexdigest())))
+        return results
+
+    def restore_zip(self, name, total=None, parts=None):
+        """Giải nén ZIP `name` vào dest, member nào đã tải đủ byte thì giải nén ngay (song song)
+
+        `parts` ([{name, offset, size, sha256}] theo index part) là các asset ghép thành ZIP,
+        None = 1 asset. ZIP đã có trong store thì không tải gì. Trả về member JSON của tool
+        ({DEDUP_LINKS: ..., ZIP_MANIFEST: ...}) sau khi đã chép lại file trùng nội dung.
+        """
+        graph = TaskGraph()
+        meta = {}
+        path = self.store.get(name, total)
+        ranges = []
+        if path is None:
+            if parts is None:
+                asset = self.client.asset(name)
+                total = asset['size']
+                segments = [(asset, 0, total, 0)]
+            else:
+                segments = [(self.client.asset(part['name']), 0, part['size'], part['offset']) for part in parts]
+            # Đoạn cuối (central directory) tải trước để biết vị trí từng member
+            ranges = self.queue_download(graph, name, segments, total, tail_first=True)
+            path = self.store.partial(name)
+            for part in parts or ():
+                graph.add(self.work_pool, check_slice, path, part['offset'], part['size'], part['sha256'],
+                          f"Part {part['name']}", needs=self._range_keys(ranges, part['offset'],
+                                                                        part['offset'] + part['size']))
+        starts = [start for start, _, _ in ranges]
+
+        def record(results):
+            for arcname, value in results:
+                if arcname in (DEDUP_LINKS, ZIP_MANIFEST):
+                    meta[arcname] = value
+                else:
+                    self.written[arcname] = value
+
+        def plan(directory):
+            if directory is None:
+                graph.add(self.work_pool, self.read_directory, path, True,
+                          needs=[key for _, _, key in ranges], on_done=plan)
+                return
+            infos, end_of_members = directory
+            bounds = [info.header_offset for info in infos[1:]] + [end_of_members]
+            batch = []
+            batch_bytes = 0
+            for index, (info, end) in enumerate(zip(infos, bounds)):
+                batch.append(info)
+                batch_bytes += info.file_size
+                if (batch_bytes >= EXTRACT_BATCH_BYTES or len(batch) >= EXTRACT_BATCH_FILES
+                        or index == len(infos) - 1):
+                    graph.add(self.work_pool, self.extract_members, path, batch, on_done=record,
+                              needs=self._range_keys(ranges, batch[0].header_offset, end, starts))
+                    batch = []
+                    batch_bytes = 0
+
+        graph.add(self.work_pool, self.read_directory, path, not ranges,
+                  needs=[ranges[-1][2]] if ranges else (), on_done=plan)
+        try:
+            graph.run()
+        finally:
+            self._close_zips(path)
+        if ranges:
+            self.store.commit(name)
+
+        links = meta.get(DEDUP_LINKS, {}).get('links', {})
+        if links:
+            self.expand_links(links)
+            print_info(f"Đã chép lại {len(links)} file trùng nội dung")
+        return meta
+
+    @staticmethod
+    def _range_keys(ranges, start, end, starts=None):
+        """Key các đoạn tải giao với [start, end)"""
+        starts = starts if starts is not None else [item[0] for item in ranges]
+        lo = max(0, bisect.bisect_right(starts, start) - 1)
+        hi = bisect.bisect_left(starts, end)
+        return [ranges[i][2] for i in range(lo, max(hi, lo + 1)) if i < len(ranges)]
+
+    def expand_links(self, links):
+        """File trùng nội dung chỉ có 1 bản trong ZIP: chép lại từ file nguồn"""
+        def copy(item):
+            arcname, source = item
+            target = self.target_path(arcname)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            clone_file(self.target_path(source), target)
+        list(self.work_pool.map(copy, links.items()))
+        for arcname, source in links.items():
+            if source in self.written:
+                self.written[arcname] = self.written[source]
+            else:
+                self.written.pop(arcname, None)
+
+    def restore_zip_asset(self, name, parts=None):
+        """ZIP `name` trên Release: ghép từ các part (theo NAME.parts.json) hoặc 1 asset
+
+        `parts` None = xem Release có index part không (bản tool cũ không ghi lại).
+        """
+        index_name = f"{name}.parts.json"
+        if parts is None:
+            parts = self.store.has(index_name) or index_name in self.client.assets()
+        if not parts:
+            return self.restore_zip(name)
+        index = json.loads(self.read_blob(index_name).decode('utf-8'))
+        print_info(f"{name}: {len(index['parts'])} part, {index['size'] / (1024*1024):.2f} MB")
+        return self.restore_zip(name, total=index['size'], parts=index['parts'])
+
+    def remove(self, arcname):
+        """Xóa file đã bị xóa ở digest sau (delta)"""
+        try:
+            os.unlink(self.target_path(arcname))
+        except FileNotFoundError:
+            pass
+        self.written.pop(arcname, None)
+
+    # ---------- Các kiểu assets ----------
+
+    def find_root(self, digest):
+        """Asset gốc của bộ assets: (kiểu, tên) theo digest, hoặc tên cố định của bản tool cũ"""
+        if digest:
+            candidates = [('recipe', digest_asset_name(CDC_RECIPE, digest)),
+                          ('chain', digest_asset_name(CHAIN_INDEX, digest)),
+                          ('parts', digest_asset_name(ASSETS_ZIP, digest) + '.parts.json'),
+                          ('zip', digest_asset_name(ASSETS_ZIP, digest))]
+            for kind, name in candidates:
+                if self.store.has(name):
+                    return kind, name
+        else:
+            candidates = [('recipe', CDC_RECIPE), ('chain', CHAIN_INDEX),
+                          ('parts', ASSETS_ZIP + '.parts.json'), ('zip', ASSETS_ZIP)]
+        assets = self.client.assets()
+        for kind, name in candidates:
+            if name in assets:
+                return kind, name
+        if digest:
+            raise RestoreError(f"Release không có asset của digest {digest[:12]} "
+                               f"(đã bị dọn hoặc chưa publish xong?)")
+        raise RestoreError(f"Không tìm thấy {ASSETS_ZIP} trong Release (có: {', '.join(sorted(assets)) or 'không có file nào'})")
+
+    def run(self, digest=None):
+        """Restore bộ assets của `digest` (None = tên cố định của bản tool cũ), trả về (kiểu, tên)"""
+        kind, name = self.find_root(digest)
+        print_info(f"Assets: {kind} {name}" + (f" (digest {digest[:12]})" if digest else ""))
+        if kind == 'recipe':
+            manifest = self.restore_recipe(name)
+        elif kind == 'chain':
+            manifest = self.restore_chain(name)
+        else:
+            index_name = name[:-len('.parts.json')] if kind == 'parts' else name
+            manifest = self.restore_zip_asset(index_name, parts=kind == 'parts').get(ZIP_MANIFEST)
+            if manifest is None:
+                print_warning("ZIP không có manifest (publish bằng bản tool cũ), chỉ kiểm tra CRC từng file")
+                return kind, name
+        published = manifest['digest']
+        # --digest có thể chỉ là phần đầu của digest
+        if digest and not published.startswith(digest):
+            raise RestoreError(f"Assets là của digest {published[:12]}, không phải {digest[:12]}")
+        self.verify(manifest['files'], published, manifest.get('pack'))
+        return kind, name
+
+    def restore_chain(self, name):
+        """Baseline rồi lần lượt từng delta (delta được tải trước trong lúc giải nén baseline), trả về chain"""
+        chain = json.loads(self.read_blob(name).decode('utf-8'))
+        if chain.get('version') != CHAIN_VERSION:
+            raise RestoreError(f"Chain version {chain.get('version')} chưa được hỗ trợ")
+        baseline = chain['baseline']
+        deltas = chain.get('deltas', [])
+        with ThreadPoolExecutor(1) as prefetch:
+            fetched = [prefetch.submit(self.fetch_blob, delta['name'], delta.get('size'), delta.get('sha256'))
+                       for delta in deltas]
+            try:
+                self.restore_zip_asset(baseline.get('name', ASSETS_ZIP), parts=baseline.get('parts'))
+                if deltas:
+                    print_info(f"Áp {len(deltas)} delta lên baseline {baseline['digest'][:12]}...")
+                for delta, future in zip(deltas, fetched):
+                    future.result()
+                    self.restore_zip(delta['name'])
+                    for arcname in delta.get('deleted', []):
+                        self.remove(arcname)
+                    print_info(f"   {delta['name']} xong")
+            finally:
+                for future in fetched:
+                    future.cancel()
+        return chain
+
+    def check_existing(self, item):
+        """File trên checkout đã đúng nội dung (source, header...) thì giữ nguyên"""
+        arcname, record = item
+        path = self.target_path(arcname)
+        try:
+            if os.path.getsize(path) == record['size'] and hash_slice(path) == record['sha256']:
+                return arcname, True
+        except OSError:
+            pass
+        return arcname, False
+
+    def assemble_file(self, arcname, record, packs, chunks):
+        """Ghép 1 file từ các chunk trong pack, kiểm tra sha256"""
+        target = self.target_path(arcname)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = target + TMP_SUFFIX
+        digest = hashlib.sha256()
+        handles = {}
+        try:
+            with open(tmp_path, 'wb') as out:
+                for i in record['chunks']:
+                    _, pack, offset, length, _, method = chunks[i]
+                    f = handles.get(pack)
+                    if f is None:
+                        f = handles[pack] = open(self.store.path(packs[pack][0]), 'rb')
+                    f.seek(offset)
+                    payload = f.read(length)
+                    if method == 'deflate':
+                        data = zlib.decompress(payload, -15)
+                    elif method == 'lzma':
+                        data = lzma.decompress(payload)
+                    else:
+                        data = payload
+                    digest.update(data)
+                    out.write(data)
+            if digest.hexdigest() != record['sha256']:
+                raise RestoreError(f"{arcname} ghép ra sai sha256")
+            os.chmod(tmp_path, 0o755 if record.get('exec') else 0o644)
+            os.replace(tmp_path, target)
+        finally:
+            for f in handles.values():
+                f.close()
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return arcname, (record['size'], record['sha256'])
+
+    def restore_recipe(self, name):
+        """Chunk store (--chunked): chỉ tải pack chứa chunk của file khác checkout, ghép file ngay khi đủ pack
+
+        Trả về recipe (files, digest, pack như manifest trong ZIP).
+        """
+        recipe = json.loads(gzip.decompress(self.read_blob(name)).decode('utf-8'))
+        if recipe.get('version') != CDC_RECIPE_VERSION:
+            raise RestoreError(f"Recipe version {recipe.get('version')} chưa được hỗ trợ")
+        files = recipe['files']
+        packs = recipe['packs']
+        chunks = recipe['chunks']
+        todo = []
+        for arcname, ok in self.work_pool.map(self.check_existing, sorted(files.items())):
+            if ok:
+                self.written[arcname] = (files[arcname]['size'], files[arcname]['sha256'])
+            else:
+                todo.append(arcname)
+        needed = sorted({chunks[i][1] for arcname in todo for i in files[arcname]['chunks']})
+        print_info(f"Ghép {len(todo)}/{len(files)} file từ {len(needed)}/{len(packs)} pack")
+
+        graph = TaskGraph()
+        for index in needed:
+            pack_name, size, sha256 = packs[index]
+            if self.store.get(pack_name, size):
+                graph.complete(('pack', index))
+                continue
+            asset = self.client.asset(pack_name)
+            ranges = self.queue_download(graph, pack_name, [(asset, 0, size, 0)], size)
+            graph.add(self.work_pool, check_slice, self.store.partial(pack_name), 0, size, sha256,
+                      f"Pack {pack_name}", needs=[key for _, _, key in ranges], provides=('pack', index),
+                      on_done=lambda _, pack_name=pack_name: self.store.commit(pack_name))
+
+        def record(result):
+            self.written[result[0]] = result[1]
+
+        for arcname in todo:
+            entry = files[arcname]
+            graph.add(self.work_pool, self.assemble_file, arcname, entry, packs, chunks, on_done=record,
+                      needs={('pack', chunks[i][1]) for i in entry['chunks']})
+        graph.run()
+        return recipe
+
+    def verify(self, files, digest, pack=None):
+        """Kiểm tra cây đã restore theo manifest {arcname: {size, sha256}} và digest của cả cây"""
+        if digest and compute_assets_digest(files, pack) != digest:
+            raise RestoreError(f"Manifest không khớp digest {digest[:12]}")
+        bad = []
+        unchecked = []
+        for arcname, record in files.items():
+            written = self.written.get(arcname)
+            if written is None:
+                unchecked.append(arcname)
+            elif written != (record['size'], record['sha256']):
+                bad.append(arcname)
+        # File không ghi ở lần restore này (nguồn link có từ trước...) thì hash trên đĩa
+        for arcname, ok in self.work_pool.map(self.check_existing, [(name, files[name]) for name in unchecked]):
+            if not ok:
+                bad.append(arcname)
+        if bad:
+            raise RestoreError(f"{len(bad)} file sai nội dung so với manifest: {', '.join(sorted(bad)[:3])}...")
+        print_success(f"Đã kiểm tra {len(files)} file theo manifest (digest {digest[:12]})")
+
+def restore_assets(client, digest=None, dest='.', cache_dir=None, jobs=DOWNLOAD_JOBS):
+    """Restore XCODE từ Release (dùng lại asset trong `cache_dir` nếu có), trả về dict thống kê
+
+    Asset theo tên cố định của bản tool cũ (digest None) có thể bị ghi đè nên không cache.
+    Cache cho ra file sai thì xóa cache và tải lại 1 lần.
+    """
+    start_time = time.time()
+    for attempt in range(2):
+        store = AssetStore(cache_dir if digest else None)
+        try:
+            with XcodeRestore(client, store, dest, jobs) as restore:
+                kind, name = restore.run(digest)
+        except RestoreError as e:
+            if attempt == 0 and store.persistent and store.hits:
+                print_warning(f"{e} → bỏ cache, tải lại từ Release")
+                store.clear()
+                continue
+            store.close(False)
+            raise
+        store.close(True)
+        break
+    seconds = time.time() - start_time
+    stats = {'kind': kind, 'name': name, 'seconds': seconds, 'downloaded': restore.downloaded,
+             'cached': store.hit_bytes, 'files': len(restore.written)}
+    speed = restore.downloaded / (1024 * 1024) / seconds if seconds > 0 else 0
+    print_success(f"Restore XCODE xong trong {seconds:.1f}s: tải {restore.downloaded / (1024*1024):.2f} MB "
+                  f"({speed:.2f} MB/s), từ cache {store.hit_bytes / (1024*1024):.2f} MB, "
+                  f"{len(restore.written)} file")
+    return stats
+
+def write_outputs(outputs):
+    """Ghi key=value cho các step sau ($GITHUB_OUTPUT), chạy ngoài Actions thì in ra"""
+    lines = ''.join(f"{key}={value}\n" for key, value in outputs.items())
+    output_path = os.environ.get('GITHUB_OUTPUT')
+    if output_path:
+        with open(output_path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+    else:
+        sys.stdout.write(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Restore XCODE từ GitHub Releases (CI)')
+    parser.add_argument('command', choices=['resolve', 'restore'],
+                        help='resolve: ghi digest bộ assets cần dùng (key cache) | restore: tải + giải nén + kiểm tra')
+    parser.add_argument('--tag', required=True, help='Tag Release chứa assets XCODE')
+    parser.add_argument('--repo', default=DEFAULT_REPO, help=f'owner/repo (mặc định: {DEFAULT_REPO})')
+    parser.add_argument('--digest', default=os.environ.get('ASSETS_DIGEST', ''),
+                        help='Digest assets (trống = theo xcode-assets.current.json trên Release)')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Thư mục cache asset theo digest (actions/cache), dùng lại nếu đã có')
+    parser.add_argument('--dest', default='.', help='Thư mục gốc repo (chứa XCODE/)')
+    parser.add_argument('--jobs', type=int, default=DOWNLOAD_JOBS,
+                        help=f'Số kết nối Range song song (mặc định: {DOWNLOAD_JOBS})')
+    args = parser.parse_args()
+
+    client = ReleaseClient(args.repo, args.tag, os.environ.get('GH_TOKEN') or os.environ.get('GITHUB_TOKEN'))
+    try:
+        if args.command == 'resolve':
+            # Chạy tay (không có input assets_digest): bộ assets hiện tại trên Release
+            digest = args.digest or current_digest(client) or ''
+            print_info(f"Assets: digest {digest[:12]}" if digest else
+                       "Release publish bằng bản tool cũ: dùng asset tên cố định")
+            write_outputs({'digest': digest})
+            return
+        restore_assets(client, args.digest or None, args.dest, args.cache_dir, args.jobs)
+    except RestoreError as e:
+        print_error(f"Lỗi: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
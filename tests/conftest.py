@@ -0,0 +1,166 @@
+"""Fixture chung: cây XCODE giả lập + Release giả lập (dựa trên stand-in của benchmark_auto_build.py)"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import auto_build_ipa as tool
+import benchmark_auto_build as bench
+
+TAG = 'v1.0-test'
+
+
+class ReleaseServer(bench.ReleaseStandIn):
+    """Release giả lập đủ cho publish + restore: lưu body asset, tag, PATCH, 422 khi trùng tên
+
+    Asset tải qua /releases/assets/{id} (Accept octet-stream) được redirect 302 sang /blob/{id}
+    của ArtifactStandIn (có Range). Upload asset có tên trong `fail`, hoặc đổi tên asset sang tên
+    trong `fail_rename`, trả về 500.
+    """
+
+    def _release(self):
+        with self.lock:
+            return {'id': 1, 'tag_name': TAG, 'assets': list(self.assets.values())}
+
+    def do_GET(self):
+        with self.lock:
+            self.requests[0] += 1
+        path = urlparse(self.path).path
+        if re.search(r'/blob/\d+$', path):
+            return bench.ArtifactStandIn.do_GET(self)
+        if re.search(r'/releases/tags/[^/]+$', path) or re.search(r'/releases/1$', path):
+            return self._send(200, self._release())
+        if re.search(r'/releases/1/assets$', path):
+            query = parse_qs(urlparse(self.path).query)
+            page = int(query.get('page', ['1'])[0])
+            per_page = int(query.get('per_page', ['30'])[0])
+            return self._send(200, self._release()['assets'][(page - 1) * per_page:page * per_page])
+        match = re.search(r'/releases/assets/(\d+)$', path)
+        if match and int(match.group(1)) in self.blobs:
+            if 'octet-stream' not in (self.headers.get('Accept') or ''):
+                with self.lock:
+                    return self._send(200, self.assets[int(match.group(1))])
+            self.send_response(302)
+            self.send_header('Location', f"http://127.0.0.1:{self.server.server_address[1]}/blob/{match.group(1)}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        query = parse_qs(urlparse(self.path).query)
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if 'name' not in query:
+            return self._send(404, {'message': 'Not Found'})
+        name = query['name'][0]
+        if name in self.fail:
+            return self._send(500, {'message': 'Server Error'})
+        with self.lock:
+            if any(asset['name'] == name for asset in self.assets.values()):
+                return self._send(422, {'message': 'Validation Failed', 'errors': [{'code': 'already_exists'}]})
+            asset_id = self.next_id[0]
+            self.next_id[0] += 1
+            asset = {'id': asset_id, 'name': name, 'label': query.get('label', [None])[0],
+                     'size': len(body), 'state': 'uploaded',
+                     'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+            self.assets[asset_id] = asset
+            self.blobs[asset_id] = body
+        self._send(201, asset)
+
+    def do_PATCH(self):
+        match = re.search(r'/releases/assets/(\d+)$', self.path)
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if data.get('name') in self.fail_rename:
+            return self._send(500, {'message': 'Server Error'})
+        with self.lock:
+            asset = self.assets.get(int(match.group(1)))
+            if asset is None:
+                return self._send(404, {'message': 'Not Found'})
+            if any(other['name'] == data.get('name') and other is not asset for other in self.assets.values()):
+                return self._send(422, {'message': 'Validation Failed'})
+            asset.update(data)
+        self._send(200, asset)
+
+    def do_DELETE(self):
+        match = re.search(r'/releases/assets/(\d+)$', self.path)
+        with self.lock:
+            self.blobs.pop(int(match.group(1)), None)
+        bench.ReleaseStandIn.do_DELETE(self)
+
+    # Tiện cho test
+    @classmethod
+    def named(cls, name):
+        with cls.lock:
+            for asset in cls.assets.values():
+                if asset['name'] == name:
+                    return asset, cls.blobs[asset['id']]
+        return None, None
+
+
+@pytest.fixture
+def release(monkeypatch):
+    """Release giả lập mới cho mỗi test, tool trỏ API/uploads vào đó"""
+    server_class = type('Release', (ReleaseServer,), {
+        'assets': {}, 'blobs': {}, 'fail': set(), 'fail_rename': set(), 'next_id': [1], 'requests': [0],
+        'lock': threading.Lock(),
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), server_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(tool, 'API_BASE', f"{root}/repos/{tool.REPO_OWNER}/{tool.REPO_NAME}")
+    monkeypatch.setattr(tool, 'UPLOADS_BASE', tool.API_BASE)
+    monkeypatch.setattr(tool, 'RELEASE_TAG', TAG)
+    monkeypatch.setattr(tool, 'UPLOAD_RETRIES', 1)
+    monkeypatch.setattr(tool, 'LEASE_POLL_INTERVAL', 0.1)
+    server_class.root = root
+    yield server_class
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Thư mục làm việc tạm có XCODE/ nhỏ: file nhị phân (không nén được), text và file trùng nội dung"""
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(7)
+    xcode = tmp_path / tool.XCODE_DIR
+    blob = bytes(rng.getrandbits(8) for _ in range(1024 * 1024))
+    for index in range(3):
+        path = xcode / 'Data' / f'level{index}.bin'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(blob[index * 1000:] + blob[:index * 1000])
+    for index in range(40):
+        path = xcode / 'Classes' / f'file{index}.cpp'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f'// file {index}\n' + 'int x = 0;\n' * (index * 20), encoding='utf-8')
+    (xcode / 'Libraries').mkdir()
+    (xcode / 'Libraries' / 'copy.bin').write_bytes((xcode / 'Data' / 'level0.bin').read_bytes())
+    (xcode / 'Libraries' / 'run.sh').write_text('#!/bin/sh\necho ok\n', encoding='utf-8')
+    os.chmod(xcode / 'Libraries' / 'run.sh', 0o755)
+    return tmp_path
+
+
+def tree_files(root):
+    """{arcname: bytes} của cây XCODE dưới `root`"""
+    root = Path(root)
+    return {path.relative_to(root).as_posix(): path.read_bytes()
+            for path in sorted((root / tool.XCODE_DIR).rglob('*')) if path.is_file()}
+
+
+def touch_tree(root, offset=3600):
+    """Đổi mtime toàn bộ file (nội dung giữ nguyên → cùng digest nhưng ZIP khác byte)"""
+    for path in Path(root, tool.XCODE_DIR).rglob('*'):
+        if path.is_file():
+            stat = path.stat()
+            os.utime(path, (stat.st_atime + offset, stat.st_mtime + offset))
@@ -0,0 +1,127 @@
+"""Tải artifact bằng Range song song: resume chỉ tải phần còn thiếu, IPA tải thẳng không qua ZIP trên đĩa"""
+
+import io
+import re
+import json
+import hashlib
+import threading
+import zipfile
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pytest
+
+import auto_build_ipa as tool
+import benchmark_auto_build as bench
+
+SEGMENT = 1024 * 1024
+
+
+class FlakyArtifacts(bench.ArtifactStandIn):
+    """ArtifactStandIn ghi lại các Range đã phục vụ; Range bắt đầu đúng tại `fail_at` trả về 500"""
+
+    def do_GET(self):
+        byte_range = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if re.search(r'/blob/\d+$', urlparse(self.path).path) and byte_range:
+            start = int(byte_range.group(1))
+            if start == self.fail_at:
+                self.send_response(500)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            with self.lock:
+                self.ranges.append(start)
+        return bench.ArtifactStandIn.do_GET(self)
+
+
+@pytest.fixture
+def artifacts(monkeypatch):
+    server_class = type('Artifacts', (FlakyArtifacts,), {
+        'blobs': {}, 'bandwidth': 0, 'fail_at': None, 'ranges': [], 'lock': threading.Lock(),
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), server_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(tool, 'API_BASE', f"http://127.0.0.1:{server.server_address[1]}/repos/o/r")
+    monkeypatch.setattr(tool, 'DOWNLOAD_SEGMENT_MB', SEGMENT // (1024 * 1024))
+    monkeypatch.setattr(tool, 'DOWNLOAD_RETRIES', 1)
+    yield server_class
+    server.shutdown()
+    server.server_close()
+
+
+def add_artifact(artifacts, size=int(3.5 * SEGMENT)):
+    data = bench.make_artifact(size)
+    artifacts.blobs[1] = data
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return data, zf.read('NROFLY.ipa')
+
+
+@pytest.mark.parametrize('name', ['NROFLY.ipa', 'build-log'])
+def test_resume_fetches_only_missing_segments(artifacts, tmp_path, name):
+    data, ipa = add_artifact(artifacts)
+    digest = 'sha256:' + hashlib.sha256(data).hexdigest()
+    # Dữ liệu IPA bắt đầu sau local header; đoạn thứ 3 của phần dữ liệu bị lỗi
+    base = data.index(ipa[:64]) if name.endswith('.ipa') else 0
+    artifacts.fail_at = base + 2 * SEGMENT
+
+    assert tool.download_artifact('token', 1, name, tmp_path, digest=digest, jobs=2, progress=False) is None
+    dest = tmp_path / (name if name.endswith('.ipa') else f'{name}.zip')
+    state = json.loads(dest.with_name(dest.name + '.part.json').read_text(encoding='utf-8'))
+    assert state['done'] == [0, 1, 3]
+
+    artifacts.fail_at = None
+    artifacts.ranges.clear()
+    path = tool.download_artifact('token', 1, name, tmp_path, digest=digest, jobs=2, progress=False)
+    assert path
+    # Lần 2 chỉ tải đoạn còn thiếu (cộng các Range nhỏ đọc header/central directory)
+    segment_starts = {start for start in artifacts.ranges
+                      if start - base >= SEGMENT and (start - base) % SEGMENT == 0}
+    assert segment_starts == {base + 2 * SEGMENT}
+    assert Path(path).read_bytes() == (ipa if name.endswith('.ipa') else data)
+    assert not dest.with_name(dest.name + '.part.json').exists()
+
+
+def test_corrupted_download_is_discarded(artifacts, tmp_path):
+    add_artifact(artifacts)
+    wrong = 'sha256:' + hashlib.sha256(b'other').hexdigest()
+    assert tool.download_artifact('token', 1, 'NROFLY.ipa', tmp_path, digest=wrong, jobs=2, progress=False) is None
+    assert not (tmp_path / 'NROFLY.ipa').exists()
+    assert not (tmp_path / 'NROFLY.ipa.part').exists()
+
+
+def test_ipa_member_streamed_without_zip_copy(artifacts, tmp_path):
+    data, ipa = add_artifact(artifacts)
+    digest = 'sha256:' + hashlib.sha256(data).hexdigest()
+    stats = tool.fetch_artifact_member('token', 1, tmp_path / 'NROFLY.ipa', digest=digest, jobs=2, progress=False)
+    assert stats['bytes'] == len(ipa)
+    # Chỉ tải dữ liệu member + header/central directory, không tải lại cả ZIP
+    assert len(ipa) <= stats['downloaded'] <= len(data)
+    assert (tmp_path / 'NROFLY.ipa').read_bytes() == ipa
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['NROFLY.ipa']
+
+
+def test_member_crc_mismatch_is_discarded(artifacts, tmp_path):
+    data, ipa = add_artifact(artifacts)
+    # Hỏng 1 byte giữa dữ liệu IPA, không có digest: chỉ CRC32 của member phát hiện
+    offset = data.index(ipa[:64]) + len(ipa) // 2
+    artifacts.blobs[1] = data[:offset] + bytes([data[offset] ^ 0xFF]) + data[offset + 1:]
+    with pytest.raises(RuntimeError, match='CRC'):
+        tool.fetch_artifact_member('token', 1, tmp_path / 'NROFLY.ipa', jobs=2, progress=False)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('members', [
+    {'NROFLY.ipa': b'ipa' * 100000},                          # Member bị nén (deflate)
+    {'NROFLY.ipa': b'ipa' * 100000, 'extra.txt': b'x'},       # Nhiều file
+])
+def test_unsupported_artifact_falls_back_to_zip(artifacts, tmp_path, members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, payload in members.items():
+            zf.writestr(name, payload)
+    artifacts.blobs[1] = buffer.getvalue()
+    assert tool.fetch_artifact_member('token', 1, tmp_path / 'NROFLY.ipa', jobs=2, progress=False) is None
+    path = tool.download_artifact('token', 1, 'NROFLY.ipa', tmp_path, jobs=2, progress=False)
+    assert Path(path).read_bytes() == members['NROFLY.ipa']
+    assert not (tmp_path / 'NROFLY.ipa.zip').exists()
@@ -0,0 +1,84 @@
+"""Build matrix: nhãn/thư mục theo chiều thay đổi, ngân sách request chung, trigger/theo dõi/tải song song"""
+
+import io
+import time
+import hashlib
+import zipfile
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import auto_build_ipa as tool
+import benchmark_auto_build as bench
+
+DURATIONS = {'Release': 1.0, 'Debug': 0.5}
+
+
+@pytest.mark.parametrize('configs, branches, workflows, labels, outputs', [
+    (['Release'], ['main'], ['build.yml'], ['Release'], ['Release']),
+    (['Release', 'Debug'], ['main'], ['build.yml'], ['Release', 'Debug'], ['Release', 'Debug']),
+    # Chiều chỉ có 1 giá trị không vào nhãn; branch có '/' được thay trong tên thư mục
+    (['Release'], ['main', 'feature/x'], ['build.yml'], ['main', 'feature/x'], ['main', 'feature_x']),
+    (['Release', 'Debug'], ['main'], ['build.yml', 'nightly.yml'],
+     ['build/Release', 'build/Debug', 'nightly/Release', 'nightly/Debug'],
+     ['build-Release', 'build-Debug', 'nightly-Release', 'nightly-Debug']),
+])
+def test_build_matrix_labels(configs, branches, workflows, labels, outputs):
+    builds = tool.build_matrix(configs, branches, workflows)
+    assert [build['label'] for build in builds] == labels
+    assert [build['output'] for build in builds] == outputs
+    assert len({(build['config'], build['branch'], build['workflow']) for build in builds}) == len(builds)
+
+
+def test_request_budget_shared_quota():
+    budget = tool.RequestBudget(60, burst=5)
+    assert budget.wait_time() == 0
+    budget.take(5)
+    # Hết burst: phải đợi ~1s (60 request/phút) cho request kế tiếp
+    assert 0.9 < budget.wait_time() <= 1
+    budget.take(2)
+    assert 2.9 < budget.wait_time() <= 3
+
+
+@pytest.fixture
+def matrix(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tool, '_clients', {})
+    monkeypatch.setattr(tool, 'DEFAULT_POLL_INTERVAL', 0.2)
+    monkeypatch.setattr(tool, 'MIN_POLL_INTERVAL', 0.2)
+    monkeypatch.setattr(tool, 'RUN_LOOKUP_MAX_INTERVAL', 0.2)
+    handler = type('Matrix', (bench.MatrixStandIn,), {
+        'runs': {}, 'counters': {}, 'blobs': {}, 'lock': threading.Lock(),
+        'durations': DURATIONS, 'artifact_size': 64 * 1024, 'bandwidth': 0,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(tool, 'API_BASE', f"http://127.0.0.1:{server.server_address[1]}/repos/o/r")
+    yield handler
+    server.shutdown()
+    server.server_close()
+
+
+def test_run_batch_builds_concurrently_and_reuses_cache(matrix, tmp_path):
+    builds = tool.build_matrix(list(DURATIONS), [tool.BRANCH], [tool.WORKFLOW_FILE])
+    cache = tool.BuildCache(tmp_path / 'cache')
+    digest = hashlib.sha256(b'assets').hexdigest()
+    start = time.time()
+    assert tool.run_batch('token', builds, tmp_path / 'out', cache=cache, assets_digest=digest)
+    # Các run chạy chồng lên nhau: nhanh hơn chạy lần lượt (mỗi run còn chờ 1s trước khi bắt đầu)
+    assert time.time() - start < sum(1 + seconds for seconds in DURATIONS.values())
+    assert len(matrix.runs) == len(DURATIONS)
+    for build in builds:
+        run = matrix.runs[build['run']['id']]
+        assert build['config'] in run['title']
+        ipa = tmp_path / 'out' / build['output'] / 'NROFLY.ipa'
+        assert build['files'] == [str(ipa)]
+        with zipfile.ZipFile(io.BytesIO(matrix.blobs[build['run']['id']])) as zf:
+            assert ipa.read_bytes() == zf.read('NROFLY.ipa')
+
+    # Lần 2 cùng commit/config/assets: lấy IPA từ cache, không trigger lại
+    again = tool.build_matrix(list(DURATIONS), [tool.BRANCH], [tool.WORKFLOW_FILE])
+    assert tool.run_batch('token', again, tmp_path / 'again', cache=cache, assets_digest=digest)
+    assert len(matrix.runs) == len(DURATIONS)
+    assert all(build.get('cached') and build['files'] for build in again)
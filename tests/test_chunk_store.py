@@ -0,0 +1,148 @@
+"""Chunk store (--chunked): ranh giới FastCDC, pack, recipe gzip và round-trip publish → restore_recipe"""
+
+import gzip
+import json
+import lzma
+import zlib
+import random
+import hashlib
+from pathlib import Path
+
+import pytest
+
+import auto_build_ipa as tool
+import restore_xcode_assets as restore
+
+from conftest import TAG, tree_files
+
+
+@pytest.fixture(autouse=True)
+def no_upload_wait(monkeypatch):
+    monkeypatch.setattr(tool.time, 'sleep', lambda seconds: None)
+
+
+def random_bytes(size, seed=1):
+    rng = random.Random(seed)
+    return bytes(rng.getrandbits(8) for _ in range(size))
+
+
+def chunk_ids(path):
+    return [chunk_id for chunk_id, _ in tool.chunk_file(path)]
+
+
+def test_chunk_sizes_within_bounds(tmp_path):
+    path = tmp_path / 'data.bin'
+    data = random_bytes(3 * 1024 * 1024)
+    path.write_bytes(data)
+    chunks = list(tool.cdc_chunks(path))
+    assert b''.join(chunks) == data
+    assert all(tool.CDC_MIN_SIZE < len(chunk) <= tool.CDC_MAX_SIZE for chunk in chunks[:-1])
+    assert len(chunks[-1]) <= tool.CDC_MAX_SIZE
+    # Trung bình quanh CDC_AVG_SIZE (normalized chunking)
+    average = len(data) / len(chunks)
+    assert tool.CDC_AVG_SIZE / 2 < average < tool.CDC_AVG_SIZE * 2
+    assert [[hashlib.sha256(chunk).hexdigest(), len(chunk)] for chunk in chunks] == tool.chunk_file(path)
+
+
+def test_small_file_is_one_chunk(tmp_path):
+    path = tmp_path / 'small.txt'
+    path.write_bytes(b'x' * tool.CDC_MIN_SIZE)
+    assert tool.chunk_file(path) == [[hashlib.sha256(b'x' * tool.CDC_MIN_SIZE).hexdigest(), tool.CDC_MIN_SIZE]]
+    (tmp_path / 'empty').write_bytes(b'')
+    assert tool.chunk_file(tmp_path / 'empty') == []
+
+
+def test_boundaries_follow_content(tmp_path):
+    data = random_bytes(2 * 1024 * 1024)
+    (tmp_path / 'a.bin').write_bytes(data)
+    # Chèn 1 byte ở giữa: các chunk phía sau trượt theo nhưng vẫn cùng nội dung
+    (tmp_path / 'b.bin').write_bytes(data[:len(data) // 2] + b'!' + data[len(data) // 2:])
+    before, after = chunk_ids(tmp_path / 'a.bin'), chunk_ids(tmp_path / 'b.bin')
+    changed = set(after) - set(before)
+    assert 1 <= len(changed) <= 2
+    assert len(set(before) & set(after)) >= len(before) - 2
+
+
+def test_chunk_packs_layout(tmp_path, monkeypatch):
+    monkeypatch.setattr(tool, 'CDC_PACK_SIZE_MB', 0.25)
+    text = tmp_path / 'code.cpp'
+    text.write_bytes(b'int value = 42;\n' * 40000)
+    blob = tmp_path / 'data.bin'
+    blob.write_bytes(random_bytes(600 * 1024, seed=3))
+    sources = {}
+    order = []
+    for path in (text, blob):
+        offset = 0
+        for chunk_id, size in tool.chunk_file(path):
+            sources[chunk_id] = (str(path), offset, size, path.name, path.stat().st_size)
+            order.append(chunk_id)
+            offset += size
+    order = list(dict.fromkeys(order))
+    policy = {'rules': [{'match': '*.cpp', 'method': 'lzma'}], 'default': {'method': 'deflate'}}
+    pack_dir = tmp_path / 'packs'
+    pack_dir.mkdir()
+    packs, locations = tool.write_chunk_packs(order, sources, pack_dir, jobs=3, policy=policy)
+    assert len(packs) > 1
+    for name, meta in packs.items():
+        content = Path(meta['path']).read_bytes()
+        assert len(content) == meta['size']
+        assert hashlib.sha256(content).hexdigest() == meta['sha256']
+        assert name == f"{tool.CDC_PACK_PREFIX}{meta['sha256'][:16]}.pack"
+    methods = set()
+    for chunk_id in order:
+        pack, offset, length, size, method = locations[chunk_id]
+        payload = Path(packs[pack]['path']).read_bytes()[offset:offset + length]
+        if method == 'deflate':
+            data = zlib.decompress(payload, -15)
+        elif method == 'lzma':
+            data = lzma.decompress(payload)
+        else:
+            data = payload
+        assert len(data) == size and hashlib.sha256(data).hexdigest() == chunk_id
+        methods.add(method)
+    # Dữ liệu ngẫu nhiên không nén được → store; text theo rule → lzma
+    assert {'lzma', 'store'} <= methods
+
+
+def publish_chunked():
+    assert tool.setup_releases('token', jobs=2, chunked=True)
+    return tool.current_assets_digest()
+
+
+def restore_into(release, dest, digest, cache_dir=None):
+    client = restore.ReleaseClient('owner/repo', TAG, 'token', api_root=release.root)
+    return restore.restore_assets(client, digest, str(dest), cache_dir and str(cache_dir), jobs=4)
+
+
+def sha_per_file(root):
+    return {name: hashlib.sha256(data).hexdigest() for name, data in tree_files(root).items()}
+
+
+def test_chunked_round_trip_and_one_byte_edit(release, workspace, tmp_path):
+    digest = publish_chunked()
+    _, body = release.named(tool.digest_asset_name(tool.CDC_RECIPE, digest))
+    recipe = json.loads(gzip.decompress(body))
+    assert recipe['version'] == tool.CDC_RECIPE_VERSION and recipe['format'] == tool.CDC_FORMAT
+    assert set(recipe['files']) == set(tree_files(workspace))
+    stats = restore_into(release, tmp_path / 'ci', digest, tmp_path / 'cache')
+    assert stats['kind'] == 'recipe'
+    assert sha_per_file(tmp_path / 'ci') == sha_per_file(workspace)
+
+    # Sửa 1 byte giữa file 1 MB: chỉ chunk chứa byte đó được nén + upload lại
+    packs_before = {asset['name'] for asset in release.assets.values()
+                    if asset['name'].startswith(tool.CDC_PACK_PREFIX)}
+    path = workspace / tool.XCODE_DIR / 'Data' / 'level1.bin'
+    data = bytearray(path.read_bytes())
+    data[len(data) // 2] ^= 0xFF
+    path.write_bytes(bytes(data))
+    digest = publish_chunked()
+    new_packs = [asset for asset in release.assets.values()
+                 if asset['name'].startswith(tool.CDC_PACK_PREFIX) and asset['name'] not in packs_before]
+    assert len(new_packs) == 1
+    assert new_packs[0]['size'] <= 2 * tool.CDC_MAX_SIZE
+
+    # Pack cũ đã có trong cache: restore chỉ tải recipe + pack mới
+    stats = restore_into(release, tmp_path / 'ci', digest, tmp_path / 'cache')
+    assert sha_per_file(tmp_path / 'ci') == sha_per_file(workspace)
+    _, recipe_body = release.named(tool.digest_asset_name(tool.CDC_RECIPE, digest))
+    assert stats['downloaded'] <= new_packs[0]['size'] + len(recipe_body) + 4096
@@ -0,0 +1,73 @@
+"""Policy nén: chọn rule theo glob/min_size, nén thử (auto), policy từ file JSON"""
+
+import os
+import json
+import zlib
+import zipfile
+
+import pytest
+
+import auto_build_ipa as tool
+
+
+@pytest.mark.parametrize('arcname, size, expected', [
+    ('XCODE/Data/Raw/icon.png', 10, ('store', tool.ZIP_LEVEL)),
+    ('XCODE/Data/sharedassets0.assets', 10, ('auto', tool.ZIP_LEVEL)),
+    ('XCODE/Data/Managed/Metadata/global-metadata.dat', 10, ('auto', tool.ZIP_LEVEL)),
+    ('XCODE/Data/globalgamemanagers', 10, ('auto', tool.ZIP_LEVEL)),
+    ('XCODE/Classes/main.mm', 10, ('deflate', tool.ZIP_LEVEL)),
+])
+def test_smart_preset(arcname, size, expected):
+    assert tool.select_compression(tool.load_compression_policy('smart'), arcname, size) == expected
+
+
+def test_first_matching_rule_wins_and_min_size():
+    policy = tool.load_compression_policy('max')
+    assert tool.select_compression(policy, 'XCODE/Il2Cpp/Bulk.cpp', 2 * 1024 * 1024) == ('lzma', tool.ZIP_LEVEL)
+    # Nhỏ hơn min_size: bỏ qua rule LZMA, rơi xuống default
+    assert tool.select_compression(policy, 'XCODE/Il2Cpp/Small.cpp', 1024) == ('deflate', 9)
+    # Media khớp rule store trước mọi rule khác
+    assert tool.select_compression(policy, 'XCODE/Data/a.png', 10 * 1024 * 1024) == ('store', tool.ZIP_LEVEL)
+
+
+def test_default_policy_is_smart():
+    assert tool.load_compression_policy() is tool.COMPRESSION_PRESETS[tool.DEFAULT_COMPRESSION]
+    assert tool.DEFAULT_COMPRESSION == 'smart'
+
+
+def test_policy_file(tmp_path):
+    path = tmp_path / 'policy.json'
+    path.write_text(json.dumps({'rules': [{'match': '*.txt', 'method': 'store'}]}), encoding='utf-8')
+    policy = tool.load_compression_policy(str(path))
+    assert policy['default'] == {'method': 'deflate'}
+    assert tool.select_compression(policy, 'XCODE/a.txt', 1) == ('store', tool.ZIP_LEVEL)
+    assert tool.select_compression(policy, 'XCODE/a.cpp', 1) == ('deflate', tool.ZIP_LEVEL)
+
+    path.write_text(json.dumps({'rules': [{'match': '*', 'method': 'brotli'}]}), encoding='utf-8')
+    with pytest.raises(ValueError):
+        tool.load_compression_policy(str(path))
+
+
+@pytest.mark.parametrize('payload, method', [
+    (os.urandom(200 * 1024), zipfile.ZIP_STORED),   # Nén thử không lợi → store
+    (b'\0' * 200 * 1024, zipfile.ZIP_DEFLATED),
+])
+def test_auto_method_samples_first_block(tmp_path, payload, method):
+    path = tmp_path / 'data.assets'
+    path.write_bytes(payload)
+    data, crc, size, _, zip_method = tool.compress_file(path, 'XCODE/Data/data.assets',
+                                                        tool.load_compression_policy('smart'))
+    assert zip_method == method and size == len(payload) and crc == zlib.crc32(payload)
+    if method == zipfile.ZIP_DEFLATED:
+        assert zlib.decompress(data, -15) == payload
+    else:
+        assert data == payload
+
+
+def test_incompressible_file_falls_back_to_store(tmp_path):
+    path = tmp_path / 'noise.cpp'
+    payload = os.urandom(64 * 1024)
+    path.write_bytes(payload)
+    data, _, _, _, zip_method = tool.compress_file(path, 'XCODE/Classes/noise.cpp',
+                                                   tool.load_compression_policy('deflate'))
+    assert zip_method == zipfile.ZIP_STORED and data == payload
@@ -0,0 +1,70 @@
+"""Dedup: file trùng nội dung chỉ nén 1 bản, restore chép lại theo member DEDUP_LINKS"""
+
+import json
+import hashlib
+import zipfile
+from pathlib import Path
+
+import pytest
+
+import auto_build_ipa as tool
+import restore_xcode_assets as restore
+
+from conftest import TAG, tree_files
+
+
+@pytest.fixture(autouse=True)
+def no_upload_wait(monkeypatch):
+    monkeypatch.setattr(tool.time, 'sleep', lambda seconds: None)
+
+
+def record(data):
+    return {'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+
+
+def test_dedup_entries_keeps_smallest_arcname():
+    big = b'x' * tool.DEDUP_MIN_SIZE
+    small = b'y' * (tool.DEDUP_MIN_SIZE - 1)
+    files = {
+        'XCODE/b/copy.bin': record(big),
+        'XCODE/a/orig.bin': record(big),
+        'XCODE/c/copy.bin': record(big),
+        'XCODE/a/small.txt': record(small),
+        'XCODE/b/small.txt': record(small),
+    }
+    # Nguồn không có trong entries (file không đổi trong delta) vẫn được dùng làm nguồn
+    entries = [(name, Path(name)) for name in sorted(files) if name != 'XCODE/a/orig.bin']
+    kept, links, skipped = tool.dedup_entries(entries, files)
+    assert links == {'XCODE/b/copy.bin': 'XCODE/a/orig.bin', 'XCODE/c/copy.bin': 'XCODE/a/orig.bin'}
+    assert skipped == 2 * len(big)
+    # File nhỏ hơn DEDUP_MIN_SIZE nén thẳng
+    assert [name for name, _ in kept] == ['XCODE/a/small.txt', 'XCODE/b/small.txt']
+
+
+def test_zip_stores_one_copy_and_links(workspace):
+    zip_path = tool.compress_xcode_assets(jobs=1, full=True)
+    with zipfile.ZipFile(zip_path) as zf:
+        names = zf.namelist()
+        links = json.loads(zf.read(tool.DEDUP_LINKS))['links']
+    assert links == {'XCODE/Libraries/copy.bin': 'XCODE/Data/level0.bin'}
+    assert 'XCODE/Libraries/copy.bin' not in names and 'XCODE/Data/level0.bin' in names
+    assert names[-2:] == [tool.DEDUP_LINKS, tool.ZIP_MANIFEST]
+
+
+def restore_into(release, dest, digest):
+    client = restore.ReleaseClient('owner/repo', TAG, 'token', api_root=release.root)
+    return restore.restore_assets(client, digest, str(dest), None, jobs=4)
+
+
+def test_delta_link_to_file_from_baseline(release, workspace, tmp_path):
+    assert tool.setup_releases('token', jobs=1, part_size_mb=0, delta=True)
+    # File mới trùng với file không đổi: delta chỉ có link, nguồn nằm trong baseline
+    xcode = workspace / tool.XCODE_DIR
+    (xcode / 'Libraries' / 'copy2.bin').write_bytes((xcode / 'Data' / 'level1.bin').read_bytes())
+    assert tool.setup_releases('token', jobs=1, part_size_mb=0, delta=True)
+    digest = tool.current_assets_digest()
+    delta = next(asset for asset in release.assets.values() if '.delta-' in asset['name'])
+    assert delta['size'] < 64 * 1024
+    stats = restore_into(release, tmp_path / 'ci', digest)
+    assert stats['kind'] == 'chain'
+    assert tree_files(tmp_path / 'ci') == tree_files(workspace)
@@ -0,0 +1,74 @@
+"""Phát hiện và commit thay đổi bằng git status --porcelain=v2 -z: tên file đặc biệt, rename, file trạng thái"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import auto_build_ipa as tool
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason='cần git')
+
+QUOTED = 'Classes/Thư mục/tên "có ngoặc" và\ttab.mm'
+
+
+def git(*args):
+    return subprocess.run(['git', *args], check=True, stdout=subprocess.PIPE).stdout.decode('utf-8')
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    git('init', '-q')
+    git('config', 'user.name', 'test')
+    git('config', 'user.email', 'test@example.com')
+    git('config', 'commit.gpgsign', 'false')
+    for path in ('README.md', 'Classes/main.mm', 'Classes/old.mm', 'Data/level0.bin'):
+        write(path, path)
+    git('add', '-A')
+    git('commit', '-q', '-m', 'init')
+    return tmp_path
+
+
+def make_changes():
+    write('README.md', 'sửa')                       # Sửa, chưa staged
+    write('Data/level1.bin', 'mới')
+    git('add', 'Data/level1.bin')                   # File mới đã staged
+    git('mv', 'Classes/old.mm', 'Classes/new.mm')   # Rename đã staged
+    write(QUOTED, 'x')                              # Untracked, tên unicode/ngoặc kép/tab
+    os.remove('Data/level0.bin')                    # Xóa
+    # File trạng thái của tool (kể cả file .tmp và thư mục) không bao giờ được commit
+    write(tool.ASSETS_MANIFEST, '{}')
+    write(tool.HASH_CACHE + '.tmp', '{}')
+    write(os.path.join(tool.BUILD_CACHE_DIR, 'index.json'), '{}')
+    return {'README.md', 'Data/level1.bin', 'Classes/old.mm', 'Classes/new.mm', QUOTED, 'Data/level0.bin'}
+
+
+def test_changed_paths(repo):
+    expected = make_changes()
+    assert sorted(tool.git_changed_paths()) == sorted(expected)
+
+
+def test_no_changes(repo):
+    assert tool.git_changed_paths() == []
+
+
+@pytest.mark.parametrize('version', [tool.GIT_PATHSPEC_FROM_FILE, (2, 20)])
+def test_commit_paths_skips_state_files(repo, monkeypatch, version):
+    monkeypatch.setattr(tool, 'git_version', lambda: version)
+    monkeypatch.setattr(tool, 'GIT_ARGS_BATCH', 2)
+    paths = make_changes()
+    # File trạng thái lỡ bị staged từ trước cũng không bị commit theo
+    git('add', '-f', tool.ASSETS_MANIFEST)
+    assert tool.git_commit_paths(tool.git_changed_paths(), 'Auto build IPA').returncode == 0
+    committed = set(git('show', '--no-renames', '--name-only', '-z', '--format=', 'HEAD').split('\0')) - {''}
+    assert committed == paths
+    assert tool.ASSETS_MANIFEST not in git('ls-tree', '-r', '--name-only', '-z', 'HEAD').split('\0')
+    assert tool.git_changed_paths() == []
@@ -0,0 +1,146 @@
+"""GitHubClient: cache ETag (304), cache trên đĩa theo ttl, giãn request khi quota sắp hết, chờ khi bị rate limit"""
+
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import auto_build_ipa as tool
+
+
+class ApiStandIn(BaseHTTPRequestHandler):
+    """GET trả payload theo path kèm ETag (304 khi khớp) và header X-RateLimit-*
+
+    `blocked` = số request tiếp theo trả 403: hết quota (Remaining 0, chờ tới Reset) hoặc
+    secondary rate limit (Retry-After: 1) theo `blocked_kind`.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.lock:
+            self.seen.append((self.path, self.headers.get('If-None-Match')))
+            blocked = self.blocked[0] > 0
+            self.blocked[0] -= blocked
+        if blocked:
+            body = b'{"message": "API rate limit exceeded"}'
+            self.send_response(403)
+            if self.blocked_kind == 'secondary':
+                self.send_header('Retry-After', '1')
+                self.send_header('X-RateLimit-Remaining', str(self.remaining[0]))
+            else:
+                self.send_header('X-RateLimit-Remaining', '0')
+        else:
+            body = json.dumps({'path': self.path, 'version': self.version[0]}).encode('utf-8')
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                body = b''
+                self.send_response(304)
+            else:
+                self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('X-RateLimit-Remaining', str(self.remaining[0]))
+        self.send_header('X-RateLimit-Limit', '5000')
+        self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    handler = type('Api', (ApiStandIn,), {'seen': [], 'version': [1], 'remaining': [4999], 'blocked': [0],
+                                          'blocked_kind': 'secondary', 'lock': threading.Lock()})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    handler.url = f"http://127.0.0.1:{server.server_address[1]}/repos/o/r"
+    monkeypatch.setattr(tool, 'API_BASE', handler.url)
+    yield handler
+    server.shutdown()
+    server.server_close()
+
+
+def test_etag_revalidation(api):
+    client = tool.GitHubClient('token')
+    url = f"{api.url}/releases/1"
+    status, first, source = client.get_json(url, with_source=True)
+    assert (status, source) == (200, 'network')
+    status, again, source = client.get_json(url, with_source=True)
+    assert (status, source) == (200, 'etag') and again == first
+    assert api.seen[-1][1] is not None  # Gửi If-None-Match
+    # Nội dung đổi → ETag khác → 200 với payload mới
+    api.version[0] = 2
+    status, changed, source = client.get_json(url, with_source=True)
+    assert source == 'network' and changed['version'] == 2
+    entry = client.stats['GET /releases/{id}']
+    assert (entry['calls'], entry['not_modified'], entry['cache_hits']) == (3, 1, 0)
+
+
+def test_ttl_cache_on_disk_per_token(api):
+    url = f"{api.url}/actions/workflows"
+    assert tool.GitHubClient('token').get_json(url, ttl=60, with_source=True)[2] == 'network'
+    requests_before = len(api.seen)
+    # Process mới (client mới) dùng luôn bản trên đĩa trong ttl, không gọi mạng
+    assert tool.GitHubClient('token').get_json(url, ttl=60, with_source=True)[2] == 'cache'
+    assert len(api.seen) == requests_before
+    # ttl=None luôn hỏi lại (có If-None-Match từ bản trên đĩa)
+    assert tool.GitHubClient('token').get_json(url, with_source=True)[2] == 'etag'
+    # Token khác không đọc cache của token này
+    assert tool.GitHubClient('other').get_json(url, ttl=60, with_source=True)[2] == 'network'
+
+
+def test_throttle_when_quota_low(api, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(tool.time, 'sleep', sleeps.append)
+    client = tool.GitHubClient('token')
+    url = f"{api.url}/releases/1"
+    client.get_json(url)
+    assert sleeps == []  # Còn nhiều quota: không giãn
+    api.remaining[0] = 10  # < 10% của 5000, reset sau ~3s
+    client.get_json(url)
+    client.get_json(url)
+    assert client.rate_remaining == 10
+    assert len(sleeps) == 1 and 0 < sleeps[0] <= 3 / 10
+
+
+def test_waits_and_retries_when_rate_limited(api, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(tool.time, 'sleep', sleeps.append)
+    client = tool.GitHubClient('token')
+    api.blocked[0] = 1
+    status, payload = client.get_json(f"{api.url}/releases/1")
+    assert status == 200 and payload['version'] == 1
+    assert sleeps == [1]
+    # Bị chặn liên tục: chỉ thử lại 1 lần rồi trả 403 cho bên gọi
+    api.blocked[0] = 2
+    assert client.request('GET', f"{api.url}/releases/2").status_code == 403
+    assert sleeps == [1, 1]
+
+
+def test_waits_for_reset_when_quota_exhausted(api, monkeypatch):
+    # Đồng hồ giả: sleep tua thời gian (cả Reset do stand-in tính) thay vì chờ thật
+    sleeps = []
+    offset = [0]
+    real_time = time.time
+    monkeypatch.setattr(tool.time, 'time', lambda: real_time() + offset[0])
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        offset[0] += seconds
+
+    monkeypatch.setattr(tool.time, 'sleep', sleep)
+    client = tool.GitHubClient('token')
+    client.get_json(f"{api.url}/releases/1")  # Biết X-RateLimit-Reset
+    api.blocked_kind = 'primary'
+    api.blocked[0] = 1
+    assert client.get_json(f"{api.url}/releases/2")[0] == 200
+    # Chờ tới Reset (+1s), không chờ thêm lần nữa ở bước giãn request
+    assert len(sleeps) == 1 and 1 <= sleeps[0] <= 5
@@ -0,0 +1,103 @@
+"""Quét cây XCODE song song và cache hash theo size/mtime: chỉ hash lại file đã đổi"""
+
+import os
+import json
+import time
+import hashlib
+
+import pytest
+
+import auto_build_ipa as tool
+
+OLD = time.time_ns() - 60 * 10**9
+
+
+@pytest.fixture
+def xcode(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    root = tmp_path / 'XCODE'
+    for index in range(30):
+        path = root / f'dir{index % 4}' / f'sub{index % 3}' / f'file{index}.bin'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(f'content {index}'.encode('utf-8') * 100)
+        os.utime(path, ns=(OLD, OLD))
+    (root / 'Classes' / 'Thư mục').mkdir(parents=True)
+    (root / 'Classes' / 'Thư mục' / 'main.mm').write_bytes(b'int main() {}')
+    os.utime(root / 'Classes' / 'Thư mục' / 'main.mm', ns=(OLD, OLD))
+    return root
+
+
+def walk_records(root):
+    records = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            arcname = os.path.relpath(path, root.parent).replace(os.sep, '/')
+            st = os.stat(path)
+            records.append((arcname, path, st.st_size, st.st_mtime_ns))
+    return sorted(records)
+
+
+def test_scan_tree_matches_os_walk(xcode):
+    assert tool.scan_tree(xcode, jobs=4) == walk_records(xcode)
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason='cần symlink')
+def test_scan_tree_skips_directory_symlinks(xcode, tmp_path):
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    (outside / 'big.bin').write_bytes(b'x')
+    os.symlink(outside, xcode / 'link', target_is_directory=True)
+    assert not any(arcname.startswith('XCODE/link/') for arcname, *_ in tool.scan_tree(xcode))
+
+
+def test_hash_cache_rehashes_only_changed_files(xcode):
+    files, hashed = tool.build_file_index(xcode, jobs=4)
+    assert hashed == len(files) == 31
+    assert files['XCODE/dir0/sub0/file0.bin']['sha256'] == hashlib.sha256(b'content 0' * 100).hexdigest()
+
+    # Lần 2: mọi hash lấy từ cache trên đĩa
+    again, hashed = tool.build_file_index(xcode, jobs=4)
+    assert (again, hashed) == (files, 0)
+
+    changed = xcode / 'dir1' / 'sub1' / 'file1.bin'
+    changed.write_bytes(b'changed')
+    os.utime(changed, ns=(OLD + 10**9, OLD + 10**9))
+    (xcode / 'dir2' / 'sub2' / 'file2.bin').unlink()
+    updated, hashed = tool.build_file_index(xcode, jobs=4)
+    assert hashed == 1
+    assert updated['XCODE/dir1/sub1/file1.bin']['sha256'] == hashlib.sha256(b'changed').hexdigest()
+    assert 'XCODE/dir2/sub2/file2.bin' not in updated
+    # File đã xóa cũng rơi khỏi cache
+    cache = json.loads(open(tool.HASH_CACHE, encoding='utf-8').read())
+    assert 'XCODE/dir2/sub2/file2.bin' not in cache['files']
+
+    # --rehash bỏ qua cache
+    assert tool.build_file_index(xcode, jobs=4, rehash=True)[1] == len(updated)
+
+
+def test_recently_modified_file_is_not_cached(xcode):
+    fresh = xcode / 'Classes' / 'fresh.mm'
+    fresh.write_bytes(b'v1')  # mtime = bây giờ: có thể bị sửa tiếp mà mtime không đổi
+    tool.build_file_index(xcode)
+    assert tool.build_file_index(xcode)[1] == 1
+    cache = tool.HashCache()
+    assert cache.get('XCODE/Classes/fresh.mm', 2, fresh.stat().st_mtime_ns) is None
+    assert cache.get('XCODE/Classes/Thư mục/main.mm', 13, OLD) is not None
+
+
+def test_previous_manifest_seeds_hashes(xcode):
+    files, _ = tool.build_file_index(xcode, cache_path=None)
+    # Không có cache hash nhưng có manifest cũ: size/mtime khớp thì dùng lại hash
+    assert tool.build_file_index(xcode, previous_files=files, cache_path=None)[1] == 0
+
+
+def test_cache_version_mismatch_is_ignored(xcode):
+    tool.build_file_index(xcode)
+    with open(tool.HASH_CACHE, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data['version'] = tool.HASH_CACHE_VERSION + 1
+    with open(tool.HASH_CACHE, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    assert tool.HashCache().files == {}
+    assert tool.build_file_index(xcode)[1] == 31
@@ -0,0 +1,123 @@
+"""Parse project.pbxproj và tập path build cần (--prune) trên project mẫu tests/fixtures/project.pbxproj"""
+
+from pathlib import Path
+
+import pytest
+
+import auto_build_ipa as tool
+
+FIXTURE = Path(__file__).parent / 'fixtures' / 'project.pbxproj'
+SPECIAL = 'Classes/Thư mục "đặc biệt".txt'
+
+TREE_FILES = [
+    'Classes/main.mm',
+    'Classes/UI/UnityAppController.h',
+    'Classes/Prefix.pch',
+    'Classes/Native/Bridge.h',
+    SPECIAL,
+    'Classes/Unused.mm',
+    'Data/Raw/level0.bin',
+    'Data/Managed/Metadata/global-metadata.dat',
+    'Libraries/libiPhone-lib.a',
+    'Libraries/bdwgc/include/gc.h',
+    'Resources/en.lproj/InfoPlist.strings',
+    'Resources/vi.lproj/InfoPlist.strings',
+    'Frameworks/Plugin.framework/Plugin',
+    'Frameworks/Plugin.framework/Info.plist',
+    'Unity-iPhone/Unity-iPhone.entitlements',
+    'Info.plist',
+    'MapFileParser.sh',
+    'Il2CppOutputProject/IL2CPP/il2cpp_root',
+    'Il2CppOutputProject/IL2CPP/build/deploy_x86_64/il2cpp',
+    'Il2CppOutputProject/IL2CPP/libil2cpp/il2cpp-api.h',
+    'Il2CppOutputProject/Source/il2cppOutput/Assembly-CSharp.cpp',
+    'Docs/readme.md',
+]
+
+
+@pytest.fixture
+def project(tmp_path):
+    xcode = tmp_path / 'XCODE'
+    for rel in TREE_FILES:
+        path = xcode / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x')
+    (xcode / tool.XCODE_PROJECT).mkdir()
+    (xcode / tool.XCODE_PROJECT / 'project.pbxproj').write_text(FIXTURE.read_text(encoding='utf-8'),
+                                                                 encoding='utf-8')
+    return xcode
+
+
+def test_parse_syntax():
+    plist = tool.parse_pbxproj(
+        '// !$*UTF8*$!\n'
+        '{ a = 1; /* chú thích { ( ; */ b = "x = \\"y\\"; // không phải comment";\n'
+        '  c = { d = ( e, "f g", ); h = {}; }; // comment cuối dòng\n'
+        '  "k l" = "\\U0111\\n"; m = "$(SRCROOT)/Libraries"; n = (); }')
+    assert plist == {
+        'a': '1',
+        'b': 'x = "y"; // không phải comment',
+        'c': {'d': ['e', 'f g'], 'h': {}},
+        'k l': 'đ\n',
+        'm': '$(SRCROOT)/Libraries',
+        'n': [],
+    }
+
+
+@pytest.mark.parametrize('text', ['{ a = 1 }', '{ a = ; }', '{ a = 1; ', '{ a = "1; }'])
+def test_parse_errors(text):
+    with pytest.raises(ValueError):
+        tool.parse_pbxproj(text)
+
+
+def test_parse_fixture():
+    plist = tool.parse_pbxproj(FIXTURE.read_text(encoding='utf-8'))
+    objects = plist['objects']
+    assert objects[plist['rootObject']]['isa'] == 'PBXProject'
+    variant = objects['AA0000000000000000000301']
+    assert variant['isa'] == 'PBXVariantGroup'
+    assert variant['children'] == ['AA0000000000000000000105', 'AA0000000000000000000106']
+    assert objects['AA0000000000000000000109']['path'] == SPECIAL
+    settings = objects['AA0000000000000000000501']['buildSettings']
+    assert settings['HEADER_SEARCH_PATHS'][1] == '"$(SRCROOT)/Classes/Native"'
+    assert settings['OTHER_LDFLAGS'] == ['-ObjC', '-weak_framework', 'CoreMotion']
+
+
+def test_required_paths(project):
+    files, dirs = tool.pbxproj_required_paths(project)
+    assert files == {
+        # File reference theo group (kể cả PBXVariantGroup), SOURCE_ROOT, tên có escape
+        'Classes/main.mm',
+        'Classes/UI/UnityAppController.h',
+        'Resources/en.lproj/InfoPlist.strings',
+        'Resources/vi.lproj/InfoPlist.strings',
+        'Libraries/libiPhone-lib.a',
+        SPECIAL,
+        # Build setting chỉ tới file
+        'Info.plist',
+        'Classes/Prefix.pch',
+        'Unity-iPhone/Unity-iPhone.entitlements',
+        # Shell script build phase
+        'MapFileParser.sh',
+        'Data/Managed/Metadata/global-metadata.dat',
+    }
+    assert dirs == {
+        tool.XCODE_PROJECT,
+        'Data',  # folder reference
+        'Frameworks/Plugin.framework',  # wrapper giữ cả bundle
+        'Classes/Native',  # search path có ngoặc kép lồng
+        'Libraries/bdwgc/include',  # search path đệ quy /**
+        'Libraries',
+        # deploy_$HOST_ARCH/il2cpp nằm trong thư mục có il2cpp_root → giữ cả thư mục gốc
+        'Il2CppOutputProject/IL2CPP',
+        'Il2CppOutputProject/Source/il2cppOutput',
+    }
+
+
+def test_prune_keeps_required_tree(project):
+    index = {f'XCODE/{rel}': {'size': 1} for rel in TREE_FILES}
+    index[f'XCODE/{tool.XCODE_PROJECT}/project.pbxproj'] = {'size': 1}
+    kept, pruned = tool.prune_file_index(project, index, allow=[], drop=[])
+    assert set(pruned) == {'XCODE/Classes/Unused.mm', 'XCODE/Docs/readme.md'}
+    assert 'XCODE/Il2CppOutputProject/IL2CPP/libil2cpp/il2cpp-api.h' in kept
+    assert 'XCODE/Data/Raw/level0.bin' in kept
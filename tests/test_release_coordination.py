@@ -0,0 +1,137 @@
+"""Phối hợp nhiều máy trên cùng Release: lease theo digest, thay con trỏ CURRENT_ASSETS, dọn asset cũ"""
+
+import json
+import time
+import threading
+
+import pytest
+
+import auto_build_ipa as tool
+
+DIGEST = 'ab' * 32
+time_sleep = time.sleep
+
+
+@pytest.fixture(autouse=True)
+def no_upload_wait(monkeypatch):
+    """Bỏ 5 giây đợi asset xuất hiện sau khi upload ZIP 1 file (Release giả lập có ngay)"""
+    monkeypatch.setattr(tool.time, 'sleep', lambda seconds: None if seconds >= 5 else time_sleep(seconds))
+
+
+def lease_name(digest=DIGEST):
+    return tool.digest_asset_name(tool.PUBLISH_LEASE, digest)
+
+
+def test_lease_is_single_flight(release):
+    spans = []
+
+    def publish(name):
+        with tool.publish_lease('token', {'id': 1}, DIGEST):
+            start = time.time()
+            time_sleep(0.3)
+            spans.append((start, time.time(), name))
+
+    threads = [threading.Thread(target=publish, args=(name,)) for name in ('a', 'b', 'c')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    spans.sort()
+    assert len(spans) == 3
+    assert all(earlier[1] <= later[0] for earlier, later in zip(spans, spans[1:]))
+    assert release.named(lease_name())[0] is None
+
+
+def test_stale_lease_is_taken_over(release):
+    with release.lock:
+        release.assets[99] = {'id': 99, 'name': lease_name(), 'label': 'dead-host pid 1', 'size': 2,
+                              'state': 'uploaded', 'created_at': '2000-01-01T00:00:00Z'}
+        release.blobs[99] = b'{}'
+    start = time.time()
+    with tool.publish_lease('token', {'id': 1}, DIGEST):
+        asset, _ = release.named(lease_name())
+        assert asset['id'] != 99
+    assert time.time() - start < 2
+    assert release.named(lease_name())[0] is None
+
+
+def test_lease_released_when_process_exits_mid_publish(release):
+    entered = threading.Event()
+    finish = threading.Event()
+
+    def publish():
+        with tool.publish_lease('token', {'id': 1}, DIGEST):
+            entered.set()
+            finish.wait(10)
+
+    thread = threading.Thread(target=publish, daemon=True)
+    thread.start()
+    assert entered.wait(5)
+    assert release.named(lease_name())[0] is not None
+    # atexit: main thoát trong lúc luồng publish (daemon) còn giữ lease
+    tool.release_held_leases()
+    assert release.named(lease_name())[0] is None
+
+    # Máy khác nhận lease; luồng cũ kết thúc sau đó không được xóa lease của máy khác
+    with tool.publish_lease('token', {'id': 1}, DIGEST):
+        finish.set()
+        thread.join(5)
+        assert release.named(lease_name())[0] is not None
+
+
+def test_pointer_readable_during_every_swap_step(release, workspace, monkeypatch):
+    rename = tool.rename_release_asset
+    seen = []
+
+    def checked_rename(token, asset_id, name, label=None):
+        before = tool.load_current_assets(token, tool.refresh_release(token, {'id': 1}))
+        result = rename(token, asset_id, name, label)
+        after = tool.load_current_assets(token, tool.refresh_release(token, {'id': 1}))
+        seen.append((before is not None, after is not None))
+        return result
+
+    monkeypatch.setattr(tool, 'rename_release_asset', checked_rename)
+    digests = []
+    for index in range(3):
+        (workspace / tool.XCODE_DIR / 'Classes' / 'swap.cpp').write_text(f'int v = {index};\n', encoding='utf-8')
+        assert tool.setup_releases('token', jobs=1, part_size_mb=0)
+        digests.append(tool.current_assets_digest())
+    # Mọi bước đổi tên (kể cả lần đầu: bản tạm đã đọc được) đều thấy 1 con trỏ đọc được
+    assert len(seen) >= 5 and all(before and after for before, after in seen)
+    names = [asset['name'] for asset in release.assets.values()]
+    assert not [name for name in names if tool.is_replacement_copy(name, tool.CURRENT_ASSETS)]
+    _, body = release.named(tool.CURRENT_ASSETS)
+    assert [entry['digest'] for entry in json.loads(body)['history']] == digests[::-1]
+
+
+def publish_versions(workspace, count):
+    digests = []
+    for index in range(count):
+        (workspace / tool.XCODE_DIR / 'Classes' / 'gc.cpp').write_text(f'int v = {index};\n', encoding='utf-8')
+        assert tool.setup_releases('token', jobs=1, part_size_mb=0)
+        digests.append(tool.current_assets_digest())
+    return digests
+
+
+def test_gc_keeps_recent_digests_within_grace(release, workspace):
+    digests = publish_versions(workspace, 4)
+    for digest in digests:
+        assert release.named(tool.digest_asset_name(tool.ASSETS_ZIP, digest))[0] is not None
+
+
+def test_gc_drops_digests_outside_history(release, workspace, monkeypatch):
+    monkeypatch.setattr(tool, 'ASSETS_KEEP', 2)
+    monkeypatch.setattr(tool, 'ASSETS_GRACE', -60)
+    digests = publish_versions(workspace, 3)
+    _, body = release.named(tool.CURRENT_ASSETS)
+    assert [entry['digest'] for entry in json.loads(body)['history']] == digests[:0:-1]
+    assert release.named(tool.digest_asset_name(tool.ASSETS_ZIP, digests[0]))[0] is None
+    for digest in digests[1:]:
+        assert release.named(tool.digest_asset_name(tool.ASSETS_ZIP, digest))[0] is not None
+    # Lease của lần publish đang chạy ở máy khác không phải asset của digest nào: vẫn giữ
+    # khi còn trong ASSETS_GRACE
+    monkeypatch.setattr(tool, 'ASSETS_GRACE', 3600)
+    other = tool.upload_asset_bytes('token', 1, lease_name(), b'{}', 'application/json', 'other pid 2')[0]
+    assert other.status_code == 201
+    publish_versions(workspace, 1)
+    assert release.named(lease_name())[0] is not None
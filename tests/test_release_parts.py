@@ -0,0 +1,137 @@
+"""Upload ZIP lên Release: resume theo part sau khi 1 part lỗi và ZIP được nén lại (cùng digest, khác byte),
+bỏ qua upload khi Release đã khớp digest, dừng nén khi part lỗi"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+
+import auto_build_ipa as tool
+
+from conftest import touch_tree
+
+
+def published_parts(release, index_name):
+    """Index trên Release + byte thật của từng part theo thứ tự"""
+    _, body = release.named(index_name)
+    index = json.loads(body)
+    blobs = [release.named(part['name'])[1] for part in index['parts']]
+    return index, blobs
+
+
+def assert_index_matches_bytes(index, blobs, expected):
+    for part, blob in zip(index['parts'], blobs):
+        assert hashlib.sha256(blob).hexdigest() == part['sha256'], part['name']
+    assert b''.join(blobs) == expected
+    assert hashlib.sha256(expected).hexdigest() == index['sha256']
+
+
+def pack(full=True):
+    zip_path = tool.compress_xcode_assets(jobs=1, full=full)
+    return zip_path, tool.current_assets_digest()
+
+
+def test_resume_after_repack_reuploads_changed_parts(release, workspace):
+    zip_path, digest = pack()
+    name = tool.digest_asset_name(tool.ASSETS_ZIP, digest)
+    release.fail.add(tool.part_name(name, 2))
+    assert tool.upload_parts_to_release('token', 1, zip_path, digest, part_size_mb=1, jobs=2, name=name) is None
+    first, _ = release.named(tool.part_name(name, 1))
+
+    # Nén lại cùng nội dung: mtime trong local header đổi nên byte của part .001 đổi
+    touch_tree(workspace)
+    zip_path, same_digest = pack()
+    assert same_digest == digest
+    release.fail.clear()
+    assert tool.upload_parts_to_release('token', 1, zip_path, digest, part_size_mb=1, jobs=2, name=name)
+
+    index, blobs = published_parts(release, tool.parts_index_name(name))
+    assert len(index['parts']) > 2
+    assert_index_matches_bytes(index, blobs, Path(zip_path).read_bytes())
+    assert release.named(tool.part_name(name, 1))[0]['id'] != first['id']
+
+
+def test_resume_keeps_parts_with_same_bytes(release, workspace):
+    zip_path, digest = pack()
+    name = tool.digest_asset_name(tool.ASSETS_ZIP, digest)
+    release.fail.add(tool.part_name(name, 2))
+    assert tool.upload_parts_to_release('token', 1, zip_path, digest, part_size_mb=1, jobs=2, name=name) is None
+    first, _ = release.named(tool.part_name(name, 1))
+
+    release.fail.clear()
+    assert tool.upload_parts_to_release('token', 1, zip_path, digest, part_size_mb=1, jobs=2, name=name)
+    assert release.named(tool.part_name(name, 1))[0]['id'] == first['id']
+    index, blobs = published_parts(release, tool.parts_index_name(name))
+    assert_index_matches_bytes(index, blobs, Path(zip_path).read_bytes())
+
+
+def stream(digest):
+    xcode_path = Path(tool.XCODE_DIR)
+    files, _ = tool.build_file_index(xcode_path, cache_path=None)
+    assert tool.compute_assets_digest(files, tool.pack_fingerprint(None, False)) == digest
+    return tool.stream_xcode_assets('token', {'id': 1}, xcode_path, files, digest, jobs=1,
+                                    part_size_mb=1, upload_jobs=2, dedup=False)
+
+
+def test_stream_resume_after_repack_reuploads_changed_parts(release, workspace):
+    files, _ = tool.build_file_index(Path(tool.XCODE_DIR), cache_path=None)
+    digest = tool.compute_assets_digest(files, tool.pack_fingerprint(None, False))
+    name = tool.digest_asset_name(tool.ASSETS_ZIP, digest)
+    release.fail.add(tool.part_name(name, 2))
+    assert not stream(digest)
+
+    touch_tree(workspace)
+    release.fail.clear()
+    assert stream(digest)
+
+    index, blobs = published_parts(release, tool.parts_index_name(name))
+    assert len(index['parts']) > 2
+    for part, blob in zip(index['parts'], blobs):
+        assert hashlib.sha256(blob).hexdigest() == part['sha256'], part['name']
+    assert hashlib.sha256(b''.join(blobs)).hexdigest() == index['sha256']
+
+
+
+def test_stream_stops_compressing_after_upload_error(release, tmp_path, monkeypatch):
+    entries = []
+    for index in range(40):
+        path = tmp_path / f'blob{index:02d}.bin'
+        path.write_bytes(os.urandom(300 * 1024))
+        entries.append((f'XCODE/Data/{path.name}', path))
+    release.fail.add(tool.part_name(tool.ASSETS_ZIP, 1))
+    compressed = []
+    compress_file = tool.compress_file
+    time_sleep = tool.time.sleep
+    monkeypatch.setattr(tool.time, 'sleep', lambda seconds: None if seconds >= 1 else time_sleep(seconds))
+
+    def slow_compress(file_path, arcname, policy):
+        compressed.append(arcname)
+        tool.time.sleep(0.02)  # Nén chậm hơn upload: lỗi của part 1 đến khi còn nhiều file chưa nén
+        return compress_file(file_path, arcname, policy)
+
+    monkeypatch.setattr(tool, 'compress_file', slow_compress)
+    assert tool.stream_pack_and_upload('token', 1, entries, digest='ab' * 32, part_size_mb=1, jobs=1,
+                                       upload_jobs=2, progress=False) is None
+    assert len(compressed) < len(entries) // 2
+    assert release.named(tool.parts_index_name(tool.ASSETS_ZIP))[0] is None
+
+
+def test_skip_upload_when_release_matches(release, workspace, monkeypatch):
+    monkeypatch.setattr(tool.time, 'sleep', lambda seconds: None)
+    assert tool.setup_releases('token', jobs=1, part_size_mb=1)
+    digest = tool.current_assets_digest()
+    uploads = release.next_id[0]
+    zip_stat = Path(tool.ASSETS_ZIP).stat()
+
+    # Cùng máy, XCODE không đổi: dùng lại ZIP, không POST asset nào
+    assert tool.setup_releases('token', jobs=1, part_size_mb=1)
+    assert release.next_id[0] == uploads
+    assert Path(tool.ASSETS_ZIP).stat().st_mtime_ns == zip_stat.st_mtime_ns
+
+    # Máy khác (chưa có ZIP/manifest) cùng nội dung: nén lại nhưng Release đã khớp digest → không upload
+    Path(tool.ASSETS_ZIP).unlink()
+    Path(tool.ASSETS_MANIFEST).unlink()
+    touch_tree(workspace)
+    assert tool.setup_releases('token', jobs=1, part_size_mb=1)
+    assert tool.current_assets_digest() == digest
+    assert release.next_id[0] == uploads
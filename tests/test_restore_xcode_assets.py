@@ -0,0 +1,178 @@
+"""restore_xcode_assets.py: publish bằng auto_build_ipa.py lên Release giả lập rồi restore từng kiểu asset"""
+
+import os
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+import auto_build_ipa as tool
+import restore_xcode_assets as restore
+
+from conftest import TAG, tree_files
+
+
+@pytest.fixture(autouse=True)
+def no_upload_wait(monkeypatch):
+    """Bỏ 5 giây đợi asset xuất hiện sau khi upload ZIP 1 file (Release giả lập có ngay)"""
+    monkeypatch.setattr(tool.time, 'sleep', lambda seconds: None)
+
+
+def publish(**options):
+    assert tool.setup_releases('token', jobs=1, **options)
+    return tool.current_assets_digest()
+
+
+def restore_into(release, dest, digest=None, cache_dir=None):
+    client = restore.ReleaseClient('owner/repo', TAG, 'token', api_root=release.root)
+    return restore.restore_assets(client, digest, str(dest), cache_dir and str(cache_dir), jobs=4)
+
+
+def edit_tree(workspace):
+    """Sửa 1 file, thêm 1 file, xóa 1 file"""
+    xcode = Path(workspace, tool.XCODE_DIR)
+    with open(xcode / 'Classes' / 'file3.cpp', 'a', encoding='utf-8') as f:
+        f.write('int y = 1;\n')
+    (xcode / 'Classes' / 'New' / 'added.cpp').parent.mkdir()
+    (xcode / 'Classes' / 'New' / 'added.cpp').write_text('int z = 2;\n', encoding='utf-8')
+    (xcode / 'Classes' / 'file5.cpp').unlink()
+
+
+@pytest.mark.parametrize('options, kind', [
+    ({'part_size_mb': 0}, 'zip'),
+    ({'part_size_mb': 1}, 'parts'),
+    ({'stream': True, 'part_size_mb': 1}, 'parts'),
+    ({'chunked': True}, 'recipe'),
+])
+def test_restore_layout(release, workspace, tmp_path, options, kind):
+    digest = publish(**options)
+    stats = restore_into(release, tmp_path / 'ci', digest)
+    assert stats['kind'] == kind
+    assert tree_files(tmp_path / 'ci') == tree_files(workspace)
+    assert os.access(tmp_path / 'ci' / tool.XCODE_DIR / 'Libraries' / 'run.sh', os.X_OK)
+
+
+def test_restore_chain_with_deltas(release, workspace, tmp_path, monkeypatch):
+    publish(part_size_mb=1, delta=True)
+    edit_tree(workspace)
+    # ZIP delta nằm ngoài repo: git add chạy song song (scheduler) không được thấy nó
+    delta_paths = []
+    upload_delta = tool.upload_delta
+    monkeypatch.setattr(tool, 'upload_delta', lambda token, release, path, digest: (
+        delta_paths.append(Path(path)) or upload_delta(token, release, path, digest)))
+    digest = publish(part_size_mb=1, delta=True)
+    assert len(delta_paths) == 1 and workspace not in delta_paths[0].parents
+    assert not delta_paths[0].exists()
+    deltas = [asset['name'] for asset in release.assets.values() if '.delta-' in asset['name']]
+    assert len(deltas) == 1 and deltas[0].startswith(tool.delta_asset_name(digest)[:-len('.zip')] + '.')
+    stats = restore_into(release, tmp_path / 'ci', digest)
+    assert stats['kind'] == 'chain'
+    assert tree_files(tmp_path / 'ci') == tree_files(workspace)
+
+
+@pytest.mark.parametrize('options', [{'dedup': False}, {'compression': 'fast'}])
+def test_packing_change_republishes_unchanged_tree(release, workspace, tmp_path, options):
+    digest = publish(part_size_mb=0)
+    assert publish(part_size_mb=0) == digest  # Không đổi gì: dùng lại ZIP và asset trên Release
+    zip_before = Path(tool.ASSETS_ZIP).read_bytes()
+    # XCODE không đổi nhưng cách đóng gói đổi: không được coi là "không thay đổi"
+    changed = publish(part_size_mb=0, **options)
+    assert changed != digest
+    assert Path(tool.ASSETS_ZIP).read_bytes() != zip_before
+    assert release.named(tool.digest_asset_name(tool.ASSETS_ZIP, changed))[0] is not None
+    stats = restore_into(release, tmp_path / 'ci', changed)
+    assert stats['kind'] == 'zip'
+    assert tree_files(tmp_path / 'ci') == tree_files(workspace)
+
+
+def test_resolve_without_digest_uses_current_pointer(release, workspace, tmp_path):
+    publish(part_size_mb=0)
+    edit_tree(workspace)
+    digest = publish(part_size_mb=0)
+    client = restore.ReleaseClient('owner/repo', TAG, 'token', api_root=release.root)
+    assert restore.current_digest(client) == digest
+    # --skip-releases: digest (key cache IPA) lấy từ Release, không từ manifest máy này
+    os.remove(tool.ASSETS_MANIFEST)
+    assert tool.release_assets_digest('token', TAG) == digest
+    restore_into(release, tmp_path / 'ci', restore.current_digest(client))
+    assert tree_files(tmp_path / 'ci') == tree_files(workspace)
+
+
+def test_pointer_never_missing_when_replace_fails(release, workspace, tmp_path, monkeypatch):
+    first = publish(part_size_mb=0)
+    client = lambda: restore.ReleaseClient('owner/repo', TAG, 'token', api_root=release.root)
+
+    # Đổi tên bản mới lỗi (1 lần) → bản cũ được trả về tên chính
+    edit_tree(workspace)
+    rename = tool.rename_release_asset
+    failures = [1]
+
+    def flaky_rename(token, asset_id, name, label=None):
+        if name == tool.CURRENT_ASSETS and failures[0]:
+            failures[0] -= 1
+            return None
+        return rename(token, asset_id, name, label)
+
+    monkeypatch.setattr(tool, 'rename_release_asset', flaky_rename)
+    assert not tool.setup_releases('token', jobs=1, part_size_mb=0)
+    second = tool.current_assets_digest()
+    assert release.named(tool.CURRENT_ASSETS)[0] is not None
+    assert restore.current_digest(client()) == first
+
+    # Trả bản cũ về cũng lỗi → tên chính vắng, người đọc dùng bản tạm mới nhất
+    release.fail_rename.add(tool.CURRENT_ASSETS)
+    assert not tool.setup_releases('token', jobs=1, part_size_mb=0)
+    assert release.named(tool.CURRENT_ASSETS)[0] is None
+    assert restore.current_digest(client()) == second
+    restore_into(release, tmp_path / 'ci', restore.current_digest(client()))
+    assert tree_files(tmp_path / 'ci') == tree_files(workspace)
+
+    # Lần publish sau đọc được history từ bản tạm nên không dọn mất digest cũ
+    release.fail_rename.clear()
+    (workspace / tool.XCODE_DIR / 'Classes' / 'file7.cpp').write_text('int w;\n', encoding='utf-8')
+    third = publish(part_size_mb=0)
+    _, body = release.named(tool.CURRENT_ASSETS)
+    assert [entry['digest'] for entry in json.loads(body)['history']] == [third, second, first]
+    assert restore.current_digest(client()) == third
+
+
+def test_restore_from_cache_without_requests(release, workspace, tmp_path):
+    digest = publish(part_size_mb=1)
+    restore_into(release, tmp_path / 'first', digest, tmp_path / 'cache')
+    before = release.requests[0]
+    stats = restore_into(release, tmp_path / 'second', digest[:16], tmp_path / 'cache')
+    assert release.requests[0] == before
+    assert stats['downloaded'] == 0
+    assert tree_files(tmp_path / 'second') == tree_files(workspace)
+
+
+def test_restore_redownloads_corrupted_cache(release, workspace, tmp_path):
+    digest = publish(part_size_mb=0)
+    restore_into(release, tmp_path / 'first', digest, tmp_path / 'cache')
+    cached = next(path for path in (tmp_path / 'cache').iterdir() if path.name.endswith('.zip'))
+    data = bytearray(cached.read_bytes())
+    data[100] ^= 0xFF
+    cached.write_bytes(bytes(data))
+    restore_into(release, tmp_path / 'second', digest, tmp_path / 'cache')
+    assert tree_files(tmp_path / 'second') == tree_files(workspace)
+
+
+def test_restore_rejects_modified_asset(release, workspace, tmp_path):
+    digest = publish(part_size_mb=0)
+    asset, body = release.named(tool.digest_asset_name(tool.ASSETS_ZIP, digest))
+    # Đổi 1 byte trong data của member (CRC sai) → restore phải lỗi, không được ra cây hỏng
+    data = bytearray(body)
+    data[len(data) // 3] ^= 0xFF
+    release.blobs[asset['id']] = bytes(data)
+    with pytest.raises(restore.RestoreError):
+        restore_into(release, tmp_path / 'ci', digest)
+
+
+def test_restore_keeps_checkout_files(release, workspace, tmp_path):
+    digest = publish(chunked=True)
+    checkout = tmp_path / 'ci'
+    shutil.copytree(workspace / tool.XCODE_DIR / 'Classes', checkout / tool.XCODE_DIR / 'Classes')
+    stats = restore_into(release, checkout, digest)
+    assert tree_files(checkout) == tree_files(workspace)
+    assert stats['downloaded'] < sum(len(data) for data in tree_files(workspace).values())
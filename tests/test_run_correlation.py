@@ -0,0 +1,128 @@
+"""Tìm đúng run vừa trigger: khớp correlation id trong tên run, workflow cũ thì theo thời gian trigger"""
+
+import re
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+import auto_build_ipa as tool
+
+WORKFLOW_ID = 42
+
+
+class DispatchStandIn(BaseHTTPRequestHandler):
+    """Giả lập workflow_dispatch: run xuất hiện sau `delay` giây, tên run chứa correlation_id
+
+    `legacy` = workflow chưa khai báo input correlation_id (422 như GitHub).
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.endswith('/actions/workflows'):
+            return self._send(200, {'workflows': [{'id': WORKFLOW_ID, 'name': 'Build IPA',
+                                                   'path': f'.github/workflows/{tool.WORKFLOW_FILE}'}]})
+        if re.search(r'/actions/workflows/[^/]+/runs$', path):
+            now = time.time()
+            with self.lock:
+                runs = [run for run in self.runs if run['visible_at'] <= now]
+            # Mới nhất trước như GitHub
+            return self._send(200, {'workflow_runs': sorted(runs, key=lambda run: run['created_at'], reverse=True)})
+        self._send(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        inputs = payload['inputs']
+        if self.legacy and 'correlation_id' in inputs:
+            return self._send(422, {'message': 'Unexpected inputs provided: ["correlation_id"]'})
+        self.add_run(inputs.get('correlation_id'))
+        self._send(204)
+
+    @classmethod
+    def add_run(cls, correlation_id=None, created=None):
+        created = time.time() if created is None else created
+        with cls.lock:
+            run_id = len(cls.runs) + 1
+            title = f"Build IPA {correlation_id}" if correlation_id else "Build IPA"
+            cls.runs.append({'id': run_id, 'display_title': title, 'name': 'Build IPA',
+                             'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(created)),
+                             'visible_at': time.time() + cls.delay})
+        return run_id
+
+
+@pytest.fixture
+def actions(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tool, '_clients', {})
+    handler = type('Actions', (DispatchStandIn,), {'runs': [], 'lock': threading.Lock(),
+                                                   'delay': 0.3, 'legacy': False})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(tool, 'API_BASE', f"http://127.0.0.1:{server.server_address[1]}/repos/o/r")
+    yield handler
+    server.shutdown()
+    server.server_close()
+
+
+def test_new_correlation_id():
+    assert re.fullmatch(r'[0-9a-f]{16}', tool.new_correlation_id())
+    assert tool.new_correlation_id() != tool.new_correlation_id()
+    key = 'c' * 64
+    assert re.fullmatch('c' * tool.BUILD_CACHE_TAG_LENGTH + r'-[0-9a-f]{8}', tool.new_correlation_id(key))
+
+
+def test_concurrent_dispatches_match_own_run(actions):
+    ids = [tool.new_correlation_id() for _ in range(3)]
+    found = {}
+
+    def dispatch_and_find(correlation_id):
+        dispatch = tool.trigger_workflow('token', correlation_id=correlation_id)
+        found[correlation_id] = tool.find_workflow_run('token', dispatch, timeout=10)
+
+    threads = [threading.Thread(target=dispatch_and_find, args=(correlation_id,)) for correlation_id in ids]
+    for thread in threads:
+        thread.start()
+    # Run của người khác trên cùng branch, tạo cùng lúc
+    actions.add_run()
+    for thread in threads:
+        thread.join(15)
+    assert len({run['id'] for run in found.values()}) == 3
+    for correlation_id, run in found.items():
+        assert correlation_id in run['display_title']
+
+
+def test_legacy_workflow_skips_known_runs(actions):
+    actions.legacy = True
+    # Run của người khác vừa tạo ngay trước lúc trigger: chỉ known_runs loại được nó
+    old = actions.add_run(created=time.time() - 1)
+    actions.runs[-1]['visible_at'] = 0
+    dispatch = tool.trigger_workflow('token', correlation_id=tool.new_correlation_id())
+    assert dispatch['correlation_id'] is None and old in dispatch['known_runs']
+    run = tool.find_workflow_run('token', dispatch, timeout=10)
+    assert run['id'] != old and run['id'] == len(actions.runs)
+
+
+def test_lookup_times_out(actions, monkeypatch):
+    monkeypatch.setattr(tool, 'RUN_LOOKUP_MAX_INTERVAL', 0.2)
+    dispatch = {'workflow': WORKFLOW_ID, 'branch': tool.BRANCH, 'correlation_id': 'never-dispatched',
+                'dispatched_at': time.time(), 'known_runs': []}
+    actions.add_run('someone-else')
+    start = time.time()
+    assert tool.find_workflow_run('token', dispatch, timeout=1.5) is None
+    assert time.time() - start < 3
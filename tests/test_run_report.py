@@ -0,0 +1,104 @@
+"""Đo thời gian: span lồng nhau/đa luồng, span CI từ jobs API, JSON lines và Chrome trace"""
+
+import json
+import threading
+
+import pytest
+
+import auto_build_ipa as tool
+
+
+def test_nested_spans_and_throughput():
+    report = tool.RunReport()
+    with report.span('publish', files=3):
+        with report.span('upload') as record:
+            record['bytes'] = 2 * 1024 * 1024
+    upload, publish = report.spans  # Span con kết thúc trước
+    assert (upload['name'], upload['parent'], upload['depth']) == ('upload', 'publish', 1)
+    assert (publish['parent'], publish['depth'], publish['files']) == (None, 0, 3)
+    assert publish['seconds'] >= upload['seconds'] >= 0
+    assert upload['start'] >= publish['start']
+    if upload['seconds'] > 0:
+        assert upload['mb_per_s'] == pytest.approx(2 / upload['seconds'], rel=0.01)
+
+
+def test_failed_span_is_recorded():
+    report = tool.RunReport()
+    with pytest.raises(RuntimeError):
+        with report.span('download'):
+            raise RuntimeError('mất mạng')
+    assert report.spans[0]['ok'] is False
+
+
+def test_threads_keep_separate_stacks():
+    report = tool.RunReport()
+    entered = threading.Barrier(2)
+
+    def worker():
+        with report.span('worker'):
+            entered.wait(5)
+
+    thread = threading.Thread(target=worker, name='upload-1')
+    with report.span('main'):
+        thread.start()
+        entered.wait(5)
+        thread.join(5)
+    worker_span = next(record for record in report.spans if record['name'] == 'worker')
+    # Span trong thread khác không lồng vào span đang mở của luồng chính
+    assert (worker_span['thread'], worker_span['parent'], worker_span['depth']) == ('upload-1', None, 0)
+
+
+def test_ci_spans_from_jobs(monkeypatch):
+    report = tool.RunReport()
+    run_data = {'id': 7, 'created_at': '2024-01-01T00:00:00Z'}
+    jobs = [{'name': 'build-ipa', 'conclusion': 'success',
+             'started_at': '2024-01-01T00:00:30Z', 'completed_at': '2024-01-01T00:05:30Z',
+             'steps': [{'name': 'Build Xcode project', 'conclusion': 'success',
+                        'started_at': '2024-01-01T00:01:00Z', 'completed_at': '2024-01-01T00:04:00Z'},
+                       {'name': 'Export IPA', 'started_at': None, 'completed_at': None}]}]
+    monkeypatch.setattr(tool, '_run_report', report)
+    tool.record_ci_spans(run_data, jobs, label='Release')
+    spans = {record['name']: record for record in report.spans}
+    assert set(spans) == {'ci.queue', 'ci.job build-ipa', 'ci.step Build Xcode project'}
+    assert spans['ci.queue']['seconds'] == 30
+    assert spans['ci.job build-ipa']['seconds'] == 300
+    step = spans['ci.step Build Xcode project']
+    assert (step['seconds'], step['parent'], step['depth'], step['label']) == (180, 'ci.job build-ipa', 1, 'Release')
+    assert all(record['cat'] == 'ci' and record['run_id'] == 7 for record in report.spans)
+
+
+def test_jsonl_and_chrome_trace(tmp_path):
+    report = tool.RunReport()
+    with report.span('scan'):
+        pass
+    report.add_span('ci.job build-ipa', report.started + 1, report.started + 3, thread='build-ipa')
+
+    path = tmp_path / 'report.jsonl'
+    report.write_jsonl(path)
+    report.write_jsonl(path)  # Nối thêm, không ghi đè
+    lines = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [line['name'] for line in lines] == ['scan', 'ci.job build-ipa'] * 2
+    assert all(line['report'] == report.id for line in lines)
+
+    trace_path = tmp_path / 'trace.json'
+    report.write_chrome_trace(trace_path)
+    events = json.loads(trace_path.read_text(encoding='utf-8'))['traceEvents']
+    complete = {event['name']: event for event in events if event['ph'] == 'X'}
+    assert complete['scan']['pid'] == 1 and complete['ci.job build-ipa']['pid'] == 2
+    assert complete['ci.job build-ipa']['ts'] == 1_000_000 and complete['ci.job build-ipa']['dur'] == 2_000_000
+    names = {(event['pid'], event['args']['name']) for event in events if event['name'] == 'thread_name'}
+    assert names == {(1, 'MainThread'), (2, 'build-ipa')}
+
+
+def test_finish_run_report_adds_total(tmp_path, monkeypatch, capsys):
+    report = tool.RunReport()
+    report.meta = {'config': 'Release'}
+    monkeypatch.setattr(tool, '_run_report', report)
+    with tool.span('publish') as record:
+        record['bytes'] = 1024
+    tool.finish_run_report(tmp_path / 'report.jsonl', tmp_path / 'trace.json')
+    lines = [json.loads(line) for line in (tmp_path / 'report.jsonl').read_text(encoding='utf-8').splitlines()]
+    total = next(line for line in lines if line['name'] == 'total')
+    assert total['config'] == 'Release' and total['seconds'] >= lines[0]['seconds']
+    assert (tmp_path / 'trace.json').exists()
+    assert 'publish' in capsys.readouterr().out
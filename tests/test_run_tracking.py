@@ -0,0 +1,76 @@
+"""Theo dõi run: poll có ETag (304) và webhook đánh thức vòng poll ngay khi run xong"""
+
+import hmac
+import json
+import time
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import auto_build_ipa as tool
+import benchmark_auto_build as bench
+
+RUN_SECONDS = 1.5
+
+
+@pytest.fixture
+def actions(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    start = time.time()
+    steps = [(name, RUN_SECONDS * share) for name, share in bench.SIMULATED_STEPS]
+    monkeypatch.setattr(bench.ActionsStandIn, 'runs', {
+        1: {'start': start, 'steps': steps, 'webhook': None},
+        2: {'start': start, 'steps': steps, 'webhook': None},
+    })
+    monkeypatch.setattr(bench.ActionsStandIn, 'counters', {})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), bench.ActionsStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(tool, 'API_BASE', f"http://127.0.0.1:{server.server_address[1]}/repos/o/r")
+    yield bench.ActionsStandIn
+    server.shutdown()
+    server.server_close()
+
+
+def finished_at(run_id):
+    return bench.ActionsStandIn.snapshot(run_id, time.time())[2]
+
+
+def test_poll_uses_etag(actions, monkeypatch):
+    monkeypatch.setattr(tool, 'DEFAULT_POLL_INTERVAL', 0.2)
+    monkeypatch.setattr(tool, 'MIN_POLL_INTERVAL', 0.2)
+    assert tool.wait_for_workflow_completion('token', 1, timeout=30)
+    assert time.time() - finished_at(1) < 1.5
+    total, not_modified = actions.counters[1]
+    assert not_modified > 0 and not_modified < total
+    # Lần build xong được ghi vào lịch sử để lần sau poll thích ứng
+    history = json.loads(open(tool.BUILD_HISTORY, encoding='utf-8').read())
+    assert history['runs'][-1]['run_id'] == 1
+
+
+def test_webhook_wakes_poll_loop(actions):
+    port = bench.free_port()
+    actions.runs[2]['webhook'] = f'http://127.0.0.1:{port}/'
+    # Không có webhook thì lần poll sau cách MAX_POLL_INTERVAL (60s): phát hiện nhanh là nhờ webhook
+    sender = threading.Thread(target=bench.send_webhook_on_completion, args=(2,), daemon=True)
+    sender.start()
+    assert tool.wait_for_workflow_completion('token', 2, timeout=30, webhook_port=port)
+    assert time.time() - finished_at(2) < 1.5
+    assert actions.counters[2][0] <= 6
+
+
+def test_webhook_checks_signature():
+    wake = threading.Event()
+    receiver = tool.WebhookReceiver(0, 7, wake, secret='s3cret')
+    try:
+        body = json.dumps({'action': 'completed', 'workflow_run': {'id': 7}}).encode('utf-8')
+        url = f'http://127.0.0.1:{receiver.port}/'
+        response = tool.requests.post(url, data=body, headers={'X-Hub-Signature-256': 'sha256=bad'}, timeout=5)
+        assert response.status_code == 401 and not wake.is_set()
+        signature = 'sha256=' + hmac.new(b's3cret', body, hashlib.sha256).hexdigest()
+        response = tool.requests.post(url, data=body, headers={'X-Hub-Signature-256': signature}, timeout=5)
+        assert response.status_code == 204 and wake.is_set()
+        assert receiver.woken == {7}
+    finally:
+        receiver.close()
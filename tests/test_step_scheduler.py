@@ -0,0 +1,71 @@
+"""StepScheduler: bước độc lập chạy song song, `after` đợi bước trước, lỗi truyền sang bước phụ thuộc và gate()"""
+
+import sys
+import time
+import threading
+
+import pytest
+
+import auto_build_ipa as tool
+
+
+@pytest.fixture(autouse=True)
+def report(monkeypatch):
+    report = tool.RunReport()
+    monkeypatch.setattr(tool, '_run_report', report)
+    return report
+
+
+def test_independent_steps_overlap(report, capsys):
+    scheduler = tool.StepScheduler()
+    barrier = threading.Barrier(2)
+    # Cả 2 bước phải cùng chạy thì mới qua được barrier
+    scheduler.add('upload', lambda: barrier.wait(5) is not None and 'uploaded')
+    scheduler.add('push', lambda: barrier.wait(5) is not None and 'pushed', mode='zip')
+    assert (scheduler.result('upload'), scheduler.result('push')) == ('uploaded', 'pushed')
+    scheduler.finish()
+    spans = {record['name']: record for record in report.spans}
+    assert spans['push']['mode'] == 'zip'
+    assert spans['push']['thread'] == tool.STEP_THREAD_PREFIX + 'push'
+    assert 'steps' in spans
+    assert 'Các bước trước khi trigger' in capsys.readouterr().out
+
+
+def test_after_waits_for_dependency():
+    scheduler = tool.StepScheduler()
+    order = []
+    scheduler.add('push', lambda: time.sleep(0.2) or order.append('push'))
+    scheduler.add('branch_commit', lambda: order.append('branch_commit') or 'abc', after=('push',))
+    # Bước phụ thuộc không có thì bỏ qua
+    scheduler.add('workflow_id', lambda: 42, after=('missing',))
+    assert scheduler.result('branch_commit') == 'abc'
+    assert scheduler.result('workflow_id') == 42
+    assert order == ['push', 'branch_commit']
+    assert scheduler.result('skipped', default=True) is True
+
+
+def test_error_propagates_to_dependents():
+    scheduler = tool.StepScheduler()
+    ran = []
+
+    def fail():
+        raise RuntimeError('push lỗi')
+
+    scheduler.add('push', fail)
+    scheduler.add('branch_commit', lambda: ran.append('branch_commit'), after=('push',))
+    with pytest.raises(RuntimeError, match='push lỗi'):
+        scheduler.gate('branch_commit')
+    assert ran == []
+
+
+def test_gate_raises_without_waiting_for_slow_steps():
+    scheduler = tool.StepScheduler()
+    release = threading.Event()
+    scheduler.add('setup_releases', lambda: release.wait(10))
+    scheduler.add('push', lambda: sys.exit(1))  # sys.exit trong bước được raise lại ở main
+    start = time.time()
+    with pytest.raises(SystemExit):
+        scheduler.gate('setup_releases', 'push')
+    assert time.time() - start < 2
+    release.set()
+    scheduler.finish()
@@ -0,0 +1,109 @@
+"""Daemon --watch: thay đổi đến trong lúc publish được publish tiếp, publish lỗi thì thử lại giãn dần"""
+
+import time
+import queue
+import threading
+
+import pytest
+
+import auto_build_ipa as tool
+
+
+class Stop(Exception):
+    pass
+
+
+class FakeWatcher:
+    """Watcher giả: wait(None) chặn tới khi có event như inotify thật"""
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.stopped = threading.Event()
+
+    def wait(self, timeout):
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.stopped.is_set():
+            try:
+                return self.events.get(timeout=0.02)
+            except queue.Empty:
+                if deadline is not None and time.time() >= deadline:
+                    return set()
+        raise Stop()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def watch(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    watcher = FakeWatcher()
+    monkeypatch.setattr(tool, 'make_watcher', lambda root: watcher)
+    threads = []
+
+    def start(publish):
+        daemon = tool.WatchDaemon(publish, {}, port=0, debounce=0.05, max_delay=1)
+
+        def run():
+            try:
+                daemon.run(tmp_path)
+            except Stop:
+                pass
+
+        threads.append(threading.Thread(target=run, daemon=True))
+        threads[-1].start()
+        return daemon, watcher
+
+    yield start
+    watcher.stopped.set()
+    for thread in threads:
+        thread.join(5)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_changes_during_publish_are_published_without_new_event(watch):
+    calls = []
+
+    def publish():
+        calls.append(time.time())
+        if len(calls) == 2:
+            watcher.events.put({'XCODE/Classes/late.cpp'})  # Đổi trong lúc đang upload
+        return True
+
+    daemon, watcher = watch(publish)
+    assert wait_until(lambda: daemon.snapshot()['state'] == 'idle')
+    watcher.events.put({'XCODE/Classes/a.cpp'})
+    # Không có event nào mới sau lần 2: lần 3 vẫn phải chạy (không chặn ở wait(None))
+    assert wait_until(lambda: len(calls) == 3 and daemon.snapshot()['state'] == 'idle', timeout=3)
+    assert not daemon.snapshot()['dirty']
+
+
+def test_failed_publish_retries_with_capped_backoff(watch, monkeypatch):
+    monkeypatch.setattr(tool, 'WATCH_RETRY_BASE', 0.3)
+    monkeypatch.setattr(tool, 'WATCH_RETRY_MAX', 0.6)
+    calls = []
+
+    def publish():
+        calls.append(time.time())
+        return False
+
+    daemon, watcher = watch(publish)
+    assert wait_until(lambda: len(calls) == 4, timeout=5)
+    gaps = [later - earlier for earlier, later in zip(calls, calls[1:])]
+    assert gaps[0] >= 0.3 and gaps[1] >= 0.6 and 0.6 <= gaps[2] < 1.2
+    status = daemon.snapshot()
+    assert status['state'] == 'error' and status['dirty'] and status['retry_at'] > time.time() - 1
+
+    # Thay đổi thật thì thử lại ngay, không đợi hết khoảng backoff
+    monkeypatch.setattr(tool, 'WATCH_RETRY_MAX', 60)
+    assert wait_until(lambda: len(calls) == 5, timeout=3)
+    watcher.events.put({'XCODE/Classes/a.cpp'})
+    assert wait_until(lambda: len(calls) == 6, timeout=1)
@@ -0,0 +1,80 @@
+"""ZipStreamWriter / pack_directory: ZIP ghi tuần tự phải mở được bằng zipfile (kể cả ZIP64)"""
+
+import io
+import os
+import zlib
+import zipfile
+
+import pytest
+
+import auto_build_ipa as tool
+
+from conftest import tree_files
+
+MEMBERS = [
+    ('XCODE/Classes/main.mm', b'int main() { return 0; }\n' * 400, 'deflate'),
+    ('XCODE/Data/level.bin', os.urandom(70000), 'store'),
+    ('XCODE/Data/big.txt', b'lzma lzma lzma\n' * 5000, 'lzma'),
+    ('XCODE/Data/empty.dat', b'', 'deflate'),
+    ('XCODE/Data/Tiếng Việt.txt', 'xin chào\n'.encode('utf-8'), 'deflate'),
+]
+
+
+def write_members(tmp_path, members=MEMBERS):
+    buffer = io.BytesIO()
+    writer = tool.ZipStreamWriter(buffer)
+    for index, (arcname, payload, method) in enumerate(members):
+        path = tmp_path / f'member{index}'
+        path.write_bytes(payload)
+        policy = {'rules': [], 'default': {'method': method}}
+        data, crc, size, st, zip_method = tool.compress_file(path, arcname, policy)
+        writer.add(arcname, data, crc, size, st.st_mtime, mode=0o100755 if index == 0 else 0o100644,
+                   method=zip_method)
+    writer.close()
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('zip64_limit', [0xFFFFFFFF, 100])
+def test_writer_round_trip(tmp_path, monkeypatch, zip64_limit):
+    # Ngưỡng nhỏ ép mọi member/offset/central directory qua nhánh ZIP64
+    monkeypatch.setattr(tool.ZipStreamWriter, 'ZIP64_LIMIT', zip64_limit)
+    data = write_members(tmp_path)
+    assert (b'PK\x06\x06' in data) == (zip64_limit == 100)
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        infos = zf.infolist()
+        assert [info.filename for info in infos] == [arcname for arcname, _, _ in MEMBERS]
+        for info, (arcname, payload, method) in zip(infos, MEMBERS):
+            assert zf.read(info) == payload
+            assert info.file_size == len(payload)
+        assert infos[1].compress_type == zipfile.ZIP_STORED
+        assert infos[2].compress_type == zipfile.ZIP_LZMA
+        assert infos[0].external_attr >> 16 == 0o100755
+
+
+def test_writer_zip64_entry_count(tmp_path):
+    buffer = io.BytesIO()
+    writer = tool.ZipStreamWriter(buffer)
+    count = 0x10000  # Quá 16 bit của end record thường
+    for index in range(count):
+        writer.add(f'f{index}', b'', zlib.crc32(b''), 0, 0, method=zipfile.ZIP_STORED)
+    writer.close()
+    with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as zf:
+        assert len(zf.infolist()) == count
+        assert zf.namelist()[-1] == f'f{count - 1}'
+
+
+def test_pack_directory_round_trip(workspace, tmp_path):
+    zip_path = tmp_path / 'out.zip'
+    stats = tool.pack_directory(tool.XCODE_DIR, zip_path, jobs=4, progress=False)
+    assert not zip_path.with_name('out.zip.tmp').exists()
+    expected = tree_files(workspace)
+    with zipfile.ZipFile(zip_path) as zf:
+        assert zf.testzip() is None
+        assert {name: zf.read(name) for name in zf.namelist()} == expected
+        assert zf.getinfo(f'{tool.XCODE_DIR}/Libraries/run.sh').external_attr >> 16 & 0o111
+    assert stats['files'] == len(expected)
+    # Cùng input → cùng byte (stream resume so sánh part theo nội dung)
+    again = tmp_path / 'again.zip'
+    tool.pack_directory(tool.XCODE_DIR, again, jobs=2, progress=False)
+    assert again.read_bytes() == zip_path.read_bytes()